@@ -62,6 +62,11 @@ class DhcpAgent(manager.Manager):
                            "enable_isolated_metadata = True")),
         cfg.IntOpt('num_sync_threads', default=4,
                    help=_('Number of threads to use during sync process.')),
+        cfg.FloatOpt('dhcp_reload_delay', default=0.5,
+                     help=_('Seconds to wait after a port event before '
+                            'reloading the allocations of its network, so '
+                            'that a burst of events is applied by one '
+                            'reload. 0 reloads on every event.')),
         cfg.StrOpt('metadata_proxy_socket',
                    default='$state_path/metadata_proxy',
                    help=_('Location of Metadata Proxy UNIX domain '
@@ -73,6 +78,9 @@ class DhcpAgent(manager.Manager):
         self.needs_resync = False
         self.conf = cfg.CONF
         self.cache = NetworkCache()
+        # the removed ips to release for each network waiting for a reload
+        self.pending_reloads = {}
+        self.reload_timer = None
         self.root_helper = config.get_root_helper(self.conf)
         self.dhcp_driver_cls = importutils.import_class(self.conf.dhcp_driver)
         ctx = context.get_admin_context_without_session()
@@ -265,10 +273,54 @@ class DhcpAgent(manager.Manager):
             # pass in port with removed ips on it
             removed_ips = previous_ips - current_ips
             if removed_ips:
+                self.schedule_release_lease(network,
+                                            updated_port.mac_address,
+                                            removed_ips)
+
+    def schedule_reload_allocations(self, network):
+        """Reload the allocations of a network after dhcp_reload_delay.
+
+        The reloads requested for a network before that are merged.
+        """
+        self.pending_reloads.setdefault(network.id, [])
+        if not self.conf.dhcp_reload_delay:
+            self._reload_pending_allocations()
+        elif self.reload_timer is None:
+            self.reload_timer = eventlet.spawn_after(
+                self.conf.dhcp_reload_delay, self.reload_pending_allocations)
+
+    def schedule_release_lease(self, network, mac_address, removed_ips):
+        """Release the leases of removed ips after the pending reload."""
+        if not self.conf.dhcp_reload_delay:
+            self.call_driver('release_lease',
+                             network,
+                             mac_address=mac_address,
+                             removed_ips=removed_ips)
+        else:
+            self.pending_reloads.setdefault(network.id, []).append(
+                (mac_address, removed_ips))
+
+    @utils.synchronized('dhcp-agent')
+    def reload_pending_allocations(self):
+        self.reload_timer = None
+        self._reload_pending_allocations()
+
+    def _reload_pending_allocations(self):
+        pending_reloads, self.pending_reloads = self.pending_reloads, {}
+        for network_id, released_leases in pending_reloads.iteritems():
+            network = self.cache.get_network_by_id(network_id)
+            if not network:
+                # the network was deleted since the reload was scheduled
+                continue
+            self.call_driver('reload_allocations', network)
+            for mac_address, removed_ips in released_leases:
                 self.call_driver('release_lease',
                                  network,
-                                 mac_address=updated_port.mac_address,
+                                 mac_address=mac_address,
                                  removed_ips=removed_ips)
+        if pending_reloads:
+            LOG.debug(_('Reloaded the allocations of %d networks'),
+                      len(pending_reloads))
 
     @utils.synchronized('dhcp-agent')
     def network_create_end(self, context, payload):
@@ -315,7 +367,7 @@ class DhcpAgent(manager.Manager):
         if network:
             prev_port = self.cache.get_port_by_id(updated_port.id)
             self.cache.put_port(updated_port)
-            self.call_driver('reload_allocations', network)
+            self.schedule_reload_allocations(network)
             self.release_lease_for_removed_ips(prev_port, updated_port,
                                                network)
 
@@ -329,13 +381,11 @@ class DhcpAgent(manager.Manager):
         if port:
             network = self.cache.get_network_by_id(port.network_id)
             self.cache.remove_port(port)
-            self.call_driver('reload_allocations', network)
+            self.schedule_reload_allocations(network)
             removed_ips = [fixed_ip.ip_address
                            for fixed_ip in port.fixed_ips]
-            self.call_driver('release_lease',
-                             network,
-                             mac_address=port.mac_address,
-                             removed_ips=removed_ips)
+            self.schedule_release_lease(network, port.mac_address,
+                                        removed_ips)
 
     def enable_isolated_metadata_proxy(self, network):
 
@@ -17,7 +17,11 @@
 # @author: Dan Wendlandt, Nicira, Inc
 #
 
+import itertools
+import time
+
 import eventlet
+from eventlet import queue
 import netaddr
 from oslo.config import cfg
 
@@ -36,7 +40,6 @@ from neutron.common import utils as common_utils
 from neutron import context
 from neutron import manager
 from neutron.openstack.common import importutils
-from neutron.openstack.common import lockutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
 from neutron.openstack.common import periodic_task
@@ -50,9 +53,14 @@ LOG = logging.getLogger(__name__)
 NS_PREFIX = 'qrouter-'
 INTERNAL_DEV_PREFIX = 'qr-'
 EXTERNAL_DEV_PREFIX = 'qg-'
-RPC_LOOP_INTERVAL = 1
 FLOATING_IP_CIDR_SUFFIX = '/32'
 
+# Lower value is higher priority
+PRIORITY_RPC = 0
+PRIORITY_SYNC_ROUTERS_TASK = 1
+DELETE_ROUTER = 'delete'
+UPDATE_ROUTER = 'update'
+
 
 class L3PluginApi(proxy.RpcProxy):
     """Agent side of the l3 agent RPC API.
@@ -68,14 +76,38 @@ class L3PluginApi(proxy.RpcProxy):
         super(L3PluginApi, self).__init__(
             topic=topic, default_version=self.BASE_RPC_API_VERSION)
         self.host = host
+        self.router_ids_supported = True
 
-    def get_routers(self, context, router_ids=None):
-        """Make a remote process call to retrieve the sync data for routers."""
+    def get_routers(self, context, router_ids=None, full_sync=False):
+        """Make a remote process call to retrieve the sync data for routers.
+
+        full_sync tells the plugin the routers are fetched by a full sync,
+        which can read them from the slave database.
+        """
         return self.call(context,
                          self.make_msg('sync_routers', host=self.host,
-                                       router_ids=router_ids),
+                                       router_ids=router_ids,
+                                       full_sync=full_sync),
                          topic=self.topic)
 
+    def get_router_ids(self, context):
+        """Make a remote process call to retrieve the hosted router ids.
+
+        Returns None when the plugin is too old to support the call.
+        """
+        if not self.router_ids_supported:
+            return
+        try:
+            return self.call(context,
+                             self.make_msg('get_router_ids', host=self.host),
+                             topic=self.topic)
+        except rpc_common.RemoteError as e:
+            if e.exc_type not in ('UnsupportedRpcVersion', 'AttributeError'):
+                raise
+            LOG.info(_("Plugin does not support getting the router ids, "
+                       "syncing all the routers at once"))
+            self.router_ids_supported = False
+
     def get_external_network_id(self, context):
         """Make a remote process call to retrieve the external network id.
 
@@ -89,6 +121,132 @@ class L3PluginApi(proxy.RpcProxy):
                          topic=self.topic)
 
 
+class RouterUpdate(object):
+    """A pending update of a router.
+
+    The router data is fetched when the update is dequeued if it is not
+    given.  data_timestamp is the time the router data, or its absence for
+    a deletion, was read from the server, once it was read.
+    """
+
+    def __init__(self, router_id, priority, action=UPDATE_ROUTER,
+                 router=None, data_timestamp=None):
+        self.router_id = router_id
+        self.priority = priority
+        self.action = action
+        self.router = router
+        self.data_timestamp = data_timestamp
+        self.timestamp = time.time()
+
+
+class RouterUpdateQueue(object):
+    """Queue of router updates ordered by priority, then by age.
+
+    The updates of a router waiting in the queue are merged into the most
+    recent one of the highest priority, which keeps the age of the oldest.
+    A router is handed to one worker at a time: its updates queued while
+    it is processed wait until the worker is done with it.  The updates
+    whose data was read before the data a router was last processed with
+    are dropped.  That time is forgotten once the router is deleted, or,
+    when a full sync is in progress, once the sync is done.
+    """
+
+    def __init__(self):
+        self._queue = queue.PriorityQueue()
+        self._pending = {}
+        self._busy = set()
+        self._counter = itertools.count()
+        # router id -> time the data a router was last processed with was
+        # read
+        self._processed = {}
+        # ids of the routers deleted while a full sync is in progress
+        self._deleted_during_sync = None
+
+    def __len__(self):
+        return len([router_id for router_id in self._pending
+                    if router_id not in self._busy])
+
+    def _is_stale(self, update):
+        return (update.data_timestamp is not None and
+                update.data_timestamp < self._processed.get(update.router_id,
+                                                            0))
+
+    def add(self, update):
+        if self._is_stale(update):
+            LOG.debug(_("Dropping the outdated update of router %s"),
+                      update.router_id)
+            return
+        current = self._pending.get(update.router_id)
+        if current:
+            if current.priority < update.priority:
+                return
+            update.timestamp = min(update.timestamp, current.timestamp)
+        self._pending[update.router_id] = update
+        if update.router_id not in self._busy:
+            self._put(update)
+
+    def _put(self, update):
+        # the updates replaced by a later one are left in the queue and
+        # skipped by get
+        self._queue.put((update.priority, update.timestamp,
+                         next(self._counter), update))
+
+    def get(self, block=True):
+        """Return the next update of a router no worker processes.
+
+        Wait for it, unless block is False: None is then returned if no
+        update is ready.
+        """
+        while True:
+            try:
+                update = self._queue.get(block=block)[-1]
+            except queue.Empty:
+                return
+            if self._pending.get(update.router_id) is update:
+                del self._pending[update.router_id]
+                self._busy.add(update.router_id)
+                return update
+
+    def done(self, update):
+        """Release the router of an update handed by get."""
+        self._busy.discard(update.router_id)
+        if update.data_timestamp is not None:
+            self._processed[update.router_id] = max(
+                update.data_timestamp,
+                self._processed.get(update.router_id, 0))
+        pending = self._pending.get(update.router_id)
+        if pending and self._is_stale(pending):
+            LOG.debug(_("Dropping the outdated update of router %s"),
+                      update.router_id)
+            del self._pending[update.router_id]
+            pending = None
+        elif pending:
+            self._put(pending)
+        if not pending and (update.action == DELETE_ROUTER or
+                            update.router is None):
+            # The router was deleted, or is not hosted by the agent anymore
+            self._forget(update.router_id)
+
+    def _forget(self, router_id):
+        # The updates of a full sync in progress may have read the router
+        # before it was deleted
+        if self._deleted_during_sync is not None:
+            self._deleted_during_sync.add(router_id)
+        else:
+            self._processed.pop(router_id, None)
+
+    def sync_started(self):
+        """Keep the times of the deleted routers until sync_done()."""
+        self._deleted_during_sync = set()
+
+    def sync_done(self):
+        deleted, self._deleted_during_sync = self._deleted_during_sync, None
+        for router_id in deleted or ():
+            if (router_id not in self._pending and
+                    router_id not in self._busy):
+                self._processed.pop(router_id, None)
+
+
 class RouterInfo(object):
 
     def __init__(self, router_id, root_helper, use_namespaces, router):
@@ -107,6 +265,14 @@ class RouterInfo(object):
             namespace=self.ns_name())
 
         self.routes = []
+        # The NAT rules and floating ip addresses last configured, from
+        # which process_router computes the changes to apply
+        self.snat_rules = []
+        # floating ip -> fixed ip
+        self.floating_ips = {}
+        # The floating ip cidrs of the gateway device, None until they are
+        # listed from the device
+        self.floating_ip_cidrs = None
 
     @property
     def router(self):
@@ -187,6 +353,12 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
                    default='$state_path/metadata_proxy',
                    help=_('Location of Metadata Proxy UNIX domain '
                           'socket')),
+        cfg.IntOpt('sync_routers_chunk_size', default=64,
+                   help=_("Maximum number of routers fetched by one rpc "
+                          "call during a full sync. It is halved each time "
+                          "a call times out.")),
+        cfg.IntOpt('router_update_workers', default=8,
+                   help=_("Number of routers updated concurrently.")),
     ]
 
     def __init__(self, host, conf=None):
@@ -213,15 +385,17 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
         self.context = context.get_admin_context_without_session()
         self.plugin_rpc = L3PluginApi(topics.L3PLUGIN, host)
         self.fullsync = True
-        self.updated_routers = set()
-        self.removed_routers = set()
+        self.sync_routers_chunk_size = self.conf.sync_routers_chunk_size
+        self.target_ex_net_id = None
+        self.router_updates = RouterUpdateQueue()
+        self.router_update_pool = eventlet.GreenPool(
+            self.conf.router_update_workers)
+        self.router_update_stats = {'updates': 0, 'latency_total': 0.0,
+                                    'latency_max': 0.0}
         self.sync_progress = False
         if self.conf.use_namespaces:
             self._destroy_router_namespaces(self.conf.router_id)
 
-        self.rpc_loop = loopingcall.FixedIntervalLoopingCall(
-            self._rpc_loop)
-        self.rpc_loop.start(interval=RPC_LOOP_INTERVAL)
         super(L3NATAgent, self).__init__(conf=self.conf)
 
     def _check_config_params(self):
@@ -288,8 +462,11 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
             ip_wrapper = ip_wrapper_root.ensure_namespace(ri.ns_name())
             ip_wrapper.netns.execute(['sysctl', '-w', 'net.ipv4.ip_forward=1'])
 
-    def _fetch_external_net_id(self):
-        """Find UUID of single external network for this agent."""
+    def _fetch_external_net_id(self, force=False):
+        """Find UUID of single external network for this agent.
+
+        The UUID got from the plugin is kept until force is set.
+        """
         if self.conf.gateway_external_network_id:
             return self.conf.gateway_external_network_id
 
@@ -299,8 +476,13 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
         if not self.conf.external_network_bridge:
             return
 
+        if self.target_ex_net_id and not force:
+            return self.target_ex_net_id
+
         try:
-            return self.plugin_rpc.get_external_network_id(self.context)
+            self.target_ex_net_id = self.plugin_rpc.get_external_network_id(
+                self.context)
+            return self.target_ex_net_id
         except rpc_common.RemoteError as e:
             if e.exc_type == 'TooManyExternalNetworks':
                 msg = _(
@@ -418,9 +600,11 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
             interface_name = self.get_external_device_name(ex_gw_port_id)
         if ex_gw_port and not ri.ex_gw_port:
             self._set_subnet_info(ex_gw_port)
+            ri.floating_ip_cidrs = None
             self.external_gateway_added(ri, ex_gw_port,
                                         interface_name, internal_cidrs)
         elif not ex_gw_port and ri.ex_gw_port:
+            ri.floating_ip_cidrs = None
             self.external_gateway_removed(ri, ri.ex_gw_port,
                                           interface_name, internal_cidrs)
 
@@ -431,6 +615,8 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
         # Process DNAT rules for floating IPs
         if ex_gw_port:
             self.process_router_floating_ips(ri, ex_gw_port)
+        elif ri.floating_ips:
+            self._update_floating_ip_rules(ri, {})
 
         ri.ex_gw_port = ex_gw_port
         ri.enable_snat = ri.router.get('enable_snat')
@@ -439,67 +625,93 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
 
     def _handle_router_snat_rules(self, ri, ex_gw_port, internal_cidrs,
                                   interface_name, action):
-        # Remove all the rules
+        # Only the rules changed since the last call are removed or added.
         # This is safe because if use_namespaces is set as False
         # then the agent can only configure one router, otherwise
         # each router's SNAT rules will be in their own namespace
-        ri.iptables_manager.ipv4['nat'].empty_chain('POSTROUTING')
-        ri.iptables_manager.ipv4['nat'].empty_chain('snat')
-
-        # Add back the jump to float-snat
-        ri.iptables_manager.ipv4['nat'].add_rule('snat', '-j $float-snat')
-
-        # And add them back if the action if add_rules
+        rules = []
         if action == 'add_rules' and ex_gw_port:
             # ex_gw_port should not be None in this case
             ex_gw_ip = ex_gw_port['fixed_ips'][0]['ip_address']
-            for rule in self.external_gateway_nat_rules(ex_gw_ip,
-                                                        internal_cidrs,
-                                                        interface_name):
-                ri.iptables_manager.ipv4['nat'].add_rule(*rule)
-        ri.iptables_manager.apply()
+            rules = self.external_gateway_nat_rules(ex_gw_ip,
+                                                    internal_cidrs,
+                                                    interface_name)
+        nat = ri.iptables_manager.ipv4['nat']
+        new_rules = set(rules)
+        for rule in ri.snat_rules:
+            if rule not in new_rules:
+                nat.remove_rule(*rule)
+        old_rules = set(ri.snat_rules)
+        # The jump to float-snat added by the IptablesManager stays first
+        for rule in rules:
+            if rule not in old_rules:
+                nat.add_rule(*rule)
+        ri.snat_rules = rules
+
+    def _update_floating_ip_rules(self, ri, floating_ips):
+        """Update the NAT rules of the floating ips changed.
+
+        floating_ips maps the floating ips of the router to their fixed ip.
+        """
+        nat = ri.iptables_manager.ipv4['nat']
+        for fip_ip, fixed in ri.floating_ips.iteritems():
+            if floating_ips.get(fip_ip) != fixed:
+                for chain, rule in self.floating_forward_rules(fip_ip, fixed):
+                    nat.remove_rule(chain, rule)
+        for fip_ip, fixed in floating_ips.iteritems():
+            if ri.floating_ips.get(fip_ip) != fixed:
+                for chain, rule in self.floating_forward_rules(fip_ip, fixed):
+                    nat.add_rule(chain, rule, tag='floating_ip')
+        ri.floating_ips = floating_ips
 
     def process_router_floating_ips(self, ri, ex_gw_port):
         """Configure the router's floating IPs
         Configures floating ips in iptables and on the router's gateway device.
 
-        Cleans up floating ips that should not longer be configured.
+        Only the floating ips added, remapped or removed since they were
+        last configured are changed.
         """
         interface_name = self.get_external_device_name(ex_gw_port['id'])
-        device = ip_lib.IPDevice(interface_name, self.root_helper,
-                                 namespace=ri.ns_name())
-
-        # Clear out all iptables rules for floating ips
-        ri.iptables_manager.ipv4['nat'].clear_rules_by_tag('floating_ip')
-
-        existing_cidrs = set([addr['cidr'] for addr in device.addr.list()])
-        new_cidrs = set()
-
-        # Loop once to ensure that floating ips are configured.
-        for fip in ri.router.get(l3_constants.FLOATINGIP_KEY, []):
-            fip_ip = fip['floating_ip_address']
-            ip_cidr = str(fip_ip) + FLOATING_IP_CIDR_SUFFIX
+        ip_wrapper = ip_lib.IPWrapper(self.root_helper,
+                                      namespace=ri.ns_name())
+        device = ip_wrapper.device(interface_name)
+
+        floating_ips = dict(
+            (fip['floating_ip_address'], fip['fixed_ip_address'])
+            for fip in ri.router.get(l3_constants.FLOATINGIP_KEY, []))
+        self._update_floating_ip_rules(ri, floating_ips)
+
+        if ri.floating_ip_cidrs is None:
+            ri.floating_ip_cidrs = set(
+                addr['cidr'] for addr in device.addr.list()
+                if addr['cidr'].endswith(FLOATING_IP_CIDR_SUFFIX))
+        new_cidrs = set(str(fip_ip) + FLOATING_IP_CIDR_SUFFIX
+                        for fip_ip in floating_ips)
+        added_cidrs = new_cidrs - ri.floating_ip_cidrs
+        removed_cidrs = ri.floating_ip_cidrs - new_cidrs
 
-            new_cidrs.add(ip_cidr)
-
-            if ip_cidr not in existing_cidrs:
-                net = netaddr.IPNetwork(ip_cidr)
-                device.addr.add(net.version, ip_cidr, str(net.broadcast))
-                self._send_gratuitous_arp_packet(ri, interface_name, fip_ip)
-
-            # Rebuild iptables rules for the floating ip.
-            fixed = fip['fixed_ip_address']
-            for chain, rule in self.floating_forward_rules(fip_ip, fixed):
-                ri.iptables_manager.ipv4['nat'].add_rule(chain, rule,
-                                                         tag='floating_ip')
-
-        ri.iptables_manager.apply()
-
-        # Clean up addresses that no longer belong on the gateway interface.
-        for ip_cidr in existing_cidrs - new_cidrs:
-            if ip_cidr.endswith(FLOATING_IP_CIDR_SUFFIX):
-                net = netaddr.IPNetwork(ip_cidr)
-                device.addr.delete(net.version, ip_cidr)
+        try:
+            # The addresses are added by a single 'ip -batch'.
+            with ip_wrapper.batch():
+                for ip_cidr in added_cidrs:
+                    net = netaddr.IPNetwork(ip_cidr)
+                    device.addr.add(net.version, ip_cidr, str(net.broadcast))
+
+            for ip_cidr in added_cidrs:
+                self._send_gratuitous_arp_packet(ri, interface_name,
+                                                 ip_cidr.split('/')[0])
+
+            # Clean up addresses that no longer belong on the gateway
+            # interface.
+            with ip_wrapper.batch():
+                for ip_cidr in removed_cidrs:
+                    net = netaddr.IPNetwork(ip_cidr)
+                    device.addr.delete(net.version, ip_cidr)
+        except Exception:
+            # The addresses are listed again by the next update
+            ri.floating_ip_cidrs = None
+            raise
+        ri.floating_ip_cidrs = new_cidrs
 
     def _get_ex_gw_port(self, ri):
         return ri.router.get('gw_port')
@@ -643,7 +855,8 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
     def router_deleted(self, context, router_id):
         """Deal with router deletion RPC message."""
         LOG.debug(_('Got router deleted notification for %s'), router_id)
-        self.removed_routers.add(router_id)
+        self.router_updates.add(RouterUpdate(router_id, PRIORITY_RPC,
+                                             action=DELETE_ROUTER))
 
     def routers_updated(self, context, routers):
         """Deal with routers modification and creation RPC message."""
@@ -652,11 +865,15 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
             # This is needed for backward compatibility
             if isinstance(routers[0], dict):
                 routers = [router['id'] for router in routers]
-            self.updated_routers.update(routers)
+            for router_id in routers:
+                self.router_updates.add(RouterUpdate(router_id,
+                                                     PRIORITY_RPC))
 
     def router_removed_from_agent(self, context, payload):
         LOG.debug(_('Got router removed from agent :%r'), payload)
-        self.removed_routers.add(payload['router_id'])
+        self.router_updates.add(RouterUpdate(payload['router_id'],
+                                             PRIORITY_RPC,
+                                             action=DELETE_ROUTER))
 
     def router_added_to_agent(self, context, payload):
         LOG.debug(_('Got router added to agent :%r'), payload)
@@ -708,39 +925,89 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
             pool.spawn_n(self._router_removed, router_id)
         pool.waitall()
 
-    @lockutils.synchronized('l3-agent', 'neutron-')
-    def _rpc_loop(self):
-        # _rpc_loop and _sync_routers_task will not be
-        # executed in the same time because of lock.
-        # so we can clear the value of updated_routers
-        # and removed_routers
+    def _process_router_updates(self):
+        """Hand the queued router updates to the workers, forever.
+
+        The updates ready for the free workers are dequeued together, and
+        the routers they need are fetched with a single call.
+        """
+        while True:
+            updates = [self.router_updates.get()]
+            batch_size = min(self.router_update_pool.free(),
+                             self.sync_routers_chunk_size)
+            while len(updates) < batch_size:
+                update = self.router_updates.get(block=False)
+                if update is None:
+                    break
+                updates.append(update)
+            self._fetch_updated_routers(updates)
+            for update in updates:
+                self.router_update_pool.spawn_n(self._process_router_update,
+                                                update)
+
+    def _fetch_updated_routers(self, updates):
+        """Fetch the routers of the updates which need them.
+
+        If the call fails, each update fetches its router when processed.
+        """
+        updates = [update for update in updates
+                   if update.action == UPDATE_ROUTER and
+                   update.data_timestamp is None]
+        if not updates:
+            return
+        timestamp = time.time()
+        router_ids = [update.router_id for update in updates]
         try:
-            LOG.debug(_("Starting RPC loop for %d updated routers"),
-                      len(self.updated_routers))
-            if self.updated_routers:
-                router_ids = list(self.updated_routers)
-                self.updated_routers.clear()
-                routers = self.plugin_rpc.get_routers(
-                    self.context, router_ids)
-                self._process_routers(routers)
-            self._process_router_delete()
-            LOG.debug(_("RPC loop successfully completed"))
+            routers = self.plugin_rpc.get_routers(self.context, router_ids)
         except Exception:
-            LOG.exception(_("Failed synchronizing routers"))
-            self.fullsync = True
+            LOG.exception(_("Failed fetching routers %s"), router_ids)
+            return
+        routers = dict((router['id'], router) for router in routers)
+        for update in updates:
+            update.router = routers.get(update.router_id)
+            update.data_timestamp = timestamp
 
-    def _process_router_delete(self):
-        current_removed_routers = list(self.removed_routers)
-        for router_id in current_removed_routers:
-            self._router_removed(router_id)
-            self.removed_routers.remove(router_id)
+    def _process_router_update(self, update):
+        start = time.time()
+        try:
+            if update.data_timestamp is None:
+                # The deletion notified, or the data fetched now
+                update.data_timestamp = start
+                if update.action == UPDATE_ROUTER:
+                    routers = self.plugin_rpc.get_routers(self.context,
+                                                          [update.router_id])
+                    update.router = routers[0] if routers else None
+            if update.action == DELETE_ROUTER:
+                self._router_removed(update.router_id)
+                return
+            router = update.router
+            if router:
+                self._process_routers([router])
+            elif update.router_id in self.router_info:
+                # The router was deleted or is not hosted by the agent
+                # anymore
+                self._router_removed(update.router_id)
+        except Exception:
+            LOG.exception(_("Failed processing router %s"), update.router_id)
+            self.fullsync = True
+        finally:
+            self.router_updates.done(update)
+            end = time.time()
+            latency = end - update.timestamp
+            stats = self.router_update_stats
+            stats['updates'] += 1
+            stats['latency_total'] += latency
+            stats['latency_max'] = max(stats['latency_max'], latency)
+            LOG.debug(_("Router %(router_id)s updated in %(time).3fs, "
+                        "%(latency).3fs after the update was queued"),
+                      {'router_id': update.router_id, 'time': end - start,
+                       'latency': latency})
 
     def _router_ids(self):
         if not self.conf.use_namespaces:
             return [self.conf.router_id]
 
     @periodic_task.periodic_task
-    @lockutils.synchronized('l3-agent', 'neutron-')
     def _sync_routers_task(self, context):
         if self.services_sync:
             super(L3NATAgent, self).process_services_sync(context)
@@ -748,22 +1015,75 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
                   self.fullsync)
         if not self.fullsync:
             return
+        self.router_updates.sync_started()
         try:
+            # The updates of the sync are dropped for the routers processed
+            # with data read after the sync started
+            timestamp = time.time()
+            prev_router_ids = set(self.router_info)
+            self._fetch_external_net_id(force=True)
             router_ids = self._router_ids()
-            self.updated_routers.clear()
-            self.removed_routers.clear()
-            routers = self.plugin_rpc.get_routers(
-                context, router_ids)
-
-            LOG.debug(_('Processing :%r'), routers)
-            self._process_routers(routers, all_routers=True)
+            if router_ids is None:
+                router_ids = self.plugin_rpc.get_router_ids(context)
+            if router_ids is None:
+                routers = self.plugin_rpc.get_routers(context)
+                synced_router_ids = self._queue_synced_routers(routers,
+                                                               timestamp)
+            else:
+                synced_router_ids = self._sync_routers_in_chunks(
+                    context, router_ids, timestamp)
+            # The routers added since the sync started are not removed
+            for router_id in prev_router_ids - synced_router_ids:
+                self.router_updates.add(
+                    RouterUpdate(router_id, PRIORITY_SYNC_ROUTERS_TASK,
+                                 action=DELETE_ROUTER,
+                                 data_timestamp=timestamp))
             self.fullsync = False
             LOG.debug(_("_sync_routers_task successfully completed"))
         except Exception:
             LOG.exception(_("Failed synchronizing routers"))
             self.fullsync = True
+        finally:
+            self.router_updates.sync_done()
+
+    def _queue_synced_routers(self, routers, timestamp):
+        LOG.debug(_('Processing :%r'), routers)
+        for router in routers:
+            self.router_updates.add(
+                RouterUpdate(router['id'], PRIORITY_SYNC_ROUTERS_TASK,
+                             router=router, data_timestamp=timestamp))
+        return set(router['id'] for router in routers)
+
+    def _sync_routers_in_chunks(self, context, router_ids, timestamp):
+        """Fetch the routers a chunk at a time and queue their updates.
+
+        timestamp is the time the sync started.  Returns the ids of the
+        routers fetched.
+        """
+        synced_router_ids = set()
+        start = 0
+        while start < len(router_ids):
+            chunk = router_ids[start:start + self.sync_routers_chunk_size]
+            try:
+                routers = self.plugin_rpc.get_routers(context, chunk,
+                                                      full_sync=True)
+            except rpc_common.Timeout:
+                if self.sync_routers_chunk_size == 1:
+                    raise
+                self.sync_routers_chunk_size = max(
+                    self.sync_routers_chunk_size // 2, 1)
+                LOG.warning(_("Timed out fetching %(count)d routers, "
+                              "fetching %(size)d routers at a time"),
+                            {'count': len(chunk),
+                             'size': self.sync_routers_chunk_size})
+                continue
+            synced_router_ids |= self._queue_synced_routers(routers,
+                                                            timestamp)
+            start += len(chunk)
+        return synced_router_ids
 
     def after_start(self):
+        eventlet.spawn_n(self._process_router_updates)
         LOG.info(_("L3 agent started"))
 
     def _update_routing_table(self, ri, operation, route):
@@ -843,6 +1163,14 @@ class L3NATAgentWithStateReport(L3NATAgent):
         configurations['ex_gw_ports'] = num_ex_gw_ports
         configurations['interfaces'] = num_interfaces
         configurations['floating_ips'] = num_floating_ips
+        # The router updates processed since the previous report
+        stats = self.router_update_stats
+        configurations['router_updates'] = stats['updates']
+        configurations['router_update_latency_avg'] = (
+            stats['updates'] and stats['latency_total'] / stats['updates'])
+        configurations['router_update_latency_max'] = stats['latency_max']
+        self.router_update_stats = {'updates': 0, 'latency_total': 0.0,
+                                    'latency_max': 0.0}
         try:
             self.state_rpc.report_state(self.context, self.agent_state,
                                         self.use_call)
@@ -158,6 +158,10 @@ class DhcpBase(object):
 class DhcpLocalProcess(DhcpBase):
     PORTS = []
 
+    # The contents of the config files last written by the drivers of the
+    # agent, the files are only replaced when their contents change
+    _conf_file_contents = {}
+
     def _enable_dhcp(self):
         """check if there is a subnet within the network with dhcp enabled."""
         for subnet in self.network.subnets:
@@ -207,6 +211,21 @@ class DhcpLocalProcess(DhcpBase):
         confs_dir = os.path.abspath(os.path.normpath(self.conf.dhcp_confs))
         conf_dir = os.path.join(confs_dir, self.network.id)
         shutil.rmtree(conf_dir, ignore_errors=True)
+        for file_name in self._conf_file_contents.keys():
+            if os.path.dirname(file_name) == conf_dir:
+                del self._conf_file_contents[file_name]
+
+    def _replace_conf_file(self, file_name, data):
+        """Replace the contents of a config file, unless they are data.
+
+        Returns whether the file was replaced.
+        """
+        if (self._conf_file_contents.get(file_name) == data and
+                os.path.exists(file_name)):
+            return False
+        utils.replace_file(file_name, data)
+        self._conf_file_contents[file_name] = data
+        return True
 
     def get_conf_file_name(self, kind, ensure_conf_dir=False):
         """Returns the file name for a given kind of config file."""
@@ -282,6 +301,13 @@ class Dnsmasq(DhcpLocalProcess):
     NEUTRON_RELAY_SOCKET_PATH_KEY = 'NEUTRON_RELAY_SOCKET_PATH'
     MINIMUM_VERSION = 2.59
 
+    _HOST_NAME_RE = re.compile('[:.]')
+
+    # The hosts file entries of the ports of each network, kept between the
+    # driver instances of the agent so that a reload only formats the
+    # entries of the ports which were updated since the previous one
+    _host_tables = {}
+
     @classmethod
     def check_version(cls):
         ver = 0
@@ -400,9 +426,14 @@ class Dnsmasq(DhcpLocalProcess):
                         'turned off DHCP: %s'), self.network.id)
             return
 
-        self._output_hosts_file()
-        self._output_opts_file()
-        if self.active:
+        hosts_changed = self._replace_conf_file(
+            self.get_conf_file_name('host'), self._build_hosts_file())
+        opts_changed = self._replace_conf_file(
+            self.get_conf_file_name('opts'), self._build_opts_file())
+        if not (hosts_changed or opts_changed):
+            LOG.debug(_('Allocations unchanged for network: %s'),
+                      self.network.id)
+        elif self.active:
             cmd = ['kill', '-HUP', self.pid]
             utils.execute(cmd, self.root_helper)
         else:
@@ -410,33 +441,59 @@ class Dnsmasq(DhcpLocalProcess):
         LOG.debug(_('Reloading allocations for network: %s'), self.network.id)
         self.device_manager.update(self.network)
 
+    def _remove_config_files(self):
+        super(Dnsmasq, self)._remove_config_files()
+        self._host_tables.pop(self.network.id, None)
+
     def _output_hosts_file(self):
         """Writes a dnsmasq compatible hosts file."""
-        r = re.compile('[:.]')
-        buf = StringIO.StringIO()
+        name = self.get_conf_file_name('host')
+        self._replace_conf_file(name, self._build_hosts_file())
+        return name
 
+    def _build_hosts_file(self):
+        """Build the hosts file from the host table of the network."""
+        host_table = self._host_tables.get(self.network.id, {})
+        new_host_table = {}
+        entries = []
         for port in self.network.ports:
-            for alloc in port.fixed_ips:
-                name = 'host-%s.%s' % (r.sub('-', alloc.ip_address),
-                                       self.conf.dhcp_domain)
-                set_tag = ''
-                if getattr(port, 'extra_dhcp_opts', False):
-                    if self.version >= self.MINIMUM_VERSION:
-                        set_tag = 'set:'
-
-                    buf.write('%s,%s,%s,%s%s\n' %
-                              (port.mac_address, name, alloc.ip_address,
-                               set_tag, port.id))
-                else:
-                    buf.write('%s,%s,%s\n' %
-                              (port.mac_address, name, alloc.ip_address))
+            entry = host_table.get(port.id)
+            # the ports which are not updated are kept by the agent cache
+            if entry is None or entry[0] is not port:
+                entry = (port, self._format_host_entry(port))
+            new_host_table[port.id] = entry
+            entries.append(entry[1])
+        self._host_tables[self.network.id] = new_host_table
+        return ''.join(entries)
+
+    def _format_host_entry(self, port):
+        """Format the hosts file lines of a port."""
+        buf = StringIO.StringIO()
+        for alloc in port.fixed_ips:
+            name = 'host-%s.%s' % (self._HOST_NAME_RE.sub('-',
+                                                          alloc.ip_address),
+                                   self.conf.dhcp_domain)
+            set_tag = ''
+            if getattr(port, 'extra_dhcp_opts', False):
+                if self.version >= self.MINIMUM_VERSION:
+                    set_tag = 'set:'
 
-        name = self.get_conf_file_name('host')
-        utils.replace_file(name, buf.getvalue())
-        return name
+                buf.write('%s,%s,%s,%s%s\n' %
+                          (port.mac_address, name, alloc.ip_address,
+                           set_tag, port.id))
+            else:
+                buf.write('%s,%s,%s\n' %
+                          (port.mac_address, name, alloc.ip_address))
+        return buf.getvalue()
 
     def _output_opts_file(self):
         """Write a dnsmasq compatible options file."""
+        name = self.get_conf_file_name('opts')
+        self._replace_conf_file(name, self._build_opts_file())
+        return name
+
+    def _build_opts_file(self):
+        """Build a dnsmasq compatible options file."""
 
         if self.conf.enable_isolated_metadata:
             subnet_to_interface_ip = self._make_subnet_interface_ip_map()
@@ -486,9 +543,7 @@ class Dnsmasq(DhcpLocalProcess):
                     self._format_option(port.id, opt.opt_name, opt.opt_value)
                     for opt in port.extra_dhcp_opts)
 
-        name = self.get_conf_file_name('opts')
-        utils.replace_file(name, '\n'.join(options))
-        return name
+        return '\n'.join(options)
 
     def _make_subnet_interface_ip_map(self):
         ip_dev = ip_lib.IPDevice(
@@ -78,28 +78,28 @@ class LinuxInterfaceDriver(object):
         ip_cidrs: list of 'X.X.X.X/YY' strings
         preserve_ips: list of ip cidrs that should not be removed from device
         """
-        device = ip_lib.IPDevice(device_name,
-                                 self.root_helper,
-                                 namespace=namespace)
+        ip = ip_lib.IPWrapper(self.root_helper, namespace=namespace)
+        device = ip.device(device_name)
 
         previous = {}
         for address in device.addr.list(scope='global', filters=['permanent']):
             previous[address['cidr']] = address['ip_version']
 
-        # add new addresses
-        for ip_cidr in ip_cidrs:
+        with ip.batch():
+            # add new addresses
+            for ip_cidr in ip_cidrs:
 
-            net = netaddr.IPNetwork(ip_cidr)
-            if ip_cidr in previous:
-                del previous[ip_cidr]
-                continue
+                net = netaddr.IPNetwork(ip_cidr)
+                if ip_cidr in previous:
+                    del previous[ip_cidr]
+                    continue
 
-            device.addr.add(net.version, ip_cidr, str(net.broadcast))
+                device.addr.add(net.version, ip_cidr, str(net.broadcast))
 
-        # clean up any old addresses
-        for ip_cidr, ip_version in previous.items():
-            if ip_cidr not in preserve_ips:
-                device.addr.delete(ip_version, ip_cidr)
+            # clean up any old addresses
+            for ip_cidr, ip_version in previous.items():
+                if ip_cidr not in preserve_ips:
+                    device.addr.delete(ip_version, ip_cidr)
 
     def check_bridge_exists(self, bridge):
         if not ip_lib.device_exists(bridge):
@@ -14,6 +14,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+import itertools
+import re
+
 import netaddr
 from oslo.config import cfg
 
@@ -34,12 +38,101 @@ LOOPBACK_DEVNAME = 'lo'
 VLAN_INTERFACE_DETAIL = ['vlan protocol 802.1q',
                          'vlan protocol 802.1Q',
                          'vlan id']
+# Reported by 'ip -batch' for the line of the first command which failed
+BATCH_FAILED_LINE_RE = re.compile(r'Command failed -:(\d+)')
+
+
+class IpBatchError(RuntimeError):
+    """A command run by 'ip -batch' failed.
+
+    command is the failed command, as it would have been run without the
+    batch. The commands queued after it were not run.
+    """
+
+    def __init__(self, command, error):
+        super(IpBatchError, self).__init__(
+            _("Batched command %(command)s failed: %(error)s") %
+            {'command': command, 'error': error})
+        self.command = command
+
+
+class IpBatch(object):
+    """Queue of ip commands run together by 'ip -batch'.
+
+    The commands queued consecutively for the same namespace and with the
+    same options are run by a single 'ip -batch -', in the order they were
+    queued.
+
+    The commands of a batch are read from its standard input, which
+    neutron-rootwrap doesn't see, so a batch is only run by the rootwrap
+    daemon, which checks each of them against the filters. Without the
+    daemon, the commands are run one by one.
+    """
+
+    def __init__(self, root_helper=None):
+        self.root_helper = root_helper
+        self.depth = 0
+        # (namespace, options, command, args) of the queued commands
+        self.commands = []
+
+    @property
+    def active(self):
+        return self.depth > 0
+
+    def add(self, namespace, options, command, args):
+        self.commands.append((namespace, list(options), command,
+                              [str(arg) for arg in args]))
+
+    def discard(self):
+        self.commands = []
+
+    def flush(self):
+        commands, self.commands = self.commands, []
+        for (namespace, options), group in itertools.groupby(
+                commands, lambda c: (c[0], c[1])):
+            self._run_batch(namespace, options, list(group))
+
+    def _run_batch(self, namespace, options, commands):
+        if namespace:
+            ip_cmd = ['ip', 'netns', 'exec', namespace, 'ip']
+        else:
+            ip_cmd = ['ip']
+        opt_list = ['-%s' % o for o in options]
+        lines = [' '.join([command] + [self._quote(arg) for arg in args])
+                 for _ns, _opts, command, args in commands]
+        try:
+            result = utils.execute(ip_cmd + opt_list + ['-batch', '-'],
+                                   root_helper=self.root_helper,
+                                   process_input='\n'.join(lines) + '\n',
+                                   daemon_only=True)
+        except RuntimeError as e:
+            match = BATCH_FAILED_LINE_RE.search(str(e))
+            if not match or not 0 < int(match.group(1)) <= len(commands):
+                raise
+            _ns, _opts, command, args = commands[int(match.group(1)) - 1]
+            raise IpBatchError(ip_cmd + opt_list + [command] + args, e)
+        if result is None:
+            for _ns, _opts, command, args in commands:
+                cmd = ip_cmd + opt_list + [command] + args
+                try:
+                    utils.execute(cmd, root_helper=self.root_helper)
+                except RuntimeError as e:
+                    raise IpBatchError(cmd, e)
+
+    @staticmethod
+    def _quote(arg):
+        # 'ip -batch' splits lines on whitespace, except inside quotes
+        if not arg or any(c.isspace() for c in arg):
+            return '"%s"' % arg
+        return arg
 
 
 class SubProcessBase(object):
     def __init__(self, root_helper=None, namespace=None):
         self.root_helper = root_helper
         self.namespace = namespace
+        # The batch of the IPWrapper which created this object, if any
+        self._batch = None
         try:
             self.force_root = cfg.CONF.ip_lib_force_root
         except cfg.NoSuchOptError:
@@ -47,7 +140,14 @@ class SubProcessBase(object):
             # need to register the option.
             self.force_root = False
 
+    def _flush_batch(self):
+        # Commands which aren't batched, like reads, see the effect of the
+        # commands queued before them
+        if self._batch is not None and self._batch.commands:
+            self._batch.flush()
+
     def _run(self, options, command, args):
+        self._flush_batch()
         if self.namespace:
             return self._as_root(options, command, args)
         elif self.force_root:
@@ -60,6 +160,7 @@ class SubProcessBase(object):
     def _as_root(self, options, command, args, use_root_namespace=False):
         if not self.root_helper:
             raise exceptions.SudoRequired()
+        self._flush_batch()
 
         namespace = self.namespace if not use_root_namespace else None
 
@@ -80,15 +181,55 @@ class SubProcessBase(object):
         return utils.execute(ip_cmd + opt_list + [command] + list(args),
                              root_helper=root_helper)
 
+    def _as_root_batched(self, options, command, args):
+        """Run a command changing links, addresses or routes as root.
+
+        The command is queued if a batch is active, see IPWrapper.batch.
+        """
+        if self._batch is not None and self._batch.active:
+            if not self.root_helper:
+                raise exceptions.SudoRequired()
+            self._batch.add(self.namespace, options, command, args)
+        else:
+            self._as_root(options, command, args)
+
 
 class IPWrapper(SubProcessBase):
     def __init__(self, root_helper=None, namespace=None):
         super(IPWrapper, self).__init__(root_helper=root_helper,
                                         namespace=namespace)
         self.netns = IpNetnsCommand(self)
+        self._batch = IpBatch(root_helper)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Run the link, addr and route changes made in the context at once.
+
+        The changes made through this wrapper and the devices it returns
+        are queued, and run by 'ip -batch' when the outermost batch context
+        exits, or before a command which isn't queued, like a read, is run.
+        The queued changes are discarded if the context raises an exception.
+        IpBatchError is raised for the first queued command which failed.
+        """
+        self._batch.depth += 1
+        try:
+            yield self
+        except Exception:
+            self._batch.depth -= 1
+            if not self._batch.active:
+                self._batch.discard()
+            raise
+        self._batch.depth -= 1
+        if not self._batch.active:
+            self._batch.flush()
+
+    def _device(self, name, namespace):
+        device = IPDevice(name, self.root_helper, namespace)
+        device._batch = self._batch
+        return device
 
     def device(self, name):
-        return IPDevice(name, self.root_helper, self.namespace)
+        return self._device(name, self.namespace)
 
     def get_devices(self, exclude_loopback=False):
         retval = []
@@ -108,14 +249,12 @@ class IPWrapper(SubProcessBase):
                 if exclude_loopback and name == LOOPBACK_DEVNAME:
                     continue
 
-                retval.append(IPDevice(name,
-                                       self.root_helper,
-                                       self.namespace))
+                retval.append(self.device(name))
         return retval
 
     def add_tuntap(self, name, mode='tap'):
-        self._as_root('', 'tuntap', ('add', name, 'mode', mode))
-        return IPDevice(name, self.root_helper, self.namespace)
+        self._as_root_batched('', 'tuntap', ('add', name, 'mode', mode))
+        return self.device(name)
 
     def add_veth(self, name1, name2, namespace2=None):
         args = ['add', name1, 'type', 'veth', 'peer', 'name', name2]
@@ -126,10 +265,9 @@ class IPWrapper(SubProcessBase):
             self.ensure_namespace(namespace2)
             args += ['netns', namespace2]
 
-        self._as_root('', 'link', tuple(args))
+        self._as_root_batched('', 'link', tuple(args))
 
-        return (IPDevice(name1, self.root_helper, self.namespace),
-                IPDevice(name2, self.root_helper, namespace2))
+        return (self.device(name1), self._device(name2, namespace2))
 
     def ensure_namespace(self, name):
         if not self.netns.exists(name):
@@ -175,8 +313,8 @@ class IPWrapper(SubProcessBase):
                 cmd.extend(['port', port[0], port[1]])
         elif port:
             raise exceptions.NetworkVxlanPortRangeError(vxlan_range=port)
-        self._as_root('', 'link', cmd)
-        return (IPDevice(name, self.root_helper, self.namespace))
+        self._as_root_batched('', 'link', cmd)
+        return self.device(name)
 
     @classmethod
     def get_namespaces(cls, root_helper):
@@ -216,6 +354,10 @@ class IpCommandBase(object):
                                      args,
                                      kwargs.get('use_root_namespace', False))
 
+    def _as_root_batched(self, *args, **kwargs):
+        self._parent._as_root_batched(kwargs.get('options', []),
+                                      self.COMMAND, args)
+
 
 class IpDeviceCommandBase(IpCommandBase):
     @property
@@ -227,30 +369,30 @@ class IpLinkCommand(IpDeviceCommandBase):
     COMMAND = 'link'
 
     def set_address(self, mac_address):
-        self._as_root('set', self.name, 'address', mac_address)
+        self._as_root_batched('set', self.name, 'address', mac_address)
 
     def set_mtu(self, mtu_size):
-        self._as_root('set', self.name, 'mtu', mtu_size)
+        self._as_root_batched('set', self.name, 'mtu', mtu_size)
 
     def set_up(self):
-        self._as_root('set', self.name, 'up')
+        self._as_root_batched('set', self.name, 'up')
 
     def set_down(self):
-        self._as_root('set', self.name, 'down')
+        self._as_root_batched('set', self.name, 'down')
 
     def set_netns(self, namespace):
-        self._as_root('set', self.name, 'netns', namespace)
+        self._as_root_batched('set', self.name, 'netns', namespace)
         self._parent.namespace = namespace
 
     def set_name(self, name):
-        self._as_root('set', self.name, 'name', name)
+        self._as_root_batched('set', self.name, 'name', name)
         self._parent.name = name
 
     def set_alias(self, alias_name):
-        self._as_root('set', self.name, 'alias', alias_name)
+        self._as_root_batched('set', self.name, 'alias', alias_name)
 
     def delete(self):
-        self._as_root('delete', self.name)
+        self._as_root_batched('delete', self.name)
 
     @property
     def address(self):
@@ -297,25 +439,25 @@ class IpAddrCommand(IpDeviceCommandBase):
     COMMAND = 'addr'
 
     def add(self, ip_version, cidr, broadcast, scope='global'):
-        self._as_root('add',
-                      cidr,
-                      'brd',
-                      broadcast,
-                      'scope',
-                      scope,
-                      'dev',
-                      self.name,
-                      options=[ip_version])
+        self._as_root_batched('add',
+                              cidr,
+                              'brd',
+                              broadcast,
+                              'scope',
+                              scope,
+                              'dev',
+                              self.name,
+                              options=[ip_version])
 
     def delete(self, ip_version, cidr):
-        self._as_root('del',
-                      cidr,
-                      'dev',
-                      self.name,
-                      options=[ip_version])
+        self._as_root_batched('del',
+                              cidr,
+                              'dev',
+                              self.name,
+                              options=[ip_version])
 
     def flush(self):
-        self._as_root('flush', self.name)
+        self._as_root_batched('flush', self.name)
 
     def list(self, scope=None, to=None, filters=None):
         if filters is None:
@@ -365,15 +507,15 @@ class IpRouteCommand(IpDeviceCommandBase):
         if metric:
             args += ['metric', metric]
         args += ['dev', self.name]
-        self._as_root(*args)
+        self._as_root_batched(*args)
 
     def delete_gateway(self, gateway):
-        self._as_root('del',
-                      'default',
-                      'via',
-                      gateway,
-                      'dev',
-                      self.name)
+        self._as_root_batched('del',
+                              'default',
+                              'via',
+                              gateway,
+                              'dev',
+                              self.name)
 
     def get_gateway(self, scope=None, filters=None):
         if filters is None:
@@ -0,0 +1,108 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Implements sets of IP addresses using the ipset utility."""
+
+from neutron.agent.linux import utils as linux_utils
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# ipset names are limited to 31 characters, the name of the set a set is
+# swapped with included.
+IPSET_NAME_MAX_LEN = 31
+SWAP_SUFFIX = '-new'
+IPSET_FAMILY = {'IPv4': 'inet', 'IPv6': 'inet6'}
+
+
+def get_ipset_name(id, ethertype):
+    """Return the name of the set of an object id and an ethertype."""
+    name = '%s%s' % (ethertype, id)
+    return name[:IPSET_NAME_MAX_LEN - len(SWAP_SUFFIX)]
+
+
+class IpsetManager(object):
+    """Wrapper for ipset.
+
+    Each set holds the IP addresses and networks of an object id, for
+    instance a security group, and an ethertype. The members written to
+    each set are remembered, so that updating a set only deletes and adds
+    the members which changed. When most of the members changed, or the
+    set was not created by this manager, a new set is filled and swapped
+    with the current one instead, which replaces all the members at once.
+
+    All the commands of an update are fed to a single 'ipset restore'.
+
+    """
+
+    def __init__(self, execute=None, root_helper=None):
+        if execute:
+            self.execute = execute
+        else:
+            self.execute = linux_utils.execute
+        self.root_helper = root_helper
+        # (id, ethertype) -> set of members of the ipset
+        self.ipsets = {}
+
+    def set_members(self, id, ethertype, member_ips):
+        """Make the members of the set of id and ethertype member_ips."""
+        name = get_ipset_name(id, ethertype)
+        member_ips = set(member_ips)
+        old_member_ips = self.ipsets.get((id, ethertype))
+        if old_member_ips is None:
+            commands = self._swap_commands(name, ethertype, member_ips)
+        else:
+            added_ips = member_ips - old_member_ips
+            deleted_ips = old_member_ips - member_ips
+            if not (added_ips or deleted_ips):
+                return
+            if len(added_ips) + len(deleted_ips) > len(member_ips):
+                commands = self._swap_commands(name, ethertype, member_ips)
+            else:
+                commands = ['del %s %s' % (name, ip)
+                            for ip in sorted(deleted_ips)]
+                commands += ['add %s %s' % (name, ip)
+                             for ip in sorted(added_ips)]
+        LOG.debug(_('Updating members of ipset %s'), name)
+        self._restore(commands)
+        self.ipsets[(id, ethertype)] = member_ips
+
+    def destroy(self, id, ethertype):
+        """Destroy the set of id and ethertype.
+
+        The set must not be referenced by iptables rules anymore.
+        """
+        if self.ipsets.pop((id, ethertype), None) is None:
+            return
+        self._restore(['destroy %s' % get_ipset_name(id, ethertype)])
+
+    def _swap_commands(self, name, ethertype, member_ips):
+        swap_name = name + SWAP_SUFFIX
+        create = 'create %%s hash:net family %s' % IPSET_FAMILY[ethertype]
+        # The current set is only created if it doesn't exist yet, and a
+        # left over set to swap with is emptied.
+        commands = [create % name, create % swap_name, 'flush %s' % swap_name]
+        commands += ['add %s %s' % (swap_name, ip)
+                     for ip in sorted(member_ips)]
+        commands += ['swap %s %s' % (swap_name, name),
+                     'destroy %s' % swap_name]
+        return commands
+
+    def _restore(self, commands):
+        self.execute(['ipset', 'restore', '-exist'],
+                     process_input='\n'.join(commands) + '\n',
+                     root_helper=self.root_helper)
@@ -19,11 +19,15 @@ import netaddr
 from oslo.config import cfg
 
 from neutron.agent import firewall
+from neutron.agent.linux import ipset_manager
 from neutron.agent.linux import iptables_manager
 from neutron.common import constants
 from neutron.openstack.common import log as logging
 
 
+cfg.CONF.import_opt('enable_ipset', 'neutron.agent.securitygroups_rpc',
+                    'SECURITYGROUP')
+
 LOG = logging.getLogger(__name__)
 SG_CHAIN = 'sg-chain'
 INGRESS_DIRECTION = 'ingress'
@@ -32,6 +36,10 @@ SPOOF_FILTER = 'spoof-filter'
 CHAIN_NAME_PREFIX = {INGRESS_DIRECTION: 'i',
                      EGRESS_DIRECTION: 'o',
                      SPOOF_FILTER: 's'}
+DIRECTION_IP_PREFIX = {INGRESS_DIRECTION: 'source_ip_prefix',
+                       EGRESS_DIRECTION: 'dest_ip_prefix'}
+IPSET_DIRECTION = {INGRESS_DIRECTION: 'src',
+                   EGRESS_DIRECTION: 'dst'}
 LINUX_DEV_LEN = 14
 
 
@@ -44,6 +52,9 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self.iptables = iptables_manager.IptablesManager(
             root_helper=cfg.CONF.AGENT.root_helper,
             use_ipv6=True)
+        self.enable_ipset = cfg.CONF.SECURITYGROUP.enable_ipset
+        self.ipset = ipset_manager.IpsetManager(
+            root_helper=cfg.CONF.AGENT.root_helper)
         # list of port which has security group
         self.filtered_ports = {}
         self._add_fallback_chain_v4v6()
@@ -60,7 +71,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self.filtered_ports[port['device']] = port
         # each security group has it own chains
         self._setup_chains()
-        self.iptables.apply()
+        self._apply()
 
     def update_port_filter(self, port):
         LOG.debug(_("Updating device (%s) filter"), port['device'])
@@ -71,7 +82,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self._remove_chains()
         self.filtered_ports[port['device']] = port
         self._setup_chains()
-        self.iptables.apply()
+        self._apply()
 
     def remove_port_filter(self, port):
         LOG.debug(_("Removing device (%s) filter"), port['device'])
@@ -82,7 +93,12 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self._remove_chains()
         self.filtered_ports.pop(port['device'], None)
         self._setup_chains()
+        self._apply()
+
+    def _apply(self):
         self.iptables.apply()
+        if not self._defer_apply:
+            self._remove_unused_ipsets()
 
     def _setup_chains(self):
         """Setup ingress and egress chain for a port."""
@@ -90,6 +106,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             self._setup_chains_apply(self.filtered_ports)
 
     def _setup_chains_apply(self, ports):
+        self._update_ipsets(ports)
         self._add_chain_by_name_v4v6(SG_CHAIN)
         for port in ports.values():
             self._setup_chain(port, INGRESS_DIRECTION)
@@ -176,7 +193,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                 ipv4_sg_rules.append(rule)
             elif rule.get('ethertype') == constants.IPv6:
                 if rule.get('protocol') == 'icmp':
-                    rule['protocol'] = 'icmpv6'
+                    rule = dict(rule, protocol='icmpv6')
                 ipv6_sg_rules.append(rule)
         return ipv4_sg_rules, ipv6_sg_rules
 
@@ -279,6 +296,9 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         iptables_rules = []
         self._drop_invalid_packets(iptables_rules)
         self._allow_established(iptables_rules)
+        if self.enable_ipset:
+            security_group_rules = self._merge_remote_group_rules(
+                security_group_rules)
         for rule in security_group_rules:
             # These arguments MUST be in the format iptables-save will
             # display them: source/dest, protocol, sport, dport, target
@@ -297,6 +317,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                                    rule.get('protocol'),
                                    rule.get('port_range_min'),
                                    rule.get('port_range_max'))
+            args += self._ipset_arg(rule)
             args += ['-j RETURN']
             iptables_rules += [' '.join(args)]
 
@@ -342,6 +363,84 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             return ['-%s' % direction, ip_prefix]
         return []
 
+    def _ipset_arg(self, rule):
+        remote_group_id = rule.get('remote_group_id')
+        if not (self.enable_ipset and remote_group_id):
+            return []
+        return ['-m set --match-set',
+                ipset_manager.get_ipset_name(remote_group_id,
+                                             rule['ethertype']),
+                IPSET_DIRECTION[rule['direction']]]
+
+    def _merge_remote_group_rules(self, security_group_rules):
+        """Replace the rules of each remote group member by a single rule.
+
+        The server converts a remote group rule to one rule per member of
+        the group, the members are matched with the ipset of the group
+        instead.
+        """
+        merged_rules = []
+        seen_rules = set()
+        for rule in security_group_rules:
+            if rule.get('remote_group_id'):
+                rule = dict(rule)
+                rule.pop(DIRECTION_IP_PREFIX[rule['direction']], None)
+                rule_key = tuple(sorted(rule.items()))
+                if rule_key in seen_rules:
+                    continue
+                seen_rules.add(rule_key)
+            merged_rules.append(rule)
+        return merged_rules
+
+    def _get_remote_group_members(self, ports):
+        """Return the members of the remote groups of the rules of ports.
+
+        :returns: dict of the set of member IP prefixes, keyed by remote
+                  group id and ethertype
+        """
+        members = {}
+        for port in ports.values():
+            for rule in port.get('security_group_rules', []):
+                remote_group_id = rule.get('remote_group_id')
+                ip_prefix = rule.get(DIRECTION_IP_PREFIX[rule['direction']])
+                if remote_group_id and ip_prefix:
+                    members.setdefault((remote_group_id, rule['ethertype']),
+                                       set()).add(ip_prefix)
+        return members
+
+    def _update_ipsets(self, ports):
+        if not self.enable_ipset:
+            return
+        members = self._get_remote_group_members(ports)
+        for (remote_group_id, ethertype), ip_prefixes in members.items():
+            self.ipset.set_members(remote_group_id, ethertype, ip_prefixes)
+
+    def _remove_unused_ipsets(self):
+        # Only called once the rules matching the sets have been removed
+        if not self.enable_ipset:
+            return
+        members = self._get_remote_group_members(self.filtered_ports)
+        for ipset_key in set(self.ipset.ipsets) - set(members):
+            self.ipset.destroy(*ipset_key)
+
+    def _ports_chains_changed(self, old_ports, new_ports):
+        """Return whether the chains of new_ports differ from old_ports.
+
+        With ipsets, a change of the members of a remote group doesn't
+        change the chains.
+        """
+        if not self.enable_ipset or set(old_ports) != set(new_ports):
+            return True
+        for device, port in new_ports.items():
+            old_port = dict(old_ports[device])
+            port = dict(port)
+            for p in (old_port, port):
+                p['security_group_rules'] = self._merge_remote_group_rules(
+                    p.get('security_group_rules', []))
+            if old_port != port:
+                return True
+        return False
+
     def _port_chain_name(self, port, direction):
         return iptables_manager.get_chain_name(
             '%s%s' % (CHAIN_NAME_PREFIX[direction], port['device'][3:]))
@@ -355,10 +454,15 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
     def filter_defer_apply_off(self):
         if self._defer_apply:
             self._defer_apply = False
-            self._remove_chains_apply(self._pre_defer_filtered_ports)
+            if self._ports_chains_changed(self._pre_defer_filtered_ports,
+                                          self.filtered_ports):
+                self._remove_chains_apply(self._pre_defer_filtered_ports)
+                self._setup_chains_apply(self.filtered_ports)
+            else:
+                self._update_ipsets(self.filtered_ports)
             self._pre_defer_filtered_ports = None
-            self._setup_chains_apply(self.filtered_ports)
             self.iptables.defer_apply_off()
+            self._remove_unused_ipsets()
 
 
 class OVSHybridIptablesFirewallDriver(IptablesFirewallDriver):
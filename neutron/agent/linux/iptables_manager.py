@@ -23,11 +23,24 @@
 
 import inspect
 import os
+import time
+
+from oslo.config import cfg
 
 from neutron.agent.linux import utils as linux_utils
 from neutron.common import utils
 from neutron.openstack.common import log as logging
 
+OPTS = [
+    cfg.IntOpt('iptables_full_sync_interval', default=60,
+               help=_('Seconds between two complete synchronizations of '
+                      'the iptables rules through iptables-save and '
+                      'iptables-restore. In between, only the chains that '
+                      'changed are rewritten. 0 synchronizes completely '
+                      'on every change.')),
+]
+cfg.CONF.register_opts(OPTS)
+
 LOG = logging.getLogger(__name__)
 
 
@@ -98,6 +111,37 @@ class IptablesTable(object):
         self.unwrapped_chains = set()
         self.remove_chains = set()
         self.wrap_name = binary_name[:16]
+        # Wrapped chains changed since the last apply, and whether a shared
+        # chain or rule changed, which requires a complete synchronization.
+        self.dirty_chains = set()
+        self.full_sync_required = False
+        # The rules of the wrapped chains as they were last applied, only
+        # the dirty chains whose rules differ from them are rewritten.
+        self.applied_chains = {}
+
+    def get_wrapped_chains_rules(self, names=None):
+        """Return the rules of the wrapped chains, by chain name.
+
+        The rules of a chain are listed in the order they are applied,
+        the top rules first.  names restricts the chains returned.
+        """
+        if names is None:
+            names = self.chains
+        chains_rules = dict((name, ([], [])) for name in names
+                            if name in self.chains)
+        for rule in self.rules:
+            if rule.wrap and rule.chain in chains_rules:
+                top_rules, bot_rules = chains_rules[rule.chain]
+                (top_rules if rule.top else bot_rules).append(str(rule))
+        return dict((name, top_rules + bot_rules)
+                    for name, (top_rules, bot_rules)
+                    in chains_rules.iteritems())
+
+    def _mark_chain_dirty(self, name, wrap):
+        if wrap:
+            self.dirty_chains.add(name)
+        else:
+            self.full_sync_required = True
 
     def add_chain(self, name, wrap=True):
         """Adds a named chain to the table.
@@ -112,6 +156,8 @@ class IptablesTable(object):
 
         """
         name = get_chain_name(name, wrap)
+        if name not in self._select_chain_set(wrap):
+            self._mark_chain_dirty(name, wrap)
         if wrap:
             self.chains.add(name)
         else:
@@ -154,6 +200,7 @@ class IptablesTable(object):
             return
 
         chain_set.remove(name)
+        self._mark_chain_dirty(name, wrap)
 
         if not wrap:
             # non-wrapped chains and rules need to be dealt with specially,
@@ -175,6 +222,9 @@ class IptablesTable(object):
             jump_snippet = '-j %s-%s' % (self.wrap_name, name)
 
         # finally, remove rules from list that have a matching jump chain
+        for rule in self.rules:
+            if jump_snippet in rule.rule:
+                self._mark_chain_dirty(rule.chain, rule.wrap)
         self.rules = [r for r in self.rules
                       if jump_snippet not in r.rule]
 
@@ -198,6 +248,7 @@ class IptablesTable(object):
 
         self.rules.append(IptablesRule(chain, rule, wrap, top, self.wrap_name,
                                        tag))
+        self._mark_chain_dirty(chain, wrap)
 
     def _wrap_target_chain(self, s):
         if s.startswith('$'):
@@ -216,6 +267,7 @@ class IptablesTable(object):
         try:
             self.rules.remove(IptablesRule(chain, rule, wrap, top,
                                            self.wrap_name))
+            self._mark_chain_dirty(chain, wrap)
             if not wrap:
                 self.remove_rules.append(IptablesRule(chain, rule, wrap, top,
                                                       self.wrap_name))
@@ -232,6 +284,7 @@ class IptablesTable(object):
                          if rule.chain == chain and rule.wrap == wrap]
         for rule in chained_rules:
             self.rules.remove(rule)
+            self._mark_chain_dirty(rule.chain, rule.wrap)
 
     def clear_rules_by_tag(self, tag):
         if not tag:
@@ -239,6 +292,7 @@ class IptablesTable(object):
         rules = [rule for rule in self.rules if rule.tag == tag]
         for rule in rules:
             self.rules.remove(rule)
+            self._mark_chain_dirty(rule.chain, rule.wrap)
 
 
 class IptablesManager(object):
@@ -277,6 +331,8 @@ class IptablesManager(object):
         self.namespace = namespace
         self.iptables_apply_deferred = False
         self.wrap_name = binary_name[:16]
+        self.full_sync_interval = cfg.CONF.iptables_full_sync_interval
+        self.last_full_sync = None
 
         self.ipv4 = {'filter': IptablesTable(binary_name=self.wrap_name)}
         self.ipv6 = {'filter': IptablesTable(binary_name=self.wrap_name)}
@@ -355,33 +411,130 @@ class IptablesManager(object):
     def _apply(self):
         """Apply the current in-memory set of iptables rules.
 
-        This will blow away any rules left over from previous runs of the
-        same component of Nova, and replace them with our current set of
-        rules. This happens atomically, thanks to iptables-restore.
+        The first apply, and then one apply every full_sync_interval
+        seconds, synchronizes all the tables with _apply_full. The others
+        only rewrite the wrapped chains changed since the last apply with
+        _apply_dirty_chains, unless a shared chain or rule changed.
 
         """
         s = [('iptables', self.ipv4)]
         if self.use_ipv6:
             s += [('ip6tables', self.ipv6)]
 
+        full_sync = self._is_full_sync_due()
         for cmd, tables in s:
-            args = ['%s-save' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            all_tables = self.execute(args, root_helper=self.root_helper)
-            all_lines = all_tables.split('\n')
-            for table_name, table in tables.iteritems():
-                start, end = self._find_table(all_lines, table_name)
-                all_lines[start:end] = self._modify_rules(
-                    all_lines[start:end], table, table_name)
-
-            args = ['%s-restore' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            self.execute(args, process_input='\n'.join(all_lines),
-                         root_helper=self.root_helper)
+            if full_sync or any(table.full_sync_required
+                                for table in tables.values()):
+                self._apply_full(cmd, tables)
+            else:
+                try:
+                    self._apply_dirty_chains(cmd, tables)
+                except RuntimeError:
+                    LOG.warn(_('Unable to rewrite the changed %s chains, '
+                               'synchronizing all the chains'), cmd)
+                    self._apply_full(cmd, tables)
+            for table in tables.values():
+                table.dirty_chains.clear()
+        if full_sync:
+            self.last_full_sync = time.time()
         LOG.debug(_("IPTablesManager.apply completed with success"))
 
+    def _is_full_sync_due(self):
+        return (not self.full_sync_interval or self.last_full_sync is None or
+                time.time() - self.last_full_sync >= self.full_sync_interval)
+
+    def _apply_full(self, cmd, tables):
+        """Apply all the in-memory iptables rules of an IP version.
+
+        This will blow away any rules left over from previous runs of the
+        same component of Nova, and replace them with our current set of
+        rules. This happens atomically, thanks to iptables-restore.
+
+        """
+        args = ['%s-save' % (cmd,), '-c']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        all_tables = self.execute(args, root_helper=self.root_helper)
+        all_lines = all_tables.split('\n')
+        for table_name, table in tables.iteritems():
+            start, end = self._find_table(all_lines, table_name)
+            all_lines[start:end] = self._modify_rules(
+                all_lines[start:end], table, table_name)
+            table.full_sync_required = False
+
+        args = ['%s-restore' % (cmd,), '-c']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        self.execute(args, process_input='\n'.join(all_lines),
+                     root_helper=self.root_helper)
+        for table in tables.values():
+            table.applied_chains = table.get_wrapped_chains_rules()
+
+    def _apply_dirty_chains(self, cmd, tables):
+        """Rewrite the wrapped chains changed since the last apply.
+
+        Only the dirty chains whose rules differ from the rules last
+        applied are rewritten: a chain removed and added back with the
+        same rules, as the firewall driver does on every update, is left
+        alone.  Declaring an existing chain flushes it when
+        iptables-restore doesn't flush the tables, so the changed chains
+        are declared and their rules appended, and the removed chains are
+        then deleted.  The other chains and rules are left alone, along
+        with their [packet:byte] counts.
+
+        """
+        all_lines = []
+        all_changes = []
+        for table_name, table in tables.iteritems():
+            if not table.dirty_chains:
+                continue
+            rules = table.get_wrapped_chains_rules(table.dirty_chains)
+            changes = dict((name, rules.get(name))
+                           for name in table.dirty_chains
+                           if table.applied_chains.get(name) !=
+                           rules.get(name))
+            if changes:
+                all_lines += self._get_changed_chains_lines(
+                    table, table_name, changes)
+                all_changes.append((table, changes))
+        if not all_lines:
+            return
+
+        args = ['%s-restore' % (cmd,), '--noflush']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        self.execute(args, process_input='\n'.join(all_lines),
+                     root_helper=self.root_helper)
+        for table, changes in all_changes:
+            for name, rules in changes.iteritems():
+                if rules is None:
+                    table.applied_chains.pop(name, None)
+                else:
+                    table.applied_chains[name] = rules
+
+    def _get_changed_chains_lines(self, table, table_name, changes):
+        """Return the restore lines of changed chains.
+
+        changes maps the name of the changed chains to their rules, or to
+        None for the chains removed.
+        """
+        names = sorted(changes)
+        lines = ['*%s' % table_name]
+        # The removed chains are declared as well, to flush them first
+        lines += [':%s-%s - [0:0]' % (self.wrap_name, name) for name in names]
+
+        top_rules = []
+        bot_rules = []
+        for rule in table.rules:
+            if rule.wrap and changes.get(rule.chain) is not None:
+                (top_rules if rule.top else bot_rules).append(str(rule))
+        lines += top_rules + bot_rules
+
+        lines += ['-X %s-%s' % (self.wrap_name, name)
+                  for name in names if changes[name] is None]
+        lines += ['COMMIT']
+        return lines
+
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
             # length only <2 when fake iptables
@@ -411,6 +564,19 @@ class IptablesManager(object):
 
         return rules_index
 
+    def _get_line_key(self, line):
+        """Return the text a saved chain or rule line is matched on.
+
+        Chains are matched on their ':<name>' part and rules on their
+        text without the leading [packet:byte] counts, any other line
+        is matched as a whole.
+        """
+        if line.startswith(':'):
+            return line.split(' ', 1)[0]
+        elif line.startswith('['):
+            return line.split('] ', 1)[-1]
+        return line
+
     def _modify_rules(self, current_lines, table, table_name):
         unwrapped_chains = table.unwrapped_chains
         chains = table.chains
@@ -434,6 +600,25 @@ class IptablesManager(object):
 
         rules_index = self._find_rules_index(new_filter)
 
+        # Index both filters on the chain name or rule text, so finding
+        # an existing match is a dict lookup instead of a scan of the
+        # whole table.  The last occurrence of a line is the one kept.
+        old_lines = dict((self._get_line_key(line), line)
+                         for line in old_filter)
+        new_lines = {}
+        for index, line in enumerate(new_filter):
+            new_lines.setdefault(self._get_line_key(line), []).append(index)
+        dup_indexes = set()
+
+        def _pop_dup_line(key):
+            # Matching lines are taken out of new_filter, so a chain or
+            # rule which is present more than once only matches once.
+            indexes = new_lines.pop(key, None)
+            if not indexes:
+                return
+            dup_indexes.update(indexes)
+            return new_filter[indexes[-1]]
+
         all_chains = [':%s' % name for name in unwrapped_chains]
         all_chains += [':%s-%s' % (self.wrap_name, name) for name in chains]
 
@@ -442,20 +627,13 @@ class IptablesManager(object):
         our_chains = []
         for chain in all_chains:
             chain_str = str(chain).strip()
-
-            orig_filter = [s for s in old_filter if chain_str in s.strip()]
-            dup_filter = [s for s in new_filter if chain_str in s.strip()]
-            new_filter = [s for s in new_filter if chain_str not in s.strip()]
+            dup = _pop_dup_line(chain_str)
 
             # if no old or duplicates, use original chain
-            if orig_filter:
-                # grab the last entry, if there is one
-                old = orig_filter[-1]
-                chain_str = str(old).strip()
-            elif dup_filter:
-                # grab the last entry, if there is one
-                dup = dup_filter[-1]
-                chain_str = str(dup).strip()
+            if chain_str in old_lines:
+                chain_str = old_lines[chain_str]
+            elif dup is not None:
+                chain_str = dup
             else:
                 # add-on the [packet:bytes]
                 chain_str += ' - [0:0]'
@@ -470,20 +648,13 @@ class IptablesManager(object):
             rule_str = str(rule).strip()
             # Further down, we weed out duplicates from the bottom of the
             # list, so here we remove the dupes ahead of time.
-
-            orig_filter = [s for s in old_filter if rule_str in s.strip()]
-            dup_filter = [s for s in new_filter if rule_str in s.strip()]
-            new_filter = [s for s in new_filter if rule_str not in s.strip()]
+            dup = _pop_dup_line(rule_str)
 
             # if no old or duplicates, use original rule
-            if orig_filter:
-                # grab the last entry, if there is one
-                old = orig_filter[-1]
-                rule_str = str(old).strip()
-            elif dup_filter:
-                # grab the last entry, if there is one
-                dup = dup_filter[-1]
-                rule_str = str(dup).strip()
+            if rule_str in old_lines:
+                rule_str = old_lines[rule_str]
+            elif dup is not None:
+                rule_str = dup
                 # backup one index so we write the array correctly
                 rules_index -= 1
             else:
@@ -498,6 +669,8 @@ class IptablesManager(object):
 
         our_rules += bot_rules
 
+        new_filter = [line for index, line in enumerate(new_filter)
+                      if index not in dup_indexes]
         new_filter[rules_index:rules_index] = our_rules
         new_filter[rules_index:rules_index] = our_chains
 
@@ -540,21 +713,23 @@ class IptablesManager(object):
             # Leave it alone
             return True
 
+        removed_rules = {}
+        for index, rule in enumerate(remove_rules):
+            removed_rules.setdefault(str(rule).strip(), []).append(index)
+        weeded_rules = set()
+
         def _weed_out_removes(line):
             # We need to find exact matches here
             if line.startswith(':'):
                 line = _strip_packets_bytes(line)
-                for chain in remove_chains:
-                    if chain == line:
-                        remove_chains.remove(chain)
-                        return False
+                if line in remove_chains:
+                    remove_chains.remove(line)
+                    return False
             elif line.startswith('['):
                 line = _strip_packets_bytes(line)
-                for rule in remove_rules:
-                    rule_str = _strip_packets_bytes(str(rule))
-                    if rule_str == line:
-                        remove_rules.remove(rule)
-                        return False
+                if removed_rules.get(line):
+                    weeded_rules.add(removed_rules[line].pop(0))
+                    return False
 
             # Leave it alone
             return True
@@ -569,6 +744,8 @@ class IptablesManager(object):
                       _weed_out_duplicate_rules(line) and
                       _weed_out_removes(line)]
         new_filter.reverse()
+        remove_rules[:] = [rule for index, rule in enumerate(remove_rules)
+                           if index not in weeded_rules]
 
         # flush lists, just in case we didn't find something
         remove_chains.clear()
@@ -41,6 +41,25 @@ cfg.CONF.register_opts(OPTS)
 
 LOG = logging.getLogger(__name__)
 
+# The columns read in a snapshot of the ports of a bridge
+SNAPSHOT_COLUMNS = {'Bridge': ['name', 'ports'],
+                    'Port': ['_uuid', 'name', 'interfaces'],
+                    'Interface': ['_uuid', 'name', 'ofport', 'external_ids']}
+
+
+def _ovsdb_rows(output):
+    """Return the rows of a table output by ovs-vsctl --format=json."""
+    table = jsonutils.loads(output)
+    return [dict(zip(table['headings'], row)) for row in table['data']]
+
+
+def _ovsdb_uuids(value):
+    """Return the uuids of an ovsdb json uuid or set of uuids."""
+    kind, data = value
+    if kind == 'uuid':
+        return [data]
+    return [uuid for uuid_kind, uuid in data]
+
 
 class VifPort:
     def __init__(self, port_name, ofport, vif_id, vif_mac, switch):
@@ -304,10 +323,53 @@ class OVSBridge(BaseOVS):
             ret[arr[0]] = arr[1].strip("\"")
         return ret
 
+    def _load_snapshot(self):
+        """Read the ports and interfaces of the bridge.
+
+        A single ovs-vsctl call lists the Bridge, Port and Interface tables.
+        Returns None if the tables couldn't be read.
+        """
+        args = ['--format=json']
+        for table in ('Bridge', 'Port', 'Interface'):
+            args += ['--', '--columns=%s' % ','.join(SNAPSHOT_COLUMNS[table]),
+                     'list', table]
+            if table == 'Bridge':
+                args.append(self.br_name)
+        result = self.run_vsctl(args)
+        if not result:
+            return
+        try:
+            bridges, ports, interfaces = [
+                _ovsdb_rows(output) for output in result.splitlines()
+                if output.strip()]
+            port_uuids = set(_ovsdb_uuids(bridges[0]['ports']))
+        except (ValueError, KeyError, IndexError, TypeError):
+            LOG.error(_("Unable to parse the ports of bridge %(bridge)s: "
+                        "%(result)s"),
+                      {'bridge': self.br_name, 'result': result})
+            return
+        port_names = []
+        iface_uuids = set()
+        for port in ports:
+            # The local port of the bridge isn't listed, as by list-ports
+            if (_ovsdb_uuids(port['_uuid'])[0] in port_uuids and
+                    port['name'] != self.br_name):
+                port_names.append(port['name'])
+                iface_uuids.update(_ovsdb_uuids(port['interfaces']))
+        snapshot_interfaces = {}
+        for interface in interfaces:
+            if _ovsdb_uuids(interface['_uuid'])[0] in iface_uuids:
+                ofport = interface['ofport']
+                snapshot_interfaces[interface['name']] = {
+                    'ofport': ofport if isinstance(ofport, int) else None,
+                    'external_ids': dict(interface['external_ids'][1])}
+        return {'port_names': sorted(port_names),
+                'interfaces': snapshot_interfaces}
+
     def get_port_name_list(self):
-        res = self.run_vsctl(["list-ports", self.br_name])
-        if res:
-            return res.strip().split("\n")
+        snapshot = self._load_snapshot()
+        if snapshot:
+            return list(snapshot['port_names'])
         return []
 
     def get_port_stats(self, port_name):
@@ -322,52 +384,44 @@ class OVSBridge(BaseOVS):
             LOG.error(_("Unable to execute %(cmd)s. Exception: %(exception)s"),
                       {'cmd': args, 'exception': e})
 
-    # returns a VIF object for each VIF port
-    def get_vif_ports(self):
-        edge_ports = []
-        port_names = self.get_port_name_list()
-        for name in port_names:
-            external_ids = self.db_get_map("Interface", name, "external_ids")
-            ofport = self.db_get_val("Interface", name, "ofport")
-            if "iface-id" in external_ids and "attached-mac" in external_ids:
-                p = VifPort(name, ofport, external_ids["iface-id"],
-                            external_ids["attached-mac"], self)
-                edge_ports.append(p)
-            elif ("xs-vif-uuid" in external_ids and
-                  "attached-mac" in external_ids):
-                # if this is a xenserver and iface-id is not automatically
-                # synced to OVS from XAPI, we grab it from XAPI directly
-                iface_id = self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
-                p = VifPort(name, ofport, iface_id,
-                            external_ids["attached-mac"], self)
-                edge_ports.append(p)
+    def _make_vif_port(self, name, interface):
+        external_ids = interface['external_ids']
+        if "attached-mac" not in external_ids:
+            return
+        if "iface-id" in external_ids:
+            iface_id = external_ids["iface-id"]
+        elif "xs-vif-uuid" in external_ids:
+            # if this is a xenserver and iface-id is not automatically
+            # synced to OVS from XAPI, we grab it from XAPI directly
+            iface_id = self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
+        else:
+            return
+        return VifPort(name, interface['ofport'], iface_id,
+                       external_ids["attached-mac"], self)
 
+    def _get_snapshot_vif_ports(self):
+        snapshot = self._load_snapshot()
+        if not snapshot:
+            return []
+        edge_ports = []
+        for name in snapshot['port_names']:
+            interface = snapshot['interfaces'].get(name)
+            if interface:
+                port = self._make_vif_port(name, interface)
+                if port:
+                    edge_ports.append(port)
         return edge_ports
 
+    # returns a VIF object for each VIF port
+    def get_vif_ports(self):
+        return self._get_snapshot_vif_ports()
+
     def get_vif_port_set(self):
-        port_names = self.get_port_name_list()
-        edge_ports = set()
-        args = ['--format=json', '--', '--columns=name,external_ids',
-                'list', 'Interface']
-        result = self.run_vsctl(args)
-        if not result:
-            return edge_ports
-        for row in jsonutils.loads(result)['data']:
-            name = row[0]
-            if name not in port_names:
-                continue
-            external_ids = dict(row[1][1])
-            if "iface-id" in external_ids and "attached-mac" in external_ids:
-                edge_ports.add(external_ids['iface-id'])
-            elif ("xs-vif-uuid" in external_ids and
-                  "attached-mac" in external_ids):
-                # if this is a xenserver and iface-id is not automatically
-                # synced to OVS from XAPI, we grab it from XAPI directly
-                iface_id = self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
-                edge_ports.add(iface_id)
-        return edge_ports
+        return set(port.vif_id for port in self._get_snapshot_vif_ports())
 
     def get_vif_port_by_id(self, port_id):
+        # A single port is found by a targeted query rather than by reading
+        # all the ports of the bridge
         args = ['--', '--columns=external_ids,name,ofport',
                 'find', 'Interface',
                 'external_ids:iface-id="%s"' % port_id]
@@ -389,10 +443,14 @@ class OVSBridge(BaseOVS):
         if all_ports:
             port_names = self.get_port_name_list()
         else:
-            port_names = (port.port_name for port in self.get_vif_ports())
+            port_names = [port.port_name for port in self.get_vif_ports()]
 
+        # All the ports are deleted by a single ovs-vsctl call
+        args = []
         for port_name in port_names:
-            self.delete_port(port_name)
+            args += ["--", "--if-exists", "del-port", self.br_name, port_name]
+        if args:
+            self.run_vsctl(args)
 
     def get_local_port_mac(self):
         """Retrieve the mac of the bridge's local port."""
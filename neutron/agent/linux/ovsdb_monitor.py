@@ -17,11 +17,17 @@
 import eventlet
 
 from neutron.agent.linux import async_process
+from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
 
+OVSDB_ACTION_INITIAL = 'initial'
+OVSDB_ACTION_INSERT = 'insert'
+OVSDB_ACTION_DELETE = 'delete'
+OVSDB_ACTION_NEW = 'new'
+
 
 class OvsdbMonitor(async_process.AsyncProcess):
     """Manages an invocation of 'ovsdb-client monitor'."""
@@ -64,20 +70,22 @@ class OvsdbMonitor(async_process.AsyncProcess):
 class SimpleInterfaceMonitor(OvsdbMonitor):
     """Monitors the Interface table of the local host's ovsdb for changes.
 
-    The has_updates() method indicates whether changes to the ovsdb
-    Interface table have been detected since the monitor started or
-    since the previous access.
+    The row updates output by the monitor are parsed into events on
+    added and removed interfaces, which get_events() returns and clears.
+    The has_updates() method indicates whether events have been received
+    since the monitor started or since the previous call to get_events().
     """
 
     def __init__(self, root_helper=None, respawn_interval=None):
         super(SimpleInterfaceMonitor, self).__init__(
             'Interface',
-            columns=['name'],
+            columns=['name', 'ofport', 'external_ids'],
             format='json',
             root_helper=root_helper,
             respawn_interval=respawn_interval,
         )
         self.data_received = False
+        self.new_events = {'added': [], 'removed': []}
 
     @property
     def is_active(self):
@@ -94,7 +102,53 @@ class SimpleInterfaceMonitor(OvsdbMonitor):
         the absence of updates at the expense of potential false
         positives.
         """
-        return bool(list(self.iter_stdout())) or not self.is_active
+        self.process_events()
+        return (bool(self.new_events['added'] or self.new_events['removed'])
+                or not self.is_active)
+
+    def get_events(self):
+        """Return and clear the events received since the previous call.
+
+        The events are a dict of 'added' and 'removed' lists of interfaces,
+        in the order the changes were received. An interface is a dict of
+        its name, ofport and external_ids.  When an interface is removed and
+        added again, it appears in both lists, otherwise only in the list
+        of its last change.
+        """
+        self.process_events()
+        events = self.new_events
+        self.new_events = {'added': [], 'removed': []}
+        return events
+
+    def process_events(self):
+        for output in self.iter_stdout():
+            try:
+                update = jsonutils.loads(output)
+                headings = update['headings']
+                rows = [dict(zip(headings, row)) for row in update['data']]
+            except (ValueError, KeyError, TypeError):
+                LOG.warning(_('Unable to parse ovsdb monitor output: %s'),
+                            output)
+                continue
+            for row in rows:
+                action = row.get('action')
+                if action in (OVSDB_ACTION_INITIAL, OVSDB_ACTION_INSERT,
+                              OVSDB_ACTION_NEW):
+                    self._add_event('added', row)
+                elif action == OVSDB_ACTION_DELETE:
+                    self._add_event('removed', row)
+
+    def _add_event(self, event_type, row):
+        interface = {'name': row['name'],
+                     'ofport': _get_ovsdb_value(row.get('ofport')),
+                     'external_ids': _get_ovsdb_value(row.get('external_ids'))}
+        if event_type == 'removed':
+            # An interface added and removed since the previous events
+            # retrieval is not reported as added.
+            self.new_events['added'] = [
+                added for added in self.new_events['added']
+                if added['name'] != interface['name']]
+        self.new_events[event_type].append(interface)
 
     def start(self, block=False, timeout=5):
         super(SimpleInterfaceMonitor, self).start()
@@ -112,3 +166,20 @@ class SimpleInterfaceMonitor(OvsdbMonitor):
         if data and not self.data_received:
             self.data_received = True
         return data
+
+
+def _get_ovsdb_value(value):
+    """Convert a value of the ovsdb json format to python.
+
+    Maps are converted to dicts, sets to lists and an empty set, the value
+    of an unset optional column, to None.
+    """
+    if isinstance(value, list) and len(value) == 2:
+        kind, data = value
+        if kind == 'map':
+            return dict(data)
+        if kind == 'set':
+            return list(data) or None
+        if kind == 'uuid':
+            return data
+    return value
@@ -53,6 +53,14 @@ class BasePollingManager(object):
     def polling_completed(self):
         self._polling_completed = True
 
+    def get_events(self):
+        """Return the interface events detected since the previous call.
+
+        None is returned when the changes are not known as events, in
+        which case the interfaces have to be fully rescanned.
+        """
+        return None
+
     def _is_polling_required(self):
         raise NotImplemented
 
@@ -100,6 +108,7 @@ class InterfacePollingMinimizer(BasePollingManager):
         self._monitor = ovsdb_monitor.SimpleInterfaceMonitor(
             root_helper=root_helper,
             respawn_interval=ovsdb_monitor_respawn_interval)
+        self._full_scan_required = True
 
     def start(self):
         self._monitor.start()
@@ -107,6 +116,19 @@ class InterfacePollingMinimizer(BasePollingManager):
     def stop(self):
         self._monitor.stop()
 
+    def force_polling(self):
+        super(InterfacePollingMinimizer, self).force_polling()
+        self._full_scan_required = True
+
+    def get_events(self):
+        events = self._monitor.get_events()
+        # Events may have been missed while the monitor was not active, and
+        # a forced polling is a request to resync with the actual state.
+        if self._full_scan_required or not self._monitor.is_active:
+            self._full_scan_required = False
+            return None
+        return events
+
     def _is_polling_required(self):
         # Maximize the chances of update detection having a chance to
         # collect output.
@@ -0,0 +1,394 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Long-lived root wrapper reached over a Unix socket.
+
+neutron-rootwrap starts a new interpreter and loads the filters for every
+command run as root. The daemon loads them once and runs the commands the
+agents send over a Unix socket, when they match the same filters as with
+neutron-rootwrap.
+
+To use it, start the daemon as root with the rootwrap configuration and
+the path of the socket:
+
+   neutron-rootwrap-daemon /etc/neutron/rootwrap.conf \\
+       /var/run/neutron/rootwrap.sock
+
+and set the socket in the agent configuration:
+
+   [AGENT]
+   root_helper_daemon_socket = /var/run/neutron/rootwrap.sock
+
+The socket is only accessible by root and by the user which started the
+daemon through sudo. The agents run the commands with root_helper when
+the daemon can't be reached.
+
+The commands read by 'ip -batch -' from its standard input are checked
+against the filters as if each of them was run on its own, since the
+filters only see the arguments of the command. ip batches are not run by
+the agents without the daemon.
+
+Each request and response is a JSON object preceded by its length, as a
+4 bytes unsigned integer in network order. A request holds the command
+and its standard input, a response its exit code, standard output and
+standard error.
+"""
+
+import ConfigParser
+import json
+import logging
+import os
+import pwd
+import shlex
+import signal
+import socket
+import SocketServer
+import struct
+import subprocess
+import sys
+
+from neutron.openstack.common.rootwrap import cmd as rootwrap_cmd
+from neutron.openstack.common.rootwrap import wrapper
+
+
+LOG = logging.getLogger(__name__)
+
+HEADER = struct.Struct('!I')
+# Not exposed by the socket module of python 2
+SO_PEERCRED = getattr(socket, 'SO_PEERCRED', 17)
+
+
+def _encode_bytes(data):
+    # The input and output of commands aren't necessarily valid UTF-8;
+    # latin-1 maps every byte to a character, which JSON can carry.
+    if data is not None:
+        return data.decode('latin-1')
+
+
+def _decode_bytes(data):
+    if data is not None:
+        return data.encode('latin-1')
+
+
+def send_message(sock, message):
+    data = json.dumps(message)
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def _recv_exactly(sock, size):
+    data = ''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return
+        data += chunk
+    return data
+
+
+def recv_message(sock):
+    """Return the next message read from sock, None at end of file."""
+    header = _recv_exactly(sock, HEADER.size)
+    if header is None:
+        return
+    data = _recv_exactly(sock, HEADER.unpack(header)[0])
+    if data is None:
+        raise EOFError(_('Connection closed while reading a message'))
+    return json.loads(data)
+
+
+def _is_batch_option(arg):
+    # ip accepts any abbreviation of its options, with one or two dashes
+    if arg.startswith('--'):
+        arg = arg[1:]
+    return len(arg) > 1 and '-batch'.startswith(arg)
+
+
+def ip_batch_commands(userargs, stdin):
+    """Return the commands run by an ip batch read from stdin.
+
+    Each line of stdin is returned as the command it stands for when run
+    on its own, in the namespace and with the options of the batch.
+    Returns None if userargs doesn't run an ip batch, raises ValueError if
+    its commands can't be checked.
+    """
+    if (userargs[:3] == ['ip', 'netns', 'exec'] and len(userargs) > 4 and
+            os.path.basename(userargs[4]) == 'ip'):
+        prefix, ip_args = userargs[:4], userargs[4:]
+    elif userargs and os.path.basename(userargs[0]) == 'ip':
+        prefix, ip_args = [], userargs
+    else:
+        return
+    positions = [i for i, arg in enumerate(ip_args)
+                 if i > 0 and _is_batch_option(arg)]
+    if not positions:
+        return
+    position = positions[0]
+    if len(positions) > 1 or ip_args[position + 1:position + 2] != ['-']:
+        raise ValueError("only a batch read from the standard input can be "
+                         "checked")
+    base = prefix + ip_args[:position] + ip_args[position + 2:]
+    commands = []
+    for line in (stdin or '').splitlines():
+        # Comments and line continuations aren't interpreted as by ip
+        if '#' in line or '\\' in line:
+            raise ValueError("unsupported batch line %r" % line)
+        args = shlex.split(line)
+        if not args:
+            continue
+        if args[0].startswith('-'):
+            raise ValueError("unsupported batch line %r" % line)
+        commands.append(base + args)
+    return commands
+
+
+class RootwrapRequestHandler(SocketServer.BaseRequestHandler):
+    """Run the commands sent on a connection until it is closed."""
+
+    def handle(self):
+        while True:
+            try:
+                request = recv_message(self.request)
+            except (EOFError, ValueError, socket.error) as e:
+                LOG.warning(_('Unable to read a request: %s'), e)
+                return
+            if request is None:
+                return
+            returncode, stdout, stderr = self.server.run_command(
+                [str(arg) for arg in request['cmd']],
+                _decode_bytes(request.get('stdin')))
+            try:
+                send_message(self.request,
+                             {'returncode': returncode,
+                              'stdout': _encode_bytes(stdout),
+                              'stderr': _encode_bytes(stderr)})
+            except socket.error as e:
+                LOG.warning(_('Unable to send a response: %s'), e)
+                return
+
+
+class RootwrapServer(SocketServer.ThreadingMixIn,
+                     SocketServer.UnixStreamServer):
+    """Run the commands matching the rootwrap filters."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, config, allowed_uid):
+        self.config = config
+        self.filters = wrapper.load_filters(config.filters_path)
+        self.allowed_uids = set([0, allowed_uid])
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        old_umask = os.umask(0o177)
+        try:
+            SocketServer.UnixStreamServer.__init__(self, socket_path,
+                                                   RootwrapRequestHandler)
+        finally:
+            os.umask(old_umask)
+        os.chown(socket_path, allowed_uid, -1)
+
+    def verify_request(self, request, client_address):
+        creds = request.getsockopt(socket.SOL_SOCKET, SO_PEERCRED,
+                                   struct.calcsize('3i'))
+        pid, uid, gid = struct.unpack('3i', creds)
+        if uid not in self.allowed_uids:
+            LOG.error(_('Refused connection of process %(pid)s of user '
+                        '%(uid)s'), {'pid': pid, 'uid': uid})
+            return False
+        return True
+
+    def run_command(self, userargs, stdin=None):
+        """Run userargs if it matches a filter.
+
+        Returns the exit code, the standard output and the standard error
+        of the command, or the error code and message of neutron-rootwrap
+        if it doesn't match.
+        """
+        exec_dirs = self.config.exec_dirs
+        try:
+            filtermatch = wrapper.match_filter(self.filters, userargs,
+                                               exec_dirs=exec_dirs)
+        except wrapper.FilterMatchNotExecutable as exc:
+            msg = ("Executable not found: %s (filter match = %s)"
+                   % (exc.match.exec_path, exc.match.name))
+            return self._error(msg, rootwrap_cmd.RC_NOEXECFOUND)
+        except wrapper.NoFilterMatched:
+            msg = ("Unauthorized command: %s (no filter matched)"
+                   % ' '.join(userargs))
+            return self._error(msg, rootwrap_cmd.RC_UNAUTHORIZED)
+
+        try:
+            batch = ip_batch_commands(userargs, stdin)
+        except ValueError as exc:
+            msg = ("Unauthorized command: %s (%s)"
+                   % (' '.join(userargs), exc))
+            return self._error(msg, rootwrap_cmd.RC_UNAUTHORIZED)
+        for batched in batch or []:
+            try:
+                wrapper.match_filter(self.filters, batched,
+                                     exec_dirs=exec_dirs)
+            except (wrapper.FilterMatchNotExecutable,
+                    wrapper.NoFilterMatched):
+                msg = ("Unauthorized batched command: %s (no filter "
+                       "matched)" % ' '.join(batched))
+                return self._error(msg, rootwrap_cmd.RC_UNAUTHORIZED)
+
+        command = filtermatch.get_command(userargs, exec_dirs=exec_dirs)
+        if self.config.use_syslog:
+            logging.info("(%s) Executing %s (filter match = %s)" % (
+                pwd.getpwuid(os.getuid())[0], command, filtermatch.name))
+        try:
+            obj = subprocess.Popen(command,
+                                   stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   close_fds=True,
+                                   preexec_fn=rootwrap_cmd._subprocess_setup,
+                                   env=filtermatch.get_environment(userargs))
+            stdout, stderr = obj.communicate(stdin)
+        except OSError as e:
+            return self._error("Unable to run %s: %s" % (command, e),
+                               rootwrap_cmd.RC_NOEXECFOUND)
+        return obj.returncode, stdout, stderr
+
+    def _error(self, message, errorcode):
+        if self.config.use_syslog:
+            logging.error(message)
+        return errorcode, '', 'neutron-rootwrap-daemon: %s\n' % message
+
+
+class RootwrapDaemonClient(object):
+    """Run commands through a rootwrap daemon.
+
+    Connections to the daemon are kept open and reused. Commands run
+    concurrently use different connections.
+    """
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self._idle = []
+        self._available = True
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except socket.error as e:
+            sock.close()
+            if self._available:
+                LOG.warning(_('Unable to connect to the rootwrap daemon at '
+                              '%(path)s, commands are run with root_helper: '
+                              '%(error)s'),
+                            {'path': self.socket_path, 'error': e})
+                self._available = False
+            return
+        if not self._available:
+            LOG.info(_('Connected to the rootwrap daemon at %s'),
+                     self.socket_path)
+            self._available = True
+        return sock
+
+    def close(self):
+        """Close the idle connections."""
+        while self._idle:
+            self._idle.pop().close()
+
+    def _send(self, request):
+        """Send request, return the connection or None if it failed."""
+        while self._idle:
+            sock = self._idle.pop()
+            try:
+                send_message(sock, request)
+                return sock
+            except socket.error:
+                # The daemon was restarted since the last command
+                sock.close()
+        sock = self._connect()
+        if not sock:
+            return
+        try:
+            send_message(sock, request)
+            return sock
+        except socket.error as e:
+            LOG.warning(_('Unable to send a command to the rootwrap daemon: '
+                          '%s'), e)
+            sock.close()
+
+    def execute(self, cmd, process_input=None):
+        """Run cmd as root.
+
+        Returns the exit code, the standard output and the standard error
+        of the command, or None if the command wasn't sent to the daemon.
+        Raises RuntimeError if the daemon failed after the command was sent,
+        since it may have been run.
+        """
+        request = {'cmd': [str(arg) for arg in cmd],
+                   'stdin': _encode_bytes(process_input)}
+        sock = self._send(request)
+        if not sock:
+            return
+        try:
+            response = recv_message(sock)
+        except (EOFError, ValueError, socket.error) as e:
+            response = e
+        if not isinstance(response, dict):
+            sock.close()
+            raise RuntimeError(_('The rootwrap daemon failed to run '
+                                 '%(cmd)s: %(error)s') %
+                               {'cmd': cmd,
+                                'error': response or 'connection closed'})
+        self._idle.append(sock)
+        return (response['returncode'], _decode_bytes(response['stdout']),
+                _decode_bytes(response['stderr']))
+
+
+def main():
+    execname = sys.argv.pop(0)
+    if len(sys.argv) != 2:
+        rootwrap_cmd._exit_error(execname,
+                                 "Usage: %s CONFIG_FILE SOCKET_PATH" %
+                                 execname, rootwrap_cmd.RC_NOCOMMAND,
+                                 log=False)
+    configfile, socket_path = sys.argv
+
+    try:
+        rawconfig = ConfigParser.RawConfigParser()
+        rawconfig.read(configfile)
+        config = wrapper.RootwrapConfig(rawconfig)
+    except ValueError as exc:
+        msg = "Incorrect value in %s: %s" % (configfile, exc.message)
+        rootwrap_cmd._exit_error(execname, msg, rootwrap_cmd.RC_BADCONFIG,
+                                 log=False)
+    except ConfigParser.Error:
+        rootwrap_cmd._exit_error(execname,
+                                 "Incorrect configuration file: %s" %
+                                 configfile, rootwrap_cmd.RC_BADCONFIG,
+                                 log=False)
+
+    if config.use_syslog:
+        wrapper.setup_syslog(execname,
+                             config.syslog_log_facility,
+                             config.syslog_log_level)
+
+    allowed_uid = int(os.environ.get('SUDO_UID', os.getuid()))
+    server = RootwrapServer(socket_path, config, allowed_uid)
+    # Remove the socket when stopped
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
@@ -26,13 +26,28 @@ import tempfile
 
 from eventlet.green import subprocess
 from eventlet import greenthread
+from oslo.config import cfg
 
+from neutron.agent.linux import rootwrap_daemon
 from neutron.common import utils
 from neutron.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
 
+OPTS = [
+    cfg.StrOpt('root_helper_daemon_socket',
+               help=_('Unix socket of a neutron-rootwrap-daemon used to run '
+                      'the commands run with root_helper. The commands are '
+                      'run with root_helper when the daemon is unreachable, '
+                      'except ip batches, whose commands are then run one '
+                      'by one.')),
+]
+cfg.CONF.register_opts(OPTS, 'AGENT')
+
+# Client of the rootwrap daemon, created on first use
+_rootwrap_daemon_client = None
+
 
 def create_process(cmd, root_helper=None, addl_env=None):
     """Create a process object for the given command.
@@ -58,20 +73,61 @@ def create_process(cmd, root_helper=None, addl_env=None):
     return obj, cmd
 
 
+def _get_rootwrap_daemon_client():
+    global _rootwrap_daemon_client
+    socket_path = cfg.CONF.AGENT.root_helper_daemon_socket
+    if not socket_path:
+        return
+    if (_rootwrap_daemon_client is None or
+            _rootwrap_daemon_client.socket_path != socket_path):
+        _rootwrap_daemon_client = rootwrap_daemon.RootwrapDaemonClient(
+            socket_path)
+    return _rootwrap_daemon_client
+
+
+def _execute_with_daemon(cmd, process_input):
+    """Run cmd through the rootwrap daemon, if it is configured.
+
+    Returns the exit code, standard output and standard error of the
+    command, or None if it wasn't run by the daemon.
+    """
+    client = _get_rootwrap_daemon_client()
+    if client:
+        LOG.debug(_("Running command with the rootwrap daemon: %s"), cmd)
+        return client.execute(cmd, process_input)
+
+
 def execute(cmd, root_helper=None, process_input=None, addl_env=None,
-            check_exit_code=True, return_stderr=False):
+            check_exit_code=True, return_stderr=False, daemon_only=False):
+    """Run cmd, as root if root_helper is given.
+
+    With daemon_only, a command run as root is only run by the rootwrap
+    daemon, which can check its input, and None is returned if it can't.
+    """
     try:
-        obj, cmd = create_process(cmd, root_helper=root_helper,
-                                  addl_env=addl_env)
-        _stdout, _stderr = (process_input and
-                            obj.communicate(process_input) or
-                            obj.communicate())
-        obj.stdin.close()
+        result = None
+        # The daemon runs commands in its own environment
+        if root_helper and not addl_env:
+            result = _execute_with_daemon(cmd, process_input)
+        if result:
+            returncode, _stdout, _stderr = result
+            cmd = map(str, cmd)
+        elif root_helper and daemon_only:
+            LOG.debug(_("Not running without the rootwrap daemon: %s"), cmd)
+            return
+        else:
+            obj, cmd = create_process(cmd, root_helper=root_helper,
+                                      addl_env=addl_env)
+            _stdout, _stderr = (process_input and
+                                obj.communicate(process_input) or
+                                obj.communicate())
+            obj.stdin.close()
+            returncode = obj.returncode
         m = _("\nCommand: %(cmd)s\nExit code: %(code)s\nStdout: %(stdout)r\n"
-              "Stderr: %(stderr)r") % {'cmd': cmd, 'code': obj.returncode,
+              "Stderr: %(stderr)r") % {'cmd': cmd, 'code': returncode,
                                        'stdout': _stdout, 'stderr': _stderr}
         LOG.debug(m)
-        if obj.returncode and check_exit_code:
+        if returncode and check_exit_code:
             raise RuntimeError(m)
     finally:
         # NOTE(termie): this appears to be necessary to let the subprocess
@@ -16,13 +16,16 @@
 #
 # @author: Mark McClain, DreamHost
 
+import collections
 import hashlib
 import hmac
 import os
 import socket
+import time
 import urlparse
 
 import eventlet
+from eventlet import pools
 import httplib2
 from neutronclient.v2_0 import client
 from oslo.config import cfg
@@ -37,6 +40,7 @@ from neutron.common import utils
 from neutron import context
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
+from neutron.openstack.common.rpc import dispatcher
 from neutron import wsgi
 
 LOG = logging.getLogger(__name__)
@@ -44,7 +48,80 @@ LOG = logging.getLogger(__name__)
 DEVICE_OWNER_ROUTER_INTF = "network:router_interface"
 
 
+class LookupCache(object):
+    """A LRU cache whose entries expire after a time to live.
+
+    An entry can be given tags, by which invalidate removes it before it
+    expires.  No entry is kept when max_size is 0.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # key -> (expiry, value, tags), the least recently used first
+        self._entries = collections.OrderedDict()
+        # tag -> keys
+        self._tags = collections.defaultdict(set)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.pop(key, None)
+        if entry and entry[0] < time.time():
+            self._untag(key, entry[2])
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return
+        self._entries[key] = entry
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, value, tags=()):
+        if self.max_size <= 0:
+            return
+        self._remove(key)
+        self._entries[key] = (time.time() + self.ttl, value, tags)
+        for tag in tags:
+            self._tags[tag].add(key)
+        while len(self._entries) > self.max_size:
+            old_key, entry = self._entries.popitem(last=False)
+            self._untag(old_key, entry[2])
+
+    def invalidate(self, tag):
+        for key in self._tags.pop(tag, ()):
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._untag(key, entry[2])
+
+    def _untag(self, key, tags):
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
 class MetadataProxyHandler(object):
+    """Proxy the metadata requests of the instances to Nova.
+
+    The instance and tenant of a remote address, and the networks of a
+    router, are cached for metadata_cache_ttl seconds.  The port update and
+    delete notifications sent to the agents invalidate them earlier.
+
+    API version history:
+        1.0 - Initial version.
+        1.1 - Port update and delete notifications.
+    """
+    RPC_API_VERSION = '1.1'
+
     OPTS = [
         cfg.StrOpt('admin_user',
                    help=_("Admin user")),
@@ -71,12 +148,38 @@ class MetadataProxyHandler(object):
         cfg.StrOpt('metadata_proxy_shared_secret',
                    default='',
                    help=_('Shared secret to sign instance-id request'),
-                   secret=True)
+                   secret=True),
+        cfg.IntOpt('metadata_cache_size', default=1000,
+                   help=_("Number of instances and routers whose lookup is "
+                          "cached, 0 disables the cache")),
+        cfg.IntOpt('metadata_cache_ttl', default=5,
+                   help=_("Seconds during which the instance of an address "
+                          "and the networks of a router are cached")),
+        cfg.IntOpt('nova_metadata_pool_size', default=100,
+                   help=_("Maximum number of connections kept open to the "
+                          "Nova metadata server")),
+        cfg.IntOpt('neutron_client_pool_size', default=10,
+                   help=_("Maximum number of Neutron API clients, which "
+                          "keep their connection and token")),
     ]
 
     def __init__(self, conf):
         self.conf = conf
         self.auth_info = {}
+        # (router id or network id, remote address) -> (instance, tenant)
+        self.instances_cache = LookupCache(conf.metadata_cache_size,
+                                           conf.metadata_cache_ttl)
+        # router id -> network ids
+        self.router_networks_cache = LookupCache(conf.metadata_cache_size,
+                                                 conf.metadata_cache_ttl)
+        # httplib2 connections can't be shared by concurrent requests, the
+        # clients and connections are taken from pools for each request
+        self.neutron_clients = pools.Pool(
+            max_size=conf.neutron_client_pool_size, order_as_stack=True,
+            create=self._get_neutron_client)
+        self.nova_connections = pools.Pool(
+            max_size=conf.nova_metadata_pool_size, order_as_stack=True,
+            create=self._get_nova_connection)
 
     def _get_neutron_client(self):
         qclient = client.Client(
@@ -92,6 +195,9 @@ class MetadataProxyHandler(object):
         )
         return qclient
 
+    def _get_nova_connection(self):
+        return httplib2.Http()
+
     @webob.dec.wsgify(RequestClass=webob.Request)
     def __call__(self, req):
         try:
@@ -110,29 +216,80 @@ class MetadataProxyHandler(object):
             return webob.exc.HTTPInternalServerError(explanation=unicode(msg))
 
     def _get_instance_and_tenant_id(self, req):
-        qclient = self._get_neutron_client()
-
         remote_address = req.headers.get('X-Forwarded-For')
         network_id = req.headers.get('X-Neutron-Network-ID')
         router_id = req.headers.get('X-Neutron-Router-ID')
 
+        key = (network_id or router_id, remote_address)
+        instance = self.instances_cache.get(key)
+        if instance:
+            return instance
+
+        with self.neutron_clients.item() as qclient:
+            ports = self._lookup_ports(qclient, network_id, router_id,
+                                       remote_address)
+            # The clients created later start with the latest token
+            self.auth_info = qclient.get_auth_info()
+
+        if len(ports) == 1:
+            port = ports[0]
+            instance = port['device_id'], port['tenant_id']
+            self.instances_cache.put(
+                key, instance, tags=(port.get('id'),
+                                     (port.get('network_id'), remote_address)))
+            return instance
+        return None, None
+
+    def _lookup_ports(self, qclient, network_id, router_id, remote_address):
         if network_id:
-            networks = [network_id]
-        else:
+            return self._get_ports(qclient, [network_id], remote_address)
+
+        cached = self.router_networks_cache.get(router_id) is not None
+        networks = self._get_router_networks(qclient, router_id)
+        ports = self._get_ports(qclient, networks, remote_address)
+        if len(ports) != 1 and cached:
+            # An interface may have been added to the router since
+            self.router_networks_cache.invalidate(router_id)
+            new_networks = self._get_router_networks(qclient, router_id)
+            if set(new_networks) != set(networks):
+                ports = self._get_ports(qclient, new_networks, remote_address)
+        return ports
+
+    def _get_router_networks(self, qclient, router_id):
+        networks = self.router_networks_cache.get(router_id)
+        if networks is None:
             internal_ports = qclient.list_ports(
                 device_id=router_id,
                 device_owner=DEVICE_OWNER_ROUTER_INTF)['ports']
-
             networks = [p['network_id'] for p in internal_ports]
+            self.router_networks_cache.put(
+                router_id, networks,
+                tags=[router_id] + [p.get('id') for p in internal_ports])
+        return networks
 
-        ports = qclient.list_ports(
+    def _get_ports(self, qclient, networks, remote_address):
+        return qclient.list_ports(
             network_id=networks,
             fixed_ips=['ip_address=%s' % remote_address])['ports']
 
-        self.auth_info = qclient.get_auth_info()
-        if len(ports) == 1:
-            return ports[0]['device_id'], ports[0]['tenant_id']
-        return None, None
+    def port_update(self, context, **kwargs):
+        port = kwargs['port']
+        LOG.debug(_("Port %s updated, invalidating its cached lookups"),
+                  port['id'])
+        self.instances_cache.invalidate(port['id'])
+        for fixed_ip in port.get('fixed_ips', []):
+            self.instances_cache.invalidate(
+                (port.get('network_id'), fixed_ip['ip_address']))
+        self.router_networks_cache.invalidate(port['id'])
+        if port.get('device_owner') == DEVICE_OWNER_ROUTER_INTF:
+            self.router_networks_cache.invalidate(port.get('device_id'))
+
+    def port_delete(self, context, **kwargs):
+        port_id = kwargs['port_id']
+        LOG.debug(_("Port %s deleted, invalidating its cached lookups"),
+                  port_id)
+        self.instances_cache.invalidate(port_id)
+        self.router_networks_cache.invalidate(port_id)
 
     def _proxy_request(self, instance_id, tenant_id, req):
         headers = {
@@ -150,9 +307,9 @@ class MetadataProxyHandler(object):
             req.query_string,
             ''))
 
-        h = httplib2.Http()
-        resp, content = h.request(url, method=req.method, headers=headers,
-                                  body=req.body)
+        with self.nova_connections.item() as h:
+            resp, content = h.request(url, method=req.method,
+                                      headers=headers, body=req.body)
 
         if resp.status == 200:
             LOG.debug(str(resp))
@@ -213,11 +370,18 @@ class UnixDomainMetadataProxy(object):
     OPTS = [
         cfg.StrOpt('metadata_proxy_socket',
                    default='$state_path/metadata_proxy',
-                   help=_('Location for Metadata Proxy UNIX domain socket'))
+                   help=_('Location for Metadata Proxy UNIX domain socket')),
+        cfg.IntOpt('metadata_proxy_pool_size', default=1000,
+                   help=_('Number of green threads serving the requests of '
+                          'the Metadata Proxy UNIX domain socket')),
+        cfg.IntOpt('metadata_proxy_backlog', default=128,
+                   help=_('Number of connections pending on the Metadata '
+                          'Proxy UNIX domain socket')),
     ]
 
     def __init__(self, conf):
         self.conf = conf
+        self.handler = MetadataProxyHandler(conf)
 
         dirname = os.path.dirname(cfg.CONF.metadata_proxy_socket)
         if os.path.isdir(dirname):
@@ -252,6 +416,7 @@ class UnixDomainMetadataProxy(object):
             self.heartbeat.start(interval=report_interval)
 
     def _report_state(self):
+        self._update_cache_stats()
         try:
             self.state_rpc.report_state(
                 self.context,
@@ -268,10 +433,28 @@ class UnixDomainMetadataProxy(object):
             return
         self.agent_state.pop('start_flag', None)
 
+    def _update_cache_stats(self):
+        configurations = self.agent_state['configurations']
+        for name, cache in (('instances', self.handler.instances_cache),
+                            ('router_networks',
+                             self.handler.router_networks_cache)):
+            configurations['%s_cache_hits' % name] = cache.hits
+            configurations['%s_cache_misses' % name] = cache.misses
+
+    def _init_notification_consumers(self):
+        # The port notifications sent to the L2 agents invalidate the
+        # cached lookups of the handler
+        self.connection = agent_rpc.create_consumers(
+            dispatcher.RpcDispatcher([self.handler]), topics.AGENT,
+            [[topics.PORT, topics.UPDATE], [topics.PORT, topics.DELETE]])
+
     def run(self):
-        server = UnixDomainWSGIServer('neutron-metadata-agent')
-        server.start(MetadataProxyHandler(self.conf),
-                     self.conf.metadata_proxy_socket)
+        self._init_notification_consumers()
+        server = UnixDomainWSGIServer(
+            'neutron-metadata-agent',
+            threads=self.conf.metadata_proxy_pool_size)
+        server.start(self.handler, self.conf.metadata_proxy_socket,
+                     backlog=self.conf.metadata_proxy_backlog)
         server.wait()
 
 
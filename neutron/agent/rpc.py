@@ -21,6 +21,7 @@ from neutron.common import topics
 
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import rpc
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.openstack.common.rpc import proxy
 from neutron.openstack.common import timeutils
 
@@ -79,6 +80,8 @@ class PluginApi(proxy.RpcProxy):
 
     API version history:
         1.0 - Initial version.
+        1.1 - Support Security Group RPC.
+        1.2 - Add get_devices_details_list and update_devices_status.
 
     '''
 
@@ -87,6 +90,25 @@ class PluginApi(proxy.RpcProxy):
     def __init__(self, topic):
         super(PluginApi, self).__init__(
             topic=topic, default_version=self.BASE_RPC_API_VERSION)
+        # Cleared when the plugin is found not to support the calls on
+        # lists of devices, which are then made device by device.
+        self.devices_list_supported = True
+
+    def _call_devices_list(self, context, msg):
+        """Make a call on a list of devices, if the plugin supports it.
+
+        Returns None when the plugin is too old to support the call.
+        """
+        if not self.devices_list_supported:
+            return
+        try:
+            return self.call(context, msg, topic=self.topic, version='1.2')
+        except rpc_common.RemoteError as e:
+            if e.exc_type not in ('UnsupportedRpcVersion', 'AttributeError'):
+                raise
+            LOG.info(_("Plugin does not support calls on lists of devices, "
+                       "making them device by device"))
+            self.devices_list_supported = False
 
     def get_device_details(self, context, device, agent_id):
         return self.call(context,
@@ -94,6 +116,15 @@ class PluginApi(proxy.RpcProxy):
                                        agent_id=agent_id),
                          topic=self.topic)
 
+    def get_devices_details_list(self, context, devices, agent_id):
+        details = self._call_devices_list(
+            context, self.make_msg('get_devices_details_list',
+                                   devices=list(devices), agent_id=agent_id))
+        if details is None:
+            details = [self.get_device_details(context, device, agent_id)
+                       for device in devices]
+        return details
+
     def update_device_down(self, context, device, agent_id, host=None):
         return self.call(context,
                          self.make_msg('update_device_down', device=device,
@@ -106,6 +137,23 @@ class PluginApi(proxy.RpcProxy):
                                        agent_id=agent_id, host=host),
                          topic=self.topic)
 
+    def update_devices_status(self, context, devices_up, devices_down,
+                              agent_id, host=None):
+        status = self._call_devices_list(
+            context, self.make_msg('update_devices_status',
+                                   devices_up=list(devices_up),
+                                   devices_down=list(devices_down),
+                                   agent_id=agent_id, host=host))
+        if status is None:
+            for device in devices_up:
+                self.update_device_up(context, device, agent_id, host)
+            status = {'devices_up': list(devices_up),
+                      'devices_down': [
+                          self.update_device_down(context, device, agent_id,
+                                                  host)
+                          for device in devices_down]}
+        return status
+
     def tunnel_sync(self, context, tunnel_ip, tunnel_type=None):
         return self.call(context,
                          self.make_msg('tunnel_sync', tunnel_ip=tunnel_ip,
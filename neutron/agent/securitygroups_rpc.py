@@ -16,20 +16,33 @@
 #    under the License.
 #
 
+import netaddr
 from oslo.config import cfg
 
 from neutron.common import topics
 from neutron.openstack.common import importutils
 from neutron.openstack.common import log as logging
+from neutron.openstack.common.rpc import common as rpc_common
 
 LOG = logging.getLogger(__name__)
 SG_RPC_VERSION = "1.1"
+# The version of the plugin RPC API with security_group_info_for_devices
+SG_INFO_RPC_VERSION = "1.3"
+
+DIRECTION_IP_PREFIX = {'ingress': 'source_ip_prefix',
+                       'egress': 'dest_ip_prefix'}
 
 security_group_opts = [
     cfg.StrOpt(
         'firewall_driver',
         default='neutron.agent.firewall.NoopFirewallDriver',
-        help=_('Driver for Security Groups Firewall'))
+        help=_('Driver for Security Groups Firewall')),
+    cfg.BoolOpt(
+        'enable_ipset',
+        default=False,
+        help=_('Match the members of remote security groups with one '
+               'ipset per security group and ethertype instead of one '
+               'iptables rule per member'))
 ]
 cfg.CONF.register_opts(security_group_opts, 'SECURITYGROUP')
 
@@ -57,6 +70,35 @@ class SecurityGroupServerRpcApiMixin(object):
                          version=SG_RPC_VERSION,
                          topic=self.topic)
 
+    # Cleared when the plugin is found not to support
+    # security_group_info_for_devices
+    sg_info_supported = True
+
+    def security_group_info_for_devices(self, context, devices,
+                                        cached_security_groups=None):
+        """Get the security groups of devices and their rules.
+
+        Returns None when the plugin is too old to support the call.
+        """
+        if not self.sg_info_supported:
+            return
+        LOG.debug(_("Get security group info "
+                    "for devices via rpc %r"), devices)
+        try:
+            return self.call(
+                context,
+                self.make_msg('security_group_info_for_devices',
+                              devices=devices,
+                              cached_security_groups=cached_security_groups),
+                version=SG_INFO_RPC_VERSION,
+                topic=self.topic)
+        except rpc_common.RemoteError as e:
+            if e.exc_type not in ('UnsupportedRpcVersion', 'AttributeError'):
+                raise
+            LOG.info(_("Plugin does not support security group info "
+                       "for devices, getting the rules of each device"))
+            self.sg_info_supported = False
+
 
 class SecurityGroupAgentRpcCallbackMixin(object):
     """A mix-in that enable SecurityGroup agent
@@ -107,24 +149,116 @@ class SecurityGroupAgentRpcMixin(object):
     support in agent implementations.
     """
 
-    def init_firewall(self):
+    def init_firewall(self, defer_refresh_firewall=False):
         firewall_driver = cfg.CONF.SECURITYGROUP.firewall_driver
         LOG.debug(_("Init firewall settings (driver=%s)"), firewall_driver)
         self.firewall = importutils.import_object(firewall_driver)
+        # With defer_refresh_firewall, the refreshes requested by security
+        # group notifications are recorded and made by the agent loop with
+        # refresh_deferred_firewall, so that the notifications received
+        # during an iteration of the loop result in a single refresh
+        self.defer_refresh_firewall = defer_refresh_firewall
+        self.devices_to_refilter = set()
+        self.global_refresh_firewall = False
+        self.pending_refresh_notifications = 0
+        self.refresh_stats = {'notifications': 0,
+                              'merged': 0,
+                              'refreshes': 0}
+        # The rules of the security groups of the filtered devices, kept
+        # between refreshes so that the plugin only sends the rules of
+        # the groups which are new or updated
+        self.sg_rules_cache = {}
+        # For each call for the rules of devices in flight, the groups
+        # whose rules were updated meanwhile: the reply may hold their
+        # previous rules, which must not be cached
+        self.sg_rules_calls = []
+        # The groups updated during a call, whose devices are refreshed
+        # once they are filtered
+        self.sg_rules_updated_in_flight = set()
+
+    def _security_group_rules_for_devices(self, device_ids):
+        cached_rules = dict(self.sg_rules_cache)
+        updated = set()
+        self.sg_rules_calls.append(updated)
+        try:
+            info = self.plugin_rpc.security_group_info_for_devices(
+                self.context, list(device_ids),
+                cached_security_groups=cached_rules.keys())
+            if info is None:
+                return self.plugin_rpc.security_group_rules_for_devices(
+                    self.context, list(device_ids))
+        finally:
+            self.sg_rules_calls.remove(updated)
+            self.sg_rules_updated_in_flight |= updated
+        cached_rules.update(info['security_groups'])
+        for sg_id, rules in info['security_groups'].items():
+            if sg_id not in updated:
+                self.sg_rules_cache[sg_id] = rules
+        return self._expand_security_group_info(info, cached_rules)
+
+    def _refresh_updated_in_flight(self):
+        """Refresh the devices filtered with rules updated meanwhile."""
+        if not self.sg_rules_updated_in_flight:
+            return
+        security_groups = self.sg_rules_updated_in_flight
+        self.sg_rules_updated_in_flight = set()
+        self._security_group_updated(security_groups, 'security_groups')
+
+    def _expand_security_group_info(self, info, rules_by_group):
+        """Build the rules of each device from the security group info.
+
+        The rules with a remote group are expanded into a rule for each IP
+        of the members of the group, other than the IPs of the device.
+        """
+        member_ips = {}
+        for sg_id, ips in info['sg_member_ips'].items():
+            member_ips[sg_id] = [
+                (ip, 'IPv%s' % netaddr.IPNetwork(ip).version,
+                 str(netaddr.IPNetwork(ip).cidr)) for ip in ips]
+        devices = info['devices']
+        for device in devices.values():
+            rules = []
+            source_groups = []
+            for sg_id in device['security_groups']:
+                for rule in rules_by_group.get(sg_id, []):
+                    remote_group_id = rule.get('remote_group_id')
+                    if not remote_group_id:
+                        rules.append(rule)
+                        continue
+                    source_groups.append(remote_group_id)
+                    direction_ip_prefix = DIRECTION_IP_PREFIX[
+                        rule['direction']]
+                    for ip, ethertype, cidr in member_ips.get(
+                            remote_group_id, []):
+                        if (ip in device['fixed_ips'] or
+                            rule['ethertype'] != ethertype):
+                            continue
+                        ip_rule = rule.copy()
+                        ip_rule[direction_ip_prefix] = cidr
+                        rules.append(ip_rule)
+            # the provider rules sent with the device come last
+            device['security_group_rules'] = (
+                rules + device['security_group_rules'])
+            device['security_group_source_groups'] = source_groups
+        return devices
 
     def prepare_devices_filter(self, device_ids):
         if not device_ids:
             return
         LOG.info(_("Preparing filters for devices %s"), device_ids)
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, list(device_ids))
+        devices = self._security_group_rules_for_devices(device_ids)
         with self.firewall.defer_apply():
             for device in devices.values():
                 self.firewall.prepare_port_filter(device)
+        self._refresh_updated_in_flight()
 
     def security_groups_rule_updated(self, security_groups):
         LOG.info(_("Security group "
                    "rule updated %r"), security_groups)
+        for sg_id in security_groups:
+            self.sg_rules_cache.pop(sg_id, None)
+        for updated in self.sg_rules_calls:
+            updated.update(security_groups)
         self._security_group_updated(
             security_groups,
             'security_groups')
@@ -143,12 +277,70 @@ class SecurityGroupAgentRpcMixin(object):
             if sec_grp_set & set(device.get(attribute, [])):
                 devices.append(device)
 
-        if devices:
+        if not devices:
+            return
+        if self.defer_refresh_firewall:
+            self._defer_refresh(devices)
+        else:
             self.refresh_firewall(devices)
 
     def security_groups_provider_updated(self):
         LOG.info(_("Provider rule updated"))
-        self.refresh_firewall()
+        if self.defer_refresh_firewall:
+            self._defer_refresh()
+        else:
+            self.refresh_firewall()
+
+    def refresh_port_firewall(self, device_id):
+        """Refresh the filter of a device whose port was updated."""
+        device = self.firewall.ports.get(device_id)
+        if not device:
+            return
+        if self.defer_refresh_firewall:
+            self._defer_refresh([device])
+        else:
+            self.refresh_firewall([device])
+
+    def _defer_refresh(self, devices=None):
+        """Record a refresh of devices, or of all the devices."""
+        if devices is None:
+            self.global_refresh_firewall = True
+        else:
+            self.devices_to_refilter |= set(
+                device['device'] for device in devices)
+        self.pending_refresh_notifications += 1
+        self.refresh_stats['notifications'] += 1
+
+    def firewall_refresh_needed(self):
+        return bool(self.global_refresh_firewall or self.devices_to_refilter)
+
+    def refresh_deferred_firewall(self):
+        """Make the refreshes recorded since the last call at once."""
+        if not self.firewall_refresh_needed():
+            return
+        notifications = self.pending_refresh_notifications
+        if self.global_refresh_firewall:
+            devices = None
+        else:
+            # the devices may have been removed since the notification
+            devices = [self.firewall.ports[device_id]
+                       for device_id in self.devices_to_refilter
+                       if device_id in self.firewall.ports]
+        self.devices_to_refilter = set()
+        self.global_refresh_firewall = False
+        self.pending_refresh_notifications = 0
+        self.refresh_stats['merged'] += max(notifications - 1, 0)
+        self.refresh_stats['refreshes'] += 1
+        LOG.debug(_("Refreshing firewall for %(devices)s devices, merging "
+                    "%(notifications)d security group notifications. "
+                    "Refresh statistics: %(stats)s"),
+                  {'devices': 'all' if devices is None else len(devices),
+                   'notifications': notifications,
+                   'stats': self.refresh_stats})
+        if devices is None:
+            self.refresh_firewall()
+        elif devices:
+            self.refresh_firewall(devices)
 
     def remove_devices_filter(self, device_ids):
         if not device_ids:
@@ -160,6 +352,14 @@ class SecurityGroupAgentRpcMixin(object):
                 if not device:
                     continue
                 self.firewall.remove_port_filter(device)
+        self._remove_unused_security_groups()
+
+    def _remove_unused_security_groups(self):
+        sg_ids = set()
+        for device in self.firewall.ports.values():
+            sg_ids.update(device.get('security_groups', []))
+        for sg_id in set(self.sg_rules_cache) - sg_ids:
+            del self.sg_rules_cache[sg_id]
 
     def refresh_firewall(self, devices=None):
         LOG.info(_("Refresh firewall rules"))
@@ -168,15 +368,17 @@ class SecurityGroupAgentRpcMixin(object):
             device_ids = [d['device'] for d in devices]
         else:
             device_ids = self.firewall.ports.keys()
+            # a full refresh also reloads the rules of the groups
+            self.sg_rules_cache.clear()
         if not device_ids:
             LOG.info(_("No ports here to refresh firewall"))
             return
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, device_ids)
+        devices = self._security_group_rules_for_devices(device_ids)
         with self.firewall.defer_apply():
             for device in devices.values():
                 LOG.debug(_("Update port filter for %s"), device['device'])
                 self.firewall.update_port_filter(device)
+        self._refresh_updated_in_flight()
 
 
 class SecurityGroupAgentRpcApiMixin(object):
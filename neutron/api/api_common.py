@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import base64
 import urllib
 
 from oslo.config import cfg
@@ -22,6 +23,7 @@ from webob import exc
 
 from neutron.common import constants
 from neutron.common import exceptions
+from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
 
 
@@ -52,21 +54,51 @@ def get_filters(request, attr_info, skips=[]):
     return res
 
 
-def get_previous_link(request, items, id_key):
+# Types of the sort key values which can be carried by a keyset marker
+KEYSET_MARKER_TYPES = (basestring, int, long, bool, type(None))
+
+
+def encode_keyset_marker(values):
+    """Return an opaque marker holding the sort key values of an item.
+
+    values maps the sort keys to their values in the last item of a page.
+    Returns None if a value can't be carried by the marker.
+    """
+    if not all(isinstance(value, KEYSET_MARKER_TYPES)
+               for value in values.itervalues()):
+        return None
+    return base64.urlsafe_b64encode(jsonutils.dumps(values))
+
+
+def decode_keyset_marker(marker):
+    """Return the sort key values of a keyset marker.
+
+    Returns None if marker isn't a keyset marker, e.g. the id of an item.
+    """
+    try:
+        values = jsonutils.loads(base64.urlsafe_b64decode(str(marker)))
+    except (TypeError, ValueError, UnicodeError):
+        return None
+    if not isinstance(values, dict):
+        return None
+    return values
+
+
+def get_previous_link(request, items, id_key, make_marker=None):
     params = request.GET.copy()
     params.pop('marker', None)
     if items:
-        marker = items[0][id_key]
+        marker = (make_marker and make_marker(items[0])) or items[0][id_key]
         params['marker'] = marker
     params['page_reverse'] = True
     return "%s?%s" % (request.path_url, urllib.urlencode(params))
 
 
-def get_next_link(request, items, id_key):
+def get_next_link(request, items, id_key, make_marker=None):
     params = request.GET.copy()
     params.pop('marker', None)
     if items:
-        marker = items[-1][id_key]
+        marker = (make_marker and make_marker(items[-1])) or items[-1][id_key]
         params['marker'] = marker
     params.pop('page_reverse', None)
     return "%s?%s" % (request.path_url, urllib.urlencode(params))
@@ -156,7 +188,7 @@ def get_page_reverse(request):
 
 
 def get_pagination_links(request, items, limit,
-                         marker, page_reverse, key="id"):
+                         marker, page_reverse, key="id", make_marker=None):
     key = key if key else 'id'
     links = []
     if not limit:
@@ -164,11 +196,11 @@ def get_pagination_links(request, items, limit,
     if not (len(items) < limit and not page_reverse):
         links.append({"rel": "next",
                       "href": get_next_link(request, items,
-                                            key)})
+                                            key, make_marker)})
     if not (len(items) < limit and page_reverse):
         links.append({"rel": "previous",
                       "href": get_previous_link(request, items,
-                                                key)})
+                                                key, make_marker)})
     return links
 
 
@@ -225,16 +257,46 @@ class PaginationEmulatedHelper(PaginationHelper):
 
 
 class PaginationNativeHelper(PaginationEmulatedHelper):
+    """Pagination done by the plugin.
+
+    The links hold keyset markers: the sort key values of the first or
+    last item of the page, so that the plugin can filter the next page
+    without looking up the item of the marker. A marker which is the id of
+    an item is passed as is to the plugin.
+    """
+
+    def __init__(self, request, primary_key='id'):
+        super(PaginationNativeHelper, self).__init__(request, primary_key)
+        self.sort_keys = [primary_key]
 
     def update_args(self, args):
         if self.primary_key not in dict(args.get('sorts', [])).keys():
             args.setdefault('sorts', []).append((self.primary_key, True))
-        args.update({'limit': self.limit, 'marker': self.marker,
+        self.sort_keys = [sort_key for sort_key, direction in args['sorts']]
+        marker = self.marker and decode_keyset_marker(self.marker)
+        args.update({'limit': self.limit, 'marker': marker or self.marker,
                      'page_reverse': self.page_reverse})
 
+    def update_fields(self, original_fields, fields_to_add):
+        if not original_fields:
+            return
+        for key in self.sort_keys:
+            if key not in original_fields:
+                original_fields.append(key)
+                fields_to_add.append(key)
+
     def paginate(self, items):
         return items
 
+    def _make_marker(self, item):
+        return encode_keyset_marker(dict((key, item[key])
+                                         for key in self.sort_keys))
+
+    def get_links(self, items):
+        return get_pagination_links(
+            self.request, items, self.limit, self.marker,
+            self.page_reverse, self.primary_key, self._make_marker)
+
 
 class NoPaginationHelper(PaginationHelper):
     pass
@@ -123,40 +123,56 @@ class Controller(object):
                                     % self._plugin.__class__.__name__)
         return getattr(self._plugin, native_sorting_attr_name, False)
 
-    def _is_visible(self, context, attr_name, data):
-        action = "%s:%s" % (self._plugin_handlers[self.SHOW], attr_name)
-        # Optimistically init authz_check to True
-        authz_check = True
+    def _get_visibility_checks(self, context):
+        """Return the checks deciding the visibility of the attributes.
+
+        The names of the visible attributes are mapped to the compiled
+        policy check of their show action, or to None if they have none.
+        The checks are compiled once for all the objects viewed in a
+        request.
+        """
         try:
-            attr = (attributes.RESOURCE_ATTRIBUTE_MAP
-                    [self._collection].get(attr_name))
-            if attr and attr.get('enforce_policy'):
-                authz_check = policy.check_if_exists(
-                    context, action, data)
+            resource_attrs = attributes.RESOURCE_ATTRIBUTE_MAP[
+                self._collection]
         except KeyError:
             # The extension was not configured for adding its resources
             # to the global resource attribute map. Policy check should
             # not be performed
-            LOG.debug(_("The resource %(resource)s was not found in the "
+            LOG.debug(_("The resource %s was not found in the "
                         "RESOURCE_ATTRIBUTE_MAP; unable to perform authZ "
-                        "check for attribute %(attr)s"),
-                      {'resource': self._collection,
-                       'attr': attr_name})
-        except exceptions.PolicyRuleNotFound:
-            LOG.debug(_("Policy rule:%(action)s not found. Assuming no "
-                        "authZ check is defined for %(attr)s"),
-                      {'action': action,
-                       'attr': attr_name})
-        attr_val = self._attr_info.get(attr_name)
-        return attr_val and attr_val['is_visible'] and authz_check
-
-    def _view(self, context, data, fields_to_strip=None):
+                        "check for its attributes"), self._collection)
+            resource_attrs = {}
+        checks = {}
+        for attr_name, attr_val in self._attr_info.iteritems():
+            if not attr_val['is_visible']:
+                continue
+            checks[attr_name] = None
+            attr = resource_attrs.get(attr_name)
+            if attr and attr.get('enforce_policy'):
+                action = "%s:%s" % (self._plugin_handlers[self.SHOW],
+                                    attr_name)
+                try:
+                    checks[attr_name] = policy.compile_check_if_exists(
+                        context, action)
+                except exceptions.PolicyRuleNotFound:
+                    LOG.debug(_("Policy rule:%(action)s not found. Assuming "
+                                "no authZ check is defined for %(attr)s"),
+                              {'action': action,
+                               'attr': attr_name})
+        return checks
+
+    def _view(self, context, data, fields_to_strip=None,
+              visibility_checks=None):
         # make sure fields_to_strip is iterable
         if not fields_to_strip:
             fields_to_strip = []
+        if visibility_checks is None:
+            visibility_checks = self._get_visibility_checks(context)
 
         return dict(item for item in data.iteritems()
-                    if (self._is_visible(context, item[0], data) and
+                    if (item[0] in visibility_checks and
+                        (visibility_checks[item[0]] is None or
+                         visibility_checks[item[0]](data)) and
                         item[0] not in fields_to_strip))
 
     def _do_field_list(self, original_fields):
@@ -238,14 +254,14 @@ class Controller(object):
             # FIXME(salvatore-orlando): obj_getter might return references to
             # other resources. Must check authZ on them too.
             # Omit items from list that should not be visible
-            obj_list = [obj for obj in obj_list
-                        if policy.check(request.context,
-                                        self._plugin_handlers[self.SHOW],
-                                        obj,
-                                        plugin=self._plugin)]
+            check = policy.compile_check(request.context,
+                                         self._plugin_handlers[self.SHOW])
+            obj_list = [obj for obj in obj_list if check(obj)]
+        visibility_checks = self._get_visibility_checks(request.context)
         collection = {self._collection:
                       [self._view(request.context, obj,
-                                  fields_to_strip=fields_to_add)
+                                  fields_to_strip=fields_to_add,
+                                  visibility_checks=visibility_checks)
                        for obj in obj_list]}
         pagination_links = pagination_helper.get_links(obj_list)
         if pagination_links:
@@ -276,7 +292,8 @@ class Controller(object):
     def index(self, request, **kwargs):
         """Returns a list of the requested entity."""
         parent_id = kwargs.get(self._parent_id_name)
-        return self._items(request, True, parent_id)
+        with request.context.reading_from_slave():
+            return self._items(request, True, parent_id)
 
     def show(self, request, id, **kwargs):
         """Returns detailed information about the requested entity."""
@@ -287,14 +304,15 @@ class Controller(object):
             field_list, added_fields = self._do_field_list(
                 api_common.list_args(request, "fields"))
             parent_id = kwargs.get(self._parent_id_name)
-            return {self._resource:
-                    self._view(request.context,
-                               self._item(request,
-                                          id,
-                                          do_authz=True,
-                                          field_list=field_list,
-                                          parent_id=parent_id),
-                               fields_to_strip=added_fields)}
+            with request.context.reading_from_slave():
+                return {self._resource:
+                        self._view(request.context,
+                                   self._item(request,
+                                              id,
+                                              do_authz=True,
+                                              field_list=field_list,
+                                              parent_id=parent_id),
+                                   fields_to_strip=added_fields)}
         except exceptions.PolicyNotAuthorized:
             # To avoid giving away information, pretend that it
             # doesn't exist
@@ -350,35 +368,37 @@ class Controller(object):
         if self._collection in body:
             # Have to account for bulk create
             items = body[self._collection]
-            deltas = {}
-            bulk = True
         else:
             items = [body]
-            bulk = False
+        deltas = {}
         for item in items:
             self._validate_network_tenant_ownership(request,
                                                     item[self._resource])
             policy.enforce(request.context,
                            action,
                            item[self._resource])
-            try:
-                tenant_id = item[self._resource]['tenant_id']
-                count = quota.QUOTAS.count(request.context, self._resource,
-                                           self._plugin, self._collection,
-                                           tenant_id)
-                if bulk:
-                    delta = deltas.get(tenant_id, 0) + 1
-                    deltas[tenant_id] = delta
-                else:
-                    delta = 1
-                kwargs = {self._resource: count + delta}
-            except exceptions.QuotaResourceUnknown as e:
-                # We don't want to quota this resource
-                LOG.debug(e)
-            else:
-                quota.QUOTAS.limit_check(request.context,
-                                         item[self._resource]['tenant_id'],
-                                         **kwargs)
+            tenant_id = item[self._resource]['tenant_id']
+            deltas[tenant_id] = deltas.get(tenant_id, 0) + 1
+        # The quota is reserved until the resources are created
+        reservations = []
+        try:
+            for tenant_id, delta in sorted(deltas.items()):
+                try:
+                    reservations.append(quota.QUOTAS.make_reservation(
+                        request.context, tenant_id, self._resource, delta,
+                        self._plugin, self._collection, tenant_id))
+                except exceptions.QuotaResourceUnknown as e:
+                    # We don't want to quota this resource
+                    LOG.debug(e)
+                    break
+            return self._create(request, body, parent_id)
+        finally:
+            for reservation in reservations:
+                quota.QUOTAS.release_reservation(request.context,
+                                                 reservation)
+
+    def _create(self, request, body, parent_id):
+        action = self._plugin_handlers[self.CREATE]
 
         def notify(create_result):
             notifier_method = self._resource + '.create.end'
@@ -55,6 +55,10 @@ core_opts = [
                help=_("The base MAC address Neutron will use for VIFs")),
     cfg.IntOpt('mac_generation_retries', default=16,
                help=_("How many times Neutron will retry MAC generation")),
+    cfg.StrOpt('ipam_driver',
+               default='neutron.db.ipam.OptimisticIpamDriver',
+               help=_("The driver used by the database plugin to manage "
+                      "the free IP addresses of subnets")),
     cfg.BoolOpt('allow_bulk', default=True,
                 help=_("Allow the usage of the bulk API")),
     cfg.BoolOpt('allow_pagination', default=False,
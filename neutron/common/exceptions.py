@@ -224,6 +224,11 @@ class IpAddressGenerationFailure(Conflict):
     message = _("No more IP addresses available on network %(net_id)s.")
 
 
+class IpAddressAllocationConflict(Conflict):
+    message = _("Unable to update the free IP addresses of subnet "
+                "%(subnet_id)s because of concurrent allocations.")
+
+
 class BridgeDoesNotExist(NeutronException):
     message = _("Bridge %(bridge)s does not exist.")
 
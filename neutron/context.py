@@ -17,6 +17,7 @@
 
 """Context: context for security/db session."""
 
+import contextlib
 import copy
 
 from datetime import datetime
@@ -153,12 +154,42 @@ class ContextBase(common_context.RequestContext):
 
 
 class Context(ContextBase):
+    _slave_session = None
+    _read_from_slave = False
+
     @property
     def session(self):
+        if self._read_from_slave:
+            if self._slave_session is None:
+                self._slave_session = db_api.get_session(slave_session=True)
+            return self._slave_session
         if self._session is None:
             self._session = db_api.get_session()
+            db_api.track_writes(self._session, self.tenant_id)
         return self._session
 
+    @contextlib.contextmanager
+    def reading_from_slave(self):
+        """Make the session read from the slave database within the block.
+
+        It is only used for read only calls: the main database is still
+        used when reads from the slave database are not enabled, within a
+        transaction, and after the context or its tenant wrote, since the
+        slave database may not have been updated yet.
+        """
+        if (self._read_from_slave or
+            (self._session is not None and
+             (self._session.is_active or
+              db_api.has_written(self._session))) or
+            not db_api.can_read_from_slave(self.tenant_id)):
+            yield
+            return
+        self._read_from_slave = True
+        try:
+            yield
+        finally:
+            self._read_from_slave = False
+
 
 def get_admin_context(read_deleted="no", load_admin_roles=True):
     return Context(user_id=None,
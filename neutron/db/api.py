@@ -17,7 +17,12 @@
 # @author: Brad Hall, Nicira Networks, Inc.
 # @author: Dan Wendlandt, Nicira Networks, Inc.
 
+import time
+import weakref
+
+from oslo.config import cfg
 import sqlalchemy as sql
+from sqlalchemy import event
 
 from neutron.db import model_base
 from neutron.openstack.common.db.sqlalchemy import session
@@ -27,6 +32,29 @@ LOG = logging.getLogger(__name__)
 
 BASE = model_base.BASEV2
 
+SLAVE_READ_OPTS = [
+    cfg.BoolOpt('use_slave_for_reads', default=False,
+                help=_("Run the queries of read only API calls and agent "
+                       "synchronizations on the database configured with "
+                       "slave_connection. The writes of a tenant are only "
+                       "known to the process which made them, so with "
+                       "several API workers or servers a read following "
+                       "a write may not see it until it is replicated")),
+    cfg.IntOpt('slave_read_delay', default=10,
+               help=_("Number of seconds after a write of a tenant during "
+                      "which its reads still go to the main database, so "
+                      "that it sees its own writes in spite of the "
+                      "replication lag of the slave database. Writes are "
+                      "only tracked by the server process which made "
+                      "them")),
+]
+cfg.CONF.register_opts(SLAVE_READ_OPTS, 'database')
+
+# tenant_id -> time of the last write of the tenant by this process
+_LAST_WRITES = {}
+# Sessions which wrote to the database
+_WRITING_SESSIONS = weakref.WeakSet()
+
 
 def configure_db():
     """Configure database.
@@ -43,11 +71,50 @@ def clear_db(base=BASE):
     session.cleanup()
 
 
-def get_session(autocommit=True, expire_on_commit=False):
-    """Helper method to grab session."""
+def get_session(autocommit=True, expire_on_commit=False,
+                slave_session=False):
+    """Helper method to grab session.
+
+    A slave session reads from the database configured with
+    slave_connection, it must not be used for writes.
+    """
     return session.get_session(autocommit=autocommit,
                                expire_on_commit=expire_on_commit,
-                               sqlite_fk=True)
+                               sqlite_fk=True,
+                               slave_session=slave_session)
+
+
+def track_writes(db_session, tenant_id=None):
+    """Record the writes made by tenant_id in db_session."""
+    def after_flush(db_session, flush_context):
+        _WRITING_SESSIONS.add(db_session)
+        if tenant_id:
+            _LAST_WRITES[tenant_id] = time.time()
+    event.listen(db_session, 'after_flush', after_flush)
+
+
+def has_written(db_session):
+    """Return True if db_session wrote since track_writes was called."""
+    return db_session in _WRITING_SESSIONS
+
+
+def can_read_from_slave(tenant_id):
+    """Return True if the reads of tenant_id can go to the slave database.
+
+    They can if the slave database is configured and enabled for reads,
+    and the tenant didn't write recently, since its writes may not have
+    been replicated yet. Only the writes made by this process are known.
+    """
+    if not (cfg.CONF.database.use_slave_for_reads and
+            cfg.CONF.database.slave_connection):
+        return False
+    last_write = _LAST_WRITES.get(tenant_id)
+    if last_write is None:
+        return True
+    if time.time() - last_write < cfg.CONF.database.slave_read_delay:
+        return False
+    _LAST_WRITES.pop(tenant_id, None)
+    return True
 
 
 def register_models(base=BASE):
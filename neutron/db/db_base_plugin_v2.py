@@ -16,7 +16,6 @@
 #    under the License.
 
 import datetime
-import itertools
 import random
 
 import netaddr
@@ -28,6 +27,7 @@ from neutron.api.v2 import attributes
 from neutron.common import constants
 from neutron.common import exceptions as q_exc
 from neutron.db import api as db
+from neutron.db import ipam
 from neutron.db import models_v2
 from neutron.db import sqlalchemyutils
 from neutron import neutron_plugin_base_v2
@@ -65,6 +65,14 @@ class CommonDbMixin(object):
     # TODO(salvatore-orlando): Avoid using class-level variables
     _dict_extend_functions = {}
 
+    # Loader options applied to the queries for collections of a model,
+    # for loading the relationships used by the dicts of its objects
+    _model_loader_options = {}
+
+    # The attributes of the dicts built for a model without the dict extend
+    # functions, mapped to the relationships they are built from
+    _model_dict_fields = {}
+
     @classmethod
     def register_model_query_hook(cls, model, name, query_hook, filter_hook,
                                   result_filters=None):
@@ -90,6 +98,50 @@ class CommonDbMixin(object):
         model_hooks[name] = {'query': query_hook, 'filter': filter_hook,
                              'result_filters': result_filters}
 
+    @classmethod
+    def register_model_loader_options(cls, model, options):
+        """Register loader options for the queries for collections of model.
+
+        The options, such as orm.subqueryload, make sure the relationships
+        used for building the dicts of the objects, in particular by dict
+        extend functions, are loaded together for all the objects of a
+        collection instead of by a query for each object.
+        """
+        cls._model_loader_options.setdefault(model, []).extend(options)
+
+    @classmethod
+    def register_model_dict_fields(cls, model, fields):
+        """Register the attributes of the dicts built for model.
+
+        fields maps the attributes set without the dict extend functions
+        to the names of the relationships they are built from. Queries for
+        collections of model only load these relationships when the
+        requested fields are all among these attributes.
+        """
+        cls._model_dict_fields[model] = fields
+
+    def _has_only_dict_fields(self, model, fields):
+        """Return True if fields don't need the dict extend functions."""
+        return bool(fields and
+                    set(fields).issubset(self._model_dict_fields.get(model,
+                                                                     ())))
+
+    def _apply_loader_options(self, query, model, fields=None):
+        options = list(self._model_loader_options.get(model, []))
+        if self._has_only_dict_fields(model, fields):
+            # The other relationships are loaded on access only, which
+            # doesn't happen since the dict extend functions are skipped
+            dict_fields = self._model_dict_fields[model]
+            needed = set(relationship for field in fields
+                         for relationship in dict_fields[field])
+            options.extend(orm.lazyload(prop.key) for prop in
+                           orm.class_mapper(model).iterate_properties
+                           if (isinstance(prop, orm.RelationshipProperty) and
+                               prop.key not in needed))
+        if options:
+            query = query.options(*options)
+        return query
+
     def _model_query(self, context, model):
         query = context.session.query(model)
         # define basic filter condition for model query
@@ -193,6 +245,7 @@ class CommonDbMixin(object):
                                            limit=limit,
                                            marker_obj=marker_obj,
                                            page_reverse=page_reverse)
+        query = self._apply_loader_options(query, model, fields)
         items = [dict_func(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
@@ -203,6 +256,9 @@ class CommonDbMixin(object):
 
     def _get_marker_obj(self, context, resource, limit, marker):
         if limit and marker:
+            if isinstance(marker, dict):
+                # Keyset marker, holding the sort key values of the item
+                return marker
             return getattr(self, '_get_%s' % resource)(context, marker)
         return None
 
@@ -237,6 +293,32 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         cur_funcs.extend(funcs)
         cls._dict_extend_functions[resource] = cur_funcs
 
+    # The subnets of networks, and the DNS name servers and host routes of
+    # subnets aren't loaded with the objects by default
+    CommonDbMixin.register_model_loader_options(
+        models_v2.Network, [orm.subqueryload('subnets')])
+    CommonDbMixin.register_model_loader_options(
+        models_v2.Subnet, [orm.subqueryload('dns_nameservers'),
+                           orm.subqueryload('routes')])
+
+    CommonDbMixin.register_model_dict_fields(
+        models_v2.Network, {'id': [], 'name': [], 'tenant_id': [],
+                            'admin_state_up': [], 'status': [], 'shared': [],
+                            'subnets': ['subnets']})
+    CommonDbMixin.register_model_dict_fields(
+        models_v2.Subnet, {'id': [], 'name': [], 'tenant_id': [],
+                           'network_id': [], 'ip_version': [], 'cidr': [],
+                           'allocation_pools': ['allocation_pools'],
+                           'gateway_ip': [], 'enable_dhcp': [],
+                           'dns_nameservers': ['dns_nameservers'],
+                           'host_routes': ['routes'], 'shared': []})
+    CommonDbMixin.register_model_dict_fields(
+        models_v2.Port, {'id': [], 'name': [], 'network_id': [],
+                         'tenant_id': [], 'mac_address': [],
+                         'admin_state_up': [], 'status': [],
+                         'fixed_ips': ['fixed_ips'], 'device_id': [],
+                         'device_owner': []})
+
     def _filter_non_model_columns(self, data, model):
         """Remove all the attributes from data which are not columns of
         the model passed as second parameter.
@@ -284,16 +366,20 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         return context.session.query(models_v2.Subnet).all()
 
     @staticmethod
-    def _generate_mac(context, network_id):
+    def _get_random_mac():
         base_mac = cfg.CONF.base_mac.split(':')
+        mac = [int(base_mac[0], 16), int(base_mac[1], 16),
+               int(base_mac[2], 16), random.randint(0x00, 0xff),
+               random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
+        if base_mac[3] != '00':
+            mac[3] = int(base_mac[3], 16)
+        return ':'.join(map(lambda x: "%02x" % x, mac))
+
+    @staticmethod
+    def _generate_mac(context, network_id):
         max_retries = cfg.CONF.mac_generation_retries
         for i in range(max_retries):
-            mac = [int(base_mac[0], 16), int(base_mac[1], 16),
-                   int(base_mac[2], 16), random.randint(0x00, 0xff),
-                   random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
-            if base_mac[3] != '00':
-                mac[3] = int(base_mac[3], 16)
-            mac_address = ':'.join(map(lambda x: "%02x" % x, mac))
+            mac_address = NeutronDbPluginV2._get_random_mac()
             if NeutronDbPluginV2._check_unique_mac(context, network_id,
                                                    mac_address):
                 LOG.debug(_("Generated mac for network %(network_id)s "
@@ -310,6 +396,41 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                   max_retries)
         raise q_exc.MacAddressGenerationFailure(net_id=network_id)
 
+    @staticmethod
+    def _generate_macs(context, network_id, count, reserved_macs):
+        """Generate count unique MAC addresses on the network.
+
+        The uniqueness of each batch of candidates is verified with a single
+        query, and only the colliding ones are generated again. Addresses in
+        reserved_macs are never returned.
+        """
+        macs = set()
+        max_retries = cfg.CONF.mac_generation_retries
+        for i in range(max_retries):
+            candidates = set(NeutronDbPluginV2._get_random_mac()
+                             for j in range(count - len(macs)))
+            candidates -= macs | reserved_macs
+            macs |= candidates - NeutronDbPluginV2._get_macs_in_use(
+                context, network_id, candidates)
+            if len(macs) == count:
+                LOG.debug(_("Generated %(count)d macs for network "
+                            "%(network_id)s"),
+                          {'count': count, 'network_id': network_id})
+                return list(macs)
+        LOG.error(_("Unable to generate mac address after %s attempts"),
+                  max_retries)
+        raise q_exc.MacAddressGenerationFailure(net_id=network_id)
+
+    @staticmethod
+    def _get_macs_in_use(context, network_id, mac_addresses):
+        if not mac_addresses:
+            return set()
+        mac_qry = context.session.query(models_v2.Port.mac_address)
+        mac_qry = mac_qry.filter(
+            models_v2.Port.network_id == network_id,
+            models_v2.Port.mac_address.in_(mac_addresses))
+        return set(mac for mac, in mac_qry)
+
     @staticmethod
     def _check_unique_mac(context, network_id, mac_address):
         mac_qry = context.session.query(models_v2.Port)
@@ -325,92 +446,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         """Return an IP address to the pool of free IP's on the network
         subnet.
         """
-        # Grab all allocation pools for the subnet
-        allocation_pools = (context.session.query(
-            models_v2.IPAllocationPool).filter_by(subnet_id=subnet_id).
-            options(orm.joinedload('available_ranges', innerjoin=True)).
-            with_lockmode('update'))
-        # If there are no available ranges the previous query will return no
-        # results as it uses an inner join to avoid errors with the postgresql
-        # backend (see lp bug 1215350). In this case IP allocation pools must
-        # be loaded with a different query, which does not require lock for
-        # update as the allocation pools for a subnet are immutable.
-        # The 2nd query will be executed only if the first yields no results
-        unlocked_allocation_pools = (context.session.query(
-            models_v2.IPAllocationPool).filter_by(subnet_id=subnet_id))
-
-        # Find the allocation pool for the IP to recycle
-        pool_id = None
-
-        for allocation_pool in itertools.chain(allocation_pools,
-                                               unlocked_allocation_pools):
-            allocation_pool_range = netaddr.IPRange(
-                allocation_pool['first_ip'], allocation_pool['last_ip'])
-            if netaddr.IPAddress(ip_address) in allocation_pool_range:
-                pool_id = allocation_pool['id']
-                break
-        if not pool_id:
-            NeutronDbPluginV2._delete_ip_allocation(
-                context, network_id, subnet_id, ip_address)
-            return
-        # Two requests will be done on the database. The first will be to
-        # search if an entry starts with ip_address + 1 (r1). The second
-        # will be to see if an entry ends with ip_address -1 (r2).
-        # If 1 of the above holds true then the specific entry will be
-        # modified. If both hold true then the two ranges will be merged.
-        # If there are no entries then a single entry will be added.
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).with_lockmode('update')
-        ip_first = str(netaddr.IPAddress(ip_address) + 1)
-        ip_last = str(netaddr.IPAddress(ip_address) - 1)
-        LOG.debug(_("Recycle %s"), ip_address)
-        try:
-            r1 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     first_ip=ip_first).one()
-            LOG.debug(_("Recycle: first match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        except exc.NoResultFound:
-            r1 = []
-        try:
-            r2 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     last_ip=ip_last).one()
-            LOG.debug(_("Recycle: last match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        except exc.NoResultFound:
-            r2 = []
-
-        if r1 and r2:
-            # Merge the two ranges
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=r2['first_ip'],
-                last_ip=r1['last_ip'])
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: merged %(first_ip1)s-%(last_ip1)s and "
-                        "%(first_ip2)s-%(last_ip2)s"),
-                      {'first_ip1': r2['first_ip'], 'last_ip1': r2['last_ip'],
-                       'first_ip2': r1['first_ip'], 'last_ip2': r1['last_ip']})
-            context.session.delete(r1)
-            context.session.delete(r2)
-        elif r1:
-            # Update the range with matched first IP
-            r1['first_ip'] = ip_address
-            LOG.debug(_("Recycle: updated first %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        elif r2:
-            # Update the range with matched last IP
-            r2['last_ip'] = ip_address
-            LOG.debug(_("Recycle: updated last %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        else:
-            # Create a new range
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=ip_address,
-                last_ip=ip_address)
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: created new %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': ip_address, 'last_ip': ip_address})
+        ipam.get_ipam_driver().release_ip(context, subnet_id, ip_address)
         NeutronDbPluginV2._delete_ip_allocation(context, network_id, subnet_id,
                                                 ip_address)
 
@@ -454,65 +490,20 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         The IP address will be generated from one of the subnets defined on
         the network.
         """
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).join(
-                models_v2.IPAllocationPool).with_lockmode('update')
-        for subnet in subnets:
-            range = range_qry.filter_by(subnet_id=subnet['id']).first()
-            if not range:
-                LOG.debug(_("All IPs from subnet %(subnet_id)s (%(cidr)s) "
-                            "allocated"),
-                          {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
-                continue
-            ip_address = range['first_ip']
-            LOG.debug(_("Allocated IP - %(ip_address)s from %(first_ip)s "
-                        "to %(last_ip)s"),
-                      {'ip_address': ip_address,
-                       'first_ip': range['first_ip'],
-                       'last_ip': range['last_ip']})
-            if range['first_ip'] == range['last_ip']:
-                # No more free indices on subnet => delete
-                LOG.debug(_("No more free IP's in slice. Deleting allocation "
-                            "pool."))
-                context.session.delete(range)
-            else:
-                # increment the first free
-                range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-            return {'ip_address': ip_address, 'subnet_id': subnet['id']}
-        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+        return NeutronDbPluginV2._generate_ips(context, subnets, 1)[0]
+
+    @staticmethod
+    def _generate_ips(context, subnets, count):
+        """Generate count IP addresses from the subnets defined on the
+        network.
+        """
+        return ipam.get_ipam_driver().generate_ips(context, subnets, count)
 
     @staticmethod
     def _allocate_specific_ip(context, subnet_id, ip_address):
         """Allocate a specific IP address on the subnet."""
-        ip = int(netaddr.IPAddress(ip_address))
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).join(
-                models_v2.IPAllocationPool).with_lockmode('update')
-        results = range_qry.filter_by(subnet_id=subnet_id)
-        for range in results:
-            first = int(netaddr.IPAddress(range['first_ip']))
-            last = int(netaddr.IPAddress(range['last_ip']))
-            if first <= ip <= last:
-                if first == last:
-                    context.session.delete(range)
-                    return
-                elif first == ip:
-                    range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-                    return
-                elif last == ip:
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    return
-                else:
-                    # Split into two ranges
-                    new_first = str(netaddr.IPAddress(ip_address) + 1)
-                    new_last = range['last_ip']
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    ip_range = models_v2.IPAvailabilityRange(
-                        allocation_pool_id=range['allocation_pool_id'],
-                        first_ip=new_first,
-                        last_ip=new_last)
-                    context.session.add(ip_range)
-                    return
+        ipam.get_ipam_driver().allocate_specific_ip(context, subnet_id,
+                                                    ip_address)
 
     @staticmethod
     def _check_unique_ip(context, network_id, subnet_id, ip_address):
@@ -564,13 +555,18 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                 return True
         return False
 
-    def _test_fixed_ips_for_port(self, context, network_id, fixed_ips):
+    def _test_fixed_ips_for_port(self, context, network_id, fixed_ips,
+                                 subnets=None, check_unique=True):
         """Test fixed IPs for port.
 
         Check that configured subnets are valid prior to allocating any
         IPs. Include the subnet_id in the result if only an IP address is
         configured.
 
+        The subnets of the network are looked up in subnets, if specified,
+        rather than in the database. When check_unique is False, the caller
+        is responsible for verifying that the IP addresses are not in use.
+
         :raises: InvalidInput, IpAddressInUse
         """
         fixed_ip_set = []
@@ -581,8 +577,9 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                     msg = _('IP allocation requires subnet_id or ip_address')
                     raise q_exc.InvalidInput(error_message=msg)
 
-                filter = {'network_id': [network_id]}
-                subnets = self.get_subnets(context, filters=filter)
+                if subnets is None:
+                    filter = {'network_id': [network_id]}
+                    subnets = self.get_subnets(context, filters=filter)
                 for subnet in subnets:
                     if NeutronDbPluginV2._check_subnet_ip(subnet['cidr'],
                                                           fixed['ip_address']):
@@ -594,7 +591,12 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                             'networks subnets') % fixed['ip_address']
                     raise q_exc.InvalidInput(error_message=msg)
             else:
-                subnet = self._get_subnet(context, fixed['subnet_id'])
+                for network_subnet in subnets or []:
+                    if network_subnet['id'] == fixed['subnet_id']:
+                        subnet = network_subnet
+                        break
+                else:
+                    subnet = self._get_subnet(context, fixed['subnet_id'])
                 if subnet['network_id'] != network_id:
                     msg = (_("Failed to create port on network %(network_id)s"
                              ", because fixed_ips included invalid subnet "
@@ -606,9 +608,9 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
             if 'ip_address' in fixed:
                 # Ensure that the IP's are unique
-                if not NeutronDbPluginV2._check_unique_ip(context, network_id,
-                                                          subnet_id,
-                                                          fixed['ip_address']):
+                if (check_unique and
+                    not NeutronDbPluginV2._check_unique_ip(
+                        context, network_id, subnet_id, fixed['ip_address'])):
                     raise q_exc.IpAddressInUse(net_id=network_id,
                                                ip_address=fixed['ip_address'])
 
@@ -882,11 +884,14 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                'tenant_id': network['tenant_id'],
                'admin_state_up': network['admin_state_up'],
                'status': network['status'],
-               'shared': network['shared'],
-               'subnets': [subnet['id']
-                           for subnet in network['subnets']]}
+               'shared': network['shared']}
+        # Only read the relationships the fields need
+        dict_fields_only = self._has_only_dict_fields(models_v2.Network,
+                                                      fields)
+        if not dict_fields_only or 'subnets' in fields:
+            res['subnets'] = [subnet['id'] for subnet in network['subnets']]
         # Call auxiliary extend functions, if any
-        if process_extensions:
+        if process_extensions and not dict_fields_only:
             self._apply_dict_extend_functions(
                 attributes.NETWORKS, res, network)
         return self._fields(res, fields)
@@ -898,18 +903,22 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                'network_id': subnet['network_id'],
                'ip_version': subnet['ip_version'],
                'cidr': subnet['cidr'],
-               'allocation_pools': [{'start': pool['first_ip'],
-                                     'end': pool['last_ip']}
-                                    for pool in subnet['allocation_pools']],
                'gateway_ip': subnet['gateway_ip'],
                'enable_dhcp': subnet['enable_dhcp'],
-               'dns_nameservers': [dns['address']
-                                   for dns in subnet['dns_nameservers']],
-               'host_routes': [{'destination': route['destination'],
-                                'nexthop': route['nexthop']}
-                               for route in subnet['routes']],
                'shared': subnet['shared']
                }
+        # Only read the relationships the fields need
+        if not fields or 'allocation_pools' in fields:
+            res['allocation_pools'] = [{'start': pool['first_ip'],
+                                        'end': pool['last_ip']}
+                                       for pool in subnet['allocation_pools']]
+        if not fields or 'dns_nameservers' in fields:
+            res['dns_nameservers'] = [dns['address']
+                                      for dns in subnet['dns_nameservers']]
+        if not fields or 'host_routes' in fields:
+            res['host_routes'] = [{'destination': route['destination'],
+                                   'nexthop': route['nexthop']}
+                                  for route in subnet['routes']]
         return self._fields(res, fields)
 
     def _make_port_dict(self, port, fields=None,
@@ -921,13 +930,16 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                "mac_address": port["mac_address"],
                "admin_state_up": port["admin_state_up"],
                "status": port["status"],
-               "fixed_ips": [{'subnet_id': ip["subnet_id"],
-                              'ip_address': ip["ip_address"]}
-                             for ip in port["fixed_ips"]],
                "device_id": port["device_id"],
                "device_owner": port["device_owner"]}
+        # Only read the relationships the fields need
+        dict_fields_only = self._has_only_dict_fields(models_v2.Port, fields)
+        if not dict_fields_only or 'fixed_ips' in fields:
+            res['fixed_ips'] = [{'subnet_id': ip["subnet_id"],
+                                 'ip_address': ip["ip_address"]}
+                                for ip in port["fixed_ips"]]
         # Call auxiliary extend functions, if any
-        if process_extensions:
+        if process_extensions and not dict_fields_only:
             self._apply_dict_extend_functions(
                 attributes.PORTS, res, port)
         return self._fields(res, fields)
@@ -1007,9 +1019,11 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             for port in ports:
                 self._delete_port(context, port['id'])
 
-            # clean up subnets
+            # clean up subnets, through the session so that their usage
+            # is updated
             subnets_qry = context.session.query(models_v2.Subnet)
-            subnets_qry.filter_by(network_id=id).delete()
+            for subnet in subnets_qry.filter_by(network_id=id):
+                context.session.delete(subnet)
             context.session.delete(network)
 
     def get_network(self, context, id, fields=None):
@@ -1304,7 +1318,209 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                           filters=filters)
 
     def create_port_bulk(self, context, ports):
-        return self._create_bulk('port', context, ports)
+        if not self._is_native_port_bulk_supported():
+            return self._create_bulk('port', context, ports)
+        return self._create_ports_bulk_native(context, ports['ports'])
+
+    def _is_native_port_bulk_supported(self):
+        """Return whether the set based path can create the ports.
+
+        Plugins extending create_port rely on it being invoked for each
+        port, so the set based path is used only when create_port is not
+        overridden, or when the class overriding it also implements
+        _create_ports_bulk_precommit to process the created ports.
+        """
+        create_port = getattr(self.create_port, '__func__', None)
+        for cls in type(self).__mro__:
+            if 'create_port' in vars(cls):
+                return (vars(cls)['create_port'] is create_port and
+                        (cls is NeutronDbPluginV2 or
+                         '_create_ports_bulk_precommit' in vars(cls)))
+        return False
+
+    def _create_ports_bulk_precommit(self, context, ports, results):
+        """Process the ports created in bulk within the transaction.
+
+        :param ports: the port requests, as passed to create_port.
+        :param results: the port dicts created for each request.
+        :returns: a state passed to _create_ports_bulk_postcommit.
+        """
+        pass
+
+    def _create_ports_bulk_postcommit(self, context, results, state):
+        """Process the ports created in bulk once committed."""
+        pass
+
+    def _create_ports_bulk_native(self, context, ports):
+        """Create several ports with a bounded number of queries.
+
+        All the ports are validated before any allocation is made. MAC
+        addresses are then generated and verified for each network with
+        set based queries, IP addresses are reserved with a single IPAM
+        call for each group of subnets, and all the rows are inserted when
+        the session is flushed. Plugins then process the created ports with
+        _create_ports_bulk_precommit and _create_ports_bulk_postcommit.
+        """
+        port_args = []
+        for item in ports:
+            p = item['port']
+            tenant_id = self._get_tenant_id_for_create(context, p)
+            port_args.append({'tenant_id': tenant_id,
+                              'id': p.get('id') or uuidutils.generate_uuid()})
+
+        with context.session.begin(subtransactions=True):
+            network_ids = set(item['port']['network_id'] for item in ports)
+            networks = self._get_collection_query(
+                context, models_v2.Network,
+                filters={'id': list(network_ids)})
+            missing = network_ids - set(network['id'] for network in networks)
+            if missing:
+                raise q_exc.NetworkNotFound(net_id=missing.pop())
+            network_subnets = dict((network_id, []) for network_id in
+                                   network_ids)
+            for subnet in self._get_collection_query(
+                    context, models_v2.Subnet,
+                    filters={'network_id': list(network_ids)}):
+                network_subnets[subnet['network_id']].append(subnet)
+
+            self._allocate_macs_for_ports(context, ports, port_args)
+            self._allocate_ips_for_ports(context, ports, port_args,
+                                         network_subnets)
+
+            db_ports = []
+            for item, args in zip(ports, port_args):
+                p = item['port']
+                fixed_ips = [models_v2.IPAllocation(
+                    network_id=p['network_id'],
+                    port_id=args['id'],
+                    ip_address=ip['ip_address'],
+                    subnet_id=ip['subnet_id']) for ip in args['ips']]
+                port = models_v2.Port(tenant_id=args['tenant_id'],
+                                      name=p['name'],
+                                      id=args['id'],
+                                      network_id=p['network_id'],
+                                      mac_address=args['mac_address'],
+                                      admin_state_up=p['admin_state_up'],
+                                      status=p.get(
+                                          'status',
+                                          constants.PORT_STATUS_ACTIVE),
+                                      device_id=p['device_id'],
+                                      device_owner=p['device_owner'],
+                                      fixed_ips=fixed_ips)
+                context.session.add(port)
+                db_ports.append(port)
+            context.session.flush()
+            results = [self._make_port_dict(port, process_extensions=False)
+                       for port in db_ports]
+            state = self._create_ports_bulk_precommit(context, ports,
+                                                      results)
+        LOG.debug(_("Created %d ports in bulk"), len(results))
+        self._create_ports_bulk_postcommit(context, results, state)
+        return results
+
+    def _allocate_macs_for_ports(self, context, ports, port_args):
+        """Set the 'mac_address' of the arguments of each port."""
+        requested = {}
+        generated = {}
+        for item, args in zip(ports, port_args):
+            p = item['port']
+            if p['mac_address'] is attributes.ATTR_NOT_SPECIFIED:
+                generated.setdefault(p['network_id'], []).append(args)
+                continue
+            macs = requested.setdefault(p['network_id'], set())
+            if p['mac_address'] in macs:
+                raise q_exc.MacAddressInUse(net_id=p['network_id'],
+                                            mac=p['mac_address'])
+            macs.add(p['mac_address'])
+            args['mac_address'] = p['mac_address']
+        for network_id, macs in requested.iteritems():
+            in_use = NeutronDbPluginV2._get_macs_in_use(context, network_id,
+                                                        macs)
+            if in_use:
+                raise q_exc.MacAddressInUse(net_id=network_id,
+                                            mac=in_use.pop())
+        for network_id, args_list in generated.iteritems():
+            macs = NeutronDbPluginV2._generate_macs(
+                context, network_id, len(args_list),
+                requested.get(network_id, set()))
+            for args, mac_address in zip(args_list, macs):
+                args['mac_address'] = mac_address
+
+    def _allocate_ips_for_ports(self, context, ports, port_args,
+                                network_subnets):
+        """Set the 'ips' of the arguments of each port.
+
+        Requested IP addresses are verified with a single query, while
+        addresses to be generated are counted and reserved together for
+        each subnet or, when no subnet was requested, for each IP version
+        of the network.
+        """
+        specific_ips = []
+        by_subnet = {}
+        by_version = {}
+        for item, args in zip(ports, port_args):
+            p = item['port']
+            subnets = network_subnets[p['network_id']]
+            args['ips'] = []
+            if p['fixed_ips'] is attributes.ATTR_NOT_SPECIFIED:
+                for version in (4, 6):
+                    version_subnets = [subnet for subnet in subnets
+                                       if subnet['ip_version'] == version]
+                    if version_subnets:
+                        key = (p['network_id'], version)
+                        by_version.setdefault(
+                            key, (version_subnets, []))[1].append(args)
+                continue
+            configured_ips = self._test_fixed_ips_for_port(
+                context, p['network_id'], p['fixed_ips'],
+                subnets=subnets, check_unique=False)
+            for fixed in configured_ips:
+                if 'ip_address' in fixed:
+                    specific_ips.append((p['network_id'], fixed))
+                else:
+                    # Keep the position of the IP to be generated
+                    by_subnet.setdefault(fixed['subnet_id'], []).append(
+                        (args['ips'], len(args['ips'])))
+                args['ips'].append(fixed)
+
+        if specific_ips:
+            requested = set()
+            for network_id, fixed in specific_ips:
+                key = (fixed['subnet_id'], fixed['ip_address'])
+                if key in requested:
+                    raise q_exc.IpAddressInUse(net_id=network_id,
+                                               ip_address=fixed['ip_address'])
+                requested.add(key)
+            IPAllocation = models_v2.IPAllocation
+            ip_qry = context.session.query(IPAllocation.subnet_id,
+                                           IPAllocation.ip_address)
+            ip_qry = ip_qry.filter(
+                IPAllocation.subnet_id.in_(set(k[0] for k in requested)),
+                IPAllocation.ip_address.in_(set(k[1] for k in requested)))
+            in_use = set(ip_qry)
+            for network_id, fixed in specific_ips:
+                if (fixed['subnet_id'], fixed['ip_address']) in in_use:
+                    raise q_exc.IpAddressInUse(net_id=network_id,
+                                               ip_address=fixed['ip_address'])
+            for network_id, fixed in specific_ips:
+                NeutronDbPluginV2._allocate_specific_ip(
+                    context, fixed['subnet_id'], fixed['ip_address'])
+
+        subnets_by_id = dict((subnet['id'], subnet)
+                             for subnets in network_subnets.itervalues()
+                             for subnet in subnets)
+        for subnet_id, positions in by_subnet.iteritems():
+            ips = NeutronDbPluginV2._generate_ips(
+                context, [subnets_by_id[subnet_id]], len(positions))
+            for (port_ips, index), ip in zip(positions, ips):
+                port_ips[index] = ip
+        # IPv4 addresses are listed before IPv6 ones, as in create_port
+        for key in sorted(by_version, key=lambda k: k[1]):
+            subnets, args_list = by_version[key]
+            ips = NeutronDbPluginV2._generate_ips(context, subnets,
+                                                  len(args_list))
+            for args, ip in zip(args_list, ips):
+                args['ips'].append(ip)
 
     def create_port(self, context, port):
         p = port['port']
@@ -1492,6 +1708,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                       sorts=sorts, limit=limit,
                                       marker_obj=marker_obj,
                                       page_reverse=page_reverse)
+        query = self._apply_loader_options(query, models_v2.Port, fields)
         items = [self._make_port_dict(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
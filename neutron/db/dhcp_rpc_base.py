@@ -39,11 +39,13 @@ class DhcpRpcCallbackMixin(object):
             plugin, constants.DHCP_AGENT_SCHEDULER_EXT_ALIAS):
             if cfg.CONF.network_auto_schedule:
                 plugin.auto_schedule_networks(context, host)
-            nets = plugin.list_active_networks_on_active_dhcp_agent(
-                context, host)
+            with context.reading_from_slave():
+                nets = plugin.list_active_networks_on_active_dhcp_agent(
+                    context, host)
         else:
             filters = dict(admin_state_up=[True])
-            nets = plugin.get_networks(context, filters=filters)
+            with context.reading_from_slave():
+                nets = plugin.get_networks(context, filters=filters)
         return nets
 
     def _port_action(self, plugin, context, port, action):
@@ -90,9 +92,10 @@ class DhcpRpcCallbackMixin(object):
         networks = self._get_active_networks(context, **kwargs)
         plugin = manager.NeutronManager.get_plugin()
         filters = {'network_id': [network['id'] for network in networks]}
-        ports = plugin.get_ports(context, filters=filters)
-        filters['enable_dhcp'] = [True]
-        subnets = plugin.get_subnets(context, filters=filters)
+        with context.reading_from_slave():
+            ports = plugin.get_ports(context, filters=filters)
+            filters['enable_dhcp'] = [True]
+            subnets = plugin.get_subnets(context, filters=filters)
 
         for network in networks:
             network['subnets'] = [subnet for subnet in subnets
@@ -0,0 +1,440 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""IP address management drivers for the core database plugin.
+
+An IPAM driver keeps track of the free addresses in the allocation pools
+of a subnet, which are stored as run-length encoded ranges in the
+ipavailabilityranges table. IPAllocation records are not managed by the
+driver; they are still created and removed by the plugin.
+"""
+
+import abc
+import collections
+import itertools
+
+import netaddr
+from oslo.config import cfg
+from sqlalchemy import orm
+from sqlalchemy.orm import exc
+
+from neutron.common import exceptions as q_exc
+from neutron.db import models_v2
+from neutron.openstack.common import importutils
+from neutron.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+_DRIVER = None
+
+
+def get_ipam_driver():
+    """Return the IPAM driver selected by the ipam_driver option."""
+    global _DRIVER
+    if _DRIVER is None:
+        _DRIVER = importutils.import_object(cfg.CONF.ipam_driver)
+        LOG.info(_("Loaded IPAM driver: %s"), cfg.CONF.ipam_driver)
+    return _DRIVER
+
+
+class IpamDriverBase(object):
+    """Base class for IP address management drivers."""
+
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def generate_ips(self, context, subnets, count=1):
+        """Allocate count free IP addresses from the given subnets.
+
+        Subnets are tried in the order they are specified, and addresses
+        are taken from the next subnet when the previous one is exhausted.
+
+        :returns: a list of dicts with 'ip_address' and 'subnet_id' keys
+        :raises: IpAddressGenerationFailure
+        """
+
+    @abc.abstractmethod
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        """Remove a specific IP address from the free addresses of a subnet.
+
+        Addresses which are not free in any allocation pool, e.g. the
+        gateway IP, are ignored.
+        """
+
+    @abc.abstractmethod
+    def release_ip(self, context, subnet_id, ip_address):
+        """Return an IP address to the free addresses of a subnet.
+
+        Addresses outside the allocation pools of the subnet are ignored.
+        """
+
+
+class LockingIpamDriver(IpamDriverBase):
+    """IPAM driver serializing allocations with SELECT ... FOR UPDATE.
+
+    Every operation locks the availability ranges of the subnet for the
+    duration of the transaction, so concurrent port creations on the same
+    subnet are executed one at a time.
+    """
+
+    def generate_ips(self, context, subnets, count=1):
+        return [self._generate_ip(context, subnets) for i in range(count)]
+
+    @staticmethod
+    def _generate_ip(context, subnets):
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        for subnet in subnets:
+            range = range_qry.filter_by(subnet_id=subnet['id']).first()
+            if not range:
+                LOG.debug(_("All IPs from subnet %(subnet_id)s (%(cidr)s) "
+                            "allocated"),
+                          {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
+                continue
+            ip_address = range['first_ip']
+            LOG.debug(_("Allocated IP - %(ip_address)s from %(first_ip)s "
+                        "to %(last_ip)s"),
+                      {'ip_address': ip_address,
+                       'first_ip': range['first_ip'],
+                       'last_ip': range['last_ip']})
+            if range['first_ip'] == range['last_ip']:
+                # No more free indices on subnet => delete
+                LOG.debug(_("No more free IP's in slice. Deleting allocation "
+                            "pool."))
+                context.session.delete(range)
+            else:
+                # increment the first free
+                range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
+            return {'ip_address': ip_address, 'subnet_id': subnet['id']}
+        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        ip = int(netaddr.IPAddress(ip_address))
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        results = range_qry.filter_by(subnet_id=subnet_id)
+        for range in results:
+            first = int(netaddr.IPAddress(range['first_ip']))
+            last = int(netaddr.IPAddress(range['last_ip']))
+            if first <= ip <= last:
+                if first == last:
+                    context.session.delete(range)
+                    return
+                elif first == ip:
+                    range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
+                    return
+                elif last == ip:
+                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
+                    return
+                else:
+                    # Split into two ranges
+                    new_first = str(netaddr.IPAddress(ip_address) + 1)
+                    new_last = range['last_ip']
+                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
+                    ip_range = models_v2.IPAvailabilityRange(
+                        allocation_pool_id=range['allocation_pool_id'],
+                        first_ip=new_first,
+                        last_ip=new_last)
+                    context.session.add(ip_range)
+                    return
+
+    def release_ip(self, context, subnet_id, ip_address):
+        # Grab all allocation pools for the subnet
+        allocation_pools = (context.session.query(
+            models_v2.IPAllocationPool).filter_by(subnet_id=subnet_id).
+            options(orm.joinedload('available_ranges', innerjoin=True)).
+            with_lockmode('update'))
+        # If there are no available ranges the previous query will return no
+        # results as it uses an inner join to avoid errors with the postgresql
+        # backend (see lp bug 1215350). In this case IP allocation pools must
+        # be loaded with a different query, which does not require lock for
+        # update as the allocation pools for a subnet are immutable.
+        # The 2nd query will be executed only if the first yields no results
+        unlocked_allocation_pools = (context.session.query(
+            models_v2.IPAllocationPool).filter_by(subnet_id=subnet_id))
+
+        # Find the allocation pool for the IP to recycle
+        pool_id = None
+
+        for allocation_pool in itertools.chain(allocation_pools,
+                                               unlocked_allocation_pools):
+            allocation_pool_range = netaddr.IPRange(
+                allocation_pool['first_ip'], allocation_pool['last_ip'])
+            if netaddr.IPAddress(ip_address) in allocation_pool_range:
+                pool_id = allocation_pool['id']
+                break
+        if not pool_id:
+            return
+        # Two requests will be done on the database. The first will be to
+        # search if an entry starts with ip_address + 1 (r1). The second
+        # will be to see if an entry ends with ip_address -1 (r2).
+        # If 1 of the above holds true then the specific entry will be
+        # modified. If both hold true then the two ranges will be merged.
+        # If there are no entries then a single entry will be added.
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).with_lockmode('update')
+        ip_first = str(netaddr.IPAddress(ip_address) + 1)
+        ip_last = str(netaddr.IPAddress(ip_address) - 1)
+        LOG.debug(_("Recycle %s"), ip_address)
+        try:
+            r1 = range_qry.filter_by(allocation_pool_id=pool_id,
+                                     first_ip=ip_first).one()
+            LOG.debug(_("Recycle: first match for %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
+        except exc.NoResultFound:
+            r1 = []
+        try:
+            r2 = range_qry.filter_by(allocation_pool_id=pool_id,
+                                     last_ip=ip_last).one()
+            LOG.debug(_("Recycle: last match for %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
+        except exc.NoResultFound:
+            r2 = []
+
+        if r1 and r2:
+            # Merge the two ranges
+            ip_range = models_v2.IPAvailabilityRange(
+                allocation_pool_id=pool_id,
+                first_ip=r2['first_ip'],
+                last_ip=r1['last_ip'])
+            context.session.add(ip_range)
+            LOG.debug(_("Recycle: merged %(first_ip1)s-%(last_ip1)s and "
+                        "%(first_ip2)s-%(last_ip2)s"),
+                      {'first_ip1': r2['first_ip'], 'last_ip1': r2['last_ip'],
+                       'first_ip2': r1['first_ip'], 'last_ip2': r1['last_ip']})
+            context.session.delete(r1)
+            context.session.delete(r2)
+        elif r1:
+            # Update the range with matched first IP
+            r1['first_ip'] = ip_address
+            LOG.debug(_("Recycle: updated first %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
+        elif r2:
+            # Update the range with matched last IP
+            r2['last_ip'] = ip_address
+            LOG.debug(_("Recycle: updated last %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
+        else:
+            # Create a new range
+            ip_range = models_v2.IPAvailabilityRange(
+                allocation_pool_id=pool_id,
+                first_ip=ip_address,
+                last_ip=ip_address)
+            context.session.add(ip_range)
+            LOG.debug(_("Recycle: created new %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': ip_address, 'last_ip': ip_address})
+
+
+# A free range of a subnet as read from the database. first and last are
+# the integer bounds of the range, while first_ip and last_ip are the
+# strings stored in the row and identify the version that was read.
+FreeRange = collections.namedtuple(
+    'FreeRange',
+    ['allocation_pool_id', 'first', 'last', 'first_ip', 'last_ip',
+     'version'])
+
+
+class OptimisticIpamDriver(IpamDriverBase):
+    """IPAM driver using compare-and-swap instead of row locks.
+
+    The free ranges of a subnet are read without locks into an in-memory
+    list of integer segments, which is used to pick any number of
+    addresses at once. Changes are then written back with UPDATE and
+    DELETE statements whose WHERE clause carries the bounds that were
+    read, i.e. the bounds of a range act as its version. A statement
+    matching no rows means a concurrent transaction modified the range
+    first: in that case the ranges are read again with a locking read,
+    which returns the latest committed state on MVCC backends and makes
+    the second attempt conflict free.
+    """
+
+    def generate_ips(self, context, subnets, count=1):
+        ips = []
+        for subnet in subnets:
+            ips.extend(self._generate_ips_on_subnet(context, subnet,
+                                                    count - len(ips)))
+            if len(ips) == count:
+                return ips
+            LOG.debug(_("All IPs from subnet %(subnet_id)s (%(cidr)s) "
+                        "allocated"),
+                      {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
+        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def _generate_ips_on_subnet(self, context, subnet, count):
+        ips = []
+        for lock in (False, True):
+            for free_range in self._get_free_ranges(context, subnet['id'],
+                                                    lock=lock):
+                wanted = count - len(ips)
+                if not wanted:
+                    break
+                size = free_range.last - free_range.first + 1
+                taken = min(wanted, size)
+                if not self._update_range(context, free_range,
+                                          free_range.first + taken,
+                                          free_range.last):
+                    break
+                ips.extend({'ip_address': str(netaddr.IPAddress(
+                    free_range.first + offset, free_range.version)),
+                    'subnet_id': subnet['id']} for offset in range(taken))
+                LOG.debug(_("Allocated %(count)d IP(s) from %(first_ip)s "
+                            "to %(last_ip)s"),
+                          {'count': taken,
+                           'first_ip': free_range.first_ip,
+                           'last_ip': free_range.last_ip})
+            else:
+                # The subnet has no more free ranges
+                return ips
+            if len(ips) == count:
+                return ips
+        raise q_exc.IpAddressAllocationConflict(subnet_id=subnet['id'])
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        ip = int(netaddr.IPAddress(ip_address))
+        for lock in (False, True):
+            for free_range in self._get_free_ranges(context, subnet_id,
+                                                    lock=lock):
+                if free_range.first <= ip <= free_range.last:
+                    break
+            else:
+                return
+            if ip == free_range.first:
+                if self._update_range(context, free_range,
+                                      ip + 1, free_range.last):
+                    return
+                continue
+            # Keep the lower part of the range in the existing row, and
+            # store the upper part, if any, in a new one
+            if not self._update_range(context, free_range,
+                                      free_range.first, ip - 1):
+                continue
+            if ip < free_range.last:
+                self._add_range(context, free_range.allocation_pool_id,
+                                ip + 1, free_range.last, free_range.version)
+            return
+        raise q_exc.IpAddressAllocationConflict(subnet_id=subnet_id)
+
+    def release_ip(self, context, subnet_id, ip_address):
+        address = netaddr.IPAddress(ip_address)
+        pools = context.session.query(
+            models_v2.IPAllocationPool.id,
+            models_v2.IPAllocationPool.first_ip,
+            models_v2.IPAllocationPool.last_ip).filter_by(subnet_id=subnet_id)
+        for pool_id, first_ip, last_ip in pools:
+            if address in netaddr.IPRange(first_ip, last_ip):
+                break
+        else:
+            return
+        LOG.debug(_("Recycle %s"), ip_address)
+        # The addresses first..last are returned to the pool by merging
+        # them with the adjacent free ranges. When both neighbours exist
+        # the lower one is removed first, which widens the segment that
+        # still needs to be stored.
+        first = last = int(address)
+        for lock in (False, True):
+            before = after = None
+            for free_range in self._get_free_ranges(context, subnet_id,
+                                                    pool_id=pool_id,
+                                                    lock=lock):
+                if free_range.last == first - 1:
+                    before = free_range
+                elif free_range.first == last + 1:
+                    after = free_range
+            if before and after:
+                if not self._update_range(context, before, 1, 0):
+                    continue
+                first = before.first
+                before = None
+            if before:
+                if self._update_range(context, before, before.first, last):
+                    return
+            elif after:
+                if self._update_range(context, after, first, after.last):
+                    return
+            else:
+                self._add_range(context, pool_id, first, last,
+                                address.version)
+                return
+        raise q_exc.IpAddressAllocationConflict(subnet_id=subnet_id)
+
+    @staticmethod
+    def _get_free_ranges(context, subnet_id, pool_id=None, lock=False):
+        """Return the free ranges of a subnet, sorted by first address.
+
+        Only columns are selected, so the ranges do not end up in the
+        identity map of the session and are always read from the database.
+        """
+        IPAvailabilityRange = models_v2.IPAvailabilityRange
+        IPAllocationPool = models_v2.IPAllocationPool
+        query = context.session.query(
+            IPAvailabilityRange.allocation_pool_id,
+            IPAvailabilityRange.first_ip,
+            IPAvailabilityRange.last_ip).join(
+                IPAllocationPool,
+                IPAllocationPool.id == IPAvailabilityRange.allocation_pool_id)
+        query = query.filter(IPAllocationPool.subnet_id == subnet_id)
+        if pool_id:
+            query = query.filter(IPAllocationPool.id == pool_id)
+        if lock:
+            query = query.with_lockmode('update')
+        ranges = []
+        for allocation_pool_id, first_ip, last_ip in query:
+            first = netaddr.IPAddress(first_ip)
+            ranges.append(FreeRange(allocation_pool_id, int(first),
+                                    int(netaddr.IPAddress(last_ip)),
+                                    first_ip, last_ip, first.version))
+        ranges.sort(key=lambda r: r.first)
+        return ranges
+
+    @staticmethod
+    def _update_range(context, free_range, first, last):
+        """Compare-and-swap the bounds of a free range.
+
+        The range is deleted when first is greater than last.
+
+        :returns: True if the range was still unchanged in the database
+        """
+        query = context.session.query(models_v2.IPAvailabilityRange).filter_by(
+            allocation_pool_id=free_range.allocation_pool_id,
+            first_ip=free_range.first_ip,
+            last_ip=free_range.last_ip)
+        if first > last:
+            rows = query.delete(synchronize_session=False)
+        else:
+            rows = query.update(
+                {'first_ip': str(netaddr.IPAddress(first,
+                                                   free_range.version)),
+                 'last_ip': str(netaddr.IPAddress(last,
+                                                  free_range.version))},
+                synchronize_session=False)
+        if not rows:
+            LOG.debug(_("Free range %(first_ip)s-%(last_ip)s was "
+                        "concurrently modified"),
+                      {'first_ip': free_range.first_ip,
+                       'last_ip': free_range.last_ip})
+        return bool(rows)
+
+    @staticmethod
+    def _add_range(context, allocation_pool_id, first, last, version):
+        ip_range = models_v2.IPAvailabilityRange(
+            allocation_pool_id=allocation_pool_id,
+            first_ip=str(netaddr.IPAddress(first, version)),
+            last_ip=str(netaddr.IPAddress(last, version)))
+        context.session.add(ip_range)
@@ -26,6 +26,7 @@ from neutron.api.rpc.agentnotifiers import l3_rpc_agent_api
 from neutron.api.v2 import attributes
 from neutron.common import constants as l3_constants
 from neutron.common import exceptions as q_exc
+from neutron.db import db_base_plugin_v2
 from neutron.db import model_base
 from neutron.db import models_v2
 from neutron.extensions import l3
@@ -91,6 +92,10 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             raise l3.RouterNotFound(router_id=id)
         return router
 
+    # The gateway ports of routers are read for building their dicts
+    db_base_plugin_v2.NeutronDbPluginV2.register_model_loader_options(
+        Router, [orm.subqueryload('gw_port')])
+
     def _make_router_dict(self, router, fields=None,
                           process_extensions=True):
         res = {'id': router['id'],
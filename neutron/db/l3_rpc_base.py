@@ -20,7 +20,6 @@ from neutron.common import utils
 from neutron import context as neutron_context
 from neutron.extensions import portbindings
 from neutron import manager
-from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
 from neutron.plugins.common import constants as plugin_constants
 
@@ -35,12 +34,13 @@ class L3RpcCallbackMixin(object):
         """Sync routers according to filters to a specific agent.
 
         @param context: contain user information
-        @param kwargs: host, router_ids
+        @param kwargs: host, router_ids, full_sync
         @return: a list of routers
                  with their interfaces and floating_ips
         """
         router_ids = kwargs.get('router_ids')
         host = kwargs.get('host')
+        full_sync = kwargs.get('full_sync')
         context = neutron_context.get_admin_context()
         l3plugin = manager.NeutronManager.get_service_plugins()[
             plugin_constants.L3_ROUTER_NAT]
@@ -48,22 +48,70 @@ class L3RpcCallbackMixin(object):
             routers = {}
             LOG.error(_('No plugin for L3 routing registered! Will reply '
                         'to l3 agent with empty router dictionary.'))
-        elif utils.is_extension_supported(
-                l3plugin, constants.L3_AGENT_SCHEDULER_EXT_ALIAS):
-            if cfg.CONF.router_auto_schedule:
-                l3plugin.auto_schedule_routers(context, host, router_ids)
-            routers = l3plugin.list_active_sync_routers_on_active_l3_agent(
-                context, host, router_ids)
         else:
-            routers = l3plugin.get_sync_data(context, router_ids)
+            self._auto_schedule_routers(l3plugin, context, host, router_ids)
+            if router_ids and not full_sync:
+                # The routers requested by id outside of a full sync were
+                # usually just notified to the agent, the slave database
+                # may not have them yet.
+                routers = self._get_sync_routers(l3plugin, context, host,
+                                                 router_ids)
+            else:
+                with context.reading_from_slave():
+                    routers = self._get_sync_routers(l3plugin, context, host,
+                                                     router_ids)
         plugin = manager.NeutronManager.get_plugin()
         if utils.is_extension_supported(
             plugin, constants.PORT_BINDING_EXT_ALIAS):
             self._ensure_host_set_on_ports(context, plugin, host, routers)
-        LOG.debug(_("Routers returned to l3 agent:\n %s"),
-                  jsonutils.dumps(routers, indent=5))
+        LOG.debug(_("%(count)d routers returned to l3 agent: %(ids)s"),
+                  {'count': len(routers),
+                   'ids': [router['id'] for router in routers]})
         return routers
 
+    def get_router_ids(self, context, **kwargs):
+        """Get the ids of the routers hosted by an agent.
+
+        The agent syncs their data with sync_routers, a few at a time.
+
+        @param context: contain user information
+        @param kwargs: host
+        @return: a list of router ids
+        """
+        host = kwargs.get('host')
+        context = neutron_context.get_admin_context()
+        l3plugin = manager.NeutronManager.get_service_plugins()[
+            plugin_constants.L3_ROUTER_NAT]
+        if not l3plugin:
+            LOG.error(_('No plugin for L3 routing registered! Will reply '
+                        'to l3 agent with empty router id list.'))
+            return []
+        self._auto_schedule_routers(l3plugin, context, host, None)
+        with context.reading_from_slave():
+            if utils.is_extension_supported(
+                    l3plugin, constants.L3_AGENT_SCHEDULER_EXT_ALIAS):
+                router_ids = l3plugin.list_router_ids_on_active_l3_agent(
+                    context, host)
+            else:
+                router_ids = [router['id'] for router in
+                              l3plugin.get_routers(context, fields=['id'])]
+        LOG.debug(_("%(count)d router ids returned to l3 agent"),
+                  {'count': len(router_ids)})
+        return router_ids
+
+    def _auto_schedule_routers(self, l3plugin, context, host, router_ids):
+        if (utils.is_extension_supported(
+                l3plugin, constants.L3_AGENT_SCHEDULER_EXT_ALIAS) and
+                cfg.CONF.router_auto_schedule):
+            l3plugin.auto_schedule_routers(context, host, router_ids)
+
+    def _get_sync_routers(self, l3plugin, context, host, router_ids):
+        if utils.is_extension_supported(
+                l3plugin, constants.L3_AGENT_SCHEDULER_EXT_ALIAS):
+            return l3plugin.list_active_sync_routers_on_active_l3_agent(
+                context, host, router_ids)
+        return l3plugin.get_sync_data(context, router_ids)
+
     def _ensure_host_set_on_ports(self, context, plugin, host, routers):
         for router in routers:
             LOG.debug(_("Checking router: %(id)s for host: %(host)s"),
@@ -0,0 +1,69 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""quota usages and reservations
+
+Revision ID: 02fd6d23ff14
+Revises: 49700dacde85
+Create Date: 2014-01-09 16:40:22.518904
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '02fd6d23ff14'
+down_revision = '49700dacde85'
+
+# Change to ['*'] if this migration applies to all plugins
+
+migration_for_plugins = ['*']
+
+from alembic import op
+import sqlalchemy as sa
+
+from neutron.db import migration
+
+
+def upgrade(active_plugins=None, options=None):
+    if not migration.should_run(active_plugins, migration_for_plugins):
+        return
+
+    op.create_table(
+        'quotausages',
+        sa.Column('tenant_id', sa.String(length=255), nullable=False),
+        sa.Column('resource', sa.String(length=255), nullable=False),
+        sa.Column('in_use', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('tenant_id', 'resource')
+    )
+    op.create_table(
+        'reservations',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('tenant_id', sa.String(length=255), nullable=False),
+        sa.Column('resource', sa.String(length=255), nullable=False),
+        sa.Column('delta', sa.Integer(), nullable=False),
+        sa.Column('expiration', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_reservations_tenant_id', 'reservations',
+                    ['tenant_id'])
+
+
+def downgrade(active_plugins=None, options=None):
+    if not migration.should_run(active_plugins, migration_for_plugins):
+        return
+
+    op.drop_table('reservations')
+    op.drop_table('quotausages')
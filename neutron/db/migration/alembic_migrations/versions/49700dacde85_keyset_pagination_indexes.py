@@ -0,0 +1,74 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""keyset pagination indexes
+
+Revision ID: 49700dacde85
+Revises: 49f5e553f61f
+Create Date: 2014-01-08 10:12:41.385412
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '49700dacde85'
+down_revision = '49f5e553f61f'
+
+# Change to ['*'] if this migration applies to all plugins
+
+migration_for_plugins = ['*']
+
+from alembic import op
+
+from neutron.db import migration
+
+# Pages of a tenant are listed by id by default, the indexes let the
+# database seek to the marker instead of scanning the previous pages.
+# The tables of the service plugins only exist when they are loaded.
+TABLES = {
+    '*': ['networks', 'subnets', 'ports'],
+    'neutron.services.loadbalancer.plugin.LoadBalancerPlugin': [
+        'vips', 'pools', 'members', 'healthmonitors'],
+    'neutron.services.firewall.fwaas_plugin.FirewallPlugin': [
+        'firewalls', 'firewall_policies', 'firewall_rules'],
+    'neutron.services.vpn.plugin.VPNDriverPlugin': [
+        'vpnservices', 'ipsec_site_connections', 'ikepolicies',
+        'ipsecpolicies'],
+}
+
+
+def _tables(active_plugins):
+    for plugin, tables in sorted(TABLES.items()):
+        if migration.should_run(active_plugins, [plugin]):
+            for table in tables:
+                yield table
+
+
+def upgrade(active_plugins=None, options=None):
+    if not migration.should_run(active_plugins, migration_for_plugins):
+        return
+
+    for table in _tables(active_plugins):
+        op.create_index('ix_%s_tenant_id_id' % table, table,
+                        ['tenant_id', 'id'])
+
+
+def downgrade(active_plugins=None, options=None):
+    if not migration.should_run(active_plugins, migration_for_plugins):
+        return
+
+    for table in _tables(active_plugins):
+        op.drop_index('ix_%s_tenant_id_id' % table, table)
@@ -15,11 +15,30 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
+from oslo.config import cfg
 import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy import func
 
 from neutron.common import exceptions
+from neutron import context as neutron_context
+from neutron.db import api as db_api
 from neutron.db import model_base
 from neutron.db import models_v2
+from neutron.openstack.common.db import exception as db_exc
+from neutron.openstack.common import log as logging
+from neutron.openstack.common import loopingcall
+from neutron.openstack.common import timeutils
+from neutron import quota
+
+LOG = logging.getLogger(__name__)
+
+# Resource name -> model of the resources whose usage is tracked
+_USAGE_MODELS = {}
+# Whether the usages are tracked, see _is_usage_tracked()
+_usage_tracked = None
 
 
 class Quota(model_base.BASEV2, models_v2.HasId):
@@ -33,13 +52,95 @@ class Quota(model_base.BASEV2, models_v2.HasId):
     limit = sa.Column(sa.Integer)
 
 
+class QuotaUsage(model_base.BASEV2):
+    """Represent the number of resources of a tenant.
+
+    The row of a tenant and resource is created when its quota is first
+    checked, then kept up to date as the resources are created and deleted.
+    """
+    tenant_id = sa.Column(sa.String(255), primary_key=True)
+    resource = sa.Column(sa.String(255), primary_key=True)
+    in_use = sa.Column(sa.Integer, nullable=False, default=0)
+
+
+class Reservation(model_base.BASEV2, models_v2.HasId):
+    """Represent the quota reserved for resources being created."""
+    tenant_id = sa.Column(sa.String(255), nullable=False, index=True)
+    resource = sa.Column(sa.String(255), nullable=False)
+    delta = sa.Column(sa.Integer, nullable=False)
+    expiration = sa.Column(sa.DateTime, nullable=False)
+
+
+def _is_usage_tracked():
+    """Return whether the usages are tracked with the database driver.
+
+    It is resolved from the configuration and the quota driver when the
+    first tracked resource is created or deleted.
+    """
+    global _usage_tracked
+    if _usage_tracked is None:
+        _usage_tracked = bool(
+            cfg.CONF.QUOTAS.track_quota_usage and
+            isinstance(quota.QUOTAS.get_driver(), DbQuotaDriver))
+    return _usage_tracked
+
+
+def track_usage(resource, model):
+    """Keep track of the rows of model as the usage of resource."""
+    _USAGE_MODELS[resource] = model
+    usages = QuotaUsage.__table__
+    # Only the usages which are already tracked are updated, in the
+    # transaction which creates or deletes the resource
+    update = usages.update().where(
+        sa.and_(usages.c.tenant_id == sa.bindparam('usage_tenant_id'),
+                usages.c.resource == resource)).values(
+                    in_use=usages.c.in_use + sa.bindparam('delta'))
+
+    def after_insert(mapper, connection, target):
+        if _is_usage_tracked():
+            connection.execute(update, usage_tenant_id=target.tenant_id,
+                               delta=1)
+
+    def after_delete(mapper, connection, target):
+        if _is_usage_tracked():
+            connection.execute(update, usage_tenant_id=target.tenant_id,
+                               delta=-1)
+
+    event.listen(model, 'after_insert', after_insert)
+    event.listen(model, 'after_delete', after_delete)
+
+
 class DbQuotaDriver(object):
     """Driver to perform necessary checks to enforce quotas and obtain quota
     information.
 
     The default driver utilizes the local database.
+
+    The usages of the resources registered with track_usage() are kept in
+    the database, so that checking their quota doesn't need to count them.
+    They are periodically checked against the resources in the database.
     """
 
+    def start_usage_resync(self):
+        """Periodically resync the usages, unless it is disabled.
+
+        It is started by the server once the plugin is loaded.
+
+        :return: the looping call running the resync, or None.
+        """
+        interval = cfg.CONF.QUOTAS.usage_resync_interval
+        if not (cfg.CONF.QUOTAS.track_quota_usage and interval > 0):
+            return
+        resync = loopingcall.FixedIntervalLoopingCall(self._resync_usages)
+        resync.start(interval=interval, initial_delay=interval)
+        return resync
+
+    def _resync_usages(self):
+        try:
+            self.resync_usages(neutron_context.get_admin_context())
+        except Exception:
+            LOG.exception(_("Failed to resync the quota usages"))
+
     @staticmethod
     def get_tenant_quotas(context, resources, tenant_id):
         """Given a list of resources, retrieve the quotas for the given
@@ -179,3 +280,129 @@ class DbQuotaDriver(object):
                  if quotas[key] >= 0 and quotas[key] < val]
         if overs:
             raise exceptions.OverQuota(overs=sorted(overs))
+
+    @staticmethod
+    def _count(context, tenant_id, resource):
+        model = _USAGE_MODELS[resource]
+        query = context.session.query(func.count(model.id))
+        return query.filter(model.tenant_id == tenant_id).scalar()
+
+    @staticmethod
+    def _create_usage(tenant_id, resource):
+        """Create the usage of a resource in its own transaction.
+
+        Once it is committed, the resources created or deleted update it.
+        Another server may have created it first.
+        """
+        session = db_api.get_session()
+        try:
+            with session.begin():
+                session.add(QuotaUsage(tenant_id=tenant_id,
+                                       resource=resource, in_use=0))
+        except db_exc.DBDuplicateEntry:
+            LOG.debug(_("Usage of %(resource)s of tenant %(tenant_id)s "
+                        "created concurrently"),
+                      {'resource': resource, 'tenant_id': tenant_id})
+
+    @staticmethod
+    def _get_usage(context, tenant_id, resource):
+        """Return the locked usage of a resource, counted if not tracked yet.
+        """
+        query = context.session.query(QuotaUsage).filter_by(
+            tenant_id=tenant_id, resource=resource).with_lockmode('update')
+        usage = query.first()
+        if usage is None:
+            DbQuotaDriver._create_usage(tenant_id, resource)
+            usage = query.one()
+            # Counted with the usage locked, the resources committed since
+            # it was created have already updated it
+            usage.in_use = DbQuotaDriver._count(context, tenant_id, resource)
+        return usage
+
+    def make_reservation(self, context, tenant_id, resources, resource,
+                         delta):
+        """Check and reserve the quota for new resources.
+
+        The reservation holds delta resources until it is released or
+        expires.
+
+        If delta more resources are over the quota, an OverQuota exception
+        is raised.
+
+        :param context: The request context, for access checks.
+        :param tenant_id: The tenant_id to check the quota.
+        :param resources: A dictionary of the registered resources.
+        :param resource: The name of the resource.
+        :param delta: The number of resources to create.
+        :return: The id of the reservation, or None if the usage of the
+                 resource isn't tracked.
+        """
+        if not (cfg.CONF.QUOTAS.track_quota_usage and
+                resource in _USAGE_MODELS):
+            return
+        limit = self._get_quotas(context, tenant_id, resources,
+                                 [resource])[resource]
+        now = timeutils.utcnow()
+        with context.session.begin(subtransactions=True):
+            usage = self._get_usage(context, tenant_id, resource)
+            reserved = context.session.query(
+                func.sum(Reservation.delta)).filter(
+                    Reservation.tenant_id == tenant_id,
+                    Reservation.resource == resource,
+                    Reservation.expiration > now).scalar() or 0
+            if limit >= 0 and usage.in_use + reserved + delta > limit:
+                raise exceptions.OverQuota(overs=[resource])
+            expiration = now + datetime.timedelta(
+                seconds=cfg.CONF.QUOTAS.reservation_expiration)
+            reservation = Reservation(tenant_id=tenant_id,
+                                      resource=resource,
+                                      delta=delta,
+                                      expiration=expiration)
+            context.session.add(reservation)
+        return reservation.id
+
+    @staticmethod
+    def release_reservation(context, reservation_id):
+        with context.session.begin(subtransactions=True):
+            context.session.query(Reservation).filter_by(
+                id=reservation_id).delete()
+
+    @staticmethod
+    def resync_usages(context):
+        """Fix the usages which don't match the resources in the database.
+
+        Resources deleted without going through the ORM aren't seen when
+        they are deleted. The expired reservations are deleted as well.
+        """
+        for resource, model in _USAGE_MODELS.items():
+            query = context.session.query(model.tenant_id,
+                                          func.count(model.id))
+            counts = dict(query.group_by(model.tenant_id))
+            usages = context.session.query(QuotaUsage.tenant_id,
+                                           QuotaUsage.in_use)
+            for tenant_id, in_use in usages.filter_by(resource=resource):
+                if in_use == counts.get(tenant_id, 0):
+                    continue
+                # Count again with the usage locked, resources could have
+                # been created or deleted meanwhile
+                with context.session.begin():
+                    usage = DbQuotaDriver._get_usage(context, tenant_id,
+                                                     resource)
+                    in_use = DbQuotaDriver._count(context, tenant_id,
+                                                  resource)
+                    if usage.in_use != in_use:
+                        LOG.warning(_("Fixing the usage of %(resource)s of "
+                                      "tenant %(tenant_id)s: %(old)s "
+                                      "instead of %(new)s"),
+                                    {'resource': resource,
+                                     'tenant_id': tenant_id,
+                                     'old': usage.in_use, 'new': in_use})
+                        usage.in_use = in_use
+        with context.session.begin():
+            context.session.query(Reservation).filter(
+                Reservation.expiration <= timeutils.utcnow()).delete()
+
+
+track_usage('network', models_v2.Network)
+track_usage('subnet', models_v2.Subnet)
+track_usage('port', models_v2.Port)
@@ -15,10 +15,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
 import netaddr
 
 from neutron.common import constants as q_const
 from neutron.common import utils
+from neutron.db import allowedaddresspairs_db as addr_pair_db
 from neutron.db import models_v2
 from neutron.db import securitygroups_db as sg_db
 from neutron.extensions import securitygroup as ext_sg
@@ -128,6 +131,19 @@ class SecurityGroupServerRpcCallbackMixin(object):
     implementations.
     """
 
+    def get_ports_from_devices(self, devices):
+        """Return the ports of devices, indexed by device.
+
+        Plugins should override this with a query for all the devices at
+        once, the default looks up the devices one by one.
+        """
+        ports = {}
+        for device in devices:
+            port = self.get_port_from_device(device)
+            if port:
+                ports[device] = port
+        return ports
+
     def security_group_rules_for_devices(self, context, **kwargs):
         """Return security group rules for each port.
 
@@ -138,31 +154,102 @@ class SecurityGroupServerRpcCallbackMixin(object):
         :returns: port correspond to the devices with security group rules
         """
         devices = kwargs.get('devices')
+        ports = self._select_ports_for_devices(devices)
+        return self._security_group_rules_for_ports(context, ports)
 
+    def security_group_info_for_devices(self, context, **kwargs):
+        """Return the security groups of devices and their rules.
+
+        Unlike security_group_rules_for_devices, the rules are returned
+        once for each security group and the remote group rules are not
+        expanded, the agent builds the rules of each port from:
+
+        {'security_groups': {sg_id: [rule, ...]},
+         'sg_member_ips': {remote_sg_id: [ip, ...]},
+         'devices': {port_id: port}}
+
+        where the security_group_rules of the ports only hold their
+        provider rules.
+
+        :params devices: list of devices
+        :params cached_security_groups: list of the security groups whose
+            rules the agent already has, they are left out of the result
+        """
+        devices = kwargs.get('devices')
+        cached_security_groups = set(kwargs.get('cached_security_groups')
+                                     or [])
+        ports = self._select_ports_for_devices(devices)
+        sg_info = self._security_group_info_for_ports(context, ports)
+        for port in ports.values():
+            self._add_ingress_ra_rule(port, sg_info['dhcp_ips'])
+            self._add_ingress_dhcp_rule(port, sg_info['dhcp_ips'])
+        security_groups = dict(
+            (sg_id, rules)
+            for sg_id, rules in sg_info['security_groups'].items()
+            if sg_id not in cached_security_groups)
+        return {'security_groups': security_groups,
+                'sg_member_ips': sg_info['sg_member_ips'],
+                'devices': ports}
+
+    def _select_ports_for_devices(self, devices):
         ports = {}
-        for device in devices:
-            port = self.get_port_from_device(device)
-            if not port:
-                continue
+        for port in self.get_ports_from_devices(devices or []).values():
             if port['device_owner'].startswith('network:'):
                 continue
             ports[port['id']] = port
-        return self._security_group_rules_for_ports(context, ports)
+        return ports
 
-    def _select_rules_for_ports(self, context, ports):
-        if not ports:
-            return []
+    def _select_sg_ids_for_ports(self, context, ports):
+        # The security groups already fetched with the ports are kept,
+        # only the bindings of the other ports are queried
+        sg_ids_by_port = {}
+        missing = []
+        for port_id, port in ports.items():
+            if ext_sg.SECURITYGROUPS in port:
+                sg_ids_by_port[port_id] = list(port[ext_sg.SECURITYGROUPS])
+            else:
+                sg_ids_by_port[port_id] = []
+                missing.append(port_id)
+        if not missing:
+            return sg_ids_by_port
         sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
         sg_binding_sgid = sg_db.SecurityGroupPortBinding.security_group_id
 
+        query = context.session.query(sg_binding_port, sg_binding_sgid)
+        query = query.filter(sg_binding_port.in_(missing))
+        for port_id, security_group_id in query:
+            sg_ids_by_port[port_id].append(security_group_id)
+        return sg_ids_by_port
+
+    def _select_rules_for_security_groups(self, context, sg_ids):
+        # the groups are kept in the order of their rules
+        rules_by_group = collections.OrderedDict()
+        if not sg_ids:
+            return rules_by_group
         sgr_sgid = sg_db.SecurityGroupRule.security_group_id
 
-        query = context.session.query(sg_db.SecurityGroupPortBinding,
-                                      sg_db.SecurityGroupRule)
-        query = query.join(sg_db.SecurityGroupRule,
-                           sgr_sgid == sg_binding_sgid)
-        query = query.filter(sg_binding_port.in_(ports.keys()))
-        return query.all()
+        query = context.session.query(sg_db.SecurityGroupRule)
+        query = query.filter(sgr_sgid.in_(sg_ids))
+        for rule_in_db in query:
+            direction = rule_in_db['direction']
+            rule_dict = {
+                'security_group_id': rule_in_db['security_group_id'],
+                'direction': direction,
+                'ethertype': rule_in_db['ethertype'],
+            }
+            for key in ('protocol', 'port_range_min', 'port_range_max',
+                        'remote_ip_prefix', 'remote_group_id'):
+                if rule_in_db.get(key):
+                    if key == 'remote_ip_prefix':
+                        direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
+                        rule_dict[direction_ip_prefix] = rule_in_db[key]
+                        continue
+                    rule_dict[key] = rule_in_db[key]
+            rules_by_group.setdefault(rule_in_db['security_group_id'],
+                                      []).append(rule_dict)
+        for sg_id in sg_ids:
+            rules_by_group.setdefault(sg_id, [])
+        return rules_by_group
 
     def _select_ips_for_remote_group(self, context, remote_group_ids):
         ips_by_group = {}
@@ -176,30 +263,32 @@ class SecurityGroupServerRpcCallbackMixin(object):
         sg_binding_sgid = sg_db.SecurityGroupPortBinding.security_group_id
 
         query = context.session.query(sg_binding_sgid,
-                                      models_v2.Port,
                                       models_v2.IPAllocation.ip_address)
         query = query.join(models_v2.IPAllocation,
                            ip_port == sg_binding_port)
-        query = query.join(models_v2.Port,
-                           ip_port == models_v2.Port.id)
         query = query.filter(sg_binding_sgid.in_(remote_group_ids))
-        for security_group_id, port, ip_address in query:
+        for security_group_id, ip_address in query:
+            ips_by_group[security_group_id].append(ip_address)
+
+        # the allowed address pairs of the members are added as well
+        pair_port = addr_pair_db.AllowedAddressPair.port_id
+        query = context.session.query(
+            sg_binding_sgid, addr_pair_db.AllowedAddressPair.ip_address)
+        query = query.join(addr_pair_db.AllowedAddressPair,
+                           pair_port == sg_binding_port)
+        query = query.filter(sg_binding_sgid.in_(remote_group_ids))
+        for security_group_id, ip_address in query:
             ips_by_group[security_group_id].append(ip_address)
-            # if there are allowed_address_pairs add them
-            if getattr(port, 'allowed_address_pairs', None):
-                for address_pair in port.allowed_address_pairs:
-                    ips_by_group[security_group_id].append(
-                        address_pair['ip_address'])
         return ips_by_group
 
-    def _select_remote_group_ids(self, ports):
-        remote_group_ids = []
-        for port in ports.values():
-            for rule in port.get('security_group_rules'):
+    def _select_remote_group_ids(self, rules_by_group):
+        remote_group_ids = set()
+        for rules in rules_by_group.values():
+            for rule in rules:
                 remote_group_id = rule.get('remote_group_id')
                 if remote_group_id:
-                    remote_group_ids.append(remote_group_id)
-        return remote_group_ids
+                    remote_group_ids.add(remote_group_id)
+        return list(remote_group_ids)
 
     def _select_network_ids(self, ports):
         return set((port['network_id'] for port in ports.values()))
@@ -207,7 +296,7 @@ class SecurityGroupServerRpcCallbackMixin(object):
     def _select_dhcp_ips_for_network_ids(self, context, network_ids):
         if not network_ids:
             return {}
-        query = context.session.query(models_v2.Port,
+        query = context.session.query(models_v2.Port.network_id,
                                       models_v2.IPAllocation.ip_address)
         query = query.join(models_v2.IPAllocation)
         query = query.filter(models_v2.Port.network_id.in_(network_ids))
@@ -218,38 +307,32 @@ class SecurityGroupServerRpcCallbackMixin(object):
         for network_id in network_ids:
             ips[network_id] = []
 
-        for port, ip in query:
-            ips[port['network_id']].append(ip)
+        for network_id, ip in query:
+            ips[network_id].append(ip)
         return ips
 
-    def _convert_remote_group_id_to_ip_prefix(self, context, ports):
-        remote_group_ids = self._select_remote_group_ids(ports)
-        ips = self._select_ips_for_remote_group(context, remote_group_ids)
-        for port in ports.values():
-            updated_rule = []
-            for rule in port.get('security_group_rules'):
-                remote_group_id = rule.get('remote_group_id')
-                direction = rule.get('direction')
-                direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
-                if not remote_group_id:
-                    updated_rule.append(rule)
-                    continue
+    def _expand_remote_group_rules(self, port, rules, ips):
+        updated_rule = []
+        for rule in rules:
+            remote_group_id = rule.get('remote_group_id')
+            if not remote_group_id:
+                updated_rule.append(rule)
+                continue
 
-                port['security_group_source_groups'].append(remote_group_id)
-                base_rule = rule
-                for ip in ips[remote_group_id]:
-                    if ip in port.get('fixed_ips', []):
-                        continue
-                    ip_rule = base_rule.copy()
-                    version = netaddr.IPNetwork(ip).version
-                    ethertype = 'IPv%s' % version
-                    if base_rule['ethertype'] != ethertype:
-                        continue
-                    ip_rule[direction_ip_prefix] = str(
-                        netaddr.IPNetwork(ip).cidr)
-                    updated_rule.append(ip_rule)
-            port['security_group_rules'] = updated_rule
-        return ports
+            direction_ip_prefix = DIRECTION_IP_PREFIX[rule['direction']]
+            port['security_group_source_groups'].append(remote_group_id)
+            for ip in ips[remote_group_id]:
+                if ip in port.get('fixed_ips', []):
+                    continue
+                version = netaddr.IPNetwork(ip).version
+                ethertype = 'IPv%s' % version
+                if rule['ethertype'] != ethertype:
+                    continue
+                ip_rule = rule.copy()
+                ip_rule[direction_ip_prefix] = str(
+                    netaddr.IPNetwork(ip).cidr)
+                updated_rule.append(ip_rule)
+        return updated_rule
 
     def _add_ingress_dhcp_rule(self, port, ips):
         dhcp_ips = ips.get(port['network_id'])
@@ -281,32 +364,47 @@ class SecurityGroupServerRpcCallbackMixin(object):
                                                      IP_MASK[q_const.IPv6])
             port['security_group_rules'].append(ra_rule)
 
-    def _apply_provider_rule(self, context, ports):
+    def _security_group_info_for_ports(self, context, ports):
+        """Resolve the security groups of ports with a few set queries.
+
+        The rules are returned once for each security group rather than
+        copied for every port:
+
+        {'security_groups': {sg_id: [rule, ...]},
+         'sg_member_ips': {remote_sg_id: [ip, ...]},
+         'dhcp_ips': {network_id: [ip, ...]},
+         'devices': {port_id: port}}
+
+        where the security_groups of each port are the ones it was fetched
+        with, or else set from its bindings.
+        """
+        sg_ids_by_port = self._select_sg_ids_for_ports(context, ports)
+        sg_ids = set()
+        for port_id, port in ports.items():
+            port[ext_sg.SECURITYGROUPS] = sg_ids_by_port[port_id]
+            sg_ids.update(sg_ids_by_port[port_id])
+        rules_by_group = self._select_rules_for_security_groups(
+            context, list(sg_ids))
+        remote_group_ids = self._select_remote_group_ids(rules_by_group)
         network_ids = self._select_network_ids(ports)
-        ips = self._select_dhcp_ips_for_network_ids(context, network_ids)
-        for port in ports.values():
-            self._add_ingress_ra_rule(port, ips)
-            self._add_ingress_dhcp_rule(port, ips)
+        return {
+            'security_groups': rules_by_group,
+            'sg_member_ips': self._select_ips_for_remote_group(
+                context, remote_group_ids),
+            'dhcp_ips': self._select_dhcp_ips_for_network_ids(
+                context, network_ids),
+            'devices': ports}
 
     def _security_group_rules_for_ports(self, context, ports):
-        rules_in_db = self._select_rules_for_ports(context, ports)
-        for (binding, rule_in_db) in rules_in_db:
-            port_id = binding['port_id']
-            port = ports[port_id]
-            direction = rule_in_db['direction']
-            rule_dict = {
-                'security_group_id': rule_in_db['security_group_id'],
-                'direction': direction,
-                'ethertype': rule_in_db['ethertype'],
-            }
-            for key in ('protocol', 'port_range_min', 'port_range_max',
-                        'remote_ip_prefix', 'remote_group_id'):
-                if rule_in_db.get(key):
-                    if key == 'remote_ip_prefix':
-                        direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
-                        rule_dict[direction_ip_prefix] = rule_in_db[key]
-                        continue
-                    rule_dict[key] = rule_in_db[key]
-            port['security_group_rules'].append(rule_dict)
-        self._apply_provider_rule(context, ports)
-        return self._convert_remote_group_id_to_ip_prefix(context, ports)
+        sg_info = self._security_group_info_for_ports(context, ports)
+        rules_by_group = sg_info['security_groups']
+        for port in ports.values():
+            rules = []
+            for sg_id, sg_rules in rules_by_group.items():
+                if sg_id in port[ext_sg.SECURITYGROUPS]:
+                    rules.extend(sg_rules)
+            port['security_group_rules'] = self._expand_remote_group_rules(
+                port, rules, sg_info['sg_member_ips'])
+            self._add_ingress_ra_rule(port, sg_info['dhcp_ips'])
+            self._add_ingress_dhcp_rule(port, sg_info['dhcp_ips'])
+        return ports
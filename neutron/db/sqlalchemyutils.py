@@ -43,15 +43,18 @@ def paginate_query(query, model, limit, sorts, marker_obj=None):
 
     Typically, the id of the last row is used as the client-facing pagination
     marker, then the actual marker object must be fetched from the db and
-    passed in to us as marker.
+    passed in to us as marker. The marker can also be a dict of the sort key
+    values of the last row, as held by the keyset markers of the API, which
+    spares that lookup.
 
     :param query: the query object to which we should add paging/sorting
     :param model: the ORM model class
     :param limit: maximum number of items to return
     :param sorts: array of attributes and direction by which results should
                  be sorted
-    :param marker: the last item of the previous page; we returns the next
-                    results after this value.
+    :param marker_obj: the last item of the previous page, or a dict of its
+                       sort key values; we returns the next results after
+                       this value.
     :rtype: sqlalchemy.orm.query.Query
     :return: The query with sorting/pagination added.
     """
@@ -83,7 +86,14 @@ def paginate_query(query, model, limit, sorts, marker_obj=None):
 
     # Add pagination
     if marker_obj:
-        marker_values = [getattr(marker_obj, sort[0]) for sort in sorts]
+        if isinstance(marker_obj, dict):
+            try:
+                marker_values = [marker_obj[sort[0]] for sort in sorts]
+            except KeyError:
+                msg = _("The marker doesn't match the sort keys")
+                raise q_exc.BadRequest(resource=model.__tablename__, msg=msg)
+        else:
+            marker_values = [getattr(marker_obj, sort[0]) for sort in sorts]
 
         # Build up an array of sort criteria as in the docstring
         criteria_list = []
@@ -376,7 +376,9 @@ class LoadBalancerPluginBase(ServicePluginBase):
         return 'LoadBalancer service plugin'
 
     @abc.abstractmethod
-    def get_vips(self, context, filters=None, fields=None):
+    def get_vips(self, context, filters=None, fields=None,
+                 sorts=None, limit=None, marker=None,
+                 page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -396,7 +398,9 @@ class LoadBalancerPluginBase(ServicePluginBase):
         pass
 
     @abc.abstractmethod
-    def get_pools(self, context, filters=None, fields=None):
+    def get_pools(self, context, filters=None, fields=None,
+                  sorts=None, limit=None, marker=None,
+                  page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -432,7 +436,9 @@ class LoadBalancerPluginBase(ServicePluginBase):
         pass
 
     @abc.abstractmethod
-    def get_members(self, context, filters=None, fields=None):
+    def get_members(self, context, filters=None, fields=None,
+                    sorts=None, limit=None, marker=None,
+                    page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -452,7 +458,9 @@ class LoadBalancerPluginBase(ServicePluginBase):
         pass
 
     @abc.abstractmethod
-    def get_health_monitors(self, context, filters=None, fields=None):
+    def get_health_monitors(self, context, filters=None, fields=None,
+                            sorts=None, limit=None, marker=None,
+                            page_reverse=False):
         pass
 
     @abc.abstractmethod
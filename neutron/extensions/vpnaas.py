@@ -396,7 +396,9 @@ class VPNPluginBase(ServicePluginBase):
         return 'VPN service plugin'
 
     @abc.abstractmethod
-    def get_vpnservices(self, context, filters=None, fields=None):
+    def get_vpnservices(self, context, filters=None, fields=None,
+                        sorts=None, limit=None, marker=None,
+                        page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -416,7 +418,9 @@ class VPNPluginBase(ServicePluginBase):
         pass
 
     @abc.abstractmethod
-    def get_ipsec_site_connections(self, context, filters=None, fields=None):
+    def get_ipsec_site_connections(self, context, filters=None, fields=None,
+                                   sorts=None, limit=None, marker=None,
+                                   page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -442,7 +446,9 @@ class VPNPluginBase(ServicePluginBase):
         pass
 
     @abc.abstractmethod
-    def get_ikepolicies(self, context, filters=None, fields=None):
+    def get_ikepolicies(self, context, filters=None, fields=None,
+                        sorts=None, limit=None, marker=None,
+                        page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -458,7 +464,9 @@ class VPNPluginBase(ServicePluginBase):
         pass
 
     @abc.abstractmethod
-    def get_ipsecpolicies(self, context, filters=None, fields=None):
+    def get_ipsecpolicies(self, context, filters=None, fields=None,
+                          sorts=None, limit=None, marker=None,
+                          page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -638,7 +638,7 @@ class LinuxBridgeRpcCallbacks(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
             return
 
         if 'security_groups' in port:
-            self.sg_agent.refresh_firewall()
+            self.sg_agent.refresh_port_firewall(tap_device_name)
         try:
             if port['admin_state_up']:
                 network_type = kwargs.get('network_type')
@@ -794,7 +794,7 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
             'start_flag': True}
 
         self.setup_rpc(interface_mappings.values())
-        self.init_firewall()
+        self.init_firewall(defer_refresh_firewall=True)
 
     def _report_state(self):
         try:
@@ -866,18 +866,20 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
     def treat_devices_added(self, devices):
         resync = False
         self.prepare_devices_filter(devices)
-        for device in devices:
+        try:
+            devices_details_list = self.plugin_rpc.get_devices_details_list(
+                self.context, devices, self.agent_id)
+        except Exception as e:
+            LOG.debug(_("Unable to get port details for "
+                        "%(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            # resync is needed
+            return True
+        devices_up = []
+        devices_down = []
+        for details in devices_details_list:
+            device = details['device']
             LOG.debug(_("Port %s added"), device)
-            try:
-                details = self.plugin_rpc.get_device_details(self.context,
-                                                             device,
-                                                             self.agent_id)
-            except Exception as e:
-                LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
             if 'port_id' in details:
                 LOG.info(_("Port %(device)s updated. Details: %(details)s"),
                          {'device': device, 'details': details})
@@ -896,44 +898,52 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
                                                  details['physical_network'],
                                                  segmentation_id,
                                                  details['port_id']):
-
-                        # update plugin about port status
-                        self.plugin_rpc.update_device_up(self.context,
-                                                         device,
-                                                         self.agent_id,
-                                                         cfg.CONF.host)
+                        devices_up.append(device)
                     else:
-                        self.plugin_rpc.update_device_down(self.context,
-                                                           device,
-                                                           self.agent_id,
-                                                           cfg.CONF.host)
+                        devices_down.append(device)
                 else:
                     self.remove_port_binding(details['network_id'],
                                              details['port_id'])
             else:
                 LOG.info(_("Device %s not defined on plugin"), device)
+        if devices_up or devices_down:
+            # update plugin about port status
+            try:
+                self.plugin_rpc.update_devices_status(self.context,
+                                                      devices_up,
+                                                      devices_down,
+                                                      self.agent_id,
+                                                      cfg.CONF.host)
+            except Exception as e:
+                LOG.debug(_("Unable to update status of %(devices)s: "
+                            "%(e)s"),
+                          {'devices': devices_up + devices_down, 'e': e})
+                resync = True
         return resync
 
     def treat_devices_removed(self, devices):
-        resync = False
         self.remove_devices_filter(devices)
         for device in devices:
             LOG.info(_("Attachment %s removed"), device)
-            try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id,
-                                                             cfg.CONF.host)
-            except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
+        try:
+            status = self.plugin_rpc.update_devices_status(self.context,
+                                                           [],
+                                                           devices,
+                                                           self.agent_id,
+                                                           cfg.CONF.host)
+        except Exception as e:
+            LOG.debug(_("port_removed failed for %(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            # resync is needed
+            return True
+        for details in status['devices_down']:
             if details['exists']:
-                LOG.info(_("Port %s updated."), device)
+                LOG.info(_("Port %s updated."), details['device'])
             else:
-                LOG.debug(_("Device %s not defined on plugin"), device)
-            self.br_mgr.remove_empty_bridges()
-        return resync
+                LOG.debug(_("Device %s not defined on plugin"),
+                          details['device'])
+        self.br_mgr.remove_empty_bridges()
+        return False
 
     def daemon_loop(self):
         sync = True
@@ -961,6 +971,10 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
                     # plugin
                     sync = self.process_network_devices(device_info)
                     devices = device_info['current']
+                # The firewall refreshes requested by the security group
+                # notifications received since the last iteration
+                if self.firewall_refresh_needed():
+                    self.refresh_deferred_firewall()
             except Exception:
                 LOG.exception(_("Error in agent loop. Devices info: %s"),
                               device_info)
@@ -13,6 +13,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
+import sqlalchemy as sa
 from sqlalchemy.orm import exc
 
 from neutron.db import api as db_api
@@ -49,15 +52,41 @@ def add_network_segment(session, network_id, segment):
               'network_id': record.network_id})
 
 
+def _make_segment_dict(record):
+    return {api.ID: record.id,
+            api.NETWORK_TYPE: record.network_type,
+            api.PHYSICAL_NETWORK: record.physical_network,
+            api.SEGMENTATION_ID: record.segmentation_id}
+
+
 def get_network_segments(session, network_id):
     with session.begin(subtransactions=True):
         records = (session.query(models.NetworkSegment).
                    filter_by(network_id=network_id))
-        return [{api.ID: record.id,
-                 api.NETWORK_TYPE: record.network_type,
-                 api.PHYSICAL_NETWORK: record.physical_network,
-                 api.SEGMENTATION_ID: record.segmentation_id}
-                for record in records]
+        return [_make_segment_dict(record) for record in records]
+
+
+def get_networks_segments(session, network_ids):
+    """Return a dict mapping each of network_ids to its segments."""
+    segments = dict((network_id, []) for network_id in network_ids)
+    if not segments:
+        return segments
+    with session.begin(subtransactions=True):
+        records = (session.query(models.NetworkSegment).
+                   filter(models.NetworkSegment.network_id.in_(segments)))
+        for record in records:
+            segments[record.network_id].append(_make_segment_dict(record))
+    return segments
+
+
+def _add_port_binding(session, port_id):
+    record = models.PortBinding(
+        port_id=port_id,
+        host='',
+        vif_type=portbindings.VIF_TYPE_UNBOUND,
+        cap_port_filter=False)
+    session.add(record)
+    return record
 
 
 def ensure_port_binding(session, port_id):
@@ -67,15 +96,62 @@ def ensure_port_binding(session, port_id):
                       filter_by(port_id=port_id).
                       one())
         except exc.NoResultFound:
-            record = models.PortBinding(
-                port_id=port_id,
-                host='',
-                vif_type=portbindings.VIF_TYPE_UNBOUND,
-                cap_port_filter=False)
-            session.add(record)
+            record = _add_port_binding(session, port_id)
         return record
 
 
+def ensure_port_bindings(session, port_ids):
+    """Return a dict mapping each of port_ids to its binding.
+
+    The bindings missing from the database are added.
+    """
+    port_ids = set(port_ids)
+    bindings = {}
+    with session.begin(subtransactions=True):
+        if port_ids:
+            records = (session.query(models.PortBinding).
+                       filter(models.PortBinding.port_id.in_(port_ids)))
+            bindings = dict((record.port_id, record) for record in records)
+        for port_id in port_ids - set(bindings):
+            bindings[port_id] = _add_port_binding(session, port_id)
+    return bindings
+
+
+def _port_id_criterion(column, port_ids):
+    """Return a criterion on column matching port ids or id prefixes."""
+    full_ids = set(port_id for port_id in port_ids
+                   if uuidutils.is_uuid_like(port_id))
+    criteria = [column.startswith(prefix)
+                for prefix in set(port_ids) - full_ids]
+    if full_ids:
+        criteria.append(column.in_(full_ids))
+    return sa.or_(*criteria)
+
+
+def _match_port_ids(records, get_port_id, port_ids):
+    """Map each of port_ids, which may be id prefixes, to its record.
+
+    As for a single port id, a prefix matching several records is not
+    mapped.
+    """
+    matches = collections.defaultdict(list)
+    lengths = set(len(port_id) for port_id in port_ids)
+    for record in records:
+        for length in lengths:
+            matches[get_port_id(record)[:length]].append(record)
+    result = {}
+    for port_id in port_ids:
+        matching = matches.get(port_id)
+        if not matching:
+            continue
+        if len(matching) > 1:
+            LOG.error(_("Multiple ports have port_id starting with %s"),
+                      port_id)
+            continue
+        result[port_id] = matching[0]
+    return result
+
+
 def get_port(session, port_id):
     """Get port record for update within transcation."""
 
@@ -93,32 +169,64 @@ def get_port(session, port_id):
             return
 
 
+def get_ports(session, port_ids):
+    """Get the port records of several port ids within a transaction.
+
+    Returns a dict mapping each of port_ids found to its port record.
+    """
+    if not port_ids:
+        return {}
+    with session.begin(subtransactions=True):
+        records = (session.query(models_v2.Port).
+                   filter(_port_id_criterion(models_v2.Port.id, port_ids)).
+                   all())
+    return _match_port_ids(records, lambda record: record.id, port_ids)
+
+
 def get_port_and_sgs(port_id):
     """Get port from database with security group info."""
 
     LOG.debug(_("get_port_and_sgs() called for port_id %s"), port_id)
+    return get_ports_and_sgs([port_id]).get(port_id)
+
+
+def get_ports_and_sgs(port_ids):
+    """Get ports from database with security group info.
+
+    Returns a dict mapping each of port_ids found to its port dict.
+    """
+
+    LOG.debug(_("get_ports_and_sgs() called for port_ids %s"), port_ids)
+    if not port_ids:
+        return {}
     session = db_api.get_session()
     sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
+    plugin = manager.NeutronManager.get_plugin()
 
     with session.begin(subtransactions=True):
         query = session.query(models_v2.Port,
                               sg_db.SecurityGroupPortBinding.security_group_id)
         query = query.outerjoin(sg_db.SecurityGroupPortBinding,
                                 models_v2.Port.id == sg_binding_port)
-        query = query.filter(models_v2.Port.id.startswith(port_id))
-        port_and_sgs = query.all()
-        if not port_and_sgs:
-            return
-        port = port_and_sgs[0][0]
-        plugin = manager.NeutronManager.get_plugin()
-        port_dict = plugin._make_port_dict(port)
-        port_dict['security_groups'] = [
-            sg_id for port_, sg_id in port_and_sgs if sg_id]
-        port_dict['security_group_rules'] = []
-        port_dict['security_group_source_groups'] = []
-        port_dict['fixed_ips'] = [ip['ip_address']
-                                  for ip in port['fixed_ips']]
-        return port_dict
+        query = query.filter(_port_id_criterion(models_v2.Port.id, port_ids))
+        query = plugin._apply_loader_options(query, models_v2.Port)
+        ports = {}
+        sg_ids = collections.defaultdict(list)
+        for port, sg_id in query:
+            ports[port.id] = port
+            if sg_id:
+                sg_ids[port.id].append(sg_id)
+        port_dicts = {}
+        for port_id, port in _match_port_ids(
+                ports.values(), lambda record: record.id, port_ids).items():
+            port_dict = plugin._make_port_dict(port)
+            port_dict['security_groups'] = sg_ids[port.id]
+            port_dict['security_group_rules'] = []
+            port_dict['security_group_source_groups'] = []
+            port_dict['fixed_ips'] = [ip['ip_address']
+                                      for ip in port['fixed_ips']]
+            port_dicts[port_id] = port_dict
+        return port_dicts
 
 
 def get_port_binding_host(port_id):
@@ -133,3 +241,19 @@ def get_port_binding_host(port_id):
                       {'port_id': port_id})
             return
     return query.host
+
+
+def get_port_binding_hosts(port_ids):
+    """Return a dict mapping each of port_ids bound to its binding host."""
+    if not port_ids:
+        return {}
+    session = db_api.get_session()
+    with session.begin(subtransactions=True):
+        column = models.PortBinding.port_id
+        records = (session.query(models.PortBinding).
+                   filter(_port_id_criterion(column, port_ids)).
+                   all())
+    bindings = _match_port_ids(records, lambda record: record.port_id,
+                               port_ids)
+    return dict((port_id, binding.host)
+                for port_id, binding in bindings.items())
@@ -175,9 +175,10 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             value = None
         return value
 
-    def _extend_network_dict_provider(self, context, network):
+    def _extend_network_dict_provider(self, context, network, segments=None):
         id = network['id']
-        segments = db.get_network_segments(context.session, id)
+        if segments is None:
+            segments = db.get_network_segments(context.session, id)
         if not segments:
             LOG.error(_("Network %s has no segments"), id)
             network[provider.NETWORK_TYPE] = None
@@ -365,8 +366,11 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             nets = super(Ml2Plugin,
                          self).get_networks(context, filters, None, sorts,
                                             limit, marker, page_reverse)
+            segments = db.get_networks_segments(
+                session, [net['id'] for net in nets])
             for net in nets:
-                self._extend_network_dict_provider(context, net)
+                self._extend_network_dict_provider(context, net,
+                                                   segments[net['id']])
 
             nets = self._filter_nets_provider(context, nets, filters)
             nets = self._filter_nets_l3(context, nets, filters)
@@ -555,22 +559,10 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
 
         session = context.session
         with session.begin(subtransactions=True):
-            self._ensure_default_security_group_on_port(context, port)
-            sgids = self._get_security_groups_on_port(context, port)
-            dhcp_opts = port['port'].get(edo_ext.EXTRADHCPOPTS, [])
             result = super(Ml2Plugin, self).create_port(context, port)
-            self._process_port_create_security_group(context, result, sgids)
             network = self.get_network(context, result['network_id'])
-            mech_context = driver_context.PortContext(self, context, result,
-                                                      network)
-            self._process_port_binding(mech_context, attrs)
-            result[addr_pair.ADDRESS_PAIRS] = (
-                self._process_create_allowed_address_pairs(
-                    context, result,
-                    attrs.get(addr_pair.ADDRESS_PAIRS)))
-            self._process_port_create_extra_dhcp_opts(context, result,
-                                                      dhcp_opts)
-            self.mechanism_manager.create_port_precommit(mech_context)
+            mech_context = self._process_port_create(context, port, result,
+                                                     network)
 
         try:
             self.mechanism_manager.create_port_postcommit(mech_context)
@@ -582,6 +574,58 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
         self.notify_security_groups_member_updated(context, result)
         return result
 
+    def create_port_bulk(self, context, ports):
+        for port in ports['ports']:
+            port['port']['status'] = const.PORT_STATUS_DOWN
+        return super(Ml2Plugin, self).create_port_bulk(context, ports)
+
+    def _create_ports_bulk_precommit(self, context, ports, results):
+        networks = {}
+        mech_contexts = []
+        for port, result in zip(ports, results):
+            network_id = result['network_id']
+            if network_id not in networks:
+                networks[network_id] = self.get_network(context, network_id)
+            mech_contexts.append(self._process_port_create(
+                context, port, result, networks[network_id]))
+        return mech_contexts
+
+    def _create_ports_bulk_postcommit(self, context, results, mech_contexts):
+        try:
+            for mech_context in mech_contexts:
+                self.mechanism_manager.create_port_postcommit(mech_context)
+        except ml2_exc.MechanismDriverError:
+            with excutils.save_and_reraise_exception():
+                LOG.error(_("mechanism_manager.create_port_postcommit "
+                            "failed, deleting ports %s"),
+                          [result['id'] for result in results])
+                for result in results:
+                    self.delete_port(context, result['id'])
+        for result in results:
+            self.notify_security_groups_member_updated(context, result)
+
+    def _process_port_create(self, context, port, result, network):
+        """Process the extensions of a port created in the db.
+
+        :returns: the mechanism driver context of the port, once the
+                  create_port_precommit of the drivers was called.
+        """
+        attrs = port['port']
+        self._ensure_default_security_group_on_port(context, port)
+        sgids = self._get_security_groups_on_port(context, port)
+        self._process_port_create_security_group(context, result, sgids)
+        mech_context = driver_context.PortContext(self, context, result,
+                                                  network)
+        self._process_port_binding(mech_context, attrs)
+        result[addr_pair.ADDRESS_PAIRS] = (
+            self._process_create_allowed_address_pairs(
+                context, result,
+                attrs.get(addr_pair.ADDRESS_PAIRS)))
+        self._process_port_create_extra_dhcp_opts(
+            context, result, attrs.get(edo_ext.EXTRADHCPOPTS, []))
+        self.mechanism_manager.create_port_precommit(mech_context)
+        return mech_context
+
     def update_port(self, context, id, port):
         attrs = port['port']
         need_port_update_notify = False
@@ -668,30 +712,45 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
         self.notify_security_groups_member_updated(context, port)
 
     def update_port_status(self, context, port_id, status):
-        updated = False
+        return port_id in self.update_ports_status(context,
+                                                   {port_id: status})
+
+    def update_ports_status(self, context, statuses):
+        """Update the status of several ports in a single transaction.
+
+        statuses maps the port ids, which may be id prefixes, to their new
+        status. Returns the set of the port ids found.
+        """
+        mech_contexts = []
+        networks = {}
         session = context.session
         with session.begin(subtransactions=True):
-            port = db.get_port(session, port_id)
-            if not port:
-                LOG.warning(_("Port %(port)s updated up by agent not found"),
-                            {'port': port_id})
-                return False
-            if port.status != status:
+            ports = db.get_ports(session, statuses.keys())
+            for port_id, status in statuses.iteritems():
+                port = ports.get(port_id)
+                if not port:
+                    LOG.warning(_("Port %(port)s updated up by agent not "
+                                  "found"), {'port': port_id})
+                    continue
+                if port.status == status:
+                    continue
                 original_port = self._make_port_dict(port)
                 port.status = status
                 updated_port = self._make_port_dict(port)
-                network = self.get_network(context,
-                                           original_port['network_id'])
+                network_id = original_port['network_id']
+                if network_id not in networks:
+                    networks[network_id] = self.get_network(context,
+                                                            network_id)
                 mech_context = driver_context.PortContext(
-                    self, context, updated_port, network,
+                    self, context, updated_port, networks[network_id],
                     original_port=original_port)
                 self.mechanism_manager.update_port_precommit(mech_context)
-                updated = True
+                mech_contexts.append(mech_context)
 
-        if updated:
+        for mech_context in mech_contexts:
             self.mechanism_manager.update_port_postcommit(mech_context)
 
-        return True
+        return set(ports)
 
     def port_bound_to_host(self, port_id, host):
         port_host = db.get_port_binding_host(port_id)
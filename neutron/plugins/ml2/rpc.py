@@ -40,10 +40,12 @@ class RpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
                    sg_db_rpc.SecurityGroupServerRpcCallbackMixin,
                    type_tunnel.TunnelRpcCallbackMixin):
 
-    RPC_API_VERSION = '1.1'
+    RPC_API_VERSION = '1.3'
     # history
     #   1.0 Initial version (from openvswitch/linuxbridge)
     #   1.1 Support Security Group RPC
+    #   1.2 Support get_devices_details_list and update_devices_status
+    #   1.3 Support security_group_info_for_devices
 
     def __init__(self, notifier, type_manager):
         # REVISIT(kmestery): This depends on the first three super classes
@@ -79,6 +81,16 @@ class RpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
             port['device'] = device
         return port
 
+    @classmethod
+    def get_ports_from_devices(cls, devices):
+        port_ids = dict((cls._device_to_port_id(device), device)
+                        for device in devices)
+        ports = {}
+        for port_id, port in db.get_ports_and_sgs(port_ids.keys()).items():
+            port['device'] = port_ids[port_id]
+            ports[port['device']] = port
+        return ports
+
     def get_device_details(self, rpc_context, **kwargs):
         """Agent requests device details."""
         agent_id = kwargs.get('agent_id')
@@ -98,50 +110,85 @@ class RpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
                 return {'device': device}
 
             segments = db.get_network_segments(session, port.network_id)
-            if not segments:
-                LOG.warning(_("Device %(device)s requested by agent "
-                              "%(agent_id)s has network %(network_id)s with "
-                              "no segments"),
-                            {'device': device,
-                             'agent_id': agent_id,
-                             'network_id': port.network_id})
-                return {'device': device}
-
             binding = db.ensure_port_binding(session, port.id)
-            if not binding.segment:
-                LOG.warning(_("Device %(device)s requested by agent "
-                              "%(agent_id)s on network %(network_id)s not "
-                              "bound, vif_type: %(vif_type)s"),
-                            {'device': device,
-                             'agent_id': agent_id,
-                             'network_id': port.network_id,
-                             'vif_type': binding.vif_type})
-                return {'device': device}
+            return self._get_device_details(device, agent_id, port,
+                                            segments, binding)
 
-            segment = self._find_segment(segments, binding.segment)
-            if not segment:
-                LOG.warning(_("Device %(device)s requested by agent "
-                              "%(agent_id)s on network %(network_id)s "
-                              "invalid segment, vif_type: %(vif_type)s"),
-                            {'device': device,
-                             'agent_id': agent_id,
-                             'network_id': port.network_id,
-                             'vif_type': binding.vif_type})
-                return {'device': device}
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests the details of a list of devices."""
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        LOG.debug(_("Details of devices %(devices)s requested by agent "
+                    "%(agent_id)s"),
+                  {'devices': devices, 'agent_id': agent_id})
+        port_ids = dict((device, self._device_to_port_id(device))
+                        for device in devices)
+
+        session = db_api.get_session()
+        with session.begin(subtransactions=True):
+            ports = db.get_ports(session, port_ids.values())
+            segments = db.get_networks_segments(
+                session, set(port.network_id for port in ports.values()))
+            bindings = db.ensure_port_bindings(
+                session, [port.id for port in ports.values()])
+            devices_details = []
+            for device in devices:
+                port = ports.get(port_ids[device])
+                if not port:
+                    LOG.warning(_("Device %(device)s requested by agent "
+                                  "%(agent_id)s not found in database"),
+                                {'device': device, 'agent_id': agent_id})
+                    devices_details.append({'device': device})
+                    continue
+                devices_details.append(self._get_device_details(
+                    device, agent_id, port, segments[port.network_id],
+                    bindings[port.id]))
+            return devices_details
+
+    def _get_device_details(self, device, agent_id, port, segments, binding):
+        if not segments:
+            LOG.warning(_("Device %(device)s requested by agent "
+                          "%(agent_id)s has network %(network_id)s with "
+                          "no segments"),
+                        {'device': device,
+                         'agent_id': agent_id,
+                         'network_id': port.network_id})
+            return {'device': device}
 
-            new_status = (q_const.PORT_STATUS_BUILD if port.admin_state_up
-                          else q_const.PORT_STATUS_DOWN)
-            if port.status != new_status:
-                port.status = new_status
-            entry = {'device': device,
-                     'network_id': port.network_id,
-                     'port_id': port.id,
-                     'admin_state_up': port.admin_state_up,
-                     'network_type': segment[api.NETWORK_TYPE],
-                     'segmentation_id': segment[api.SEGMENTATION_ID],
-                     'physical_network': segment[api.PHYSICAL_NETWORK]}
-            LOG.debug(_("Returning: %s"), entry)
-            return entry
+        if not binding.segment:
+            LOG.warning(_("Device %(device)s requested by agent "
+                          "%(agent_id)s on network %(network_id)s not "
+                          "bound, vif_type: %(vif_type)s"),
+                        {'device': device,
+                         'agent_id': agent_id,
+                         'network_id': port.network_id,
+                         'vif_type': binding.vif_type})
+            return {'device': device}
+
+        segment = self._find_segment(segments, binding.segment)
+        if not segment:
+            LOG.warning(_("Device %(device)s requested by agent "
+                          "%(agent_id)s on network %(network_id)s "
+                          "invalid segment, vif_type: %(vif_type)s"),
+                        {'device': device,
+                         'agent_id': agent_id,
+                         'network_id': port.network_id,
+                         'vif_type': binding.vif_type})
+            return {'device': device}
+
+        new_status = (q_const.PORT_STATUS_BUILD if port.admin_state_up
+                      else q_const.PORT_STATUS_DOWN)
+        if port.status != new_status:
+            port.status = new_status
+        entry = {'device': device,
+                 'network_id': port.network_id,
+                 'port_id': port.id,
+                 'admin_state_up': port.admin_state_up,
+                 'network_type': segment[api.NETWORK_TYPE],
+                 'segmentation_id': segment[api.SEGMENTATION_ID],
+                 'physical_network': segment[api.PHYSICAL_NETWORK]}
+        LOG.debug(_("Returning: %s"), entry)
+        return entry
 
     def _find_segment(self, segments, segment_id):
         for segment in segments:
@@ -191,6 +238,52 @@ class RpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
         plugin.update_port_status(rpc_context, port_id,
                                   q_const.PORT_STATUS_ACTIVE)
 
+    def update_devices_status(self, rpc_context, **kwargs):
+        """Devices are up or no longer exist on agent.
+
+        Returns the devices reported up, and the details of the devices
+        reported down as update_device_down does.
+        """
+        agent_id = kwargs.get('agent_id')
+        devices_up = kwargs.get('devices_up', [])
+        devices_down = kwargs.get('devices_down', [])
+        host = kwargs.get('host')
+        LOG.debug(_("Devices %(devices_up)s up and devices %(devices_down)s "
+                    "no longer existing at agent %(agent_id)s"),
+                  {'devices_up': devices_up, 'devices_down': devices_down,
+                   'agent_id': agent_id})
+        plugin = manager.NeutronManager.get_plugin()
+        port_ids = dict((device, self._device_to_port_id(device))
+                        for device in devices_up + devices_down)
+        if host:
+            hosts = db.get_port_binding_hosts(port_ids.values())
+
+        def bound_to_host(device):
+            if host and hosts.get(port_ids[device]) != host:
+                LOG.debug(_("Device %(device)s not bound to the"
+                            " agent host %(host)s"),
+                          {'device': device, 'host': host})
+                return False
+            return True
+
+        # The devices reported down last win, as when updated one by one
+        statuses = {}
+        for device in devices_up:
+            if bound_to_host(device):
+                statuses[port_ids[device]] = q_const.PORT_STATUS_ACTIVE
+        for device in devices_down:
+            if bound_to_host(device):
+                statuses[port_ids[device]] = q_const.PORT_STATUS_DOWN
+        found = plugin.update_ports_status(rpc_context, statuses)
+        devices_down_details = []
+        for device in devices_down:
+            port_exists = (port_ids[device] not in statuses or
+                           port_ids[device] in found)
+            devices_down_details.append({'device': device,
+                                         'exists': port_exists})
+        return {'devices_up': devices_up,
+                'devices_down': devices_down_details}
+
 
 class AgentNotifierApi(proxy.RpcProxy,
                        sg_rpc.SecurityGroupAgentRpcApiMixin,
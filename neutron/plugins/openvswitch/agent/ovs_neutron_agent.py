@@ -119,7 +119,7 @@ class OVSSecurityGroupAgent(sg_rpc.SecurityGroupAgentRpcMixin):
         self.context = context
         self.plugin_rpc = plugin_rpc
         self.root_helper = root_helper
-        self.init_firewall()
+        self.init_firewall(defer_refresh_firewall=True)
 
 
 class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
@@ -301,7 +301,7 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
             return
 
         if ext_sg.SECURITYGROUPS in port:
-            self.sg_agent.refresh_firewall()
+            self.sg_agent.refresh_port_firewall(port['id'])
         network_type = kwargs.get('network_type')
         segmentation_id = kwargs.get('segmentation_id')
         physical_network = kwargs.get('physical_network')
@@ -854,6 +854,73 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                 'added': added,
                 'removed': removed}
 
+    def _get_iface_id(self, external_ids):
+        external_ids = external_ids or {}
+        if "attached-mac" not in external_ids:
+            return
+        if "iface-id" in external_ids:
+            return external_ids["iface-id"]
+        if "xs-vif-uuid" in external_ids:
+            return self.int_br.get_xapi_iface_id(external_ids["xs-vif-uuid"])
+
+    def process_ports_events(self, events, registered_ports,
+                             ancillary_ports):
+        """Compute the port changes from the events of the ovsdb monitor.
+
+        Only the ports of the events are looked at, instead of all the
+        ports of the bridges.
+
+        :returns: the changes of the integration bridge ports and of the
+                  ancillary bridges ports, like update_ports and
+                  update_ancillary_ports do.
+        """
+        removed = set()
+        ancillary_removed = set()
+        for interface in events['removed']:
+            port_id = self._get_iface_id(interface['external_ids'])
+            if port_id in registered_ports:
+                removed.add(port_id)
+            elif port_id in ancillary_ports:
+                ancillary_removed.add(port_id)
+
+        added = set()
+        ancillary_added = set()
+        if events['added']:
+            int_br_names = set(self.int_br.get_port_name_list())
+            ancillary_names = set()
+            for bridge in self.ancillary_brs:
+                ancillary_names.update(bridge.get_port_name_list())
+            for interface in events['added']:
+                port_id = self._get_iface_id(interface['external_ids'])
+                if not port_id:
+                    continue
+                if interface['name'] in int_br_names:
+                    # A port removed and added again is treated again
+                    if port_id not in registered_ports or port_id in removed:
+                        added.add(port_id)
+                        removed.discard(port_id)
+                elif interface['name'] in ancillary_names:
+                    if (port_id not in ancillary_ports or
+                            port_id in ancillary_removed):
+                        ancillary_added.add(port_id)
+                        ancillary_removed.discard(port_id)
+
+        port_info = None
+        if added or removed:
+            current = (registered_ports - removed) | added
+            self.int_br_device_count = len(current)
+            port_info = {'current': current,
+                         'added': added,
+                         'removed': removed}
+        ancillary_port_info = None
+        if ancillary_added or ancillary_removed:
+            ancillary_port_info = {
+                'current': (ancillary_ports - ancillary_removed) |
+                ancillary_added,
+                'added': ancillary_added,
+                'removed': ancillary_removed}
+        return port_info, ancillary_port_info
+
     def treat_vif_port(self, vif_port, port_id, network_id, network_type,
                        physical_network, segmentation_id, admin_state_up):
         if vif_port:
@@ -920,19 +987,20 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
     def treat_devices_added(self, devices):
         resync = False
         self.sg_agent.prepare_devices_filter(devices)
-        for device in devices:
+        try:
+            devices_details_list = self.plugin_rpc.get_devices_details_list(
+                self.context, devices, self.agent_id)
+        except Exception as e:
+            LOG.debug(_("Unable to get port details for "
+                        "%(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            # resync is needed
+            return True
+        devices_up = []
+        for details in devices_details_list:
+            device = details['device']
             LOG.info(_("Port %s added"), device)
-            try:
-                details = self.plugin_rpc.get_device_details(self.context,
-                                                             device,
-                                                             self.agent_id)
-            except Exception as e:
-                LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
-            port = self.int_br.get_vif_port_by_id(details['device'])
+            port = self.int_br.get_vif_port_by_id(device)
             if 'port_id' in details:
                 LOG.info(_("Port %(device)s updated. Details: %(details)s"),
                          {'device': device, 'details': details})
@@ -942,77 +1010,74 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                                     details['physical_network'],
                                     details['segmentation_id'],
                                     details['admin_state_up'])
-
-                # update plugin about port status
-                self.plugin_rpc.update_device_up(self.context,
-                                                 device,
-                                                 self.agent_id,
-                                                 cfg.CONF.host)
+                devices_up.append(device)
             else:
                 LOG.debug(_("Device %s not defined on plugin"), device)
                 if (port and int(port.ofport) != -1):
                     self.port_dead(port)
+        if devices_up:
+            # update plugin about port status
+            resync = self._update_devices_status(devices_up, []) is None
         return resync
 
+    def _update_devices_status(self, devices_up, devices_down):
+        """Update the plugin about the status of devices.
+
+        Returns the status returned by the plugin, or None on failure.
+        """
+        try:
+            return self.plugin_rpc.update_devices_status(self.context,
+                                                         devices_up,
+                                                         devices_down,
+                                                         self.agent_id,
+                                                         cfg.CONF.host)
+        except Exception as e:
+            LOG.debug(_("Unable to update status of %(devices)s: %(e)s"),
+                      {'devices': list(devices_up) + list(devices_down),
+                       'e': e})
+
     def treat_ancillary_devices_added(self, devices):
-        resync = False
         for device in devices:
             LOG.info(_("Ancillary Port %s added"), device)
-            try:
-                self.plugin_rpc.get_device_details(self.context, device,
-                                                   self.agent_id)
-            except Exception as e:
-                LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
+        try:
+            self.plugin_rpc.get_devices_details_list(self.context, devices,
+                                                     self.agent_id)
+        except Exception as e:
+            LOG.debug(_("Unable to get port details for "
+                        "%(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            # resync is needed
+            return True
 
-            # update plugin about port status
-            self.plugin_rpc.update_device_up(self.context,
-                                             device,
-                                             self.agent_id,
-                                             cfg.CONF.host)
-        return resync
+        # update plugin about port status
+        return self._update_devices_status(devices, []) is None
 
     def treat_devices_removed(self, devices):
-        resync = False
         self.sg_agent.remove_devices_filter(devices)
         for device in devices:
             LOG.info(_("Attachment %s removed"), device)
-            try:
-                self.plugin_rpc.update_device_down(self.context,
-                                                   device,
-                                                   self.agent_id,
-                                                   cfg.CONF.host)
-            except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
+        if self._update_devices_status([], devices) is None:
+            # resync is needed
+            return True
+        for device in devices:
             self.port_unbound(device)
-        return resync
+        return False
 
     def treat_ancillary_devices_removed(self, devices):
-        resync = False
         for device in devices:
             LOG.info(_("Attachment %s removed"), device)
-            try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id,
-                                                             cfg.CONF.host)
-            except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
+        status = self._update_devices_status([], devices)
+        if status is None:
+            # resync is needed
+            return True
+        for details in status['devices_down']:
             if details['exists']:
-                LOG.info(_("Port %s updated."), device)
+                LOG.info(_("Port %s updated."), details['device'])
                 # Nothing to do regarding local networking
             else:
-                LOG.debug(_("Device %s not defined on plugin"), device)
-        return resync
+                LOG.debug(_("Device %s not defined on plugin"),
+                          details['device'])
+        return False
 
     def process_network_ports(self, port_info):
         resync_a = False
@@ -1111,7 +1176,15 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                                 "starting polling. Elapsed:%(elapsed).3f"),
                               {'iter_num': self.iter_num,
                                'elapsed': time.time() - start})
-                    port_info = self.update_ports(ports)
+                    # The events of the ovsdb monitor are only missing when
+                    # a full rescan of the ports is required
+                    events = polling_manager.get_events()
+                    if events is None:
+                        port_info = self.update_ports(ports)
+                    else:
+                        (port_info,
+                         ancillary_port_info) = self.process_ports_events(
+                             events, ports, ancillary_ports)
                     LOG.debug(_("Agent rpc_loop - iteration:%(iter_num)d - "
                                 "port information retrieved. "
                                 "Elapsed:%(elapsed).3f"),
@@ -1133,8 +1206,11 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                             len(port_info.get('removed', [])))
                     # Treat ancillary devices if they exist
                     if self.ancillary_brs:
-                        port_info = self.update_ancillary_ports(
-                            ancillary_ports)
+                        if events is None:
+                            port_info = self.update_ancillary_ports(
+                                ancillary_ports)
+                        else:
+                            port_info = ancillary_port_info
                         LOG.debug(_("Agent rpc_loop - iteration:%(iter_num)d -"
                                     "ancillary port info retrieved. "
                                     "Elapsed:%(elapsed).3f"),
@@ -1158,6 +1234,15 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
 
                     polling_manager.polling_completed()
 
+                # The firewall refreshes requested by the security group
+                # notifications received since the last iteration
+                if self.sg_agent.firewall_refresh_needed():
+                    self.sg_agent.refresh_deferred_firewall()
+                    LOG.debug(_("Agent rpc_loop - iteration:%(iter_num)d - "
+                                "firewall refreshed. Elapsed:%(elapsed).3f"),
+                              {'iter_num': self.iter_num,
+                               'elapsed': time.time() - start})
+
             except Exception:
                 LOG.exception(_("Error in agent event loop"))
                 sync = True
@@ -321,27 +321,38 @@ def get_port(port_id):
 def get_port_from_device(port_id):
     """Get port from database."""
     LOG.debug(_("get_port_with_securitygroups() called:port_id=%s"), port_id)
+    return get_ports_from_devices([port_id]).get(port_id)
+
+
+def get_ports_from_devices(port_ids):
+    """Get the ports of a list of devices from database with one query."""
+    LOG.debug(_("get_ports_from_devices() called:port_ids=%s"), port_ids)
+    if not port_ids:
+        return {}
     session = db.get_session()
     sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
+    plugin = manager.NeutronManager.get_plugin()
 
     query = session.query(models_v2.Port,
                           sg_db.SecurityGroupPortBinding.security_group_id)
     query = query.outerjoin(sg_db.SecurityGroupPortBinding,
                             models_v2.Port.id == sg_binding_port)
-    query = query.filter(models_v2.Port.id == port_id)
-    port_and_sgs = query.all()
-    if not port_and_sgs:
-        return None
-    port = port_and_sgs[0][0]
-    plugin = manager.NeutronManager.get_plugin()
-    port_dict = plugin._make_port_dict(port)
-    port_dict[ext_sg.SECURITYGROUPS] = [
-        sg_id for port_, sg_id in port_and_sgs if sg_id]
-    port_dict['security_group_rules'] = []
-    port_dict['security_group_source_groups'] = []
-    port_dict['fixed_ips'] = [ip['ip_address']
-                              for ip in port['fixed_ips']]
-    return port_dict
+    query = query.filter(models_v2.Port.id.in_(port_ids))
+    query = plugin._apply_loader_options(query, models_v2.Port)
+    port_dicts = {}
+    for port, sg_id in query:
+        port_dict = port_dicts.get(port.id)
+        if not port_dict:
+            port_dict = plugin._make_port_dict(port)
+            port_dict[ext_sg.SECURITYGROUPS] = []
+            port_dict['security_group_rules'] = []
+            port_dict['security_group_source_groups'] = []
+            port_dict['fixed_ips'] = [ip['ip_address']
+                                      for ip in port['fixed_ips']]
+            port_dicts[port.id] = port_dict
+        if sg_id:
+            port_dict[ext_sg.SECURITYGROUPS].append(sg_id)
+    return port_dicts
 
 
 def set_port_status(port_id, status):
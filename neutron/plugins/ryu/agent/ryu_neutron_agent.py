@@ -242,7 +242,7 @@ class OVSNeutronOFPRyuAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             return
 
         if ext_sg.SECURITYGROUPS in port:
-            self.sg_agent.refresh_firewall()
+            self.sg_agent.refresh_port_firewall(port['id'])
 
     def _update_ports(self, registered_ports):
         ports = self.int_br.get_vif_port_set()
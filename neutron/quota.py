@@ -55,6 +55,22 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default=QUOTA_DB_DRIVER,
                help=_('Default driver to use for quota checks')),
+    cfg.BoolOpt('track_quota_usage',
+                default=True,
+                help=_('Keep track of the number of resources of each '
+                       'tenant in the database instead of counting them on '
+                       'each creation, when the database quota driver is '
+                       'used')),
+    cfg.IntOpt('reservation_expiration',
+               default=600,
+               help=_('Number of seconds after which the quota reserved '
+                      'for resources being created is released if their '
+                      'creation never completed')),
+    cfg.IntOpt('usage_resync_interval',
+               default=3600,
+               help=_('Number of seconds between the checks of the tracked '
+                      'quota usages against the resources in the database. '
+                      '0 disables them.')),
 ]
 # Register the configuration options
 cfg.CONF.register_opts(quota_opts, 'QUOTAS')
@@ -301,6 +317,51 @@ class QuotaEngine(object):
         return self.get_driver().limit_check(context, tenant_id,
                                              self._resources, values)
 
+    def make_reservation(self, context, tenant_id, resource, delta, *args):
+        """Check and reserve the quota for new resources of a tenant.
+
+        Drivers which keep track of the usage of the resource reserve delta
+        resources until the reservation is released, so that concurrent
+        requests can't go over the quota. Otherwise the resource is counted
+        as with count(), with the arguments following delta, and the
+        quota is only checked.
+
+        Raises OverQuota if delta more resources are over the quota.
+        Returns the reservation to release once the resources are created,
+        or their creation failed.
+
+        :param context: The request context, for access checks.
+        :param tenant_id: The tenant_id to check the quota.
+        :param resource: The name of the resource, as a string.
+        :param delta: The number of resources to create.
+        """
+
+        res = self._resources.get(resource)
+        if not res:
+            raise exceptions.QuotaResourceUnknown(unknown=[resource])
+        driver = self.get_driver()
+        if hasattr(driver, 'make_reservation'):
+            reservation = driver.make_reservation(context, tenant_id,
+                                                  self._resources,
+                                                  resource, delta)
+            if reservation is not None:
+                return reservation
+        count = self.count(context, resource, *args)
+        self.limit_check(context, tenant_id, **{resource: count + delta})
+
+    def release_reservation(self, context, reservation):
+        """Release a reservation returned by make_reservation()."""
+        if reservation is not None:
+            self.get_driver().release_reservation(context, reservation)
+
+    def start_usage_resync(self):
+        """Start the periodic resync of the usages, for drivers which keep
+        track of them.
+        """
+        driver = self.get_driver()
+        if hasattr(driver, 'start_usage_resync'):
+            driver.start_usage_resync()
+
     @property
     def resources(self):
         return self._resources
@@ -29,6 +29,7 @@ from neutron.openstack.common import importutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
 from neutron.openstack.common.rpc import service
+from neutron import quota
 from neutron import wsgi
 
 
@@ -90,6 +91,12 @@ class NeutronApiService(WsgiService):
         service = cls(app_name)
         return service
 
+    def start(self):
+        super(NeutronApiService, self).start()
+        # Started once the API workers are forked, so that only this
+        # process resyncs the quota usages
+        quota.QUOTAS.start_usage_resync()
+
 
 def serve_wsgi(cls):
 
@@ -14,10 +14,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+
 import eventlet.event
 import mock
 
 from neutron.agent.linux import ovsdb_monitor
+from neutron.openstack.common import jsonutils
 from neutron.tests import base
 
 
@@ -110,3 +113,77 @@ class TestSimpleInterfaceMonitor(base.BaseTestCase):
                 return_value=output):
             self.monitor._read_stdout()
         self.assertFalse(self.monitor.data_received)
+
+    def _output(self, *rows):
+        return jsonutils.dumps({
+            'data': [list(row) for row in rows],
+            'headings': ['row', 'action', 'name', 'ofport', 'external_ids']})
+
+    def _row(self, action, name, ofport=1, iface_id=None):
+        external_ids = ['map', [['iface-id', iface_id or name],
+                                ['attached-mac', 'aa:bb:cc:dd:ee:ff']]]
+        return ['row-' + name, action, name, ofport, external_ids]
+
+    def _get_events(self, *outputs):
+        with mock.patch.object(self.monitor, 'iter_stdout',
+                               return_value=iter(outputs)):
+            return self.monitor.get_events()
+
+    def test_get_events_parses_added_and_removed_interfaces(self):
+        events = self._get_events(
+            self._output(self._row('initial', 'tap1'),
+                         self._row('insert', 'tap2', ['set', []])),
+            self._output(self._row('delete', 'tap3')))
+        self.assertEqual(
+            [{'name': 'tap1', 'ofport': 1,
+              'external_ids': {'iface-id': 'tap1',
+                               'attached-mac': 'aa:bb:cc:dd:ee:ff'}},
+             {'name': 'tap2', 'ofport': None,
+              'external_ids': {'iface-id': 'tap2',
+                               'attached-mac': 'aa:bb:cc:dd:ee:ff'}}],
+            events['added'])
+        self.assertEqual(['tap3'], [i['name'] for i in events['removed']])
+
+    def test_get_events_reports_modified_interfaces_as_added(self):
+        events = self._get_events(
+            self._output(self._row('old', 'tap1', ['set', []]),
+                         self._row('new', 'tap1', 5)))
+        self.assertEqual([5], [i['ofport'] for i in events['added']])
+        self.assertEqual([], events['removed'])
+
+    def test_get_events_does_not_report_interface_added_then_removed(self):
+        events = self._get_events(self._output(self._row('insert', 'tap1')),
+                                  self._output(self._row('delete', 'tap1')))
+        self.assertEqual([], events['added'])
+        self.assertEqual(['tap1'], [i['name'] for i in events['removed']])
+
+    def test_get_events_reports_interface_removed_then_added(self):
+        events = self._get_events(self._output(self._row('delete', 'tap1')),
+                                  self._output(self._row('insert', 'tap1')))
+        self.assertEqual(['tap1'], [i['name'] for i in events['added']])
+        self.assertEqual(['tap1'], [i['name'] for i in events['removed']])
+
+    def test_get_events_ignores_invalid_output(self):
+        events = self._get_events('foo', self._output(self._row('insert',
+                                                                'tap1')))
+        self.assertEqual(['tap1'], [i['name'] for i in events['added']])
+
+    def test_get_events_clears_events(self):
+        self._get_events(self._output(self._row('insert', 'tap1')))
+        self.assertEqual({'added': [], 'removed': []}, self._get_events())
+
+    def test_has_updates_is_true_for_pending_events(self):
+        target = ('neutron.agent.linux.ovsdb_monitor.SimpleInterfaceMonitor'
+                  '.is_active')
+        output = self._output(self._row('insert', 'tap1'))
+        with contextlib.nested(
+            mock.patch(target,
+                       new_callable=mock.PropertyMock(return_value=True)),
+            mock.patch.object(self.monitor, 'iter_stdout',
+                              return_value=iter([output]))
+        ):
+            self.assertTrue(self.monitor.has_updates)
+            # The events are kept until they are retrieved
+            self.assertTrue(self.monitor.has_updates)
+            self.monitor.get_events()
+            self.assertFalse(self.monitor.has_updates)
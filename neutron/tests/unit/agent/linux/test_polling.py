@@ -86,6 +86,10 @@ class TestAlwaysPoll(base.BaseTestCase):
         pm = polling.AlwaysPoll()
         self.assertTrue(pm.is_polling_required)
 
+    def test_get_events_returns_none(self):
+        pm = polling.AlwaysPoll()
+        self.assertIsNone(pm.get_events())
+
 
 class TestInterfacePollingMinimizer(base.BaseTestCase):
 
@@ -114,3 +118,37 @@ class TestInterfacePollingMinimizer(base.BaseTestCase):
     def test__is_polling_required_returns_when_updates_are_present(self):
         with self.mock_has_updates(True):
             self.assertTrue(self.pm._is_polling_required())
+
+    def mock_is_active(self, return_value):
+        target = ('neutron.agent.linux.ovsdb_monitor.SimpleInterfaceMonitor'
+                  '.is_active')
+        return mock.patch(
+            target,
+            new_callable=mock.PropertyMock(return_value=return_value),
+        )
+
+    def test_get_events_returns_none_for_first_call(self):
+        with self.mock_is_active(True):
+            self.assertIsNone(self.pm.get_events())
+
+    def test_get_events_returns_monitor_events(self):
+        events = {'added': [{'name': 'tap1'}], 'removed': []}
+        self.pm._full_scan_required = False
+        with self.mock_is_active(True):
+            with mock.patch.object(self.pm._monitor, 'get_events',
+                                   return_value=events):
+                self.assertEqual(events, self.pm.get_events())
+
+    def test_get_events_returns_none_when_forced(self):
+        self.pm._full_scan_required = False
+        self.pm.force_polling()
+        with self.mock_is_active(True):
+            with mock.patch.object(self.pm._monitor, 'get_events'):
+                self.assertIsNone(self.pm.get_events())
+                self.assertIsNotNone(self.pm.get_events())
+
+    def test_get_events_returns_none_for_inactive_monitor(self):
+        self.pm._full_scan_required = False
+        with self.mock_is_active(False):
+            with mock.patch.object(self.pm._monitor, 'get_events'):
+                self.assertIsNone(self.pm.get_events())
@@ -597,7 +597,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
             for k, v in keys:
                 self.assertEqual(res['vips'][0][k], v)
 
-    def test_list_vips_with_sort_emulated(self):
+    def test_list_vips_with_sort_native(self):
         with self.subnet() as subnet:
             with contextlib.nested(
                 self.vip(name='vip1', subnet=subnet, protocol_port=81),
@@ -610,7 +610,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
                     [('protocol_port', 'asc'), ('name', 'desc')]
                 )
 
-    def test_list_vips_with_pagination_emulated(self):
+    def test_list_vips_with_pagination_native(self):
         with self.subnet() as subnet:
             with contextlib.nested(self.vip(name='vip1', subnet=subnet),
                                    self.vip(name='vip2', subnet=subnet),
@@ -620,7 +620,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
                                                 (vip1, vip2, vip3),
                                                 ('name', 'asc'), 2, 2)
 
-    def test_list_vips_with_pagination_reverse_emulated(self):
+    def test_list_vips_with_pagination_reverse_native(self):
         with self.subnet() as subnet:
             with contextlib.nested(self.vip(name='vip1', subnet=subnet),
                                    self.vip(name='vip2', subnet=subnet),
@@ -772,7 +772,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
             for k, v in keys:
                 self.assertEqual(res['pool'][k], v)
 
-    def test_list_pools_with_sort_emulated(self):
+    def test_list_pools_with_sort_native(self):
         with contextlib.nested(self.pool(name='p1'),
                                self.pool(name='p2'),
                                self.pool(name='p3')
@@ -780,7 +780,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
             self._test_list_with_sort('pool', (p3, p2, p1),
                                       [('name', 'desc')])
 
-    def test_list_pools_with_pagination_emulated(self):
+    def test_list_pools_with_pagination_native(self):
         with contextlib.nested(self.pool(name='p1'),
                                self.pool(name='p2'),
                                self.pool(name='p3')
@@ -789,7 +789,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
                                             (p1, p2, p3),
                                             ('name', 'asc'), 2, 2)
 
-    def test_list_pools_with_pagination_reverse_emulated(self):
+    def test_list_pools_with_pagination_reverse_native(self):
         with contextlib.nested(self.pool(name='p1'),
                                self.pool(name='p2'),
                                self.pool(name='p3')
@@ -939,7 +939,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
                 for k, v in keys:
                     self.assertEqual(res['member'][k], v)
 
-    def test_list_members_with_sort_emulated(self):
+    def test_list_members_with_sort_native(self):
         with self.pool() as pool:
             with contextlib.nested(self.member(pool_id=pool['pool']['id'],
                                                protocol_port=81),
@@ -951,7 +951,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
                 self._test_list_with_sort('member', (m3, m2, m1),
                                           [('protocol_port', 'desc')])
 
-    def test_list_members_with_pagination_emulated(self):
+    def test_list_members_with_pagination_native(self):
         with self.pool() as pool:
             with contextlib.nested(self.member(pool_id=pool['pool']['id'],
                                                protocol_port=81),
@@ -964,7 +964,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
                     'member', (m1, m2, m3), ('protocol_port', 'asc'), 2, 2
                 )
 
-    def test_list_members_with_pagination_reverse_emulated(self):
+    def test_list_members_with_pagination_reverse_native(self):
         with self.pool() as pool:
             with contextlib.nested(self.member(pool_id=pool['pool']['id'],
                                                protocol_port=81),
@@ -1073,7 +1073,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
             for k, v in keys:
                 self.assertEqual(res['health_monitor'][k], v)
 
-    def test_list_healthmonitors_with_sort_emulated(self):
+    def test_list_healthmonitors_with_sort_native(self):
         with contextlib.nested(self.health_monitor(delay=30),
                                self.health_monitor(delay=31),
                                self.health_monitor(delay=32)
@@ -1081,7 +1081,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
             self._test_list_with_sort('health_monitor', (m3, m2, m1),
                                       [('delay', 'desc')])
 
-    def test_list_healthmonitors_with_pagination_emulated(self):
+    def test_list_healthmonitors_with_pagination_native(self):
         with contextlib.nested(self.health_monitor(delay=30),
                                self.health_monitor(delay=31),
                                self.health_monitor(delay=32)
@@ -1090,7 +1090,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
                                             (m1, m2, m3),
                                             ('delay', 'asc'), 2, 2)
 
-    def test_list_healthmonitors_with_pagination_reverse_emulated(self):
+    def test_list_healthmonitors_with_pagination_reverse_native(self):
         with contextlib.nested(self.health_monitor(delay=30),
                                self.health_monitor(delay=31),
                                self.health_monitor(delay=32)
@@ -468,7 +468,7 @@ class TestVpnaas(VPNPluginDbTestCase):
             for k, v in lifetime.iteritems():
                 self.assertEqual(res['ikepolicies'][0]['lifetime'][k], v)
 
-    def test_list_ikepolicies_with_sort_emulated(self):
+    def test_list_ikepolicies_with_sort_native(self):
         """Test case to list all ikepolicies."""
         with contextlib.nested(self.ikepolicy(name='ikepolicy1'),
                                self.ikepolicy(name='ikepolicy2'),
@@ -480,7 +480,7 @@ class TestVpnaas(VPNPluginDbTestCase):
                                       [('name', 'desc')],
                                       'ikepolicies')
 
-    def test_list_ikepolicies_with_pagination_emulated(self):
+    def test_list_ikepolicies_with_pagination_native(self):
         """Test case to list all ikepolicies with pagination."""
         with contextlib.nested(self.ikepolicy(name='ikepolicy1'),
                                self.ikepolicy(name='ikepolicy2'),
@@ -493,7 +493,7 @@ class TestVpnaas(VPNPluginDbTestCase):
                                             ('name', 'asc'), 2, 2,
                                             'ikepolicies')
 
-    def test_list_ikepolicies_with_pagination_reverse_emulated(self):
+    def test_list_ikepolicies_with_pagination_reverse_native(self):
         """Test case to list all ikepolicies with reverse pagination."""
         with contextlib.nested(self.ikepolicy(name='ikepolicy1'),
                                self.ikepolicy(name='ikepolicy2'),
@@ -656,7 +656,7 @@ class TestVpnaas(VPNPluginDbTestCase):
             self.assertEqual(len(res), 1)
             self._check_policy(res['ipsecpolicies'][0], keys, lifetime)
 
-    def test_list_ipsecpolicies_with_sort_emulated(self):
+    def test_list_ipsecpolicies_with_sort_native(self):
         """Test case to list all ipsecpolicies."""
         with contextlib.nested(self.ipsecpolicy(name='ipsecpolicy1'),
                                self.ipsecpolicy(name='ipsecpolicy2'),
@@ -668,7 +668,7 @@ class TestVpnaas(VPNPluginDbTestCase):
                                       [('name', 'desc')],
                                       'ipsecpolicies')
 
-    def test_list_ipsecpolicies_with_pagination_emulated(self):
+    def test_list_ipsecpolicies_with_pagination_native(self):
         """Test case to list all ipsecpolicies with pagination."""
         with contextlib.nested(self.ipsecpolicy(name='ipsecpolicy1'),
                                self.ipsecpolicy(name='ipsecpolicy2'),
@@ -681,7 +681,7 @@ class TestVpnaas(VPNPluginDbTestCase):
                                             ('name', 'asc'), 2, 2,
                                             'ipsecpolicies')
 
-    def test_list_ipsecpolicies_with_pagination_reverse_emulated(self):
+    def test_list_ipsecpolicies_with_pagination_reverse_native(self):
         """Test case to list all ipsecpolicies with reverse pagination."""
         with contextlib.nested(self.ipsecpolicy(name='ipsecpolicy1'),
                                self.ipsecpolicy(name='ipsecpolicy2'),
@@ -952,7 +952,7 @@ class TestVpnaas(VPNPluginDbTestCase):
             for k, v in keys:
                 self.assertEqual(res['vpnservices'][0][k], v)
 
-    def test_list_vpnservices_with_sort_emulated(self):
+    def test_list_vpnservices_with_sort_native(self):
         """Test case to list all vpnservices with sorting."""
         with self.subnet() as subnet:
             with self.router() as router:
@@ -974,7 +974,7 @@ class TestVpnaas(VPNPluginDbTestCase):
                                                              vpnservice1),
                                               [('name', 'desc')])
 
-    def test_list_vpnservice_with_pagination_emulated(self):
+    def test_list_vpnservice_with_pagination_native(self):
         """Test case to list all vpnservices with pagination."""
         with self.subnet() as subnet:
             with self.router() as router:
@@ -997,7 +997,7 @@ class TestVpnaas(VPNPluginDbTestCase):
                                                      vpnservice3),
                                                     ('name', 'asc'), 2, 2)
 
-    def test_list_vpnservice_with_pagination_reverse_emulated(self):
+    def test_list_vpnservice_with_pagination_reverse_native(self):
         """Test case to list all vpnservices with reverse pagination."""
         with self.subnet() as subnet:
             with self.router() as router:
@@ -1375,7 +1375,7 @@ class TestVpnaas(VPNPluginDbTestCase):
                         keys,
                         dpd)
 
-    def test_list_ipsec_site_connections_with_sort_emulated(self):
+    def test_list_ipsec_site_connections_with_sort_native(self):
         """Test case to list all ipsec_site_connections with sort."""
         with self.subnet(cidr='10.2.0.0/24') as subnet:
             with self.router() as router:
@@ -1401,7 +1401,7 @@ class TestVpnaas(VPNPluginDbTestCase):
                                                    ipsec_site_connection1),
                                                   [('name', 'desc')])
 
-    def test_list_ipsec_site_connections_with_pagination_emulated(self):
+    def test_list_ipsec_site_connections_with_pagination_native(self):
         """Test case to list all ipsec_site_connections with pagination."""
         with self.subnet(cidr='10.2.0.0/24') as subnet:
             with self.router() as router:
@@ -1431,7 +1431,7 @@ class TestVpnaas(VPNPluginDbTestCase):
                              ipsec_site_connection3),
                             ('name', 'asc'), 2, 2)
 
-    def test_list_ipsec_site_conns_with_pagination_reverse_emulated(self):
+    def test_list_ipsec_site_conns_with_pagination_reverse_native(self):
         """Test to list all ipsec_site_connections with reverse pagination."""
         with self.subnet(cidr='10.2.0.0/24') as subnet:
             with self.router() as router:
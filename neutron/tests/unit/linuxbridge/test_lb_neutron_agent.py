@@ -155,6 +155,75 @@ class TestLinuxBridgeAgent(base.BaseTestCase):
                     agent.daemon_loop()
                 self.assertEqual(3, log.call_count)
 
+    def test_treat_devices_added_reports_status_at_once(self):
+        agent = linuxbridge_neutron_agent.LinuxBridgeNeutronAgentRPC({},
+                                                                     0,
+                                                                     None)
+        devices_details_list = [
+            {'device': device, 'port_id': device, 'network_id': 'net',
+             'network_type': p_const.TYPE_LOCAL, 'physical_network': None,
+             'segmentation_id': None, 'admin_state_up': True}
+            for device in ['tap1', 'tap2']]
+        devices_details_list.append({'device': 'tap3'})
+        with contextlib.nested(
+            mock.patch.object(agent, 'prepare_devices_filter'),
+            mock.patch.object(agent.plugin_rpc, 'get_devices_details_list',
+                              return_value=devices_details_list),
+            mock.patch.object(agent.plugin_rpc, 'update_devices_status'),
+            mock.patch.object(agent.br_mgr, 'add_interface',
+                              side_effect=[True, False])
+        ) as (prepare_fn, get_dev_fn, upd_dev_status, add_if_fn):
+            devices = ['tap1', 'tap2', 'tap3']
+            self.assertFalse(agent.treat_devices_added(devices))
+        get_dev_fn.assert_called_once_with(agent.context, devices,
+                                           agent.agent_id)
+        upd_dev_status.assert_called_once_with(agent.context, ['tap1'],
+                                               ['tap2'], agent.agent_id,
+                                               cfg.CONF.host)
+
+    def test_treat_devices_added_returns_true_for_missing_device(self):
+        agent = linuxbridge_neutron_agent.LinuxBridgeNeutronAgentRPC({},
+                                                                     0,
+                                                                     None)
+        with contextlib.nested(
+            mock.patch.object(agent, 'prepare_devices_filter'),
+            mock.patch.object(agent.plugin_rpc, 'get_devices_details_list',
+                              side_effect=Exception())
+        ):
+            self.assertTrue(agent.treat_devices_added(['tap1']))
+
+    def test_treat_devices_removed(self):
+        agent = linuxbridge_neutron_agent.LinuxBridgeNeutronAgentRPC({},
+                                                                     0,
+                                                                     None)
+        status = {'devices_up': [],
+                  'devices_down': [{'device': 'tap1', 'exists': True},
+                                   {'device': 'tap2', 'exists': False}]}
+        with contextlib.nested(
+            mock.patch.object(agent, 'remove_devices_filter'),
+            mock.patch.object(agent.plugin_rpc, 'update_devices_status',
+                              return_value=status),
+            mock.patch.object(agent.br_mgr, 'remove_empty_bridges')
+        ) as (remove_fn, upd_dev_status, remove_bridges_fn):
+            self.assertFalse(agent.treat_devices_removed(['tap1', 'tap2']))
+        upd_dev_status.assert_called_once_with(agent.context, [],
+                                               ['tap1', 'tap2'],
+                                               agent.agent_id, cfg.CONF.host)
+        remove_bridges_fn.assert_called_once_with()
+
+    def test_treat_devices_removed_returns_true_on_failure(self):
+        agent = linuxbridge_neutron_agent.LinuxBridgeNeutronAgentRPC({},
+                                                                     0,
+                                                                     None)
+        with contextlib.nested(
+            mock.patch.object(agent, 'remove_devices_filter'),
+            mock.patch.object(agent.plugin_rpc, 'update_devices_status',
+                              side_effect=Exception()),
+            mock.patch.object(agent.br_mgr, 'remove_empty_bridges')
+        ) as (remove_fn, upd_dev_status, remove_bridges_fn):
+            self.assertTrue(agent.treat_devices_removed(['tap1']))
+        self.assertFalse(remove_bridges_fn.called)
+
 
 class TestLinuxBridgeManager(base.BaseTestCase):
     def setUp(self):
@@ -719,7 +788,7 @@ class TestLinuxBridgeRpcCallbacks(base.BaseTestCase):
             mock.patch.object(self.lb_rpc.agent,
                               "plugin_rpc", create=True),
             mock.patch.object(self.lb_rpc.sg_agent,
-                              "refresh_firewall", create=True)
+                              "refresh_port_firewall", create=True)
         ) as (get_tap_fn, udev_fn, getbr_fn, remif_fn,
               addif_fn, rpc_obj, reffw_fn):
             get_tap_fn.return_value = "tap123"
@@ -821,7 +890,7 @@ class TestLinuxBridgeRpcCallbacks(base.BaseTestCase):
                                   "remove_interface"),
                 mock.patch.object(self.lb_rpc.agent.br_mgr, "add_interface"),
                 mock.patch.object(self.lb_rpc.sg_agent,
-                                  "refresh_firewall", create=True),
+                                  "refresh_port_firewall", create=True),
                 mock.patch.object(self.lb_rpc.agent,
                                   "plugin_rpc", create=True),
                 mock.patch.object(linuxbridge_neutron_agent.LOG, 'error'),
@@ -13,9 +13,18 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+
+import mock
+import webob.exc
+
+from neutron import context
 from neutron.extensions import multiprovidernet as mpnet
 from neutron.extensions import portbindings
 from neutron.extensions import providernet as pnet
+from neutron.extensions import securitygroup as ext_sg
+from neutron import manager
+from neutron.plugins.ml2.common import exceptions as ml2_exc
 from neutron.plugins.ml2 import config
 from neutron.tests.unit import _test_extension_portbindings as test_bindings
 from neutron.tests.unit import test_db_plugin as test_plugin
@@ -67,6 +76,11 @@ class TestMl2NetworksV2(test_plugin.TestNetworksV2,
     pass
 
 
+class TestMl2ListQueries(test_plugin.TestListQueries,
+                         Ml2PluginV2TestCase):
+    pass
+
+
 class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
 
     def test_update_port_status_build(self):
@@ -74,6 +88,46 @@ class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
             self.assertEqual(port['port']['status'], 'DOWN')
             self.assertEqual(self.port_create_status, 'DOWN')
 
+    def test_create_ports_bulk_native_processes_ports(self):
+        ctx = context.get_admin_context()
+        plugin = manager.NeutronManager.get_plugin()
+        mech_manager = plugin.mechanism_manager
+        with contextlib.nested(
+            mock.patch.object(plugin, '_create_bulk'),
+            mock.patch.object(mech_manager, 'create_port_precommit',
+                              wraps=mech_manager.create_port_precommit),
+            mock.patch.object(mech_manager, 'create_port_postcommit',
+                              wraps=mech_manager.create_port_postcommit)
+        ) as (create_bulk, precommit, postcommit):
+            with self.network() as net:
+                res = self._create_port_bulk(self.fmt, 2,
+                                             net['network']['id'],
+                                             'test', True)
+                self.assertEqual(res.status_int,
+                                 webob.exc.HTTPCreated.code)
+                ports = self.deserialize(self.fmt, res)['ports']
+                self.assertFalse(create_bulk.called)
+                self.assertEqual(2, precommit.call_count)
+                self.assertEqual(2, postcommit.call_count)
+                for port in ports:
+                    self.assertEqual('DOWN', port['status'])
+                    port_db = plugin.get_port(ctx, port['id'])
+                    self.assertEqual(1, len(port_db[ext_sg.SECURITYGROUPS]))
+                    self._delete('ports', port['id'])
+
+    def test_create_ports_bulk_native_postcommit_failure(self):
+        plugin = manager.NeutronManager.get_plugin()
+        with mock.patch.object(plugin.mechanism_manager,
+                               'create_port_postcommit',
+                               side_effect=ml2_exc.MechanismDriverError(
+                                   method='create_port_postcommit')):
+            with self.network() as net:
+                res = self._create_port_bulk(self.fmt, 2,
+                                             net['network']['id'],
+                                             'test', True)
+                self._validate_behavior_on_bulk_failure(
+                    res, 'ports', webob.exc.HTTPServerError.code)
+
 
 class TestMl2PortBinding(Ml2PluginV2TestCase,
                          test_bindings.PortBindingsTestCase):
@@ -13,12 +13,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+
 import mock
 
 from neutron import context
 from neutron.extensions import portbindings
 from neutron import manager
 from neutron.plugins.ml2 import config as config
+from neutron.plugins.ml2 import db as ml2_db
 from neutron.tests.unit import test_db_plugin as test_plugin
 
 
@@ -80,6 +83,84 @@ class PortBindingTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                 portbindings.VIF_TYPE_BRIDGE,
                                 True, True)
 
+    def test_get_devices_details_list(self):
+        host_arg = {portbindings.HOST_ID: 'host-ovs-no_filter'}
+        with self.subnet() as subnet:
+            with contextlib.nested(
+                self.port(subnet=subnet, name='bound',
+                          arg_list=(portbindings.HOST_ID,), **host_arg),
+                self.port(subnet=subnet, name='unbound')
+            ) as (bound, unbound):
+                bound_id = bound['port']['id']
+                unbound_id = unbound['port']['id']
+                devices = [bound_id, 'tap' + bound_id[:11], unbound_id,
+                           'unknown']
+                details = self.plugin.callbacks.get_devices_details_list(
+                    None, agent_id="theAgentId", devices=devices)
+                self.assertEqual(devices, [d['device'] for d in details])
+                for device_details in details[:2]:
+                    self.assertEqual(bound_id, device_details['port_id'])
+                    self.assertEqual('local',
+                                     device_details['network_type'])
+                self.assertEqual([{'device': unbound_id},
+                                  {'device': 'unknown'}], details[2:])
+                self.assertEqual(
+                    self.plugin.callbacks.get_device_details(
+                        None, agent_id="theAgentId", device=bound_id),
+                    details[0])
+
+    def test_update_devices_status(self):
+        host_arg = {portbindings.HOST_ID: 'host-ovs-no_filter'}
+        with self.subnet() as subnet:
+            with contextlib.nested(
+                self.port(subnet=subnet, name='up',
+                          arg_list=(portbindings.HOST_ID,), **host_arg),
+                self.port(subnet=subnet, name='other-host')
+            ) as (up, other_host):
+                up_id = up['port']['id']
+                other_host_id = other_host['port']['id']
+                status = self.plugin.callbacks.update_devices_status(
+                    context.get_admin_context(), agent_id="theAgentId",
+                    devices_up=['tap' + up_id[:11]],
+                    devices_down=[other_host_id, 'unknown'],
+                    host='host-ovs-no_filter')
+                self.assertEqual(['tap' + up_id[:11]], status['devices_up'])
+                self.assertEqual(
+                    [{'device': other_host_id, 'exists': True},
+                     {'device': 'unknown', 'exists': True}],
+                    status['devices_down'])
+                ports = dict((port['id'], port['status']) for port in
+                             self._list('ports')['ports'])
+                self.assertEqual('ACTIVE', ports[up_id])
+                self.assertEqual('DOWN', ports[other_host_id])
+
+                status = self.plugin.callbacks.update_devices_status(
+                    context.get_admin_context(), agent_id="theAgentId",
+                    devices_down=[up_id, 'unknown'])
+                self.assertEqual(
+                    [{'device': up_id, 'exists': True},
+                     {'device': 'unknown', 'exists': False}],
+                    status['devices_down'])
+                self.assertEqual('DOWN',
+                                 self._show('ports', up_id)['port']['status'])
+
+    def test_update_devices_status_single_query(self):
+        with self.subnet() as subnet:
+            with contextlib.nested(self.port(subnet=subnet),
+                                   self.port(subnet=subnet)) as (up, down):
+                up_id = up['port']['id']
+                down_id = down['port']['id']
+                with mock.patch.object(ml2_db, 'get_ports',
+                                       wraps=ml2_db.get_ports) as get_ports:
+                    self.plugin.callbacks.update_devices_status(
+                        context.get_admin_context(), agent_id="theAgentId",
+                        devices_up=[up_id], devices_down=[down_id])
+                self.assertEqual(1, get_ports.call_count)
+                self.assertEqual(
+                    'ACTIVE', self._show('ports', up_id)['port']['status'])
+                self.assertEqual(
+                    'DOWN', self._show('ports', down_id)['port']['status'])
+
     def _test_update_port_binding(self, host, new_host=None):
         with mock.patch.object(self.plugin,
                                '_notify_port_updated') as notify_mock:
@@ -79,6 +79,33 @@ class TestMl2SecurityGroups(Ml2SecurityGroupsTestCase,
                                      port_dict['fixed_ips'])
                     self._delete('ports', port_id)
 
+    def test_security_group_get_ports_from_devices(self):
+        with self.network() as n:
+            with self.subnet(n):
+                with self.security_group() as sg:
+                    security_group_id = sg['security_group']['id']
+                    ports = [self.deserialize(self.fmt, self._create_port(
+                        self.fmt, n['network']['id'],
+                        security_groups=[security_group_id]))['port']
+                        for i in range(2)]
+                    tap_device = 'tap' + ports[0]['id'][:11]
+                    devices = [tap_device, ports[1]['id'], 'bad_device_id']
+                    plugin = manager.NeutronManager.get_plugin()
+                    port_dicts = plugin.callbacks.get_ports_from_devices(
+                        devices)
+                    self.assertEqual(sorted(devices[:2]),
+                                     sorted(port_dicts.keys()))
+                    for device, port in zip(devices, ports):
+                        port_dict = port_dicts[device]
+                        self.assertEqual(port['id'], port_dict['id'])
+                        self.assertEqual(device, port_dict['device'])
+                        self.assertEqual([security_group_id],
+                                         port_dict[ext_sg.SECURITYGROUPS])
+                        self.assertEqual([port['fixed_ips'][0]['ip_address']],
+                                         port_dict['fixed_ips'])
+                    for port in ports:
+                        self._delete('ports', port['id'])
+
     def test_security_group_get_port_from_device_with_no_port(self):
         plugin = manager.NeutronManager.get_plugin()
         port_dict = plugin.callbacks.get_port_from_device('bad_device_id')
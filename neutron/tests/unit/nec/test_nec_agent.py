@@ -270,8 +270,8 @@ class TestNecAgentCallback(TestNecAgentBase):
     def test_port_update(self):
         with contextlib.nested(
             mock.patch.object(ovs_lib.OVSBridge, 'get_vif_port_by_id'),
-            mock.patch.object(self.agent.sg_agent, 'refresh_firewall')
-        ) as (get_vif_port_by_id, refresh_firewall):
+            mock.patch.object(self.agent.sg_agent, 'refresh_port_firewall')
+        ) as (get_vif_port_by_id, refresh_port_firewall):
             context = mock.Mock()
             vifport = ovs_lib.VifPort('port1', '1', 'id-1', 'mac-1',
                                       self.agent.int_br)
@@ -281,14 +281,14 @@ class TestNecAgentCallback(TestNecAgentBase):
             port = {'id': 'update-port-1'}
             self.agent.callback_nec.port_update(context, port=port)
             self.assertEqual(get_vif_port_by_id.call_count, 1)
-            self.assertFalse(refresh_firewall.call_count)
+            self.assertFalse(refresh_port_firewall.call_count)
 
             # The OVS port exists but no security group is associated.
             get_vif_port_by_id.return_value = vifport
             port = {'id': 'update-port-1'}
             self.agent.callback_nec.port_update(context, port=port)
             self.assertEqual(get_vif_port_by_id.call_count, 2)
-            self.assertFalse(refresh_firewall.call_count)
+            self.assertFalse(refresh_port_firewall.call_count)
 
             # The OVS port exists but a security group is associated.
             get_vif_port_by_id.return_value = vifport
@@ -296,14 +296,14 @@ class TestNecAgentCallback(TestNecAgentBase):
                     ext_sg.SECURITYGROUPS: ['default']}
             self.agent.callback_nec.port_update(context, port=port)
             self.assertEqual(get_vif_port_by_id.call_count, 3)
-            self.assertEqual(refresh_firewall.call_count, 1)
+            self.assertEqual(refresh_port_firewall.call_count, 1)
 
             get_vif_port_by_id.return_value = None
             port = {'id': 'update-port-1',
                     ext_sg.SECURITYGROUPS: ['default']}
             self.agent.callback_nec.port_update(context, port=port)
             self.assertEqual(get_vif_port_by_id.call_count, 4)
-            self.assertEqual(refresh_firewall.call_count, 1)
+            self.assertEqual(refresh_port_firewall.call_count, 1)
 
 
 class TestNecAgentPluginApi(TestNecAgentBase):
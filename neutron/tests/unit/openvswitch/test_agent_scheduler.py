@@ -589,6 +589,27 @@ class OvsAgentSchedulerTestCase(OvsAgentSchedulerTestCaseBase):
                                     router_ids=[uuidutils.generate_uuid()])
         self.assertFalse(ret_a)
 
+    def _test_sync_routers_by_id_from_slave(self, full_sync,
+                                            from_slave):
+        with self.router() as router:
+            l3_rpc = l3_rpc_base.L3RpcCallbackMixin()
+            self._register_agent_states()
+            with mock.patch.object(context.Context,
+                                   'reading_from_slave') as from_slave_mock:
+                ret_a = l3_rpc.sync_routers(
+                    self.adminContext, host=L3_HOSTA,
+                    router_ids=[router['router']['id']],
+                    full_sync=full_sync)
+            self.assertEqual([router['router']['id']],
+                             [r['id'] for r in ret_a])
+        self.assertEqual(from_slave, from_slave_mock.called)
+
+    def test_sync_routers_by_id_reads_from_master(self):
+        self._test_sync_routers_by_id_from_slave(None, False)
+
+    def test_sync_routers_by_id_in_full_sync_reads_from_slave(self):
+        self._test_sync_routers_by_id_from_slave(True, True)
+
     def test_router_auto_schedule_with_hosted(self):
         with self.router() as router:
             l3_rpc = l3_rpc_base.L3RpcCallbackMixin()
@@ -748,6 +769,23 @@ class OvsAgentSchedulerTestCase(OvsAgentSchedulerTestCaseBase):
             self.assertIn(router_ids[0], [r['id'] for r in ret_a])
             self.assertIn(router_ids[2], [r['id'] for r in ret_a])
 
+    def test_rpc_get_router_ids(self):
+        l3_rpc = l3_rpc_base.L3RpcCallbackMixin()
+        self._register_agent_states()
+
+        # No routers
+        self.assertEqual([], l3_rpc.get_router_ids(self.adminContext,
+                                                   host=L3_HOSTA))
+
+        with contextlib.nested(self.router(),
+                               self.router()) as routers:
+            router_ids = [r['router']['id'] for r in routers]
+            ret_a = l3_rpc.get_router_ids(self.adminContext, host=L3_HOSTA)
+            self.assertEqual(set(router_ids), set(ret_a))
+            # The routers were scheduled to the first agent asking for them
+            self.assertEqual([], l3_rpc.get_router_ids(self.adminContext,
+                                                       host=L3_HOSTB))
+
     def test_router_auto_schedule_for_specified_routers(self):
 
         def _sync_router_with_ids(router_ids, exp_synced, exp_hosted, host_id):
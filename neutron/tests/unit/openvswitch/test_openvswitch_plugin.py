@@ -53,6 +53,11 @@ class TestOpenvswitchNetworksV2(test_plugin.TestNetworksV2,
     pass
 
 
+class TestOpenvswitchListQueries(test_plugin.TestListQueries,
+                                 OpenvswitchPluginV2TestCase):
+    pass
+
+
 class TestOpenvswitchPortBinding(OpenvswitchPluginV2TestCase,
                                  test_bindings.PortBindingsTestCase):
     VIF_TYPE = portbindings.VIF_TYPE_OVS
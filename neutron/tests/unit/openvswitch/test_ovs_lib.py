@@ -355,32 +355,76 @@ class OVS_Lib_Test(base.BaseTestCase):
         self.assertEqual(self.br.add_patch_port(pname, peer), ofport)
         tools.verify_mock_calls(self.execute, expected_calls_and_values)
 
+    def _encode_ovs_json(self, headings, data):
+        # See man ovs-vsctl(8) for the encoding details.
+        r = {"data": [],
+             "headings": headings}
+        for row in data:
+            ovs_row = []
+            r["data"].append(ovs_row)
+            for cell in row:
+                if isinstance(cell, (str, int, list)):
+                    ovs_row.append(cell)
+                elif isinstance(cell, dict):
+                    ovs_row.append(["map", cell.items()])
+                else:
+                    raise TypeError('%r not str, int, list or dict' %
+                                    type(cell))
+        return jsonutils.dumps(r)
+
+    def _snapshot_call(self):
+        return mock.call(
+            ["ovs-vsctl", self.TO, "--format=json",
+             "--", "--columns=name,ports", "list", "Bridge", self.BR_NAME,
+             "--", "--columns=_uuid,name,interfaces", "list", "Port",
+             "--", "--columns=_uuid,name,ofport,external_ids",
+             "list", "Interface"],
+            root_helper=self.root_helper)
+
+    def _encode_snapshot(self, ports, other_ports=()):
+        """Encode the tables listed for a snapshot of the bridge.
+
+        :param ports: (name, ofport, external_ids) of the bridge ports
+        :param other_ports: (name, ofport, external_ids) of the ports of
+                            another bridge
+        """
+        port_rows = []
+        iface_rows = []
+        bridge_ports = [['uuid', 'port-%s' % self.BR_NAME]]
+        port_rows.append([['uuid', 'port-%s' % self.BR_NAME], self.BR_NAME,
+                          ['uuid', 'iface-%s' % self.BR_NAME]])
+        iface_rows.append([['uuid', 'iface-%s' % self.BR_NAME], self.BR_NAME,
+                           65534, {}])
+        for name, ofport, external_ids in list(ports) + list(other_ports):
+            if (name, ofport, external_ids) in ports:
+                bridge_ports.append(['uuid', 'port-%s' % name])
+            port_rows.append([['uuid', 'port-%s' % name], name,
+                              ['uuid', 'iface-%s' % name]])
+            iface_rows.append([['uuid', 'iface-%s' % name], name, ofport,
+                               external_ids])
+        return '\n'.join([
+            self._encode_ovs_json(['name', 'ports'],
+                                  [[self.BR_NAME, ['set', bridge_ports]]]),
+            self._encode_ovs_json(['_uuid', 'name', 'interfaces'],
+                                  port_rows),
+            self._encode_ovs_json(['_uuid', 'name', 'ofport',
+                                   'external_ids'], iface_rows)]) + '\n'
+
     def _test_get_vif_ports(self, is_xen=False):
         pname = "tap99"
-        ofport = "6"
+        ofport = 6
         vif_id = uuidutils.generate_uuid()
         mac = "ca:fe:de:ad:be:ef"
 
         if is_xen:
-            external_ids = ('{xs-vif-uuid="%s", attached-mac="%s"}'
-                            % (vif_id, mac))
+            external_ids = {"xs-vif-uuid": vif_id, "attached-mac": mac}
         else:
-            external_ids = ('{iface-id="%s", attached-mac="%s"}'
-                            % (vif_id, mac))
+            external_ids = {"iface-id": vif_id, "attached-mac": mac}
 
         # Each element is a tuple of (expected mock call, return_value)
         expected_calls_and_values = [
-            (mock.call(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
-                       root_helper=self.root_helper),
-             "%s\n" % pname),
-            (mock.call(["ovs-vsctl", self.TO, "get",
-                        "Interface", pname, "external_ids"],
-                       root_helper=self.root_helper),
-             external_ids),
-            (mock.call(["ovs-vsctl", self.TO, "get",
-                        "Interface", pname, "ofport"],
-                       root_helper=self.root_helper),
-             ofport),
+            (self._snapshot_call(),
+             self._encode_snapshot([(pname, ofport, external_ids)])),
         ]
         if is_xen:
             expected_calls_and_values.append(
@@ -400,48 +444,27 @@ class OVS_Lib_Test(base.BaseTestCase):
         self.assertEqual(ports[0].switch.br_name, self.BR_NAME)
         tools.verify_mock_calls(self.execute, expected_calls_and_values)
 
-    def _encode_ovs_json(self, headings, data):
-        # See man ovs-vsctl(8) for the encoding details.
-        r = {"data": [],
-             "headings": headings}
-        for row in data:
-            ovs_row = []
-            r["data"].append(ovs_row)
-            for cell in row:
-                if isinstance(cell, str):
-                    ovs_row.append(cell)
-                elif isinstance(cell, dict):
-                    ovs_row.append(["map", cell.items()])
-                else:
-                    raise TypeError('%r not str or dict' % type(cell))
-        return jsonutils.dumps(r)
-
     def _test_get_vif_port_set(self, is_xen):
         if is_xen:
             id_key = 'xs-vif-uuid'
         else:
             id_key = 'iface-id'
 
-        headings = ['name', 'external_ids']
-        data = [
+        ports = [
             # A vif port on this bridge:
-            ['tap99', {id_key: 'tap99id', 'attached-mac': 'tap99mac'}],
-            # A vif port on another bridge:
-            ['tap88', {id_key: 'tap88id', 'attached-mac': 'tap88id'}],
+            ('tap99', 1, {id_key: 'tap99id', 'attached-mac': 'tap99mac'}),
             # Non-vif port on this bridge:
-            ['tun22', {}],
+            ('tun22', 2, {}),
+        ]
+        other_ports = [
+            # A vif port on another bridge:
+            ('tap88', 1, {id_key: 'tap88id', 'attached-mac': 'tap88id'}),
         ]
 
         # Each element is a tuple of (expected mock call, return_value)
         expected_calls_and_values = [
-            (mock.call(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
-                       root_helper=self.root_helper),
-             'tap99\ntun22'),
-            (mock.call(["ovs-vsctl", self.TO, "--format=json",
-                        "--", "--columns=name,external_ids",
-                        "list", "Interface"],
-                       root_helper=self.root_helper),
-             self._encode_ovs_json(headings, data)),
+            (self._snapshot_call(),
+             self._encode_snapshot(ports, other_ports)),
         ]
         tools.setup_mock_calls(self.execute, expected_calls_and_values)
 
@@ -468,35 +491,53 @@ class OVS_Lib_Test(base.BaseTestCase):
     def test_get_vif_port_set_xen(self):
         self._test_get_vif_port_set(True)
 
-    def test_get_vif_port_set_list_ports_error(self):
+    def test_get_vif_port_set_list_error(self):
         expected_calls_and_values = [
-            (mock.call(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
-                       root_helper=self.root_helper),
-             RuntimeError()),
-            (mock.call(["ovs-vsctl", self.TO, "--format=json",
-                        "--", "--columns=name,external_ids",
-                        "list", "Interface"],
-                       root_helper=self.root_helper),
-             self._encode_ovs_json(['name', 'external_ids'], []))
+            (self._snapshot_call(), RuntimeError()),
         ]
         tools.setup_mock_calls(self.execute, expected_calls_and_values)
         self.assertEqual(set(), self.br.get_vif_port_set())
         tools.verify_mock_calls(self.execute, expected_calls_and_values)
 
-    def test_get_vif_port_set_list_interface_error(self):
-        expected_calls_and_values = [
-            (mock.call(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
-                       root_helper=self.root_helper),
-             'tap99\n'),
-            (mock.call(["ovs-vsctl", self.TO, "--format=json",
-                        "--", "--columns=name,external_ids",
-                        "list", "Interface"],
-                       root_helper=self.root_helper),
-             RuntimeError()),
-        ]
-        tools.setup_mock_calls(self.execute, expected_calls_and_values)
+    def test_get_vif_port_set_invalid_output(self):
+        self.execute.return_value = 'foo'
         self.assertEqual(set(), self.br.get_vif_port_set())
-        tools.verify_mock_calls(self.execute, expected_calls_and_values)
+
+    def test_get_port_name_list(self):
+        self.execute.return_value = self._encode_snapshot(
+            [('tun22', 2, {}), ('tap99', 1, {})], [('tap88', 1, {})])
+        self.assertEqual(['tap99', 'tun22'], self.br.get_port_name_list())
+        self.execute.assert_called_once_with(*self._snapshot_call()[1],
+                                             **self._snapshot_call()[2])
+
+    def _find_vif_call(self, vif_id):
+        return mock.call(
+            ["ovs-vsctl", self.TO, "--", "--columns=external_ids,name,ofport",
+             "find", "Interface", 'external_ids:iface-id="%s"' % vif_id],
+            root_helper=self.root_helper)
+
+    def test_get_vif_port_by_id(self):
+        vif_id = uuidutils.generate_uuid()
+        self.execute.return_value = (
+            'external_ids        : {attached-mac="ca:fe:de:ad:be:ef", '
+            'iface-id="%s", iface-status=active}\n'
+            'name                : "tap99"\n'
+            'ofport              : 6\n' % vif_id)
+        port = self.br.get_vif_port_by_id(vif_id)
+        self.assertEqual(('tap99', 6, vif_id, 'ca:fe:de:ad:be:ef'),
+                         (port.port_name, port.ofport, port.vif_id,
+                          port.vif_mac))
+        # A single port is found without reading the whole bridge
+        self.execute.assert_called_once_with(
+            *self._find_vif_call(vif_id)[1], **self._find_vif_call(vif_id)[2])
+
+    def test_get_vif_port_by_id_missing_port(self):
+        self.execute.return_value = ''
+        self.assertIsNone(self.br.get_vif_port_by_id('id1'))
+
+    def test_get_vif_port_by_id_unparsable(self):
+        self.execute.return_value = 'name                : "tap99"\n'
+        self.assertIsNone(self.br.get_vif_port_by_id('id1'))
 
     def test_clear_db_attribute(self):
         pname = "tap77"
@@ -552,10 +593,11 @@ class OVS_Lib_Test(base.BaseTestCase):
     def test_delete_all_ports(self):
         with mock.patch.object(self.br, 'get_port_name_list',
                                return_value=['port1']) as get_port:
-            with mock.patch.object(self.br, 'delete_port') as delete_port:
-                self.br.delete_ports(all_ports=True)
+            self.br.delete_ports(all_ports=True)
         get_port.assert_called_once_with()
-        delete_port.assert_called_once_with('port1')
+        self.execute.assert_called_once_with(
+            ["ovs-vsctl", self.TO, "--", "--if-exists", "del-port",
+             self.BR_NAME, "port1"], root_helper=self.root_helper)
 
     def test_delete_neutron_ports(self):
         port1 = ovs_lib.VifPort('tap1234', 1, uuidutils.generate_uuid(),
@@ -564,13 +606,18 @@ class OVS_Lib_Test(base.BaseTestCase):
                                 'ca:ee:de:ad:be:ef', 'br')
         with mock.patch.object(self.br, 'get_vif_ports',
                                return_value=[port1, port2]) as get_ports:
-            with mock.patch.object(self.br, 'delete_port') as delete_port:
-                self.br.delete_ports(all_ports=False)
+            self.br.delete_ports(all_ports=False)
         get_ports.assert_called_once_with()
-        delete_port.assert_has_calls([
-            mock.call('tap1234'),
-            mock.call('tap5678')
-        ])
+        self.execute.assert_called_once_with(
+            ["ovs-vsctl", self.TO,
+             "--", "--if-exists", "del-port", self.BR_NAME, "tap1234",
+             "--", "--if-exists", "del-port", self.BR_NAME, "tap5678"],
+            root_helper=self.root_helper)
+
+    def test_delete_no_ports(self):
+        with mock.patch.object(self.br, 'get_vif_ports', return_value=[]):
+            self.br.delete_ports(all_ports=False)
+        self.assertFalse(self.execute.called)
 
     def _test_get_bridges(self, exp_timeout=None):
         bridges = ['br-int', 'br-ex']
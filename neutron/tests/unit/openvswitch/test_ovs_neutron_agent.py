@@ -169,8 +169,113 @@ class TestOvsNeutronAgent(base.BaseTestCase):
         actual = self.mock_update_ports(vif_port_set, registered_ports)
         self.assertEqual(expected, actual)
 
+    def _interface(self, name, iface_id=None):
+        return {'name': name, 'ofport': 1,
+                'external_ids': {'iface-id': iface_id or name,
+                                 'attached-mac': 'aa:bb:cc:dd:ee:ff'}}
+
+    def mock_process_ports_events(self, events, registered_ports,
+                                  int_br_names):
+        with mock.patch.object(self.agent.int_br, 'get_port_name_list',
+                               return_value=int_br_names):
+            return self.agent.process_ports_events(events, registered_ports,
+                                                   set())
+
+    def test_process_ports_events_returns_port_changes(self):
+        events = {'added': [self._interface('tap3'),
+                            self._interface('other-bridge')],
+                  'removed': [self._interface('tap2'),
+                              self._interface('unknown')]}
+        port_info, ancillary_port_info = self.mock_process_ports_events(
+            events, set(['tap1', 'tap2']), ['tap1', 'tap3'])
+        self.assertEqual({'current': set(['tap1', 'tap3']),
+                          'added': set(['tap3']),
+                          'removed': set(['tap2'])}, port_info)
+        self.assertIsNone(ancillary_port_info)
+
+    def test_process_ports_events_ignores_registered_ports(self):
+        events = {'added': [self._interface('tap1')], 'removed': []}
+        port_info, ancillary_port_info = self.mock_process_ports_events(
+            events, set(['tap1']), ['tap1'])
+        self.assertIsNone(port_info)
+
+    def test_process_ports_events_treats_readded_port_again(self):
+        events = {'added': [self._interface('tap1')],
+                  'removed': [self._interface('tap1')]}
+        port_info, ancillary_port_info = self.mock_process_ports_events(
+            events, set(['tap1']), ['tap1'])
+        self.assertEqual({'current': set(['tap1']),
+                          'added': set(['tap1']),
+                          'removed': set()}, port_info)
+
+    def test_process_ports_events_ignores_non_vif_interfaces(self):
+        interface = self._interface('patch-tun')
+        interface['external_ids'] = {}
+        events = {'added': [interface], 'removed': []}
+        port_info, ancillary_port_info = self.mock_process_ports_events(
+            events, set(), ['patch-tun'])
+        self.assertIsNone(port_info)
+
+    def test_process_ports_events_does_not_list_ports_for_removals(self):
+        events = {'added': [], 'removed': [self._interface('tap1')]}
+        with mock.patch.object(self.agent.int_br,
+                               'get_port_name_list') as get_port_names:
+            port_info, ancillary_port_info = self.agent.process_ports_events(
+                events, set(['tap1']), set())
+        self.assertFalse(get_port_names.called)
+        self.assertEqual(set(['tap1']), port_info['removed'])
+
+    def test_rpc_loop_processes_events_instead_of_scanning(self):
+        events = {'added': [self._interface('tap1')], 'removed': []}
+        polling_manager = mock.Mock()
+        polling_manager.is_polling_required = True
+        polling_manager.get_events.return_value = events
+        port_info = {'current': set(['tap1']), 'added': set(['tap1']),
+                     'removed': set()}
+        with contextlib.nested(
+            mock.patch.object(self.agent, 'update_ports'),
+            mock.patch.object(self.agent, 'process_ports_events',
+                              return_value=(port_info, None)),
+            mock.patch.object(self.agent, 'process_network_ports',
+                              return_value=False),
+            mock.patch.object(ovs_neutron_agent.time, 'sleep',
+                              side_effect=[None, RuntimeError])
+        ) as (update_ports, process_events, process_ports, sleep):
+            self.assertRaises(RuntimeError, self.agent.rpc_loop,
+                              polling_manager)
+        self.assertFalse(update_ports.called)
+        process_events.assert_called_with(events, set(['tap1']), set())
+        process_ports.assert_called_with(port_info)
+
+    def test_rpc_loop_scans_ports_without_events(self):
+        polling_manager = mock.Mock()
+        polling_manager.is_polling_required = True
+        polling_manager.get_events.return_value = None
+        with contextlib.nested(
+            mock.patch.object(self.agent, 'update_ports', return_value=None),
+            mock.patch.object(self.agent, 'process_ports_events'),
+            mock.patch.object(ovs_neutron_agent.time, 'sleep',
+                              side_effect=RuntimeError)
+        ) as (update_ports, process_events, sleep):
+            self.assertRaises(RuntimeError, self.agent.rpc_loop,
+                              polling_manager)
+        update_ports.assert_called_once_with(set())
+        self.assertFalse(process_events.called)
+
+    def test_rpc_loop_refreshes_deferred_firewall(self):
+        polling_manager = mock.Mock()
+        polling_manager.is_polling_required = False
+        self.agent.sg_agent.firewall_refresh_needed.side_effect = [True,
+                                                                   False]
+        with mock.patch.object(ovs_neutron_agent.time, 'sleep',
+                               side_effect=[None, RuntimeError]):
+            self.assertRaises(RuntimeError, self.agent.rpc_loop,
+                              polling_manager)
+        self.agent.sg_agent.refresh_deferred_firewall.assert_called_once_with()
+
     def test_treat_devices_added_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
+        with mock.patch.object(self.agent.plugin_rpc,
+                               'get_devices_details_list',
                                side_effect=Exception()):
             self.assertTrue(self.agent.treat_devices_added([{}]))
 
@@ -183,13 +288,14 @@ class TestOvsNeutronAgent(base.BaseTestCase):
         :returns: whether the named function was called
         """
         with contextlib.nested(
-            mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
-                              return_value=details),
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=[details]),
             mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
                               return_value=port),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_up'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_status'),
             mock.patch.object(self.agent, func_name)
-        ) as (get_dev_fn, get_vif_func, upd_dev_up, func):
+        ) as (get_dev_fn, get_vif_func, upd_dev_status, func):
             self.assertFalse(self.agent.treat_devices_added([{}]))
         return func.called
 
@@ -212,15 +318,58 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                                                        mock.Mock(),
                                                        'treat_vif_port'))
 
+    def test_treat_devices_added_reports_devices_up_at_once(self):
+        devices_details_list = [
+            {'device': device, 'port_id': device, 'network_id': 'net',
+             'network_type': 'vlan', 'physical_network': 'physnet',
+             'segmentation_id': 1, 'admin_state_up': True}
+            for device in ['dev1', 'dev2']]
+        with contextlib.nested(
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=devices_details_list),
+            mock.patch.object(self.agent.int_br, 'get_vif_port_by_id'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_status'),
+            mock.patch.object(self.agent, 'treat_vif_port')
+        ) as (get_dev_fn, get_vif_func, upd_dev_status, treat_vif_port):
+            self.assertFalse(self.agent.treat_devices_added(['dev1', 'dev2']))
+        get_dev_fn.assert_called_once_with(self.agent.context,
+                                           ['dev1', 'dev2'],
+                                           self.agent.agent_id)
+        upd_dev_status.assert_called_once_with(self.agent.context,
+                                               ['dev1', 'dev2'], [],
+                                               self.agent.agent_id,
+                                               cfg.CONF.host)
+        self.assertEqual(2, treat_vif_port.call_count)
+
+    def test_treat_devices_added_returns_true_on_status_failure(self):
+        details = mock.MagicMock()
+        details.__contains__.side_effect = lambda x: True
+        with contextlib.nested(
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=[details]),
+            mock.patch.object(self.agent.int_br, 'get_vif_port_by_id'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_status',
+                              side_effect=Exception()),
+            mock.patch.object(self.agent, 'treat_vif_port')
+        ):
+            self.assertTrue(self.agent.treat_devices_added([{}]))
+
     def test_treat_devices_removed_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
-                               side_effect=Exception()):
+        with contextlib.nested(
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_status',
+                              side_effect=Exception()),
+            mock.patch.object(self.agent, 'port_unbound')
+        ) as (upd_dev_status, port_unbound):
             self.assertTrue(self.agent.treat_devices_removed([{}]))
+        self.assertFalse(port_unbound.called)
 
     def _mock_treat_devices_removed(self, port_exists):
-        details = dict(exists=port_exists)
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
-                               return_value=details):
+        status = {'devices_up': [],
+                  'devices_down': [dict(device={}, exists=port_exists)]}
+        with mock.patch.object(self.agent.plugin_rpc, 'update_devices_status',
+                               return_value=status):
             with mock.patch.object(self.agent, 'port_unbound') as port_unbound:
                 self.assertFalse(self.agent.treat_devices_removed([{}]))
         self.assertTrue(port_unbound.called)
@@ -136,7 +136,7 @@ class TestOVSNeutronOFPRyuAgent(RyuAgentTestCase):
 
         get_vif.assert_called_once_with(1)
         self.sg_agent.assert_has_calls([
-            mock.call().refresh_firewall()
+            mock.call().refresh_port_firewall(1)
         ])
 
     def test_port_update_not_vifport(self, **kwargs):
@@ -148,7 +148,8 @@ class TestOVSNeutronOFPRyuAgent(RyuAgentTestCase):
             self.mock_port_update(port=port)
 
         get_vif.assert_called_once_with(1)
-        self.assertFalse(self.sg_agent.return_value.refresh_firewall.called)
+        self.assertFalse(
+            self.sg_agent.return_value.refresh_port_firewall.called)
 
     def test_port_update_without_secgroup(self, **kwargs):
         port = {'id': 1}
@@ -159,7 +160,8 @@ class TestOVSNeutronOFPRyuAgent(RyuAgentTestCase):
             self.mock_port_update(port=port)
 
         get_vif.assert_called_once_with(1)
-        self.assertFalse(self.sg_agent.return_value.refresh_firewall.called)
+        self.assertFalse(
+            self.sg_agent.return_value.refresh_port_firewall.called)
 
     def mock_update_ports(self, vif_port_set=None, registered_ports=None):
         with mock.patch.object(self.ovsbridge.return_value,
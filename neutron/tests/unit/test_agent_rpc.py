@@ -19,6 +19,7 @@ import mock
 
 from neutron.agent import rpc
 from neutron.openstack.common import context
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.tests import base
 
 
@@ -45,6 +46,84 @@ class AgentRPCPluginApi(base.BaseTestCase):
     def test_tunnel_sync(self):
         self._test_rpc_call('tunnel_sync')
 
+    def test_get_devices_details_list(self):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        with mock.patch.object(agent, 'call',
+                               return_value='foo') as call:
+            self.assertEqual(
+                'foo', agent.get_devices_details_list(ctxt, set(['dev1']),
+                                                      'fake_agent_id'))
+        call.assert_called_once_with(
+            ctxt, agent.make_msg('get_devices_details_list',
+                                 devices=['dev1'], agent_id='fake_agent_id'),
+            topic='fake_topic', version='1.2')
+
+    def test_update_devices_status(self):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        with mock.patch.object(agent, 'call',
+                               return_value='foo') as call:
+            self.assertEqual(
+                'foo', agent.update_devices_status(ctxt, ['dev1'], ['dev2'],
+                                                   'fake_agent_id',
+                                                   'fake_host'))
+        call.assert_called_once_with(
+            ctxt, agent.make_msg('update_devices_status',
+                                 devices_up=['dev1'], devices_down=['dev2'],
+                                 agent_id='fake_agent_id', host='fake_host'),
+            topic='fake_topic', version='1.2')
+
+    def _test_devices_list_fallback(self, exc_type):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        with mock.patch.object(agent, 'call') as call:
+            call.side_effect = [rpc_common.RemoteError(exc_type),
+                                {'device': 'dev1'}, {'device': 'dev2'},
+                                {'device': 'dev3'}]
+            details = agent.get_devices_details_list(ctxt, ['dev1', 'dev2'],
+                                                     'fake_agent_id')
+            self.assertEqual([{'device': 'dev1'}, {'device': 'dev2'}],
+                             details)
+            self.assertFalse(agent.devices_list_supported)
+            # The plugin is not asked for the list of devices again
+            details = agent.get_devices_details_list(ctxt, ['dev3'],
+                                                     'fake_agent_id')
+            self.assertEqual([{'device': 'dev3'}], details)
+        self.assertEqual(4, call.call_count)
+        self.assertEqual('get_device_details',
+                         call.call_args[0][1]['method'])
+
+    def test_get_devices_details_list_fallback_unsupported_version(self):
+        self._test_devices_list_fallback('UnsupportedRpcVersion')
+
+    def test_get_devices_details_list_fallback_missing_function(self):
+        self._test_devices_list_fallback('AttributeError')
+
+    def test_get_devices_details_list_raises_other_errors(self):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        with mock.patch.object(agent, 'call',
+                               side_effect=rpc_common.RemoteError('Error')):
+            self.assertRaises(rpc_common.RemoteError,
+                              agent.get_devices_details_list, ctxt,
+                              ['dev1'], 'fake_agent_id')
+        self.assertTrue(agent.devices_list_supported)
+
+    def test_update_devices_status_fallback(self):
+        agent = rpc.PluginApi('fake_topic')
+        agent.devices_list_supported = False
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        with mock.patch.object(agent, 'call') as call:
+            call.side_effect = [None, {'device': 'dev2', 'exists': True}]
+            status = agent.update_devices_status(ctxt, ['dev1'], ['dev2'],
+                                                 'fake_agent_id', 'fake_host')
+        self.assertEqual({'devices_up': ['dev1'],
+                          'devices_down': [{'device': 'dev2',
+                                            'exists': True}]}, status)
+        self.assertEqual(['update_device_up', 'update_device_down'],
+                         [c[0][1]['method'] for c in call.call_args_list])
+
 
 class AgentPluginReportState(base.BaseTestCase):
     def test_plugin_report_state_use_call(self):
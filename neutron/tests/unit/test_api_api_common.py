@@ -97,3 +97,25 @@ class APICommonTestCase(base.BaseTestCase):
                           self.controller._prepare_request_body,
                           body,
                           params)
+
+
+class KeysetMarkerTestCase(base.BaseTestCase):
+
+    def test_encode_decode(self):
+        values = {'id': 'fake_id', 'name': 'net1', 'admin_state_up': True,
+                  'mtu': 1500, 'description': None}
+        marker = common.encode_keyset_marker(values)
+        self.assertEqual(values, common.decode_keyset_marker(marker))
+
+    def test_encode_unsupported_value(self):
+        self.assertIsNone(common.encode_keyset_marker(
+            {'id': 'fake_id', 'subnets': ['fake_subnet_id']}))
+
+    def test_decode_id(self):
+        self.assertIsNone(common.decode_keyset_marker(
+            'd6c1b5e0-6d8f-4b2a-9c3e-0f2a4c6e8b10'))
+
+    def test_decode_not_a_dict(self):
+        marker = common.encode_keyset_marker({'id': 'fake_id'})
+        self.assertIsNone(common.decode_keyset_marker(marker[:-4]))
+        self.assertIsNone(common.decode_keyset_marker('WyJpZCJd'))
@@ -372,6 +372,18 @@ class APIv2TestCase(APIv2TestBase):
         kwargs = self._get_collection_kwargs(limit=1000, marker=marker)
         instance.get_networks.assert_called_once_with(mock.ANY, **kwargs)
 
+    def test_keyset_marker(self):
+        cfg.CONF.set_override('pagination_max_limit', '1000')
+        instance = self.plugin.return_value
+        instance.get_networks.return_value = []
+        values = {'name': 'net1', 'id': _uuid()}
+        self.api.get(_get_path('networks'),
+                     {'marker': api_common.encode_keyset_marker(values),
+                      'sort_key': 'name', 'sort_dir': 'asc'})
+        kwargs = self._get_collection_kwargs(
+            limit=1000, marker=values, sorts=[('name', True), ('id', True)])
+        instance.get_networks.assert_called_once_with(mock.ANY, **kwargs)
+
     def test_page_reverse(self):
         calls = []
         instance = self.plugin.return_value
@@ -614,12 +626,14 @@ class JSONV2TestCase(APIv2TestBase, testlib_api.WebTestCase):
 
         url = urlparse.urlparse(next_links[0]['href'])
         self.assertEqual(url.path, _get_path('networks'))
-        params['marker'] = [id2]
+        params['marker'] = [api_common.encode_keyset_marker(
+            {'name': 'net2', 'id': id2})]
         self.assertEqual(urlparse.parse_qs(url.query), params)
 
         url = urlparse.urlparse(previous_links[0]['href'])
         self.assertEqual(url.path, _get_path('networks'))
-        params['marker'] = [id1]
+        params['marker'] = [api_common.encode_keyset_marker(
+            {'name': 'net1', 'id': id1})]
         params['page_reverse'] = ['True']
         self.assertEqual(urlparse.parse_qs(url.query), params)
 
@@ -654,7 +668,8 @@ class JSONV2TestCase(APIv2TestBase, testlib_api.WebTestCase):
         url = urlparse.urlparse(previous_links[0]['href'])
         self.assertEqual(url.path, _get_path('networks'))
         expect_params = params.copy()
-        expect_params['marker'] = [id]
+        expect_params['marker'] = [api_common.encode_keyset_marker(
+            {'id': id})]
         expect_params['page_reverse'] = ['True']
         self.assertEqual(urlparse.parse_qs(url.query), expect_params)
 
@@ -717,7 +732,8 @@ class JSONV2TestCase(APIv2TestBase, testlib_api.WebTestCase):
         self.assertEqual(url.path, _get_path('networks'))
         expected_params = params.copy()
         del expected_params['page_reverse']
-        expected_params['marker'] = [id]
+        expected_params['marker'] = [api_common.encode_keyset_marker(
+            {'id': id})]
         self.assertEqual(urlparse.parse_qs(url.query),
                          expected_params)
 
@@ -0,0 +1,178 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo.config import cfg
+
+from neutron.common import exceptions as q_exc
+from neutron import context
+from neutron.db import ipam
+from neutron.tests.unit import test_db_plugin
+
+
+LOCKING_IPAM_DRIVER = 'neutron.db.ipam.LockingIpamDriver'
+
+
+class TestOptimisticIpamDriver(test_db_plugin.NeutronDbPluginV2TestCase):
+
+    def setUp(self):
+        super(TestOptimisticIpamDriver, self).setUp()
+        self.driver = ipam.OptimisticIpamDriver()
+        self.ctx = context.get_admin_context()
+
+    def _get_ranges(self, subnet_id):
+        return [(r.first_ip, r.last_ip)
+                for r in self.driver._get_free_ranges(self.ctx, subnet_id)]
+
+    def _generate_ips(self, subnet, count):
+        with self.ctx.session.begin(subtransactions=True):
+            ips = self.driver.generate_ips(self.ctx, [subnet], count)
+        return [ip['ip_address'] for ip in ips]
+
+    def test_generate_ips(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            ips = self._generate_ips(subnet['subnet'], 3)
+            self.assertEqual(['10.0.0.2', '10.0.0.3', '10.0.0.4'], ips)
+            self.assertEqual([('10.0.0.5', '10.0.0.254')],
+                             self._get_ranges(subnet['subnet']['id']))
+
+    def test_generate_ips_across_ranges(self):
+        pools = [{'start': '10.0.0.2', 'end': '10.0.0.3'},
+                 {'start': '10.0.0.10', 'end': '10.0.0.20'}]
+        with self.subnet(cidr='10.0.0.0/24',
+                         allocation_pools=pools) as subnet:
+            ips = self._generate_ips(subnet['subnet'], 4)
+            self.assertEqual(['10.0.0.2', '10.0.0.3',
+                              '10.0.0.10', '10.0.0.11'], ips)
+            self.assertEqual([('10.0.0.12', '10.0.0.20')],
+                             self._get_ranges(subnet['subnet']['id']))
+
+    def test_generate_ips_ipv6(self):
+        with self.subnet(cidr='2001:db8::/64', gateway_ip='2001:db8::1',
+                         ip_version=6) as subnet:
+            ips = self._generate_ips(subnet['subnet'], 2)
+            self.assertEqual(['2001:db8::2', '2001:db8::3'], ips)
+
+    def test_generate_ips_exhausted(self):
+        pools = [{'start': '10.0.0.2', 'end': '10.0.0.3'}]
+        with self.subnet(cidr='10.0.0.0/24',
+                         allocation_pools=pools) as subnet:
+            self.assertRaises(q_exc.IpAddressGenerationFailure,
+                              self._generate_ips, subnet['subnet'], 3)
+
+    def test_generate_ips_retries_with_lock_on_conflict(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            subnet_id = subnet['subnet']['id']
+            stale = self.driver._get_free_ranges(self.ctx, subnet_id)
+            # A concurrent allocation modifies the range after it was read
+            self._generate_ips(subnet['subnet'], 1)
+            get_ranges = self.driver._get_free_ranges
+            with mock.patch.object(self.driver, '_get_free_ranges',
+                                   side_effect=[stale,
+                                                get_ranges(self.ctx,
+                                                           subnet_id)]
+                                   ) as get_free_ranges:
+                ips = self._generate_ips(subnet['subnet'], 2)
+            self.assertEqual(['10.0.0.3', '10.0.0.4'], ips)
+            self.assertEqual(
+                [mock.call(self.ctx, subnet_id, lock=False),
+                 mock.call(self.ctx, subnet_id, lock=True)],
+                get_free_ranges.call_args_list)
+
+    def test_generate_ips_raises_on_repeated_conflict(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            subnet_id = subnet['subnet']['id']
+            stale = self.driver._get_free_ranges(self.ctx, subnet_id)
+            self._generate_ips(subnet['subnet'], 1)
+            with mock.patch.object(self.driver, '_get_free_ranges',
+                                   return_value=stale):
+                self.assertRaises(q_exc.IpAddressAllocationConflict,
+                                  self._generate_ips, subnet['subnet'], 1)
+
+    def test_allocate_specific_ip_splits_range(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            subnet_id = subnet['subnet']['id']
+            with self.ctx.session.begin(subtransactions=True):
+                self.driver.allocate_specific_ip(self.ctx, subnet_id,
+                                                 '10.0.0.10')
+            self.assertEqual([('10.0.0.2', '10.0.0.9'),
+                              ('10.0.0.11', '10.0.0.254')],
+                             self._get_ranges(subnet_id))
+
+    def test_allocate_specific_ip_first_of_range(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            subnet_id = subnet['subnet']['id']
+            with self.ctx.session.begin(subtransactions=True):
+                self.driver.allocate_specific_ip(self.ctx, subnet_id,
+                                                 '10.0.0.2')
+            self.assertEqual([('10.0.0.3', '10.0.0.254')],
+                             self._get_ranges(subnet_id))
+
+    def test_allocate_specific_ip_not_free(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            subnet_id = subnet['subnet']['id']
+            with self.ctx.session.begin(subtransactions=True):
+                self.driver.allocate_specific_ip(self.ctx, subnet_id,
+                                                 '10.0.0.1')
+            self.assertEqual([('10.0.0.2', '10.0.0.254')],
+                             self._get_ranges(subnet_id))
+
+    def test_release_ip_merges_ranges(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            subnet_id = subnet['subnet']['id']
+            with self.ctx.session.begin(subtransactions=True):
+                self.driver.allocate_specific_ip(self.ctx, subnet_id,
+                                                 '10.0.0.10')
+                self.driver.release_ip(self.ctx, subnet_id, '10.0.0.10')
+            self.assertEqual([('10.0.0.2', '10.0.0.254')],
+                             self._get_ranges(subnet_id))
+
+    def test_release_ip_on_exhausted_pool(self):
+        pools = [{'start': '10.0.0.2', 'end': '10.0.0.3'}]
+        with self.subnet(cidr='10.0.0.0/24',
+                         allocation_pools=pools) as subnet:
+            subnet_id = subnet['subnet']['id']
+            self._generate_ips(subnet['subnet'], 2)
+            with self.ctx.session.begin(subtransactions=True):
+                self.driver.release_ip(self.ctx, subnet_id, '10.0.0.3')
+                self.driver.release_ip(self.ctx, subnet_id, '10.0.0.2')
+            self.assertEqual([('10.0.0.2', '10.0.0.3')],
+                             self._get_ranges(subnet_id))
+
+    def test_release_ip_outside_pools(self):
+        pools = [{'start': '10.0.0.2', 'end': '10.0.0.3'}]
+        with self.subnet(cidr='10.0.0.0/24',
+                         allocation_pools=pools) as subnet:
+            subnet_id = subnet['subnet']['id']
+            with self.ctx.session.begin(subtransactions=True):
+                self.driver.release_ip(self.ctx, subnet_id, '10.0.0.4')
+            self.assertEqual([('10.0.0.2', '10.0.0.3')],
+                             self._get_ranges(subnet_id))
+
+
+class TestLockingIpamDriverPortsV2(test_db_plugin.TestPortsV2):
+
+    def setUp(self):
+        super(TestLockingIpamDriverPortsV2, self).setUp()
+        cfg.CONF.set_override('ipam_driver', LOCKING_IPAM_DRIVER)
+        driver_patcher = mock.patch.object(ipam, '_DRIVER', None)
+        driver_patcher.start()
+        self.addCleanup(driver_patcher.stop)
+
+    def test_locking_driver_is_loaded(self):
+        self.assertIsInstance(ipam.get_ipam_driver(),
+                              ipam.LockingIpamDriver)
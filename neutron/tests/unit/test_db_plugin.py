@@ -939,6 +939,57 @@ class TestPortsV2(NeutronDbPluginV2TestCase):
                 self._validate_behavior_on_bulk_failure(
                     res, 'ports', webob.exc.HTTPServerError.code)
 
+    def test_create_ports_bulk_native_with_fixed_ips(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            subnet_id = subnet['subnet']['id']
+            override = {0: {'fixed_ips': [{'subnet_id': subnet_id,
+                                           'ip_address': '10.0.0.2'}]},
+                        1: {'fixed_ips': [{'subnet_id': subnet_id},
+                                          {'ip_address': '10.0.0.10'}]}}
+            res = self._create_port_bulk(self.fmt, 3,
+                                         subnet['subnet']['network_id'],
+                                         'test', True, override=override)
+            self.assertEqual(res.status_int, webob.exc.HTTPCreated.code)
+            ports = self.deserialize(self.fmt, res)['ports']
+            ips = [[ip['ip_address'] for ip in port['fixed_ips']]
+                   for port in ports]
+            self.assertEqual(['10.0.0.2'], ips[0])
+            self.assertEqual(2, len(ips[1]))
+            self.assertEqual('10.0.0.10', ips[1][1])
+            self.assertEqual(1, len(ips[2]))
+            self.assertEqual(4, len(set(ips[0] + ips[1] + ips[2])))
+            self.assertEqual(3, len(set(port['mac_address']
+                                        for port in ports)))
+            for port in ports:
+                self._delete('ports', port['id'])
+
+    def test_create_ports_bulk_native_duplicate_mac(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        with self.network() as net:
+            override = {0: {'mac_address': '00:11:22:33:44:55'},
+                        1: {'mac_address': '00:11:22:33:44:55'}}
+            res = self._create_port_bulk(self.fmt, 2, net['network']['id'],
+                                         'test', True, override=override)
+            self._validate_behavior_on_bulk_failure(
+                res, 'ports', webob.exc.HTTPConflict.code)
+
+    def test_create_ports_bulk_native_duplicate_ip(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        with self.subnet() as subnet:
+            fixed_ips = [{'subnet_id': subnet['subnet']['id'],
+                          'ip_address': '10.0.0.5'}]
+            override = {0: {'fixed_ips': fixed_ips},
+                        1: {'fixed_ips': fixed_ips}}
+            res = self._create_port_bulk(self.fmt, 2,
+                                         subnet['subnet']['network_id'],
+                                         'test', True, override=override)
+            self._validate_behavior_on_bulk_failure(
+                res, 'ports', webob.exc.HTTPConflict.code)
+
     def test_list_ports(self):
         # for this test we need to enable overlapping ips
         cfg.CONF.set_default('allow_overlapping_ips', True)
@@ -2114,6 +2165,36 @@ class TestNetworksV2(NeutronDbPluginV2TestCase):
                                             (net1, net2, net3),
                                             ('name', 'asc'), 2, 2)
 
+    def test_list_networks_with_pagination_native_keyset_marker(self):
+        if self._skip_native_pagination:
+            self.skipTest("Skip test for not implemented pagination feature")
+        plugin = NeutronManager.get_plugin()
+        with contextlib.nested(self.network(name='net1'),
+                               self.network(name='net2'),
+                               self.network(name='net3')
+                               ) as (net1, net2, net3):
+            # The following pages are filtered with the values held by
+            # the markers, the networks of the markers aren't looked up
+            with mock.patch.object(plugin, '_get_network') as get_network:
+                self._test_list_with_pagination('network',
+                                                (net1, net2, net3),
+                                                ('name', 'asc'), 2, 2,
+                                                query_params='fields=name',
+                                                verify_key='name')
+            self.assertFalse(get_network.called)
+
+    def test_list_networks_with_keyset_marker_missing_sort_key(self):
+        if self._skip_native_pagination:
+            self.skipTest("Skip test for not implemented pagination feature")
+        with self.network() as net:
+            marker = api_common.encode_keyset_marker(
+                {'id': net['network']['id']})
+            req = self.new_list_request(
+                'networks', params='limit=1&sort_key=name&sort_dir=asc'
+                                   '&marker=%s' % marker)
+            res = req.get_response(self.api)
+            self.assertEqual(res.status_int, webob.exc.HTTPBadRequest.code)
+
     def test_list_networks_with_pagination_emulated(self):
         helper_patcher = mock.patch(
             'neutron.api.v2.base.Controller._get_pagination_helper',
@@ -3584,6 +3665,136 @@ class TestSubnetsV2(NeutronDbPluginV2TestCase):
             q_exc.HostRoutesExhausted)
 
 
+class TestNativeBulkPortCreate(NeutronDbPluginV2TestCase):
+
+    def test_create_ports_bulk_does_not_query_per_port(self):
+        plugin = db_base_plugin_v2.NeutronDbPluginV2
+        with self.subnet() as subnet:
+            with contextlib.nested(
+                mock.patch.object(plugin, '_check_unique_mac'),
+                mock.patch.object(plugin, '_check_unique_ip'),
+                mock.patch.object(plugin, '_generate_ips',
+                                  wraps=plugin._generate_ips)
+            ) as (check_unique_mac, check_unique_ip, generate_ips):
+                res = self._create_port_bulk(self.fmt, 10,
+                                             subnet['subnet']['network_id'],
+                                             'test', True)
+            self.assertEqual(res.status_int, webob.exc.HTTPCreated.code)
+            ports = self.deserialize(self.fmt, res)['ports']
+            self.assertEqual(10, len(ports))
+            self.assertFalse(check_unique_mac.called)
+            self.assertFalse(check_unique_ip.called)
+            self.assertEqual(1, generate_ips.call_count)
+            for port in ports:
+                self._delete('ports', port['id'])
+
+    def test_create_ports_bulk_requested_mac_in_use(self):
+        with self.port() as port:
+            override = {1: {'mac_address': port['port']['mac_address']}}
+            res = self._create_port_bulk(self.fmt, 2,
+                                         port['port']['network_id'],
+                                         'test', True, override=override)
+            self.assertEqual(res.status_int, webob.exc.HTTPConflict.code)
+
+    def test_create_ports_bulk_requested_ip_in_use(self):
+        with self.port() as port:
+            override = {1: {'fixed_ips': port['port']['fixed_ips']}}
+            res = self._create_port_bulk(self.fmt, 2,
+                                         port['port']['network_id'],
+                                         'test', True, override=override)
+            self.assertEqual(res.status_int, webob.exc.HTTPConflict.code)
+
+    def test_create_ports_bulk_mac_generation_failure(self):
+        plugin = db_base_plugin_v2.NeutronDbPluginV2
+        with self.network() as net:
+            with mock.patch.object(plugin, '_get_macs_in_use',
+                                   side_effect=lambda ctx, net_id, macs:
+                                   set(macs)):
+                res = self._create_port_bulk(self.fmt, 2,
+                                             net['network']['id'],
+                                             'test', True)
+            self._validate_behavior_on_bulk_failure(
+                res, 'ports', webob.exc.HTTPServiceUnavailable.code)
+
+
+class TestListQueries(NeutronDbPluginV2TestCase):
+    """Check the queries run by list calls don't depend on their results."""
+
+    def _count_list_queries(self, resource):
+        with testlib_api.QueryCounter() as counter:
+            self._list(resource)
+        return counter.count
+
+    def _test_list_queries(self, resource, create_item):
+        create_item(0)
+        queries = self._count_list_queries(resource)
+        for i in range(1, 4):
+            create_item(i)
+        self.assertEqual(queries, self._count_list_queries(resource))
+
+    def test_list_networks_queries(self):
+        def create_network(i):
+            network = self._make_network(self.fmt, 'net%d' % i, True)
+            self._make_subnet(self.fmt, network, '10.0.%d.1' % i,
+                              '10.0.%d.0/24' % i)
+        self._test_list_queries('networks', create_network)
+
+    def test_list_subnets_queries(self):
+        def create_subnet(i):
+            network = self._make_network(self.fmt, 'net%d' % i, True)
+            self._make_subnet(self.fmt, network, '10.0.%d.1' % i,
+                              '10.0.%d.0/24' % i,
+                              dns_nameservers=['1.2.3.4', '4.3.2.1'],
+                              host_routes=[{'destination': '12.0.0.0/8',
+                                            'nexthop': '10.0.%d.2' % i}])
+        self._test_list_queries('subnets', create_subnet)
+
+    def test_list_ports_queries(self):
+        network = self._make_network(self.fmt, 'net', True)
+        self._make_subnet(self.fmt, network, '10.0.0.1', '10.0.0.0/24')
+        self._test_list_queries(
+            'ports',
+            lambda i: self._make_port(self.fmt, network['network']['id']))
+
+    def _test_list_fields(self, resource, fields, table, table_read):
+        # Only the dicts of the fetched resource are built without their
+        # extensions, the network of ports is read for policy checks
+        with contextlib.nested(
+            testlib_api.QueryCounter(),
+            mock.patch.object(db_base_plugin_v2.NeutronDbPluginV2,
+                              '_apply_dict_extend_functions')
+        ) as (counter, extend):
+            items = self._list(resource, query_params='&'.join(
+                'fields=%s' % field for field in fields))[resource]
+        self.assertNotIn(resource, [args[0] for args, kwargs in
+                                    extend.call_args_list])
+        self.assertTrue(items)
+        self.assertEqual([dict((field, item[field]) for field in fields)
+                          for item in self._list(resource)[resource]],
+                         items)
+        self.assertEqual(table_read, any(table in statement
+                                         for statement in counter.statements))
+
+    def test_list_ports_fields(self):
+        network = self._make_network(self.fmt, 'net', True)
+        self._make_subnet(self.fmt, network, '10.0.0.1', '10.0.0.0/24')
+        self._make_port(self.fmt, network['network']['id'])
+        self._test_list_fields('ports', ['id', 'tenant_id'],
+                               'ipallocations', False)
+        self._test_list_fields('ports', ['id', 'tenant_id', 'fixed_ips'],
+                               'ipallocations', True)
+
+    def test_list_subnets_fields(self):
+        network = self._make_network(self.fmt, 'net', True)
+        self._make_subnet(self.fmt, network, '10.0.0.1', '10.0.0.0/24',
+                          dns_nameservers=['1.2.3.4'])
+        self._test_list_fields('subnets', ['id', 'tenant_id', 'cidr'],
+                               'dnsnameservers', False)
+        self._test_list_fields('subnets', ['id', 'tenant_id',
+                                           'dns_nameservers'],
+                               'dnsnameservers', True)
+
+
 class DbModelTestCase(base.BaseTestCase):
     """DB model tests."""
     def test_repr(self):
@@ -42,7 +42,8 @@ class TestDhcpRpcCallackMixin(base.BaseTestCase):
         plugin_retval = [dict(id='a'), dict(id='b')]
         self.plugin.get_networks.return_value = plugin_retval
 
-        networks = self.callbacks.get_active_networks(mock.Mock(), host='host')
+        networks = self.callbacks.get_active_networks(mock.MagicMock(),
+                                                      host='host')
 
         self.assertEqual(networks, ['a', 'b'])
         self.plugin.assert_has_calls(
@@ -454,6 +454,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
                               'neutron.agent.linux.interface.NullDriver')
         config.register_root_helper(cfg.CONF)
         cfg.CONF.register_opts(dhcp_agent.DhcpAgent.OPTS)
+        cfg.CONF.set_override('dhcp_reload_delay', 0)
 
         self.plugin_p = mock.patch(DHCP_PLUGIN)
         plugin_cls = self.plugin_p.start()
@@ -846,6 +847,43 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.cache.assert_has_calls([mock.call.get_port_by_id('unknown')])
         self.assertEqual(self.call_driver.call_count, 0)
 
+    def test_port_events_reload_allocations_once(self):
+        cfg.CONF.set_override('dhcp_reload_delay', 0.5)
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.side_effect = [None, None, fake_port2]
+        with mock.patch.object(dhcp_agent.eventlet,
+                               'spawn_after') as spawn_after:
+            self.dhcp.port_create_end(None, dict(port=vars(fake_port1)))
+            self.dhcp.port_update_end(None, dict(port=vars(fake_port2)))
+            self.dhcp.port_delete_end(None, dict(port_id=fake_port2.id))
+            spawn_after.assert_called_once_with(
+                0.5, self.dhcp.reload_pending_allocations)
+        self.assertFalse(self.call_driver.called)
+
+        self.dhcp.reload_pending_allocations()
+        removed_ips = [fixed_ip.ip_address
+                       for fixed_ip in fake_port2.fixed_ips]
+        self.assertEqual(
+            [mock.call('reload_allocations', fake_network),
+             mock.call('release_lease',
+                       fake_network,
+                       mac_address=fake_port2.mac_address,
+                       removed_ips=removed_ips)],
+            self.call_driver.call_args_list)
+        self.assertIsNone(self.dhcp.reload_timer)
+        self.assertEqual({}, self.dhcp.pending_reloads)
+
+    def test_reload_pending_allocations_deleted_network(self):
+        cfg.CONF.set_override('dhcp_reload_delay', 0.5)
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = None
+        with mock.patch.object(dhcp_agent.eventlet, 'spawn_after'):
+            self.dhcp.port_create_end(None, dict(port=vars(fake_port1)))
+        self.cache.get_network_by_id.return_value = None
+
+        self.dhcp.reload_pending_allocations()
+        self.assertFalse(self.call_driver.called)
+
 
 class TestDhcpPluginApiProxy(base.BaseTestCase):
     def setUp(self):
@@ -0,0 +1,114 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent.linux import ipset_manager
+from neutron.tests import base
+
+
+SG_ID = 'fake_sg_id'
+NAME = 'IPv4fake_sg_id'
+
+
+class IpsetManagerTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IpsetManagerTestCase, self).setUp()
+        self.execute = mock.Mock()
+        self.ipset = ipset_manager.IpsetManager(execute=self.execute,
+                                                root_helper='sudo')
+
+    def _assert_restore(self, commands):
+        self.execute.assert_called_once_with(
+            ['ipset', 'restore', '-exist'],
+            process_input='\n'.join(commands) + '\n',
+            root_helper='sudo')
+
+    def _set_members(self, member_ips):
+        self.ipset.set_members(SG_ID, 'IPv4', member_ips)
+
+    def test_get_ipset_name(self):
+        self.assertEqual(NAME, ipset_manager.get_ipset_name(SG_ID, 'IPv4'))
+        name = ipset_manager.get_ipset_name('a' * 36, 'IPv6')
+        self.assertEqual('IPv6' + 'a' * 23, name)
+        self.assertEqual(ipset_manager.IPSET_NAME_MAX_LEN,
+                         len(name + ipset_manager.SWAP_SUFFIX))
+
+    def test_set_members_of_new_set(self):
+        self._set_members(['10.0.0.3/32', '10.0.0.2/32'])
+
+        self._assert_restore(['create %s hash:net family inet' % NAME,
+                              'create %s-new hash:net family inet' % NAME,
+                              'flush %s-new' % NAME,
+                              'add %s-new 10.0.0.2/32' % NAME,
+                              'add %s-new 10.0.0.3/32' % NAME,
+                              'swap %s-new %s' % (NAME, NAME),
+                              'destroy %s-new' % NAME])
+        self.assertEqual({(SG_ID, 'IPv4'): set(['10.0.0.2/32',
+                                                '10.0.0.3/32'])},
+                         self.ipset.ipsets)
+
+    def test_set_members_adds_and_deletes_changed_members(self):
+        self._set_members(['10.0.0.2/32', '10.0.0.3/32', '10.0.0.4/32'])
+        self.execute.reset_mock()
+
+        self._set_members(['10.0.0.2/32', '10.0.0.3/32', '10.0.0.5/32'])
+
+        self._assert_restore(['del %s 10.0.0.4/32' % NAME,
+                              'add %s 10.0.0.5/32' % NAME])
+
+    def test_set_members_swaps_when_most_members_change(self):
+        self._set_members(['10.0.0.2/32', '10.0.0.3/32'])
+        self.execute.reset_mock()
+
+        self._set_members(['10.0.0.4/32'])
+
+        self._assert_restore(['create %s hash:net family inet' % NAME,
+                              'create %s-new hash:net family inet' % NAME,
+                              'flush %s-new' % NAME,
+                              'add %s-new 10.0.0.4/32' % NAME,
+                              'swap %s-new %s' % (NAME, NAME),
+                              'destroy %s-new' % NAME])
+
+    def test_set_members_unchanged(self):
+        self._set_members(['10.0.0.2/32'])
+        self.execute.reset_mock()
+
+        self._set_members(['10.0.0.2/32'])
+
+        self.assertFalse(self.execute.called)
+
+    def test_set_members_of_ipv6_set(self):
+        self.ipset.set_members(SG_ID, 'IPv6', ['fe80::2/128'])
+
+        self.assertIn('create IPv6fake_sg_id hash:net family inet6\n',
+                      self.execute.call_args[1]['process_input'])
+
+    def test_destroy(self):
+        self._set_members(['10.0.0.2/32'])
+        self.execute.reset_mock()
+
+        self.ipset.destroy(SG_ID, 'IPv4')
+
+        self._assert_restore(['destroy %s' % NAME])
+        self.assertEqual({}, self.ipset.ipsets)
+
+    def test_destroy_unknown_set(self):
+        self.ipset.destroy(SG_ID, 'IPv4')
+
+        self.assertFalse(self.execute.called)
@@ -1134,3 +1134,98 @@ class IptablesFirewallTestCase(base.BaseTestCase):
                  call.add_rule('ofake_dev', '-j $sg-fallback'),
                  call.add_rule('sg-chain', '-j ACCEPT')]
         self.v4filter_inst.assert_has_calls(calls)
+
+
+class IptablesFirewallIpsetTestCase(IptablesFirewallTestCase):
+    def setUp(self):
+        cfg.CONF.set_override('enable_ipset', True, 'SECURITYGROUP')
+        super(IptablesFirewallIpsetTestCase, self).setUp()
+
+    def _fake_port_with_members(self, *member_ips):
+        port = self._fake_port()
+        port['security_group_rules'] = [
+            {'ethertype': 'IPv4',
+             'direction': 'ingress',
+             'protocol': 'tcp',
+             'port_range_min': 22,
+             'port_range_max': 22,
+             'remote_group_id': 'fake_sg_id',
+             'source_ip_prefix': member_ip} for member_ip in member_ips]
+        return port
+
+    def _get_ipset_inputs(self):
+        return [c[1]['process_input'] for c in self.utils_exec.call_args_list
+                if c[0][0][:2] == ['ipset', 'restore']]
+
+    def test_prepare_port_filter_with_remote_group(self):
+        port = self._fake_port_with_members('10.0.0.2/32', '10.0.0.3/32')
+        self.firewall.prepare_port_filter(port)
+
+        remote_group_rule = call.add_rule(
+            'ifake_dev', '-p tcp -m tcp --dport 22 -m set --match-set '
+            'IPv4fake_sg_id src -j RETURN')
+        self.v4filter_inst.assert_has_calls([remote_group_rule])
+        self.assertEqual(
+            1, self.v4filter_inst.method_calls.count(remote_group_rule))
+        self.assertNotIn(
+            call.add_rule('ifake_dev', '-s 10.0.0.2/32 -p tcp -m tcp '
+                          '--dport 22 -j RETURN'),
+            self.v4filter_inst.method_calls)
+        ipset_inputs = self._get_ipset_inputs()
+        self.assertEqual(1, len(ipset_inputs))
+        self.assertIn('add IPv4fake_sg_id-new 10.0.0.2/32\n'
+                      'add IPv4fake_sg_id-new 10.0.0.3/32\n',
+                      ipset_inputs[0])
+
+    def test_member_update_only_updates_ipset(self):
+        port = self._fake_port_with_members('10.0.0.2/32', '10.0.0.3/32')
+        self.firewall.prepare_port_filter(port)
+        self.v4filter_inst.reset_mock()
+        self.utils_exec.reset_mock()
+
+        port = self._fake_port_with_members('10.0.0.2/32', '10.0.0.4/32')
+        with self.firewall.defer_apply():
+            self.firewall.update_port_filter(port)
+
+        self.assertEqual([], self.v4filter_inst.method_calls)
+        self.assertEqual(['del IPv4fake_sg_id 10.0.0.3/32\n'
+                          'add IPv4fake_sg_id 10.0.0.4/32\n'],
+                         self._get_ipset_inputs())
+
+    def test_rule_update_rewrites_chains(self):
+        port = self._fake_port_with_members('10.0.0.2/32')
+        self.firewall.prepare_port_filter(port)
+        self.v4filter_inst.reset_mock()
+
+        port = self._fake_port_with_members('10.0.0.2/32')
+        port['security_group_rules'][0]['port_range_max'] = 23
+        with self.firewall.defer_apply():
+            self.firewall.update_port_filter(port)
+
+        self.v4filter_inst.assert_has_calls([
+            call.ensure_remove_chain('ifake_dev')])
+        self.v4filter_inst.assert_has_calls([
+            call.add_rule('ifake_dev', '-p tcp -m tcp -m multiport '
+                          '--dports 22:23 -m set --match-set '
+                          'IPv4fake_sg_id src -j RETURN')])
+
+    def test_defer_chain_apply_coalesce_simple(self):
+        chain_applies = self._mock_chain_applies()
+        port = self._fake_port()
+        with self.firewall.defer_apply():
+            self.firewall.prepare_port_filter(port)
+            self.firewall.update_port_filter(port)
+            self.firewall.remove_port_filter(port)
+        # The chains of the ports didn't change
+        self.assertEqual([], chain_applies.mock_calls)
+
+    def test_remove_port_filter_destroys_unused_ipset(self):
+        port = self._fake_port_with_members('10.0.0.2/32')
+        self.firewall.prepare_port_filter(port)
+        self.utils_exec.reset_mock()
+
+        self.firewall.remove_port_filter(port)
+
+        self.assertEqual(['destroy IPv4fake_sg_id\n'],
+                         self._get_ipset_inputs())
+        self.assertEqual({}, self.firewall.ipset.ipsets)
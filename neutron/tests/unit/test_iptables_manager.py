@@ -21,6 +21,7 @@ import inspect
 import os
 
 import mock
+from oslo.config import cfg
 
 from neutron.agent.linux import iptables_manager
 from neutron.tests import base
@@ -68,6 +69,7 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
 
     def setUp(self):
         super(IptablesManagerStateFulTestCase, self).setUp()
+        self.config(iptables_full_sync_interval=0)
         self.root_helper = 'sudo'
         self.iptables = (iptables_manager.
                          IptablesManager(root_helper=self.root_helper))
@@ -454,6 +456,79 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
 
         tools.verify_mock_calls(self.execute, expected_calls_and_values)
 
+    def _modify_filter_rules(self, saved_dump):
+        table = self.iptables.ipv4['filter']
+        table.add_chain('filter')
+        table.add_rule('filter', '-j DROP')
+        table.add_rule('INPUT', '-s 10.0.0.2 -j $filter')
+        lines = self.iptables._modify_rules(
+            (saved_dump % IPTABLES_ARG).split('\n'), table, 'filter')
+        return '\n'.join(lines)
+
+    def test_modify_rules_preserves_counters(self):
+        saved_dump = ('# Generated by iptables-save\n'
+                      '*filter\n'
+                      ':INPUT ACCEPT [0:0]\n'
+                      ':FORWARD ACCEPT [0:0]\n'
+                      ':OUTPUT ACCEPT [0:0]\n'
+                      ':%(bn)s-FORWARD - [0:0]\n'
+                      ':%(bn)s-INPUT - [0:0]\n'
+                      ':%(bn)s-local - [0:0]\n'
+                      ':%(bn)s-OUTPUT - [0:0]\n'
+                      ':%(bn)s-filter - [0:0]\n'
+                      ':%(bn)s-stale - [0:0]\n'
+                      '[4:40] -A INPUT -j %(bn)s-INPUT\n'
+                      '[5:50] -A OUTPUT -j %(bn)s-OUTPUT\n'
+                      '[6:60] -A FORWARD -j %(bn)s-FORWARD\n'
+                      '[7:70] -A %(bn)s-filter -j DROP\n'
+                      '[8:80] -A %(bn)s-stale -j DROP\n'
+                      '[9:90] -A INPUT -j ACCEPT\n'
+                      '[11:110] -A %(bn)s-filter -j DROP\n'
+                      'COMMIT\n'
+                      '# Completed by iptables-save')
+        expected = ('# Generated by iptables-save\n'
+                    '*filter\n'
+                    ':INPUT ACCEPT [0:0]\n'
+                    ':FORWARD ACCEPT [0:0]\n'
+                    ':OUTPUT ACCEPT [0:0]\n'
+                    ':neutron-filter-top - [0:0]\n'
+                    ':%(bn)s-FORWARD - [0:0]\n'
+                    ':%(bn)s-INPUT - [0:0]\n'
+                    ':%(bn)s-local - [0:0]\n'
+                    ':%(bn)s-filter - [0:0]\n'
+                    ':%(bn)s-OUTPUT - [0:0]\n'
+                    '[0:0] -A FORWARD -j neutron-filter-top\n'
+                    '[0:0] -A OUTPUT -j neutron-filter-top\n'
+                    '[0:0] -A neutron-filter-top -j %(bn)s-local\n'
+                    '[4:40] -A INPUT -j %(bn)s-INPUT\n'
+                    '[5:50] -A OUTPUT -j %(bn)s-OUTPUT\n'
+                    '[6:60] -A FORWARD -j %(bn)s-FORWARD\n'
+                    '[11:110] -A %(bn)s-filter -j DROP\n'
+                    '[0:0] -A %(bn)s-INPUT -s 10.0.0.2 -j %(bn)s-filter\n'
+                    '[9:90] -A INPUT -j ACCEPT\n'
+                    'COMMIT\n'
+                    '# Completed by iptables-save' % IPTABLES_ARG)
+
+        self.assertEqual(expected, self._modify_filter_rules(saved_dump))
+
+    def test_modify_rules_removes_unwrapped_rule(self):
+        saved_dump = ('# Generated by iptables-save\n'
+                      '*filter\n'
+                      ':INPUT ACCEPT [0:0]\n'
+                      ':FORWARD ACCEPT [0:0]\n'
+                      ':OUTPUT ACCEPT [0:0]\n'
+                      '[9:90] -A INPUT -j ACCEPT\n'
+                      '[10:100] -A INPUT -j ACCEPT\n'
+                      'COMMIT\n'
+                      '# Completed by iptables-save')
+        table = self.iptables.ipv4['filter']
+        table.add_rule('INPUT', '-j ACCEPT', wrap=False)
+        table.remove_rule('INPUT', '-j ACCEPT', wrap=False)
+
+        self.assertNotIn('-A INPUT -j ACCEPT',
+                         self._modify_filter_rules(saved_dump))
+        self.assertEqual([], table.remove_rules)
+
     def test_add_rule_to_a_nonexistent_chain(self):
         self.assertRaises(LookupError, self.iptables.ipv4['filter'].add_rule,
                           'nonexistent', '-j DROP')
@@ -548,6 +623,150 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
         tools.verify_mock_calls(self.execute, expected_calls_and_values)
 
 
+class IptablesManagerDirtyChainsTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IptablesManagerDirtyChainsTestCase, self).setUp()
+        self.root_helper = 'sudo'
+        self.iptables = iptables_manager.IptablesManager(
+            root_helper=self.root_helper, state_less=True)
+        self.execute = mock.patch.object(self.iptables, "execute").start()
+        self.time = mock.patch('time.time', return_value=1000).start()
+        self.addCleanup(mock.patch.stopall)
+        self.filter = self.iptables.ipv4['filter']
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+    def _assert_noflush_restore(self, process_input):
+        self.execute.assert_called_once_with(
+            ['iptables-restore', '--noflush'],
+            process_input=process_input % IPTABLES_ARG,
+            root_helper=self.root_helper)
+
+    def test_first_apply_is_full(self):
+        self.assertEqual(1000, self.iptables.last_full_sync)
+        self.assertFalse(self.filter.full_sync_required)
+        self.assertEqual(set(), self.filter.dirty_chains)
+
+    def test_apply_without_changes(self):
+        self.iptables.apply()
+
+        self.assertFalse(self.execute.called)
+
+    def test_apply_rewrites_changed_chains(self):
+        self.filter.add_chain('filter')
+        self.filter.add_rule('filter', '-j DROP')
+        self.filter.add_rule('INPUT', '-s 10.0.0.2 -j $filter', top=True)
+        self.filter.add_rule('INPUT', '-j $local')
+        self.iptables.apply()
+
+        self._assert_noflush_restore('*filter\n'
+                                     ':%(bn)s-INPUT - [0:0]\n'
+                                     ':%(bn)s-filter - [0:0]\n'
+                                     '-A %(bn)s-INPUT -s 10.0.0.2 -j '
+                                     '%(bn)s-filter\n'
+                                     '-A %(bn)s-filter -j DROP\n'
+                                     '-A %(bn)s-INPUT -j %(bn)s-local\n'
+                                     'COMMIT')
+        self.assertEqual(set(), self.filter.dirty_chains)
+
+    def test_apply_skips_chains_added_back_unchanged(self):
+        self.filter.add_chain('filter')
+        self.filter.add_rule('filter', '-j DROP')
+        self.filter.add_rule('INPUT', '-j $filter')
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        self.filter.remove_chain('filter')
+        self.filter.add_chain('filter')
+        self.filter.add_rule('filter', '-j DROP')
+        self.filter.add_rule('INPUT', '-j $filter')
+        self.iptables.apply()
+
+        self.assertFalse(self.execute.called)
+        self.assertEqual(set(), self.filter.dirty_chains)
+
+    def test_apply_rewrites_only_chains_which_differ(self):
+        self.filter.add_chain('filter1')
+        self.filter.add_chain('filter2')
+        self.filter.add_rule('filter1', '-j DROP')
+        self.filter.add_rule('filter2', '-j DROP')
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        self.filter.empty_chain('filter1')
+        self.filter.empty_chain('filter2')
+        self.filter.add_rule('filter1', '-j DROP')
+        self.filter.add_rule('filter2', '-j ACCEPT')
+        self.iptables.apply()
+
+        self._assert_noflush_restore('*filter\n'
+                                     ':%(bn)s-filter2 - [0:0]\n'
+                                     '-A %(bn)s-filter2 -j ACCEPT\n'
+                                     'COMMIT')
+
+    def test_full_sync_records_applied_chains(self):
+        self.filter.add_chain('filter')
+        self.filter.add_rule('filter', '-j DROP')
+        self.time.return_value = 1000 + cfg.CONF.iptables_full_sync_interval
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        self.filter.empty_chain('filter')
+        self.filter.add_rule('filter', '-j DROP')
+        self.iptables.apply()
+
+        self.assertFalse(self.execute.called)
+        self.assertEqual(['-A %(bn)s-filter -j DROP' % IPTABLES_ARG],
+                         self.filter.applied_chains['filter'])
+
+    def test_apply_deletes_removed_chains(self):
+        self.filter.add_chain('filter')
+        self.filter.add_rule('filter', '-j DROP')
+        self.filter.add_rule('INPUT', '-j $filter')
+        self.filter.add_rule('INPUT', '-j ACCEPT')
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        self.filter.remove_chain('filter')
+        self.iptables.apply()
+
+        self._assert_noflush_restore('*filter\n'
+                                     ':%(bn)s-INPUT - [0:0]\n'
+                                     ':%(bn)s-filter - [0:0]\n'
+                                     '-A %(bn)s-INPUT -j ACCEPT\n'
+                                     '-X %(bn)s-filter\n'
+                                     'COMMIT')
+
+    def test_apply_with_unwrapped_change_is_full(self):
+        self.filter.add_rule('INPUT', '-j ACCEPT', wrap=False)
+        self.iptables.apply()
+
+        self.assertEqual(2, self.execute.call_count)
+        self.assertEqual(['iptables-save', '-c'],
+                         self.execute.call_args_list[0][0][0])
+        self.assertFalse(self.filter.full_sync_required)
+
+    def test_apply_after_full_sync_interval_is_full(self):
+        self.filter.add_chain('filter')
+        self.time.return_value = 1000 + cfg.CONF.iptables_full_sync_interval
+        self.iptables.apply()
+
+        self.assertEqual(2, self.execute.call_count)
+        self.assertEqual(self.time.return_value,
+                         self.iptables.last_full_sync)
+
+    def test_apply_falls_back_to_full_on_error(self):
+        self.execute.side_effect = [RuntimeError(), '', None]
+        self.filter.add_chain('filter')
+        self.iptables.apply()
+
+        self.assertEqual(
+            [['iptables-restore', '--noflush'], ['iptables-save', '-c'],
+             ['iptables-restore', '-c']],
+            [call[0][0] for call in self.execute.call_args_list])
+
+
 class IptablesManagerStateLessTestCase(base.BaseTestCase):
 
     def setUp(self):
@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import copy
 
 import mock
@@ -27,6 +28,7 @@ from neutron.agent.linux import interface
 from neutron.common import config as base_config
 from neutron.common import constants as l3_constants
 from neutron.common import exceptions as n_exc
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.openstack.common import uuidutils
 from neutron.tests import base
 
@@ -420,76 +422,116 @@ class TestBasicRouterOperations(base.BaseTestCase):
         self.send_arp.assert_called_once()
         self.assertFalse(agent.process_router_floating_ips.called)
 
-    @mock.patch('neutron.agent.linux.ip_lib.IPDevice')
-    def test_process_router_floating_ip_add(self, IPDevice):
-        fip = {
-            'id': _uuid(), 'port_id': _uuid(),
-            'floating_ip_address': '15.1.2.3',
-            'fixed_ip_address': '192.168.0.1'
-        }
+    def _floating_ip_router(self, *fips):
+        router = {'id': _uuid(),
+                  l3_constants.FLOATINGIP_KEY: [
+                      {'id': _uuid(), 'port_id': _uuid(),
+                       'floating_ip_address': floating_ip,
+                       'fixed_ip_address': fixed_ip}
+                      for floating_ip, fixed_ip in fips]}
+        return l3_agent.RouterInfo(router['id'], self.conf.root_helper,
+                                   self.conf.use_namespaces, router)
+
+    def _nat_rules(self, ri):
+        nat = ri.iptables_manager.ipv4['nat']
+        return [(r.chain, r.rule) for r in nat.rules if r.tag == 'floating_ip']
 
-        IPDevice.return_value = device = mock.Mock()
+    def test_process_router_floating_ip_add(self):
+        device = self.mock_ip.device.return_value
         device.addr.list.return_value = []
-
-        ri = mock.MagicMock()
-        ri.router.get.return_value = [fip]
+        ri = self._floating_ip_router(('15.1.2.3', '192.168.0.1'))
 
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
 
         agent.process_router_floating_ips(ri, {'id': _uuid()})
 
         device.addr.add.assert_called_once_with(4, '15.1.2.3/32', '15.1.2.3')
+        self.assertEqual(
+            agent.floating_forward_rules('15.1.2.3', '192.168.0.1'),
+            self._nat_rules(ri))
+        self.assertEqual({'15.1.2.3': '192.168.0.1'}, ri.floating_ips)
 
-        nat = ri.iptables_manager.ipv4['nat']
-        nat.clear_rules_by_tag.assert_called_once_with('floating_ip')
-        rules = agent.floating_forward_rules('15.1.2.3', '192.168.0.1')
-        for chain, rule in rules:
-            nat.add_rule.assert_any_call(chain, rule, tag='floating_ip')
-
-    @mock.patch('neutron.agent.linux.ip_lib.IPDevice')
-    def test_process_router_floating_ip_remove(self, IPDevice):
-        IPDevice.return_value = device = mock.Mock()
-        device.addr.list.return_value = [{'cidr': '15.1.2.3/32'}]
+    def test_process_router_floating_ip_add_to_existing(self):
+        device = self.mock_ip.device.return_value
+        device.addr.list.return_value = []
+        ri = self._floating_ip_router(('15.1.2.3', '192.168.0.1'))
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.process_router_floating_ips(ri, {'id': _uuid()})
+        device.reset_mock()
 
-        ri = mock.MagicMock()
-        ri.router.get.return_value = []
+        ri.router = self._floating_ip_router(
+            ('15.1.2.3', '192.168.0.1'), ('15.1.2.4', '192.168.0.2')).router
+        with mock.patch.object(ri.iptables_manager.ipv4['nat'],
+                               'add_rule') as add_rule:
+            agent.process_router_floating_ips(ri, {'id': _uuid()})
 
-        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.assertFalse(device.addr.list.called)
+        device.addr.add.assert_called_once_with(4, '15.1.2.4/32', '15.1.2.4')
+        self.assertFalse(device.addr.delete.called)
+        self.assertEqual(
+            [mock.call(chain, rule, tag='floating_ip') for chain, rule in
+             agent.floating_forward_rules('15.1.2.4', '192.168.0.2')],
+            add_rule.call_args_list)
 
+    def test_process_router_floating_ip_unchanged(self):
+        device = self.mock_ip.device.return_value
+        device.addr.list.return_value = []
+        ri = self._floating_ip_router(('15.1.2.3', '192.168.0.1'))
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.process_router_floating_ips(ri, {'id': _uuid()})
+        ri.iptables_manager.apply()
+        device.reset_mock()
+        self.utils_exec.reset_mock()
 
-        device.addr.delete.assert_called_once_with(4, '15.1.2.3/32')
-
-        nat = ri.iptables_manager.ipv4['nat']
-        nat = ri.iptables_manager.ipv4['nat']
-        nat.clear_rules_by_tag.assert_called_once_with('floating_ip')
+        agent.process_router_floating_ips(ri, {'id': _uuid()})
+        ri.iptables_manager.apply()
 
-    @mock.patch('neutron.agent.linux.ip_lib.IPDevice')
-    def test_process_router_floating_ip_remap(self, IPDevice):
-        fip = {
-            'id': _uuid(), 'port_id': _uuid(),
-            'floating_ip_address': '15.1.2.3',
-            'fixed_ip_address': '192.168.0.2'
-        }
+        self.assertFalse(device.addr.list.called)
+        self.assertFalse(device.addr.add.called)
+        self.assertFalse(device.addr.delete.called)
+        self.assertFalse(self.utils_exec.called)
 
-        IPDevice.return_value = device = mock.Mock()
+    def test_process_router_floating_ip_remove(self):
+        device = self.mock_ip.device.return_value
         device.addr.list.return_value = [{'cidr': '15.1.2.3/32'}]
-        ri = mock.MagicMock()
+        ri = self._floating_ip_router(('15.1.2.3', '192.168.0.1'))
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.process_router_floating_ips(ri, {'id': _uuid()})
 
-        ri.router.get.return_value = [fip]
+        ri.router = self._floating_ip_router().router
+        agent.process_router_floating_ips(ri, {'id': _uuid()})
 
+        device.addr.delete.assert_called_once_with(4, '15.1.2.3/32')
+        self.assertEqual([], self._nat_rules(ri))
+        self.assertEqual({}, ri.floating_ips)
+
+    def test_process_router_floating_ip_remap(self):
+        device = self.mock_ip.device.return_value
+        device.addr.list.return_value = [{'cidr': '15.1.2.3/32'}]
+        ri = self._floating_ip_router(('15.1.2.3', '192.168.0.1'))
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.process_router_floating_ips(ri, {'id': _uuid()})
 
+        ri.router = self._floating_ip_router(
+            ('15.1.2.3', '192.168.0.2')).router
         agent.process_router_floating_ips(ri, {'id': _uuid()})
 
         self.assertFalse(device.addr.add.called)
         self.assertFalse(device.addr.delete.called)
+        self.assertEqual(
+            agent.floating_forward_rules('15.1.2.3', '192.168.0.2'),
+            self._nat_rules(ri))
 
-        nat = ri.iptables_manager.ipv4['nat']
-        nat.clear_rules_by_tag.assert_called_once_with('floating_ip')
-        rules = agent.floating_forward_rules('15.1.2.3', '192.168.0.2')
-        for chain, rule in rules:
-            nat.add_rule.assert_any_call(chain, rule, tag='floating_ip')
+    def test_process_router_floating_ip_failure_relists(self):
+        device = self.mock_ip.device.return_value
+        device.addr.list.return_value = []
+        device.addr.add.side_effect = RuntimeError
+        ri = self._floating_ip_router(('15.1.2.3', '192.168.0.1'))
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+
+        self.assertRaises(RuntimeError, agent.process_router_floating_ips,
+                          ri, {'id': _uuid()})
+        self.assertIsNone(ri.floating_ip_cidrs)
 
     def test_process_router_snat_disabled(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
@@ -640,20 +682,50 @@ class TestBasicRouterOperations(base.BaseTestCase):
 
     def test_handle_router_snat_rules_add_back_jump(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
-        ri = mock.MagicMock()
+        ri = l3_agent.RouterInfo(_uuid(), self.conf.root_helper,
+                                 self.conf.use_namespaces, None)
         port = {'fixed_ips': [{'ip_address': '192.168.1.4'}]}
 
+        agent._handle_router_snat_rules(ri, port, ['10.0.0.0/24'], "iface",
+                                        "add_rules")
         agent._handle_router_snat_rules(ri, port, [], "iface", "add_rules")
 
         nat = ri.iptables_manager.ipv4['nat']
-        nat.empty_chain.assert_any_call('snat')
-        nat.add_rule.assert_any_call('snat', '-j $float-snat')
-        for call in nat.mock_calls:
-            name, args, kwargs = call
-            if name == 'add_rule':
-                self.assertEqual(args, ('snat', '-j $float-snat'))
-                self.assertEqual(kwargs, {})
-                break
+        snat_rules = [r.rule for r in nat.rules if r.chain == 'snat']
+        wrap_name = ri.iptables_manager.wrap_name
+        self.assertEqual(['-j %s-float-snat' % wrap_name], snat_rules)
+
+    def test_handle_router_snat_rules_unchanged(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        ri = l3_agent.RouterInfo(_uuid(), self.conf.root_helper,
+                                 self.conf.use_namespaces, None)
+        port = {'fixed_ips': [{'ip_address': '192.168.1.4'}]}
+        agent._handle_router_snat_rules(ri, port, ['10.0.0.0/24'], "iface",
+                                        "add_rules")
+        ri.iptables_manager.apply()
+        self.utils_exec.reset_mock()
+
+        agent._handle_router_snat_rules(ri, port, ['10.0.0.0/24'], "iface",
+                                        "add_rules")
+        ri.iptables_manager.apply()
+
+        self.assertFalse(self.utils_exec.called)
+
+    def test_handle_router_snat_rules_remove_rules(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        ri = l3_agent.RouterInfo(_uuid(), self.conf.root_helper,
+                                 self.conf.use_namespaces, None)
+        port = {'fixed_ips': [{'ip_address': '192.168.1.4'}]}
+        nat = ri.iptables_manager.ipv4['nat']
+        initial_rules = list(nat.rules)
+        agent._handle_router_snat_rules(ri, port, ['10.0.0.0/24'], "iface",
+                                        "add_rules")
+
+        agent._handle_router_snat_rules(ri, port, ['10.0.0.0/24'], "iface",
+                                        "remove_rules")
+
+        self.assertEqual(initial_rules, nat.rules)
+        self.assertEqual([], ri.snat_rules)
 
     def test_handle_router_snat_rules_add_rules(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
@@ -690,31 +762,100 @@ class TestBasicRouterOperations(base.BaseTestCase):
         agent._process_routers(routers)
         self.assertNotIn(routers[0]['id'], agent.router_info)
 
+    def _queued_updates(self, agent):
+        updates = []
+        while len(agent.router_updates):
+            update = agent.router_updates.get()
+            agent.router_updates.done(update)
+            updates.append((update.router_id, update.priority, update.action,
+                            update.router))
+        return updates
+
+    def _sync_routers_task(self, router_ids, routers):
+        self.conf.set_override('sync_routers_chunk_size', 2)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.router_info['stale-id'] = mock.Mock()
+        self.plugin_api.get_router_ids.return_value = router_ids
+        self.plugin_api.get_routers.side_effect = routers
+        agent._sync_routers_task(agent.context)
+        self.assertFalse(agent.fullsync)
+        return agent
+
+    def test_sync_routers_task_in_chunks(self):
+        routers = [{'id': 'id%d' % i} for i in range(3)]
+        agent = self._sync_routers_task(['id0', 'id1', 'id2'],
+                                        [routers[:2], routers[2:]])
+        self.assertEqual(
+            [mock.call(agent.context, ['id0', 'id1'], full_sync=True),
+             mock.call(agent.context, ['id2'], full_sync=True)],
+            self.plugin_api.get_routers.call_args_list)
+        sync = l3_agent.PRIORITY_SYNC_ROUTERS_TASK
+        self.assertEqual(
+            [(router['id'], sync, l3_agent.UPDATE_ROUTER, router)
+             for router in routers] +
+            [('stale-id', sync, l3_agent.DELETE_ROUTER, None)],
+            self._queued_updates(agent))
+
+    def test_sync_routers_task_shrinks_chunks_on_timeout(self):
+        routers = [{'id': 'id%d' % i} for i in range(3)]
+        agent = self._sync_routers_task(
+            ['id0', 'id1', 'id2'],
+            [rpc_common.Timeout(), routers[:1], routers[1:2], routers[2:]])
+        self.assertEqual(
+            [mock.call(agent.context, ['id0', 'id1'], full_sync=True),
+             mock.call(agent.context, ['id0'], full_sync=True),
+             mock.call(agent.context, ['id1'], full_sync=True),
+             mock.call(agent.context, ['id2'], full_sync=True)],
+            self.plugin_api.get_routers.call_args_list)
+        self.assertEqual(4, len(agent.router_updates))
+        self.assertEqual(1, agent.sync_routers_chunk_size)
+
+    def test_sync_routers_task_router_ids_unsupported(self):
+        routers = [{'id': 'id0'}]
+        agent = self._sync_routers_task(None, [routers])
+        self.plugin_api.get_routers.assert_called_once_with(agent.context)
+        self.assertEqual(
+            ['id0', 'stale-id'],
+            [update[0] for update in self._queued_updates(agent)])
+
+    def test_sync_routers_task_timeout_with_chunks_of_one_router(self):
+        self.conf.set_override('sync_routers_chunk_size', 1)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_router_ids.return_value = ['id0']
+        self.plugin_api.get_routers.side_effect = rpc_common.Timeout()
+        agent._sync_routers_task(agent.context)
+        self.assertEqual(1, self.plugin_api.get_routers.call_count)
+        self.assertTrue(agent.fullsync)
+
     def test_router_deleted(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.router_deleted(None, FAKE_ID)
-        # verify that will set fullsync
-        self.assertIn(FAKE_ID, agent.removed_routers)
+        self.assertEqual(
+            [(FAKE_ID, l3_agent.PRIORITY_RPC, l3_agent.DELETE_ROUTER, None)],
+            self._queued_updates(agent))
 
     def test_routers_updated(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.routers_updated(None, [FAKE_ID])
-        # verify that will set fullsync
-        self.assertIn(FAKE_ID, agent.updated_routers)
+        self.assertEqual(
+            [(FAKE_ID, l3_agent.PRIORITY_RPC, l3_agent.UPDATE_ROUTER, None)],
+            self._queued_updates(agent))
 
     def test_removed_from_agent(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.router_removed_from_agent(None, {'router_id': FAKE_ID})
-        # verify that will set fullsync
-        self.assertIn(FAKE_ID, agent.removed_routers)
+        self.assertEqual(
+            [(FAKE_ID, l3_agent.PRIORITY_RPC, l3_agent.DELETE_ROUTER, None)],
+            self._queued_updates(agent))
 
     def test_added_to_agent(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.router_added_to_agent(None, [FAKE_ID])
-        # verify that will set fullsync
-        self.assertIn(FAKE_ID, agent.updated_routers)
+        self.assertEqual(
+            [(FAKE_ID, l3_agent.PRIORITY_RPC, l3_agent.UPDATE_ROUTER, None)],
+            self._queued_updates(agent))
 
-    def test_process_router_delete(self):
+    def test_process_router_update_delete(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         ex_gw_port = {'id': _uuid(),
                       'network_id': _uuid(),
@@ -729,8 +870,123 @@ class TestBasicRouterOperations(base.BaseTestCase):
             'gw_port': ex_gw_port}
         agent._router_added(router['id'], router)
         agent.router_deleted(None, router['id'])
-        agent._process_router_delete()
-        self.assertFalse(list(agent.removed_routers))
+        agent._process_router_update(agent.router_updates.get())
+        self.assertNotIn(router['id'], agent.router_info)
+        self.assertEqual(1, agent.router_update_stats['updates'])
+
+    def test_process_router_update_fetches_router(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.fullsync = False
+        router = {'id': FAKE_ID}
+        self.plugin_api.get_routers.return_value = [router]
+        agent.routers_updated(None, [FAKE_ID])
+        with mock.patch.object(agent, '_process_routers') as process_routers:
+            agent._process_router_update(agent.router_updates.get())
+        self.plugin_api.get_routers.assert_called_once_with(agent.context,
+                                                            [FAKE_ID])
+        process_routers.assert_called_once_with([router])
+        self.assertFalse(agent.fullsync)
+
+    def test_sync_data_older_than_processed_update_dropped(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        fresh_router = {'id': FAKE_ID, 'routes': ['fresh']}
+        stale_router = {'id': FAKE_ID, 'routes': ['stale']}
+        agent.routers_updated(None, [FAKE_ID])
+        update = agent.router_updates.get()
+        with contextlib.nested(
+            mock.patch('time.time'),
+            mock.patch.object(agent, '_process_routers')
+        ) as (time, process_routers):
+            # The sync starts and reads the router while its notified update
+            # is processed, which reads the router later
+            time.return_value = 100
+            self.plugin_api.get_router_ids.return_value = [FAKE_ID]
+            self.plugin_api.get_routers.return_value = [stale_router]
+            agent._sync_routers_task(agent.context)
+            time.return_value = 110
+            self.plugin_api.get_routers.return_value = [fresh_router]
+            agent._process_router_update(update)
+
+        process_routers.assert_called_once_with([fresh_router])
+        self.assertEqual(0, len(agent.router_updates))
+
+    def test_process_router_updates_fetches_routers_together(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = {'id': 'r1'}
+        self.plugin_api.get_routers.return_value = [router]
+        agent.routers_updated(None, ['r1', 'r2'])
+        agent.router_deleted(None, 'r3')
+
+        class Stop(Exception):
+            pass
+
+        get = agent.router_updates.get
+        blocking_gets = []
+
+        def get_update(block=True):
+            if block:
+                if blocking_gets:
+                    raise Stop()
+                blocking_gets.append(block)
+            return get(block)
+
+        with contextlib.nested(
+            mock.patch.object(agent.router_updates, 'get',
+                              side_effect=get_update),
+            mock.patch.object(agent.router_update_pool, 'spawn_n')
+        ) as (get_mock, spawn_n):
+            self.assertRaises(Stop, agent._process_router_updates)
+
+        self.plugin_api.get_routers.assert_called_once_with(agent.context,
+                                                            ['r1', 'r2'])
+        updates = [call[0][1] for call in spawn_n.call_args_list]
+        self.assertEqual(['r1', 'r2', 'r3'],
+                         [update.router_id for update in updates])
+        self.assertEqual(router, updates[0].router)
+        self.assertIsNone(updates[1].router)
+        self.assertIsNotNone(updates[1].data_timestamp)
+        self.assertIsNone(updates[2].data_timestamp)
+
+    def test_process_router_update_fetched_router_not_fetched_again(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = {'id': FAKE_ID}
+        self.plugin_api.get_routers.return_value = [router]
+        agent.routers_updated(None, [FAKE_ID])
+        update = agent.router_updates.get()
+        agent._fetch_updated_routers([update])
+        with mock.patch.object(agent, '_process_routers') as process_routers:
+            agent._process_router_update(update)
+        self.assertEqual(1, self.plugin_api.get_routers.call_count)
+        process_routers.assert_called_once_with([router])
+
+    def test_fetch_updated_routers_failure(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_routers.side_effect = Exception
+        agent.routers_updated(None, [FAKE_ID])
+        update = agent.router_updates.get()
+        agent._fetch_updated_routers([update])
+        # The router is fetched again when the update is processed
+        self.assertIsNone(update.data_timestamp)
+
+    def test_process_router_update_router_gone(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.router_info[FAKE_ID] = mock.Mock()
+        self.plugin_api.get_routers.return_value = []
+        agent.routers_updated(None, [FAKE_ID])
+        with mock.patch.object(agent, '_router_removed') as router_removed:
+            agent._process_router_update(agent.router_updates.get())
+        router_removed.assert_called_once_with(FAKE_ID)
+
+    def test_process_router_update_failure(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.fullsync = False
+        self.plugin_api.get_routers.side_effect = Exception
+        agent.routers_updated(None, [FAKE_ID])
+        agent._process_router_update(agent.router_updates.get())
+        self.assertTrue(agent.fullsync)
+        # The router can be updated again
+        agent.routers_updated(None, [FAKE_ID])
+        self.assertEqual(1, len(agent.router_updates))
 
     def test_destroy_namespace(self):
 
@@ -1012,3 +1268,96 @@ class TestL3AgentEventHandler(base.BaseTestCase):
                 ])
         finally:
             self.external_process_p.start()
+
+
+class TestRouterUpdateQueue(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestRouterUpdateQueue, self).setUp()
+        self.queue = l3_agent.RouterUpdateQueue()
+
+    def _add(self, router_id, priority, **kwargs):
+        update = l3_agent.RouterUpdate(router_id, priority, **kwargs)
+        self.queue.add(update)
+        return update
+
+    def test_get_by_priority_then_age(self):
+        sync = self._add('r1', l3_agent.PRIORITY_SYNC_ROUTERS_TASK)
+        rpc2 = self._add('r2', l3_agent.PRIORITY_RPC)
+        rpc3 = self._add('r3', l3_agent.PRIORITY_RPC)
+        rpc2.timestamp = rpc3.timestamp - 1
+        self.assertEqual([rpc2, rpc3, sync],
+                         [self.queue.get() for i in range(3)])
+        self.assertEqual(0, len(self.queue))
+
+    def test_updates_of_a_router_are_merged(self):
+        first = self._add('r1', l3_agent.PRIORITY_SYNC_ROUTERS_TASK)
+        last = self._add('r1', l3_agent.PRIORITY_RPC,
+                         action=l3_agent.DELETE_ROUTER)
+        self.assertEqual(1, len(self.queue))
+        self.assertIs(last, self.queue.get())
+        self.assertEqual(first.timestamp, last.timestamp)
+        self.assertEqual(0, len(self.queue))
+
+    def test_sync_update_does_not_replace_rpc_update(self):
+        rpc = self._add('r1', l3_agent.PRIORITY_RPC)
+        self._add('r1', l3_agent.PRIORITY_SYNC_ROUTERS_TASK, router={})
+        self.assertIs(rpc, self.queue.get())
+
+    def test_update_older_than_processed_data_dropped(self):
+        first = self._add('r1', l3_agent.PRIORITY_RPC, router={},
+                          data_timestamp=110)
+        self.queue.get()
+        self._add('r1', l3_agent.PRIORITY_SYNC_ROUTERS_TASK, router={},
+                  data_timestamp=100)
+        self.queue.done(first)
+        self.assertEqual(0, len(self.queue))
+        self._add('r1', l3_agent.PRIORITY_SYNC_ROUTERS_TASK, router={},
+                  data_timestamp=105)
+        self.assertEqual(0, len(self.queue))
+        newer = self._add('r1', l3_agent.PRIORITY_SYNC_ROUTERS_TASK,
+                          router={}, data_timestamp=120)
+        self.assertIs(newer, self.queue.get())
+
+    def test_get_without_blocking(self):
+        self.assertIsNone(self.queue.get(block=False))
+        update = self._add('r1', l3_agent.PRIORITY_RPC)
+        self.assertIs(update, self.queue.get(block=False))
+
+    def test_deleted_router_forgotten(self):
+        self._add('r1', l3_agent.PRIORITY_RPC, router={}, data_timestamp=110)
+        self.queue.done(self.queue.get())
+        self.assertIn('r1', self.queue._processed)
+        self._add('r1', l3_agent.PRIORITY_RPC, action=l3_agent.DELETE_ROUTER,
+                  data_timestamp=120)
+        self.queue.done(self.queue.get())
+        self.assertNotIn('r1', self.queue._processed)
+
+    def test_router_deleted_during_sync_forgotten_once_done(self):
+        self.queue.sync_started()
+        self._add('r1', l3_agent.PRIORITY_RPC, action=l3_agent.DELETE_ROUTER,
+                  data_timestamp=120)
+        self.queue.done(self.queue.get())
+        # The sync read the router before it was deleted
+        self._add('r1', l3_agent.PRIORITY_SYNC_ROUTERS_TASK, router={},
+                  data_timestamp=100)
+        self.assertEqual(0, len(self.queue))
+        self.queue.sync_done()
+        self.assertNotIn('r1', self.queue._processed)
+
+    def test_update_without_data_not_dropped(self):
+        first = self._add('r1', l3_agent.PRIORITY_RPC, data_timestamp=110)
+        self.queue.get()
+        self.queue.done(first)
+        second = self._add('r1', l3_agent.PRIORITY_RPC)
+        self.assertIs(second, self.queue.get())
+
+    def test_updates_of_a_busy_router_wait(self):
+        first = self._add('r1', l3_agent.PRIORITY_RPC)
+        self.assertIs(first, self.queue.get())
+        second = self._add('r1', l3_agent.PRIORITY_RPC)
+        other = self._add('r2', l3_agent.PRIORITY_SYNC_ROUTERS_TASK)
+        self.assertEqual(1, len(self.queue))
+        self.assertIs(other, self.queue.get())
+        self.queue.done(first)
+        self.assertIs(second, self.queue.get())
@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import os
 
 import mock
@@ -350,6 +351,11 @@ class TestBase(base.BaseTestCase):
         self.safe = self.replace_p.start()
         self.execute = self.execute_p.start()
         self.addCleanup(mock.patch.stopall)
+        for cache in (dhcp.DhcpLocalProcess._conf_file_contents,
+                      dhcp.Dnsmasq._host_tables):
+            cache_p = mock.patch.dict(cache, clear=True)
+            cache_p.start()
+            self.addCleanup(cache_p.stop)
 
 
 class TestDhcpBase(TestBase):
@@ -985,6 +991,43 @@ tag:tag1,249,%s,%s""".lstrip() % (fake_v6,
                                         mock.call(exp_opt_name, exp_opt_data)])
             mock_open.assert_called_once_with('/proc/5/cmdline', 'r')
 
+    def _reload_allocations(self, network):
+        with contextlib.nested(
+            mock.patch('os.path.isdir', return_value=True),
+            mock.patch('os.path.exists', return_value=True),
+            mock.patch.object(dhcp.Dnsmasq, 'active'),
+            mock.patch.object(dhcp.Dnsmasq, 'pid'),
+            mock.patch.object(dhcp.Dnsmasq, '_make_subnet_interface_ip_map',
+                              return_value={})
+        ) as (isdir, exists, active, pid, ip_map):
+            active.__get__ = mock.Mock(return_value=True)
+            pid.__get__ = mock.Mock(return_value=5)
+            dm = dhcp.Dnsmasq(self.conf, network, version=float(2.59))
+            dm.reload_allocations()
+
+    def test_reload_allocations_unchanged(self):
+        network = FakeDualNetwork()
+        self._reload_allocations(network)
+        self.assertEqual(2, self.safe.call_count)
+        self.assertEqual(1, self.execute.call_count)
+
+        self._reload_allocations(network)
+        self.assertEqual(2, self.safe.call_count)
+        self.assertEqual(1, self.execute.call_count)
+
+    def test_reload_allocations_port_changed(self):
+        network = FakeDualNetwork()
+        self._reload_allocations(network)
+        with mock.patch.object(dhcp.Dnsmasq, '_format_host_entry',
+                               return_value='') as format_entry:
+            network.ports = [FakePort1()] + network.ports[1:]
+            self._reload_allocations(network)
+            format_entry.assert_called_once_with(network.ports[0])
+        exp_host_name = '/dhcp/cccccccc-cccc-cccc-cccc-cccccccccccc/host'
+        self.assertEqual(mock.call(exp_host_name, mock.ANY),
+                         self.safe.call_args)
+        self.assertEqual(2, self.execute.call_count)
+
     def test_make_subnet_interface_ip_map(self):
         with mock.patch('neutron.agent.linux.ip_lib.IPDevice') as ip_dev:
             ip_dev.return_value.addr.list.return_value = [
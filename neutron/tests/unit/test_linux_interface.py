@@ -83,31 +83,43 @@ class TestABCDriver(TestBase):
     def test_l3_init(self):
         addresses = [dict(ip_version=4, scope='global',
                           dynamic=False, cidr='172.16.77.240/24')]
-        self.ip_dev().addr.list = mock.Mock(return_value=addresses)
+        self.ip().device().addr.list = mock.Mock(return_value=addresses)
 
         bc = BaseChild(self.conf)
         ns = '12345678-1234-5678-90ab-ba0987654321'
         bc.init_l3('tap0', ['192.168.1.2/24'], namespace=ns)
-        self.ip_dev.assert_has_calls(
-            [mock.call('tap0', 'sudo', namespace=ns),
-             mock.call().addr.list(scope='global', filters=['permanent']),
-             mock.call().addr.add(4, '192.168.1.2/24', '192.168.1.255'),
-             mock.call().addr.delete(4, '172.16.77.240/24')])
+        self.ip.assert_has_calls(
+            [mock.call('sudo', namespace=ns),
+             mock.call().device('tap0'),
+             mock.call().device().addr.list(scope='global',
+                                            filters=['permanent']),
+             mock.call().batch(),
+             mock.call().batch().__enter__(),
+             mock.call().device().addr.add(4, '192.168.1.2/24',
+                                           '192.168.1.255'),
+             mock.call().device().addr.delete(4, '172.16.77.240/24'),
+             mock.call().batch().__exit__(None, None, None)])
 
     def test_l3_init_with_preserve(self):
         addresses = [dict(ip_version=4, scope='global',
                           dynamic=False, cidr='192.168.1.3/32')]
-        self.ip_dev().addr.list = mock.Mock(return_value=addresses)
+        self.ip().device().addr.list = mock.Mock(return_value=addresses)
 
         bc = BaseChild(self.conf)
         ns = '12345678-1234-5678-90ab-ba0987654321'
         bc.init_l3('tap0', ['192.168.1.2/24'], namespace=ns,
                    preserve_ips=['192.168.1.3/32'])
-        self.ip_dev.assert_has_calls(
-            [mock.call('tap0', 'sudo', namespace=ns),
-             mock.call().addr.list(scope='global', filters=['permanent']),
-             mock.call().addr.add(4, '192.168.1.2/24', '192.168.1.255')])
-        self.assertFalse(self.ip_dev().addr.delete.called)
+        self.ip.assert_has_calls(
+            [mock.call('sudo', namespace=ns),
+             mock.call().device('tap0'),
+             mock.call().device().addr.list(scope='global',
+                                            filters=['permanent']),
+             mock.call().batch(),
+             mock.call().batch().__enter__(),
+             mock.call().device().addr.add(4, '192.168.1.2/24',
+                                           '192.168.1.255'),
+             mock.call().batch().__exit__(None, None, None)])
+        self.assertFalse(self.ip().device().addr.delete.called)
 
 
 class TestOVSInterfaceDriver(TestBase):
@@ -16,6 +16,7 @@
 #    under the License.
 
 import mock
+import testtools
 
 from neutron.agent.linux import ip_lib
 from neutron.common import exceptions
@@ -374,6 +375,140 @@ class TestIpWrapper(base.BaseTestCase):
         self.assertEqual(dev.mock_calls, [])
 
 
+class TestIpBatch(base.BaseTestCase):
+    def setUp(self):
+        super(TestIpBatch, self).setUp()
+        self.execute_p = mock.patch.object(ip_lib.utils, 'execute')
+        self.execute = self.execute_p.start()
+        self.addCleanup(self.execute_p.stop)
+        self.ip = ip_lib.IPWrapper('sudo', 'ns')
+
+    def _batch_call(self, lines, options=(), namespace='ns'):
+        return mock.call(['ip', 'netns', 'exec', namespace, 'ip'] +
+                         list(options) + ['-batch', '-'],
+                         root_helper='sudo',
+                         process_input=''.join('%s\n' % l for l in lines),
+                         daemon_only=True)
+
+    def test_batch(self):
+        device = self.ip.device('tap0')
+        with self.ip.batch():
+            device.link.set_up()
+            device.route.add_gateway('10.0.0.1')
+            device.addr.add(4, '10.0.0.2/24', '10.0.0.255')
+            device.addr.add(4, '10.0.0.3/24', '10.0.0.255')
+            device.link.set_alias('a b')
+            self.assertFalse(self.execute.called)
+        self.assertEqual(
+            [self._batch_call(['link set tap0 up',
+                               'route replace default via 10.0.0.1 '
+                               'dev tap0']),
+             self._batch_call(['addr add 10.0.0.2/24 brd 10.0.0.255 '
+                               'scope global dev tap0',
+                               'addr add 10.0.0.3/24 brd 10.0.0.255 '
+                               'scope global dev tap0'], options=['-4']),
+             self._batch_call(['link set tap0 alias "a b"'])],
+            self.execute.call_args_list)
+
+    def test_batch_follows_namespace_changes(self):
+        with self.ip.batch():
+            device = self.ip.add_tuntap('tap0')
+            device.link.set_netns('ns2')
+            device.link.set_up()
+        self.assertEqual(
+            [self._batch_call(['tuntap add tap0 mode tap',
+                               'link set tap0 netns ns2']),
+             self._batch_call(['link set tap0 up'], namespace='ns2')],
+            self.execute.call_args_list)
+
+    def test_nested_batch(self):
+        with self.ip.batch():
+            with self.ip.batch():
+                self.ip.device('tap0').link.set_up()
+            self.assertFalse(self.execute.called)
+        self.assertEqual([self._batch_call(['link set tap0 up'])],
+                         self.execute.call_args_list)
+
+    def test_batch_flushed_before_read(self):
+        device = self.ip.device('tap0')
+        with self.ip.batch():
+            device.link.set_up()
+            device.addr.list()
+        self.assertEqual(
+            [self._batch_call(['link set tap0 up']),
+             mock.call(['ip', 'netns', 'exec', 'ns', 'ip', 'addr', 'show',
+                        'tap0'], root_helper='sudo')],
+            self.execute.call_args_list)
+
+    def test_batch_discarded_on_exception(self):
+        def set_up():
+            with self.ip.batch():
+                self.ip.device('tap0').link.set_up()
+                raise ValueError()
+        self.assertRaises(ValueError, set_up)
+        self.assertFalse(self.execute.called)
+        with self.ip.batch():
+            pass
+        self.assertFalse(self.execute.called)
+
+    def test_batch_error_names_failed_command(self):
+        self.execute.side_effect = RuntimeError(
+            "Stderr: 'RTNETLINK answers: File exists\\n"
+            "Command failed -:2\\n'")
+        device = self.ip.device('tap0')
+
+        def configure():
+            with self.ip.batch():
+                device.link.set_up()
+                device.route.add_gateway('10.0.0.1')
+                device.link.set_down()
+        e = self.assertRaises(ip_lib.IpBatchError, configure)
+        self.assertEqual(['ip', 'netns', 'exec', 'ns', 'ip', 'route',
+                          'replace', 'default', 'via', '10.0.0.1', 'dev',
+                          'tap0'], e.command)
+
+    def test_batch_error_without_line(self):
+        self.execute.side_effect = RuntimeError('Exit code: 255')
+        device = self.ip.device('tap0')
+        with testtools.ExpectedException(RuntimeError, 'Exit code: 255'):
+            with self.ip.batch():
+                device.link.set_up()
+
+    def test_batch_without_daemon(self):
+        # The commands are run one by one when the daemon can't check them
+        self.execute.side_effect = (
+            lambda cmd, root_helper, process_input=None, daemon_only=False:
+            None if daemon_only else '')
+        device = self.ip.device('tap0')
+        with self.ip.batch():
+            device.link.set_up()
+            device.addr.add(4, '10.0.0.2/24', '10.0.0.255')
+        self.assertEqual(
+            [self._batch_call(['link set tap0 up']),
+             mock.call(['ip', 'netns', 'exec', 'ns', 'ip', 'link', 'set',
+                        'tap0', 'up'], root_helper='sudo'),
+             self._batch_call(['addr add 10.0.0.2/24 brd 10.0.0.255 '
+                               'scope global dev tap0'], options=['-4']),
+             mock.call(['ip', 'netns', 'exec', 'ns', 'ip', '-4', 'addr',
+                        'add', '10.0.0.2/24', 'brd', '10.0.0.255', 'scope',
+                        'global', 'dev', 'tap0'], root_helper='sudo')],
+            self.execute.call_args_list)
+
+    def test_batch_without_daemon_error_names_failed_command(self):
+        def execute(cmd, root_helper, process_input=None, daemon_only=False):
+            if not daemon_only:
+                raise RuntimeError('Exit code: 2')
+        self.execute.side_effect = execute
+        with testtools.ExpectedException(ip_lib.IpBatchError):
+            with self.ip.batch():
+                self.ip.device('tap0').link.set_up()
+
+    def test_device_without_batch(self):
+        with self.ip.batch():
+            ip_lib.IPDevice('tap0', 'sudo', 'ns').link.set_up()
+            self.assertTrue(self.execute.called)
+
+
 class TestIPDevice(base.BaseTestCase):
     def test_eq_same_name(self):
         dev1 = ip_lib.IPDevice('tap0')
@@ -461,6 +596,10 @@ class TestIPCmdBase(base.BaseTestCase):
             [mock.call._as_root(options, self.command, args,
                                 force_root_namespace)])
 
+    def _assert_sudo_batched(self, options, args):
+        self.parent.assert_has_calls(
+            [mock.call._as_root_batched(options, self.command, args)])
+
 
 class TestIpLinkCommand(TestIPCmdBase):
     def setUp(self):
@@ -471,37 +610,38 @@ class TestIpLinkCommand(TestIPCmdBase):
 
     def test_set_address(self):
         self.link_cmd.set_address('aa:bb:cc:dd:ee:ff')
-        self._assert_sudo([], ('set', 'eth0', 'address', 'aa:bb:cc:dd:ee:ff'))
+        self._assert_sudo_batched([], ('set', 'eth0', 'address',
+                                       'aa:bb:cc:dd:ee:ff'))
 
     def test_set_mtu(self):
         self.link_cmd.set_mtu(1500)
-        self._assert_sudo([], ('set', 'eth0', 'mtu', 1500))
+        self._assert_sudo_batched([], ('set', 'eth0', 'mtu', 1500))
 
     def test_set_up(self):
         self.link_cmd.set_up()
-        self._assert_sudo([], ('set', 'eth0', 'up'))
+        self._assert_sudo_batched([], ('set', 'eth0', 'up'))
 
     def test_set_down(self):
         self.link_cmd.set_down()
-        self._assert_sudo([], ('set', 'eth0', 'down'))
+        self._assert_sudo_batched([], ('set', 'eth0', 'down'))
 
     def test_set_netns(self):
         self.link_cmd.set_netns('foo')
-        self._assert_sudo([], ('set', 'eth0', 'netns', 'foo'))
+        self._assert_sudo_batched([], ('set', 'eth0', 'netns', 'foo'))
         self.assertEqual(self.parent.namespace, 'foo')
 
     def test_set_name(self):
         self.link_cmd.set_name('tap1')
-        self._assert_sudo([], ('set', 'eth0', 'name', 'tap1'))
+        self._assert_sudo_batched([], ('set', 'eth0', 'name', 'tap1'))
         self.assertEqual(self.parent.name, 'tap1')
 
     def test_set_alias(self):
         self.link_cmd.set_alias('openvswitch')
-        self._assert_sudo([], ('set', 'eth0', 'alias', 'openvswitch'))
+        self._assert_sudo_batched([], ('set', 'eth0', 'alias', 'openvswitch'))
 
     def test_delete(self):
         self.link_cmd.delete()
-        self._assert_sudo([], ('delete', 'eth0'))
+        self._assert_sudo_batched([], ('delete', 'eth0'))
 
     def test_address_property(self):
         self.parent._execute = mock.Mock(return_value=LINK_SAMPLE[1])
@@ -549,25 +689,27 @@ class TestIpAddrCommand(TestIPCmdBase):
 
     def test_add_address(self):
         self.addr_cmd.add(4, '192.168.45.100/24', '192.168.45.255')
-        self._assert_sudo([4],
-                          ('add', '192.168.45.100/24', 'brd', '192.168.45.255',
-                           'scope', 'global', 'dev', 'tap0'))
+        self._assert_sudo_batched([4],
+                                  ('add', '192.168.45.100/24', 'brd',
+                                   '192.168.45.255', 'scope', 'global',
+                                   'dev', 'tap0'))
 
     def test_add_address_scoped(self):
         self.addr_cmd.add(4, '192.168.45.100/24', '192.168.45.255',
                           scope='link')
-        self._assert_sudo([4],
-                          ('add', '192.168.45.100/24', 'brd', '192.168.45.255',
-                           'scope', 'link', 'dev', 'tap0'))
+        self._assert_sudo_batched([4],
+                                  ('add', '192.168.45.100/24', 'brd',
+                                   '192.168.45.255', 'scope', 'link',
+                                   'dev', 'tap0'))
 
     def test_del_address(self):
         self.addr_cmd.delete(4, '192.168.45.100/24')
-        self._assert_sudo([4],
-                          ('del', '192.168.45.100/24', 'dev', 'tap0'))
+        self._assert_sudo_batched([4],
+                                  ('del', '192.168.45.100/24', 'dev', 'tap0'))
 
     def test_flush(self):
         self.addr_cmd.flush()
-        self._assert_sudo([], ('flush', 'tap0'))
+        self._assert_sudo_batched([], ('flush', 'tap0'))
 
     def test_list(self):
         expected = [
@@ -625,17 +767,17 @@ class TestIpRouteCommand(TestIPCmdBase):
         gateway = '192.168.45.100'
         metric = 100
         self.route_cmd.add_gateway(gateway, metric)
-        self._assert_sudo([],
-                          ('replace', 'default', 'via', gateway,
-                           'metric', metric,
-                           'dev', self.parent.name))
+        self._assert_sudo_batched([],
+                                  ('replace', 'default', 'via', gateway,
+                                   'metric', metric,
+                                   'dev', self.parent.name))
 
     def test_del_gateway(self):
         gateway = '192.168.45.100'
         self.route_cmd.delete_gateway(gateway)
-        self._assert_sudo([],
-                          ('del', 'default', 'via', gateway,
-                           'dev', self.parent.name))
+        self._assert_sudo_batched([],
+                                  ('del', 'default', 'via', gateway,
+                                   'dev', self.parent.name))
 
     def test_get_gateway(self):
         test_cases = [{'sample': GATEWAY_SAMPLE1,
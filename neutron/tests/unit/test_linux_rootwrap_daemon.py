@@ -0,0 +1,182 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+import os
+import threading
+
+import fixtures
+import mock
+from oslo.config import cfg
+
+from neutron.agent.linux import rootwrap_daemon
+from neutron.agent.linux import utils
+from neutron.openstack.common.rootwrap import cmd as rootwrap_cmd
+from neutron.tests import base
+
+
+class RootwrapDaemonTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(RootwrapDaemonTestCase, self).setUp()
+        tempdir = self.useFixture(fixtures.TempDir()).path
+        filters_path = os.path.join(tempdir, 'rootwrap.d')
+        os.mkdir(filters_path)
+        with open(os.path.join(filters_path, 'test.filters'), 'w') as f:
+            f.write('[Filters]\n'
+                    'cat: CommandFilter, cat, root\n'
+                    'false: CommandFilter, false, root\n'
+                    'ip: IpFilter, ip, root\n'
+                    'ip_exec: IpNetnsExecFilter, ip, root\n')
+        self.config = mock.Mock(filters_path=[filters_path],
+                                exec_dirs=['/sbin', '/bin', '/usr/sbin',
+                                           '/usr/bin'],
+                                use_syslog=False)
+        self.socket_path = os.path.join(tempdir, 'rootwrap.sock')
+        self.server = self._start_server()
+        self.client = rootwrap_daemon.RootwrapDaemonClient(self.socket_path)
+        self.addCleanup(self.client.close)
+
+    def _start_server(self):
+        server = rootwrap_daemon.RootwrapServer(self.socket_path, self.config,
+                                                os.getuid())
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+        self.addCleanup(stop)
+        return server
+
+    def test_socket_is_private(self):
+        self.assertEqual(0o600, os.stat(self.socket_path).st_mode & 0o777)
+
+    def test_execute(self):
+        self.assertEqual((0, 'foo\xffbar', ''),
+                         self.client.execute(['cat'], 'foo\xffbar'))
+
+    def test_execute_exit_code(self):
+        self.assertEqual((1, '', ''), self.client.execute(['false']))
+
+    def test_execute_unauthorized(self):
+        returncode, stdout, stderr = self.client.execute(['rm', '/foo'])
+        self.assertEqual(rootwrap_cmd.RC_UNAUTHORIZED, returncode)
+        self.assertIn('Unauthorized command: rm /foo', stderr)
+
+    def test_ip_batch_commands(self):
+        self.assertEqual(
+            [['ip', 'netns', 'exec', 'ns', 'ip', '-4', 'addr', 'add',
+              '10.0.0.2/24', 'dev', 'tap0'],
+             ['ip', 'netns', 'exec', 'ns', 'ip', '-4', 'link', 'set', 'tap0',
+              'alias', 'a b']],
+            rootwrap_daemon.ip_batch_commands(
+                ['ip', 'netns', 'exec', 'ns', 'ip', '-4', '-batch', '-'],
+                'addr add 10.0.0.2/24 dev tap0\n\n'
+                'link set tap0 alias "a b"\n'))
+        self.assertIsNone(rootwrap_daemon.ip_batch_commands(
+            ['ip', 'link', 'set', 'tap0', 'up'], None))
+        self.assertIsNone(rootwrap_daemon.ip_batch_commands(['cat'], 'foo'))
+        for args, stdin in ((['ip', '-b', '/tmp/batch'], None),
+                            (['ip', '--batch'], None),
+                            (['ip', '-batch', '-'], 'link set tap0 up # x'),
+                            (['ip', '-batch', '-'], '-force link show')):
+            self.assertRaises(ValueError, rootwrap_daemon.ip_batch_commands,
+                              args, stdin)
+
+    def _run_ip_batch(self, userargs, stdin):
+        with mock.patch.object(rootwrap_daemon.subprocess,
+                               'Popen') as popen:
+            popen.return_value.communicate.return_value = ('', '')
+            popen.return_value.returncode = 0
+            result = self.server.run_command(userargs, stdin)
+        return result, popen
+
+    def test_ip_batch(self):
+        (returncode, _stdout, _stderr), popen = self._run_ip_batch(
+            ['ip', 'netns', 'exec', 'ns', 'ip', '-batch', '-'],
+            'link set tap0 up\naddr add 10.0.0.2/24 dev tap0\n')
+        self.assertEqual(0, returncode)
+        self.assertTrue(popen.called)
+
+    def test_ip_batch_unauthorized_command(self):
+        # Each batched command is checked as if it was run on its own
+        (returncode, _stdout, stderr), popen = self._run_ip_batch(
+            ['ip', 'netns', 'exec', 'ns', 'ip', '-batch', '-'],
+            'link set tap0 up\nnetns exec ns2 sh -c id\n')
+        self.assertEqual(rootwrap_cmd.RC_UNAUTHORIZED, returncode)
+        self.assertIn('Unauthorized batched command: ip netns exec ns ip '
+                      'netns exec ns2 sh -c id', stderr)
+        self.assertFalse(popen.called)
+
+    def test_ip_batch_from_file_unauthorized(self):
+        (returncode, _stdout, _stderr), popen = self._run_ip_batch(
+            ['ip', '-batch', '/tmp/batch'], None)
+        self.assertEqual(rootwrap_cmd.RC_UNAUTHORIZED, returncode)
+        self.assertFalse(popen.called)
+
+    def test_connection_is_reused(self):
+        with mock.patch.object(self.client, '_connect',
+                               wraps=self.client._connect) as connect:
+            self.client.execute(['cat'], 'foo')
+            self.client.execute(['cat'], 'bar')
+        self.assertEqual(1, connect.call_count)
+
+    def test_reconnect_after_restart(self):
+        self.client.execute(['cat'], 'foo')
+        self.server.shutdown()
+        self.server.server_close()
+        self._start_server()
+        self.assertEqual((0, 'bar', ''), self.client.execute(['cat'], 'bar'))
+
+    def test_execute_without_daemon(self):
+        client = rootwrap_daemon.RootwrapDaemonClient(self.socket_path + '2')
+        self.assertIsNone(client.execute(['cat'], 'foo'))
+
+    def test_execute_raises_on_lost_response(self):
+        # The daemon closes the connection without responding
+        with contextlib.nested(
+            mock.patch.object(self.server, 'run_command',
+                              side_effect=SystemExit),
+            mock.patch.object(self.server, 'handle_error')
+        ):
+            self.assertRaises(RuntimeError, self.client.execute, ['cat'])
+
+    def test_agent_execute_uses_daemon(self):
+        cfg.CONF.set_override('root_helper_daemon_socket', self.socket_path,
+                              'AGENT')
+        self.addCleanup(cfg.CONF.reset)
+        self.addCleanup(utils._get_rootwrap_daemon_client().close)
+        with mock.patch.object(utils, 'create_process') as create_process:
+            self.assertEqual('foo', utils.execute(['cat'], 'sudo',
+                                                  process_input='foo'))
+            self.assertRaises(RuntimeError, utils.execute, ['false'], 'sudo')
+        self.assertFalse(create_process.called)
+
+    def test_agent_execute_falls_back_to_root_helper(self):
+        cfg.CONF.set_override('root_helper_daemon_socket',
+                              self.socket_path + '2', 'AGENT')
+        self.addCleanup(cfg.CONF.reset)
+        with mock.patch.object(utils, 'create_process') as create_process:
+            create_process.return_value = (mock.Mock(returncode=0), ['cat'])
+            create_process.return_value[0].communicate.return_value = (
+                'foo', '')
+            self.assertEqual('foo', utils.execute(['cat'], 'sudo',
+                                                  process_input='foo'))
+        create_process.assert_called_once_with(['cat'], root_helper='sudo',
+                                               addl_env=None)
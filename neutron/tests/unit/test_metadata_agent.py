@@ -16,6 +16,7 @@
 #
 # @author: Mark McClain, DreamHost
 
+import contextlib
 import socket
 
 import mock
@@ -38,6 +39,55 @@ class FakeConf(object):
     nova_metadata_ip = '9.9.9.9'
     nova_metadata_port = 8775
     metadata_proxy_shared_secret = 'secret'
+    metadata_cache_size = 1000
+    metadata_cache_ttl = 5
+    nova_metadata_pool_size = 100
+    neutron_client_pool_size = 10
+
+
+class TestLookupCache(base.BaseTestCase):
+    def setUp(self):
+        super(TestLookupCache, self).setUp()
+        self.cache = agent.LookupCache(2, 5)
+
+    def test_get_put(self):
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.put('key', 'value')
+        self.assertEqual('value', self.cache.get('key'))
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(1, self.cache.misses)
+
+    def test_expired(self):
+        with mock.patch('time.time') as time:
+            time.return_value = 100
+            self.cache.put('key', 'value')
+            time.return_value = 106
+            self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(0, len(self.cache))
+        self.assertEqual(1, self.cache.misses)
+
+    def test_least_recently_used_evicted(self):
+        self.cache.put('key1', 'value1', tags=['tag'])
+        self.cache.put('key2', 'value2')
+        self.cache.get('key1')
+        self.cache.put('key3', 'value3')
+        self.assertIsNone(self.cache.get('key2'))
+        self.assertEqual('value1', self.cache.get('key1'))
+        self.assertEqual('value3', self.cache.get('key3'))
+
+    def test_invalidate(self):
+        self.cache.put('key1', 'value1', tags=['tag1', 'tag2'])
+        self.cache.put('key2', 'value2', tags=['tag2'])
+        self.cache.invalidate('tag1')
+        self.assertIsNone(self.cache.get('key1'))
+        self.assertEqual('value2', self.cache.get('key2'))
+        self.cache.invalidate('tag2')
+        self.assertEqual(0, len(self.cache))
+
+    def test_disabled(self):
+        cache = agent.LookupCache(0, 5)
+        cache.put('key', 'value')
+        self.assertIsNone(cache.get('key'))
 
 
 class TestMetadataProxyHandler(base.BaseTestCase):
@@ -190,6 +240,107 @@ class TestMetadataProxyHandler(base.BaseTestCase):
             (None, None)
         )
 
+    def _get_instance_and_tenant_id(self, network_id=None, router_id=None,
+                                    remote_address='192.168.1.1'):
+        headers = {'X-Forwarded-For': remote_address}
+        if network_id:
+            headers['X-Neutron-Network-ID'] = network_id
+        if router_id:
+            headers['X-Neutron-Router-ID'] = router_id
+        return self.handler._get_instance_and_tenant_id(
+            mock.Mock(headers=headers))
+
+    def _mock_list_ports(self, router_ports, instance_ports):
+        def mock_list_ports(device_id=None, **kwargs):
+            if device_id:
+                return {'ports': router_ports}
+            return {'ports': [p for p in instance_ports
+                              if p['network_id'] in kwargs['network_id']]}
+        list_ports = self.qclient.return_value.list_ports
+        list_ports.side_effect = mock_list_ports
+        return list_ports
+
+    def test_get_instance_id_cached(self):
+        list_ports = self._mock_list_ports(
+            [{'id': 'rport', 'network_id': 'net1'}],
+            [{'id': 'port', 'network_id': 'net1', 'device_id': 'device_id',
+              'tenant_id': 'tenant_id'}])
+        for i in range(3):
+            self.assertEqual(('device_id', 'tenant_id'),
+                             self._get_instance_and_tenant_id(
+                                 router_id='router'))
+        self.assertEqual(2, list_ports.call_count)
+        self.assertEqual(2, self.handler.instances_cache.hits)
+        self.assertEqual(1, self.handler.instances_cache.misses)
+
+    def test_get_instance_id_no_match_not_cached(self):
+        list_ports = self._mock_list_ports([], [])
+        for i in range(2):
+            self.assertEqual((None, None),
+                             self._get_instance_and_tenant_id(
+                                 network_id='net1'))
+        self.assertEqual(2, list_ports.call_count)
+
+    def test_get_instance_id_router_interface_added(self):
+        instance_ports = [{'id': 'port', 'network_id': 'net2',
+                           'device_id': 'device_id',
+                           'tenant_id': 'tenant_id'}]
+        self._mock_list_ports([{'id': 'rport1', 'network_id': 'net1'}],
+                              instance_ports)
+        self.assertEqual((None, None),
+                         self._get_instance_and_tenant_id(router_id='router'))
+
+        list_ports = self._mock_list_ports(
+            [{'id': 'rport1', 'network_id': 'net1'},
+             {'id': 'rport2', 'network_id': 'net2'}], instance_ports)
+        self.assertEqual(('device_id', 'tenant_id'),
+                         self._get_instance_and_tenant_id(router_id='router'))
+        self.assertEqual(5, list_ports.call_count)
+
+    def test_port_update_invalidates_instance(self):
+        list_ports = self._mock_list_ports(
+            [], [{'id': 'port', 'network_id': 'net1',
+                  'device_id': 'device_id', 'tenant_id': 'tenant_id'}])
+        self._get_instance_and_tenant_id(network_id='net1')
+        self.handler.port_update(
+            None, port={'id': 'other', 'network_id': 'net1',
+                        'fixed_ips': [{'ip_address': '192.168.1.2'}]})
+        self._get_instance_and_tenant_id(network_id='net1')
+        self.assertEqual(1, list_ports.call_count)
+
+        self.handler.port_update(
+            None, port={'id': 'new_port', 'network_id': 'net1',
+                        'fixed_ips': [{'ip_address': '192.168.1.1'}]})
+        self._get_instance_and_tenant_id(network_id='net1')
+        self.assertEqual(2, list_ports.call_count)
+
+    def test_port_update_invalidates_router_networks(self):
+        list_ports = self._mock_list_ports(
+            [{'id': 'rport', 'network_id': 'net1'}],
+            [{'id': 'port', 'network_id': 'net1',
+              'device_id': 'device_id', 'tenant_id': 'tenant_id'}])
+        self._get_instance_and_tenant_id(router_id='router')
+        self.handler.port_update(
+            None, port={'id': 'rport2', 'network_id': 'net2',
+                        'device_id': 'router',
+                        'device_owner': 'network:router_interface',
+                        'fixed_ips': []})
+        self.assertIsNotNone(self.handler.instances_cache.get(
+            ('router', '192.168.1.1')))
+        self.assertIsNone(self.handler.router_networks_cache.get('router'))
+        self.handler.port_delete(None, port_id='port')
+        self._get_instance_and_tenant_id(router_id='router')
+        self.assertEqual(4, list_ports.call_count)
+
+    def test_port_delete_invalidates_instance(self):
+        list_ports = self._mock_list_ports(
+            [], [{'id': 'port', 'network_id': 'net1',
+                  'device_id': 'device_id', 'tenant_id': 'tenant_id'}])
+        self._get_instance_and_tenant_id(network_id='net1')
+        self.handler.port_delete(None, port_id='port')
+        self._get_instance_and_tenant_id(network_id='net1')
+        self.assertEqual(2, list_ports.call_count)
+
     def _proxy_request_test_helper(self, response_code=200, method='GET'):
         hdrs = {'X-Forwarded-For': '8.8.8.8'}
         body = 'body'
@@ -220,6 +371,40 @@ class TestMetadataProxyHandler(base.BaseTestCase):
 
                 return retval
 
+    def test_neutron_client_reused(self):
+        self.qclient.return_value.list_ports.return_value = {'ports': []}
+        self.qclient.return_value.get_auth_info.return_value = {
+            'auth_token': 'token', 'endpoint_url': 'url'}
+        for i in range(3):
+            self._get_instance_and_tenant_id(network_id='net1')
+        self.assertEqual(1, self.qclient.call_count)
+        self.assertEqual({'auth_token': 'token', 'endpoint_url': 'url'},
+                         self.handler.auth_info)
+
+    def test_neutron_client_created_with_latest_token(self):
+        self.qclient.return_value.get_auth_info.return_value = {
+            'auth_token': 'token', 'endpoint_url': 'url'}
+        with self.handler.neutron_clients.item():
+            self.handler.auth_info = self.qclient().get_auth_info()
+            self.qclient.reset_mock()
+            self.qclient.return_value.list_ports.return_value = {'ports': []}
+            self._get_instance_and_tenant_id(network_id='net1')
+        self.assertEqual(2, len(self.handler.neutron_clients.free_items))
+        self.assertEqual('token',
+                         self.qclient.call_args[1]['auth_token'])
+        self.assertEqual('url', self.qclient.call_args[1]['endpoint_url'])
+
+    def test_proxy_request_connection_reused(self):
+        req = mock.Mock(path_info='/the_path', query_string='', headers={},
+                        method='GET', body='')
+        with mock.patch('httplib2.Http') as mock_http:
+            mock_http.return_value.request.return_value = (
+                mock.Mock(status=200), 'content')
+            for i in range(3):
+                self.handler._proxy_request('the_id', 'tenant_id', req)
+        self.assertEqual(1, mock_http.call_count)
+        self.assertEqual(3, mock_http.return_value.request.call_count)
+
     def test_proxy_request_post(self):
         self.assertEqual('content',
                          self._proxy_request_test_helper(method='POST'))
@@ -362,23 +547,32 @@ class TestUnixDomainMetadataProxy(base.BaseTestCase):
                     exists.assert_called_once_with('/the/path')
 
     def test_run(self):
-        with mock.patch.object(agent, 'MetadataProxyHandler') as handler:
-            with mock.patch.object(agent, 'UnixDomainWSGIServer') as server:
-                with mock.patch('os.path.isdir') as isdir:
-                    with mock.patch('os.makedirs') as makedirs:
-                        isdir.return_value = False
-
-                        p = agent.UnixDomainMetadataProxy(self.cfg.CONF)
-                        p.run()
-
-                        isdir.assert_called_once_with('/the')
-                        makedirs.assert_called_once_with('/the', 0o755)
-                        server.assert_has_calls([
-                            mock.call('neutron-metadata-agent'),
-                            mock.call().start(handler.return_value,
-                                              '/the/path'),
-                            mock.call().wait()]
-                        )
+        with contextlib.nested(
+            mock.patch.object(agent, 'MetadataProxyHandler'),
+            mock.patch.object(agent, 'UnixDomainWSGIServer'),
+            mock.patch.object(agent.agent_rpc, 'create_consumers'),
+            mock.patch('os.path.isdir'),
+            mock.patch('os.makedirs')
+        ) as (handler, server, create_consumers, isdir, makedirs):
+            isdir.return_value = False
+
+            p = agent.UnixDomainMetadataProxy(self.cfg.CONF)
+            p.run()
+
+            create_consumers.assert_called_once_with(
+                mock.ANY, 'q-agent-notifier',
+                [['port', 'update'], ['port', 'delete']])
+
+            isdir.assert_called_once_with('/the')
+            makedirs.assert_called_once_with('/the', 0o755)
+            server.assert_has_calls([
+                mock.call('neutron-metadata-agent',
+                          threads=self.cfg.CONF.metadata_proxy_pool_size),
+                mock.call().start(
+                    handler.return_value, '/the/path',
+                    backlog=self.cfg.CONF.metadata_proxy_backlog),
+                mock.call().wait()]
+            )
 
     def test_main(self):
         with mock.patch.object(agent, 'UnixDomainMetadataProxy') as proxy:
@@ -412,3 +606,22 @@ class TestUnixDomainMetadataProxy(base.BaseTestCase):
                 state_api_inst = state_api.return_value
                 state_api_inst.report_state.assert_called_once_with(
                     proxy.context, proxy.agent_state, use_call=True)
+
+    def test_report_state_cache_stats(self):
+        with contextlib.nested(
+            mock.patch('neutron.agent.rpc.PluginReportStateAPI'),
+            mock.patch('os.makedirs'),
+            mock.patch.object(agent, 'MetadataProxyHandler')
+        ) as (state_api, makedirs, handler):
+            handler.return_value.instances_cache = mock.Mock(hits=3,
+                                                             misses=1)
+            handler.return_value.router_networks_cache = mock.Mock(hits=2,
+                                                                   misses=0)
+            proxy = agent.UnixDomainMetadataProxy(mock.Mock())
+            proxy._report_state()
+            configurations = proxy.agent_state['configurations']
+            self.assertEqual(3, configurations['instances_cache_hits'])
+            self.assertEqual(1, configurations['instances_cache_misses'])
+            self.assertEqual(2, configurations['router_networks_cache_hits'])
+            self.assertEqual(0,
+                             configurations['router_networks_cache_misses'])
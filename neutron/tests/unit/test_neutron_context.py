@@ -16,21 +16,37 @@
 #    under the License.
 
 import mock
+from oslo.config import cfg
+import sqlalchemy as sa
+from sqlalchemy.ext import declarative
+from sqlalchemy import orm
 from testtools import matchers
 
 from neutron import context
+from neutron.db import api as db_api
 from neutron.openstack.common import local
 from neutron.tests import base
 
 
+FakeBase = declarative.declarative_base()
+
+
+class FakeModel(FakeBase):
+    __tablename__ = 'fake_models'
+    id = sa.Column(sa.String(36), primary_key=True)
+
+
 class TestNeutronContext(base.BaseTestCase):
 
     def setUp(self):
         super(TestNeutronContext, self).setUp()
-        db_api = 'neutron.db.api.get_session'
-        self._db_api_session_patcher = mock.patch(db_api)
+        self._db_api_session_patcher = mock.patch(
+            'neutron.db.api.get_session')
         self.db_api_session = self._db_api_session_patcher.start()
         self.addCleanup(self._db_api_session_patcher.stop)
+        track_writes_patcher = mock.patch('neutron.db.api.track_writes')
+        track_writes_patcher.start()
+        self.addCleanup(track_writes_patcher.stop)
 
     def test_neutron_context_create(self):
         ctx = context.Context('user_id', 'tenant_id')
@@ -137,3 +153,76 @@ class TestNeutronContext(base.BaseTestCase):
         ctx_admin = context.get_admin_context()
         self.assertEqual(req_id_before, local.store.context.request_id)
         self.assertNotEqual(req_id_before, ctx_admin.request_id)
+
+
+class TestNeutronContextSlaveReads(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestNeutronContextSlaveReads, self).setUp()
+        # A main and a slave database
+        self.sessions = {}
+        for slave_session in (False, True):
+            engine = sa.create_engine('sqlite://')
+            FakeBase.metadata.create_all(engine)
+            self.sessions[slave_session] = orm.sessionmaker(
+                bind=engine, autocommit=True)
+
+        def get_session(slave_session=False):
+            return self.sessions[slave_session]()
+
+        get_session_patcher = mock.patch.object(db_api, 'get_session',
+                                                side_effect=get_session)
+        get_session_patcher.start()
+        self.addCleanup(get_session_patcher.stop)
+        self.addCleanup(db_api._LAST_WRITES.clear)
+        cfg.CONF.set_override('slave_connection', 'sqlite://', 'database')
+        cfg.CONF.set_override('use_slave_for_reads', True, 'database')
+        self.addCleanup(cfg.CONF.reset)
+
+    def _write(self, ctx, id):
+        with ctx.session.begin():
+            ctx.session.add(FakeModel(id=id))
+
+    def _read(self, ctx):
+        with ctx.reading_from_slave():
+            return [row.id for row in ctx.session.query(FakeModel)]
+
+    def test_reading_from_slave(self):
+        self._write(context.Context('user_id', 'tenant_id'), 'a')
+        ctx = context.Context('user_id', 'other_tenant_id')
+        self.assertEqual([], self._read(ctx))
+        self.assertEqual(['a'], [row.id for row in
+                                 ctx.session.query(FakeModel)])
+
+    def test_reading_from_slave_not_enabled(self):
+        cfg.CONF.set_override('use_slave_for_reads', False, 'database')
+        self._write(context.Context('user_id', 'tenant_id'), 'a')
+        ctx = context.Context('user_id', 'other_tenant_id')
+        self.assertEqual(['a'], self._read(ctx))
+
+    def test_reading_from_slave_without_slave_connection(self):
+        cfg.CONF.set_override('slave_connection', '', 'database')
+        self._write(context.Context('user_id', 'tenant_id'), 'a')
+        ctx = context.Context('user_id', 'other_tenant_id')
+        self.assertEqual(['a'], self._read(ctx))
+
+    def test_reading_from_slave_after_write_of_context(self):
+        ctx = context.get_admin_context()
+        self._write(ctx, 'a')
+        self.assertEqual(['a'], self._read(ctx))
+
+    def test_reading_from_slave_in_transaction(self):
+        ctx = context.Context('user_id', 'tenant_id')
+        with ctx.session.begin():
+            ctx.session.add(FakeModel(id='a'))
+            self.assertEqual(['a'], self._read(ctx))
+
+    def test_reading_from_slave_after_write_of_tenant(self):
+        self._write(context.Context('user_id', 'tenant_id'), 'a')
+        ctx = context.Context('user_id', 'tenant_id')
+        self.assertEqual(['a'], self._read(ctx))
+        with mock.patch('time.time', return_value=db_api._LAST_WRITES[
+                'tenant_id'] + cfg.CONF.database.slave_read_delay):
+            self.assertEqual([], self._read(
+                context.Context('user_id', 'tenant_id')))
+        self.assertNotIn('tenant_id', db_api._LAST_WRITES)
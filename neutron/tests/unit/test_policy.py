@@ -548,3 +548,64 @@ class NeutronPolicyTestCase(base.BaseTestCase):
             {'extension:provider_network:set': 'rule:admin_only'},
             dict((policy, 'rule:admin_only') for policy in
                  expected_policies))
+
+    def _test_compile_check(self, rules, action, targets):
+        self.rules = dict((k, common_policy.parse_rule(v))
+                          for k, v in rules.items())
+        contexts = [context.Context('', 'the_owner', roles=['user']),
+                    context.Context('', 'other', roles=['user', 'Admin']),
+                    context.Context('', 'other', roles=[]),
+                    context.Context('', 'other', roles=['advsvc'])]
+        for ctx in contexts:
+            check = policy.compile_check(ctx, action)
+            for target in targets:
+                self.assertEqual(policy.check(ctx, action, target),
+                                 check(target))
+
+    def test_compile_check_matches_check(self):
+        targets = [{'tenant_id': 'the_owner', 'shared': False},
+                   {'tenant_id': 'someone', 'shared': True},
+                   {'tenant_id': 'someone', 'shared': False}]
+        rules = {
+            "context_is_admin": "role:admin",
+            "admin_or_owner": "rule:context_is_admin or "
+                              "tenant_id:%(tenant_id)s",
+            "shared": "field:networks:shared=True",
+            "never": "!",
+            "get_network": "rule:admin_or_owner or rule:shared",
+            "get_network:shared": "rule:never or not role:user",
+            "get_network:status": "role:user and tenant_id:%(tenant_id)s",
+            "get_network:name": "(role:advsvc or rule:unknown) and "
+                                "not rule:shared",
+            "get_network:id": "rule:never and tenant_id:%(tenant_id)s",
+            "default": "rule:admin_or_owner"}
+        for action in ['get_network', 'get_network:shared',
+                       'get_network:status', 'get_network:name',
+                       'get_network:id', 'get_network:unknown']:
+            self._test_compile_check(rules, action, targets)
+
+    def test_compile_check_write_action(self):
+        rules = {"create_network": "rule:admin_only",
+                 "create_network:shared": "role:admin",
+                 "admin_only": "role:admin"}
+        targets = [{'tenant_id': 'the_owner'},
+                   {'tenant_id': 'the_owner', 'shared': True}]
+        self._test_compile_check(rules, 'create_network', targets)
+
+    def test_compile_check_if_exists_non_existent_action_raises(self):
+        self.assertRaises(exceptions.PolicyRuleNotFound,
+                          policy.compile_check_if_exists,
+                          self.context, 'get_network:unknown')
+
+    def test_compile_check_if_exists(self):
+        check = policy.compile_check_if_exists(self.context, 'get_network')
+        self.assertTrue(check({'tenant_id': 'fake'}))
+        self.assertFalse(check({'tenant_id': 'other', 'shared': False}))
+
+    def test_compile_check_after_rules_change(self):
+        target = {'tenant_id': 'other', 'shared': False}
+        self.assertFalse(policy.compile_check(self.context,
+                                              'get_network')(target))
+        self.rules['get_network'] = common_policy.parse_rule('role:user')
+        self.assertTrue(policy.compile_check(self.context,
+                                             'get_network')(target))
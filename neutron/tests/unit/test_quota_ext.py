@@ -28,8 +28,11 @@ from neutron.common import config
 from neutron.common import exceptions
 from neutron import context
 from neutron.db import api as db
+from neutron.db import models_v2
 from neutron.db import quota_db
 from neutron import manager
+from neutron.openstack.common.db import exception as db_exc
+from neutron.openstack.common.db.sqlalchemy import session
 from neutron.plugins.linuxbridge.db import l2network_db_v2
 from neutron import quota
 from neutron.tests import base
@@ -70,6 +73,7 @@ class QuotaExtensionTestCase(testlib_api.WebTestCase):
             group='QUOTAS')
         quota.QUOTAS = quota.QuotaEngine()
         quota.register_resources_from_config()
+        quota_db._usage_tracked = None
         self._plugin_patcher = mock.patch(TARGET_PLUGIN, autospec=True)
         self.plugin = self._plugin_patcher.start()
         self.plugin.return_value.supported_extension_aliases = ['quotas']
@@ -321,6 +325,132 @@ class QuotaExtensionDbTestCase(QuotaExtensionTestCase):
                            extra_environ=env, expect_errors=True)
         self.assertEqual(400, res.status_int)
 
+    def _add_network(self, ctx, tenant_id):
+        with ctx.session.begin():
+            network = models_v2.Network(tenant_id=tenant_id, name='net',
+                                        admin_state_up=True, shared=False)
+            ctx.session.add(network)
+        return network
+
+    def test_make_reservation_tracks_usage(self):
+        tenant_id = 'tenant_id1'
+        cfg.CONF.set_override('quota_network', 2, group='QUOTAS')
+        ctx = context.Context('', tenant_id)
+        self._add_network(ctx, tenant_id)
+        reservation = quota.QUOTAS.make_reservation(ctx, tenant_id,
+                                                    'network', 1)
+        self.assertIsNotNone(reservation)
+        # The usage is counted once, then updated as networks change
+        with mock.patch.object(quota_db.DbQuotaDriver, '_count') as count:
+            with testtools.ExpectedException(exceptions.OverQuota):
+                quota.QUOTAS.make_reservation(ctx, tenant_id, 'network', 1)
+            quota.QUOTAS.release_reservation(ctx, reservation)
+            network = self._add_network(ctx, tenant_id)
+            with testtools.ExpectedException(exceptions.OverQuota):
+                quota.QUOTAS.make_reservation(ctx, tenant_id, 'network', 1)
+            with ctx.session.begin():
+                ctx.session.delete(network)
+            quota.QUOTAS.make_reservation(ctx, tenant_id, 'network', 1)
+        self.assertFalse(count.called)
+
+    def test_make_reservation_first_use_concurrently(self):
+        tenant_id = 'tenant_id1'
+        cfg.CONF.set_override('quota_network', 2, group='QUOTAS')
+        ctx = context.Context('', tenant_id)
+        other_ctx = context.Context('', tenant_id)
+        create_usage = quota_db.DbQuotaDriver._create_usage
+
+        def create_concurrently(tenant_id, resource):
+            # Another server creates the usage, then a network, first
+            with other_ctx.session.begin():
+                other_ctx.session.add(quota_db.QuotaUsage(
+                    tenant_id=tenant_id, resource=resource, in_use=0))
+            self._add_network(other_ctx, tenant_id)
+            error = db_exc.DBDuplicateEntry(['tenant_id', 'resource'])
+            with mock.patch.object(session.Session, 'flush',
+                                   side_effect=error):
+                create_usage(tenant_id, resource)
+
+        with mock.patch.object(quota_db.DbQuotaDriver, '_create_usage',
+                               side_effect=create_concurrently):
+            self.assertIsNotNone(quota.QUOTAS.make_reservation(
+                ctx, tenant_id, 'network', 1))
+        usage = ctx.session.query(quota_db.QuotaUsage).one()
+        self.assertEqual(1, usage.in_use)
+        with testtools.ExpectedException(exceptions.OverQuota):
+            quota.QUOTAS.make_reservation(ctx, tenant_id, 'network', 1)
+
+    def test_make_reservation_expired(self):
+        tenant_id = 'tenant_id1'
+        cfg.CONF.set_override('quota_network', 1, group='QUOTAS')
+        cfg.CONF.set_override('reservation_expiration', -1, group='QUOTAS')
+        ctx = context.Context('', tenant_id)
+        quota.QUOTAS.make_reservation(ctx, tenant_id, 'network', 1)
+        quota.QUOTAS.make_reservation(ctx, tenant_id, 'network', 1)
+
+    def test_make_reservation_without_tracking(self):
+        tenant_id = 'tenant_id1'
+        cfg.CONF.set_override('track_quota_usage', False, group='QUOTAS')
+        cfg.CONF.set_override('quota_network', 1, group='QUOTAS')
+        ctx = context.Context('', tenant_id)
+        count = mock.Mock(return_value=1)
+        with mock.patch.object(quota.QUOTAS.resources['network'], 'count',
+                               new=count):
+            with testtools.ExpectedException(exceptions.OverQuota):
+                quota.QUOTAS.make_reservation(ctx, tenant_id, 'network', 1,
+                                              'plugin', 'networks', tenant_id)
+        count.assert_called_once_with(ctx, 'plugin', 'networks', tenant_id)
+
+    def test_make_reservation_untracked_resource(self):
+        tenant_id = 'tenant_id1'
+        ctx = context.Context('', tenant_id)
+        count = mock.Mock(return_value=1)
+        with mock.patch.object(quota.QUOTAS.resources['extra1'], 'count',
+                               new=count):
+            self.assertIsNone(quota.QUOTAS.make_reservation(
+                ctx, tenant_id, 'extra1', 1, 'plugin', 'extra1s', tenant_id))
+        count.assert_called_once_with(ctx, 'plugin', 'extra1s', tenant_id)
+
+    def test_resync_usages(self):
+        tenant_id = 'tenant_id1'
+        ctx = context.get_admin_context()
+        self._add_network(ctx, tenant_id)
+        quota.QUOTAS.make_reservation(ctx, tenant_id, 'network', 1)
+        cfg.CONF.set_override('reservation_expiration', -1, group='QUOTAS')
+        quota.QUOTAS.make_reservation(ctx, tenant_id, 'network', 1)
+        # Deleted without going through the ORM
+        ctx.session.query(models_v2.Network).delete()
+        quota.QUOTAS.get_driver().resync_usages(ctx)
+        usage = ctx.session.query(quota_db.QuotaUsage).one()
+        self.assertEqual(0, usage.in_use)
+        self.assertEqual(1, ctx.session.query(quota_db.Reservation).count())
+
+    def test_usage_tracking_resolved_once(self):
+        tenant_id = 'tenant_id1'
+        ctx = context.Context('', tenant_id)
+        with mock.patch.object(quota.QUOTAS, 'get_driver',
+                               wraps=quota.QUOTAS.get_driver) as get_driver:
+            self._add_network(ctx, tenant_id)
+            self._add_network(ctx, tenant_id)
+        self.assertEqual(1, get_driver.call_count)
+
+    def test_start_usage_resync(self):
+        cfg.CONF.set_override('usage_resync_interval', 60, group='QUOTAS')
+        with mock.patch('neutron.openstack.common.loopingcall.'
+                        'FixedIntervalLoopingCall') as looping_call:
+            quota_db.DbQuotaDriver()
+            self.assertFalse(looping_call.called)
+            quota.QUOTAS.start_usage_resync()
+        looping_call.return_value.start.assert_called_once_with(
+            interval=60, initial_delay=60)
+
+    def test_start_usage_resync_disabled(self):
+        cfg.CONF.set_override('usage_resync_interval', 0, group='QUOTAS')
+        with mock.patch('neutron.openstack.common.loopingcall.'
+                        'FixedIntervalLoopingCall') as looping_call:
+            self.assertIsNone(quota_db.DbQuotaDriver().start_usage_resync())
+        self.assertFalse(looping_call.called)
+
 
 class QuotaExtensionDbTestCaseXML(QuotaExtensionDbTestCase):
     fmt = 'xml'
@@ -33,10 +33,12 @@ from neutron.db import securitygroups_rpc_base as sg_db_rpc
 from neutron.extensions import allowedaddresspairs as addr_pair
 from neutron.extensions import securitygroup as ext_sg
 from neutron.manager import NeutronManager
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.openstack.common.rpc import proxy
 from neutron.tests import base
 from neutron.tests.unit import test_extension_security_group as test_sg
 from neutron.tests.unit import test_iptables_firewall as test_fw
+from neutron.tests.unit import testlib_api
 
 
 class FakeSGCallback(sg_db_rpc.SecurityGroupServerRpcCallbackMixin):
@@ -268,10 +270,6 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
                              'security_group_id': sg1_id},
                             {'direction': 'egress', 'ethertype': const.IPv6,
                              'security_group_id': sg1_id},
-                            {'direction': 'egress', 'ethertype': const.IPv4,
-                             'security_group_id': sg2_id},
-                            {'direction': 'egress', 'ethertype': const.IPv6,
-                             'security_group_id': sg2_id},
                             {'direction': u'ingress',
                              'source_ip_prefix': u'10.0.0.3/32',
                              'protocol': const.PROTO_NAME_TCP,
@@ -279,12 +277,143 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
                              'port_range_max': 25, 'port_range_min': 24,
                              'remote_group_id': sg2_id,
                              'security_group_id': sg1_id},
+                            {'direction': 'egress', 'ethertype': const.IPv4,
+                             'security_group_id': sg2_id},
+                            {'direction': 'egress', 'ethertype': const.IPv6,
+                             'security_group_id': sg2_id},
                             ]
                 self.assertEqual(port_rpc['security_group_rules'],
                                  expected)
                 self._delete('ports', port_id1)
                 self._delete('ports', port_id2)
 
+    def test_security_group_rules_for_devices_queries(self):
+        with self.network() as n:
+            with nested(self.subnet(n),
+                        self.security_group(),
+                        self.security_group()) as (subnet_v4,
+                                                   sg1,
+                                                   sg2):
+                sg1_id = sg1['security_group']['id']
+                sg2_id = sg2['security_group']['id']
+                rule1 = self._build_security_group_rule(
+                    sg1_id,
+                    'ingress', const.PROTO_NAME_TCP, '24',
+                    '25', remote_group_id=sg2_id)
+                rules = {
+                    'security_group_rules': [rule1['security_group_rule']]}
+                res = self._create_security_group_rule(self.fmt, rules)
+                self.deserialize(self.fmt, res)
+                self.assertEqual(res.status_int, webob.exc.HTTPCreated.code)
+
+                self.rpc.devices = {}
+                for i in range(4):
+                    res = self._create_port(
+                        self.fmt, n['network']['id'],
+                        security_groups=[sg1_id, sg2_id])
+                    port = self.deserialize(self.fmt, res)['port']
+                    self.rpc.devices[port['id']] = port
+                devices = self.rpc.devices.keys()
+                ctx = context.get_admin_context()
+
+                def count_queries(devices):
+                    with testlib_api.QueryCounter() as counter:
+                        ports_rpc = self.rpc.security_group_rules_for_devices(
+                            ctx, devices=devices)
+                    self.assertEqual(len(devices), len(ports_rpc))
+                    return counter.count
+
+                # the fake callback only looks up each device once
+                self.assertEqual(count_queries(devices[:1]),
+                                 count_queries(devices[1:]))
+                for device in devices:
+                    self._delete('ports', device)
+
+    def test_select_sg_ids_for_ports(self):
+        with self.network() as n:
+            with nested(self.subnet(n),
+                        self.security_group()) as (subnet_v4, sg1):
+                sg1_id = sg1['security_group']['id']
+                ports = {}
+                for i in range(2):
+                    res = self._create_port(
+                        self.fmt, n['network']['id'],
+                        security_groups=[sg1_id])
+                    port = self.deserialize(self.fmt, res)['port']
+                    ports[port['id']] = port
+                fetched_id, missing_id = ports.keys()
+                ports[fetched_id]['security_groups'] = ['fetched_sg']
+                del ports[missing_id]['security_groups']
+                ctx = context.get_admin_context()
+                with testlib_api.QueryCounter() as counter:
+                    sg_ids = self.rpc._select_sg_ids_for_ports(ctx, ports)
+                self.assertEqual({fetched_id: ['fetched_sg'],
+                                  missing_id: [sg1_id]}, sg_ids)
+                self.assertEqual(1, counter.count)
+                del ports[missing_id]
+                with testlib_api.QueryCounter() as counter:
+                    self.rpc._select_sg_ids_for_ports(ctx, ports)
+                self.assertEqual(0, counter.count)
+                for port_id in (fetched_id, missing_id):
+                    self._delete('ports', port_id)
+
+    def test_security_group_info_for_devices(self):
+        with self.network() as n:
+            with nested(self.subnet(n),
+                        self.security_group(),
+                        self.security_group()) as (subnet_v4,
+                                                   sg1,
+                                                   sg2):
+                sg1_id = sg1['security_group']['id']
+                sg2_id = sg2['security_group']['id']
+                rule1 = self._build_security_group_rule(
+                    sg1_id,
+                    'ingress', const.PROTO_NAME_TCP, '24',
+                    '25', remote_group_id=sg2_id)
+                rules = {
+                    'security_group_rules': [rule1['security_group_rule']]}
+                res = self._create_security_group_rule(self.fmt, rules)
+                self.deserialize(self.fmt, res)
+                self.assertEqual(res.status_int, webob.exc.HTTPCreated.code)
+
+                res1 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg1_id])
+                ports_rest1 = self.deserialize(self.fmt, res1)
+                port_id1 = ports_rest1['port']['id']
+                self.rpc.devices = {port_id1: ports_rest1['port']}
+                devices = [port_id1, 'no_exist_device']
+
+                res2 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg2_id])
+                ports_rest2 = self.deserialize(self.fmt, res2)
+                port_id2 = ports_rest2['port']['id']
+                ctx = context.get_admin_context()
+                sg_info = self.rpc.security_group_info_for_devices(
+                    ctx, devices=devices, cached_security_groups=[sg2_id])
+                expected = [{'direction': 'egress', 'ethertype': const.IPv4,
+                             'security_group_id': sg1_id},
+                            {'direction': 'egress', 'ethertype': const.IPv6,
+                             'security_group_id': sg1_id},
+                            {'direction': 'ingress',
+                             'protocol': const.PROTO_NAME_TCP,
+                             'ethertype': const.IPv4,
+                             'port_range_max': 25, 'port_range_min': 24,
+                             'remote_group_id': sg2_id,
+                             'security_group_id': sg1_id},
+                            ]
+                self.assertEqual({sg1_id: expected},
+                                 sg_info['security_groups'])
+                self.assertEqual({sg2_id: ['10.0.0.3']},
+                                 sg_info['sg_member_ips'])
+                self.assertEqual([port_id1], sg_info['devices'].keys())
+                port_rpc = sg_info['devices'][port_id1]
+                self.assertEqual([sg1_id], port_rpc['security_groups'])
+                self.assertEqual([], port_rpc['security_group_rules'])
+                self._delete('ports', port_id1)
+                self._delete('ports', port_id2)
+
     def test_security_group_rules_for_devices_ipv6_ingress(self):
         fake_prefix = test_fw.FAKE_PREFIX[const.IPv6]
         with self.network() as n:
@@ -454,10 +583,6 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
                              'security_group_id': sg1_id},
                             {'direction': 'egress', 'ethertype': const.IPv6,
                              'security_group_id': sg1_id},
-                            {'direction': 'egress', 'ethertype': const.IPv4,
-                             'security_group_id': sg2_id},
-                            {'direction': 'egress', 'ethertype': const.IPv6,
-                             'security_group_id': sg2_id},
                             {'direction': 'ingress',
                              'source_ip_prefix': 'fe80::3/128',
                              'protocol': const.PROTO_NAME_TCP,
@@ -465,6 +590,10 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
                              'port_range_max': 25, 'port_range_min': 24,
                              'remote_group_id': sg2_id,
                              'security_group_id': sg1_id},
+                            {'direction': 'egress', 'ethertype': const.IPv4,
+                             'security_group_id': sg2_id},
+                            {'direction': 'egress', 'ethertype': const.IPv6,
+                             'security_group_id': sg2_id},
                             ]
                 self.assertEqual(port_rpc['security_group_rules'],
                                  expected)
@@ -524,6 +653,8 @@ class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
                                                       'fake_sgid2'}]}
         fake_devices = {'fake_device': self.fake_device}
         self.firewall.ports = fake_devices
+        # the plugin doesn't support security group info
+        rpc.security_group_info_for_devices.return_value = None
         rpc.security_group_rules_for_devices.return_value = fake_devices
 
     def test_prepare_and_remove_devices_filter(self):
@@ -593,6 +724,207 @@ class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
         self.firewall.assert_has_calls([])
 
 
+class SecurityGroupAgentDeferredRefreshTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(SecurityGroupAgentDeferredRefreshTestCase, self).setUp()
+        self.agent = sg_rpc.SecurityGroupAgentRpcMixin()
+        self.agent.context = None
+        self.addCleanup(mock.patch.stopall)
+        mock.patch('neutron.agent.linux.iptables_manager').start()
+        self.agent.root_helper = 'sudo'
+        self.agent.init_firewall(defer_refresh_firewall=True)
+        self.firewall = mock.Mock()
+        self.agent.firewall = self.firewall
+        self.agent.refresh_firewall = mock.Mock()
+        self.devices = {}
+        for i in range(1, 4):
+            device_id = 'fake_device%d' % i
+            self.devices[device_id] = {
+                'device': device_id,
+                'security_groups': ['fake_sgid%d' % i],
+                'security_group_source_groups': ['fake_sgid1']}
+        self.firewall.ports = self.devices
+
+    def _refreshed_devices(self):
+        args = self.agent.refresh_firewall.call_args[0]
+        return sorted(device['device'] for device in args[0])
+
+    def test_security_groups_updated_deferred(self):
+        self.agent.security_groups_rule_updated(['fake_sgid2'])
+        self.agent.security_groups_rule_updated(['fake_sgid3'])
+        self.agent.security_groups_member_updated(['fake_sgid4'])
+        self.assertFalse(self.agent.refresh_firewall.called)
+        self.assertTrue(self.agent.firewall_refresh_needed())
+        self.agent.refresh_deferred_firewall()
+        self.assertEqual(1, self.agent.refresh_firewall.call_count)
+        self.assertEqual(['fake_device2', 'fake_device3'],
+                         self._refreshed_devices())
+        self.assertFalse(self.agent.firewall_refresh_needed())
+        self.assertEqual({'notifications': 2, 'merged': 1, 'refreshes': 1},
+                         self.agent.refresh_stats)
+
+    def test_member_updated_notifications_merged(self):
+        for i in range(100):
+            self.agent.security_groups_member_updated(['fake_sgid1'])
+        self.agent.refresh_deferred_firewall()
+        self.agent.refresh_deferred_firewall()
+        self.assertEqual(1, self.agent.refresh_firewall.call_count)
+        self.assertEqual(sorted(self.devices), self._refreshed_devices())
+        self.assertEqual({'notifications': 100, 'merged': 99,
+                          'refreshes': 1},
+                         self.agent.refresh_stats)
+
+    def test_provider_updated_deferred(self):
+        self.agent.security_groups_rule_updated(['fake_sgid2'])
+        self.agent.security_groups_provider_updated()
+        self.assertFalse(self.agent.refresh_firewall.called)
+        self.agent.refresh_deferred_firewall()
+        self.agent.refresh_firewall.assert_called_once_with()
+
+    def test_removed_device_not_refreshed(self):
+        self.agent.security_groups_rule_updated(['fake_sgid2'])
+        del self.devices['fake_device2']
+        self.agent.refresh_deferred_firewall()
+        self.assertFalse(self.agent.refresh_firewall.called)
+        self.assertFalse(self.agent.firewall_refresh_needed())
+
+
+class SecurityGroupAgentInfoRpcTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(SecurityGroupAgentInfoRpcTestCase, self).setUp()
+        self.agent = sg_rpc.SecurityGroupAgentRpcMixin()
+        self.agent.context = None
+        self.addCleanup(mock.patch.stopall)
+        mock.patch('neutron.agent.linux.iptables_manager').start()
+        self.agent.root_helper = 'sudo'
+        self.agent.init_firewall()
+        self.firewall = mock.Mock()
+        firewall_object = firewall_base.FirewallDriver()
+        self.firewall.defer_apply.side_effect = firewall_object.defer_apply
+        self.firewall.ports = {}
+        self.agent.firewall = self.firewall
+        self.rpc = mock.Mock()
+        self.agent.plugin_rpc = self.rpc
+        self.sg1_rules = [
+            {'security_group_id': 'fake_sgid1', 'direction': 'egress',
+             'ethertype': const.IPv4},
+            {'security_group_id': 'fake_sgid1', 'direction': 'ingress',
+             'ethertype': const.IPv4, 'protocol': const.PROTO_NAME_TCP,
+             'remote_group_id': 'fake_sgid2'}]
+        self.dhcp_rule = {'direction': 'ingress', 'ethertype': const.IPv4,
+                          'protocol': const.PROTO_NAME_UDP,
+                          'source_ip_prefix': '10.0.0.2/32'}
+
+    def _device(self):
+        return {'device': 'fake_device',
+                'security_groups': ['fake_sgid1'],
+                'fixed_ips': ['10.0.0.3'],
+                'security_group_rules': [self.dhcp_rule],
+                'security_group_source_groups': []}
+
+    def _info(self, security_groups):
+        return {'security_groups': security_groups,
+                'sg_member_ips': {'fake_sgid2': ['10.0.0.3', '10.0.0.4',
+                                                 'fe80::4']},
+                'devices': {'fake_device': self._device()}}
+
+    def test_prepare_devices_filter(self):
+        self.rpc.security_group_info_for_devices.return_value = self._info(
+            {'fake_sgid1': self.sg1_rules})
+        self.agent.prepare_devices_filter(['fake_device'])
+        device = self._device()
+        device['security_group_rules'] = [
+            self.sg1_rules[0],
+            dict(self.sg1_rules[1], source_ip_prefix='10.0.0.4/32'),
+            self.dhcp_rule]
+        device['security_group_source_groups'] = ['fake_sgid2']
+        self.firewall.assert_has_calls([call.defer_apply(),
+                                        call.prepare_port_filter(device)])
+        self.rpc.security_group_info_for_devices.assert_called_once_with(
+            None, ['fake_device'], cached_security_groups=[])
+        self.assertFalse(self.rpc.security_group_rules_for_devices.called)
+
+    def test_cached_security_groups(self):
+        self.rpc.security_group_info_for_devices.return_value = self._info(
+            {'fake_sgid1': self.sg1_rules})
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.firewall.ports = {'fake_device': self._device()}
+        self.rpc.security_group_info_for_devices.return_value = self._info(
+            {})
+        self.agent.refresh_firewall([self._device()])
+        self.rpc.security_group_info_for_devices.assert_called_with(
+            None, ['fake_device'], cached_security_groups=['fake_sgid1'])
+        device = self.firewall.update_port_filter.call_args[0][0]
+        self.assertEqual(3, len(device['security_group_rules']))
+
+    def test_security_groups_rule_updated_clears_cache(self):
+        self.agent.sg_rules_cache = {'fake_sgid1': self.sg1_rules,
+                                     'fake_sgid3': []}
+        self.agent.refresh_firewall = mock.Mock()
+        self.agent.security_groups_rule_updated(['fake_sgid1'])
+        self.assertEqual({'fake_sgid3': []}, self.agent.sg_rules_cache)
+
+    def test_rules_updated_during_call_not_cached(self):
+        new_rules = [{'security_group_id': 'fake_sgid1',
+                      'direction': 'egress', 'ethertype': const.IPv6}]
+
+        def info_for_devices(context, devices, cached_security_groups):
+            if self.rpc.security_group_info_for_devices.call_count == 1:
+                # The rules are updated before the reply is received
+                self.agent.security_groups_rule_updated(['fake_sgid1'])
+                return self._info({'fake_sgid1': self.sg1_rules})
+            self.assertEqual([], cached_security_groups)
+            return self._info({'fake_sgid1': new_rules})
+
+        self.rpc.security_group_info_for_devices.side_effect = (
+            info_for_devices)
+        self.firewall.prepare_port_filter.side_effect = (
+            lambda device: self.firewall.ports.update(
+                {device['device']: device}))
+        self.agent.prepare_devices_filter(['fake_device'])
+        # The device is filtered with the rules of the reply, then
+        # refreshed with the updated ones
+        self.assertEqual(2, self.rpc.security_group_info_for_devices.
+                         call_count)
+        device = self.firewall.update_port_filter.call_args[0][0]
+        self.assertEqual(new_rules + [self.dhcp_rule],
+                         device['security_group_rules'])
+        self.assertEqual({'fake_sgid1': new_rules},
+                         self.agent.sg_rules_cache)
+
+    def test_refresh_port_firewall_keeps_cache(self):
+        self.agent.sg_rules_cache = {'fake_sgid1': self.sg1_rules}
+        self.firewall.ports = {'fake_device': self._device(),
+                               'other_device': self._device()}
+        self.rpc.security_group_info_for_devices.return_value = self._info(
+            {})
+        self.agent.refresh_port_firewall('unknown_device')
+        self.assertFalse(self.rpc.security_group_info_for_devices.called)
+        self.agent.refresh_port_firewall('fake_device')
+        self.rpc.security_group_info_for_devices.assert_called_once_with(
+            None, ['fake_device'], cached_security_groups=['fake_sgid1'])
+        self.assertEqual({'fake_sgid1': self.sg1_rules},
+                         self.agent.sg_rules_cache)
+
+    def test_remove_devices_filter_clears_cache(self):
+        self.agent.sg_rules_cache = {'fake_sgid1': self.sg1_rules}
+        device = self._device()
+        self.firewall.ports = {'fake_device': device}
+        self.firewall.remove_port_filter.side_effect = (
+            lambda device: self.firewall.ports.pop(device['device']))
+        self.agent.remove_devices_filter(['fake_device'])
+        self.assertEqual({}, self.agent.sg_rules_cache)
+
+    def test_refresh_all_clears_cache(self):
+        self.agent.sg_rules_cache = {'fake_sgid1': self.sg1_rules}
+        self.firewall.ports = {'fake_device': self._device()}
+        self.rpc.security_group_info_for_devices.return_value = self._info(
+            {'fake_sgid1': self.sg1_rules})
+        self.agent.refresh_firewall()
+        self.rpc.security_group_info_for_devices.assert_called_once_with(
+            None, ['fake_device'], cached_security_groups=[])
+
+
 class FakeSGRpcApi(agent_rpc.PluginApi,
                    sg_rpc.SecurityGroupServerRpcApiMixin):
     pass
@@ -615,6 +947,33 @@ class SecurityGroupServerRpcApiTestCase(base.BaseTestCase):
              version=sg_rpc.SG_RPC_VERSION,
              topic='fake_topic')])
 
+    def test_security_group_info_for_devices(self):
+        self.rpc.security_group_info_for_devices(None, ['fake_device'])
+        self.rpc.call.assert_has_calls(
+            [call(None,
+             {'args':
+                 {'devices': ['fake_device'],
+                  'cached_security_groups': None},
+              'method': 'security_group_info_for_devices',
+              'namespace': None},
+             version=sg_rpc.SG_INFO_RPC_VERSION,
+             topic='fake_topic')])
+
+    def test_security_group_info_for_devices_unsupported(self):
+        self.rpc.call.side_effect = rpc_common.RemoteError(
+            'UnsupportedRpcVersion')
+        self.assertIsNone(
+            self.rpc.security_group_info_for_devices(None, ['fake_device']))
+        self.assertIsNone(
+            self.rpc.security_group_info_for_devices(None, ['fake_device']))
+        self.assertEqual(1, self.rpc.call.call_count)
+
+    def test_security_group_info_for_devices_error(self):
+        self.rpc.call.side_effect = rpc_common.RemoteError('ValueError')
+        self.assertRaises(rpc_common.RemoteError,
+                          self.rpc.security_group_info_for_devices,
+                          None, ['fake_device'])
+
 
 class FakeSGNotifierAPI(proxy.RpcProxy,
                         sg_rpc.SecurityGroupAgentRpcApiMixin):
@@ -750,57 +1109,6 @@ COMMIT
 """ % IPTABLES_ARG
 
 
-IPTABLES_FILTER_1_2 = """# Generated by iptables_manager
-*filter
-:neutron-filter-top - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-[0:0] -A FORWARD -j neutron-filter-top
-[0:0] -A OUTPUT -j neutron-filter-top
-[0:0] -A neutron-filter-top -j %(bn)s-local
-[0:0] -A INPUT -j %(bn)s-INPUT
-[0:0] -A OUTPUT -j %(bn)s-OUTPUT
-[0:0] -A FORWARD -j %(bn)s-FORWARD
-[0:0] -A %(bn)s-sg-fallback -j DROP
-[0:0] -A %(bn)s-FORWARD %(physdev_mod)s --physdev-INGRESS tap_port1 \
-%(physdev_is_bridged)s -j %(bn)s-sg-chain
-[0:0] -A %(bn)s-sg-chain %(physdev_mod)s --physdev-INGRESS tap_port1 \
-%(physdev_is_bridged)s -j %(bn)s-i_port1
-[0:0] -A %(bn)s-i_port1 -m state --state INVALID -j DROP
-[0:0] -A %(bn)s-i_port1 -m state --state RELATED,ESTABLISHED -j RETURN
-[0:0] -A %(bn)s-i_port1 -s 10.0.0.2 -p udp -m udp --sport 67 --dport 68 -j \
-RETURN
-[0:0] -A %(bn)s-i_port1 -p tcp -m tcp --dport 22 -j RETURN
-[0:0] -A %(bn)s-i_port1 -s 10.0.0.4 -j RETURN
-[0:0] -A %(bn)s-i_port1 -j %(bn)s-sg-fallback
-[0:0] -A %(bn)s-FORWARD %(physdev_mod)s --physdev-EGRESS tap_port1 \
-%(physdev_is_bridged)s -j %(bn)s-sg-chain
-[0:0] -A %(bn)s-sg-chain %(physdev_mod)s --physdev-EGRESS tap_port1 \
-%(physdev_is_bridged)s -j %(bn)s-o_port1
-[0:0] -A %(bn)s-INPUT %(physdev_mod)s --physdev-EGRESS tap_port1 \
-%(physdev_is_bridged)s -j %(bn)s-o_port1
-[0:0] -A %(bn)s-s_port1 -m mac --mac-source 12:34:56:78:9a:bc -s 10.0.0.3 -j \
-RETURN
-[0:0] -A %(bn)s-s_port1 -j DROP
-[0:0] -A %(bn)s-o_port1 -p udp -m udp --sport 68 --dport 67 -j RETURN
-[0:0] -A %(bn)s-o_port1 -j %(bn)s-s_port1
-[0:0] -A %(bn)s-o_port1 -p udp -m udp --sport 67 --dport 68 -j DROP
-[0:0] -A %(bn)s-o_port1 -m state --state INVALID -j DROP
-[0:0] -A %(bn)s-o_port1 -m state --state RELATED,ESTABLISHED -j RETURN
-[0:0] -A %(bn)s-o_port1 -j RETURN
-[0:0] -A %(bn)s-o_port1 -j %(bn)s-sg-fallback
-[0:0] -A %(bn)s-sg-chain -j ACCEPT
-COMMIT
-# Completed by iptables_manager
-""" % IPTABLES_ARG
-
 IPTABLES_ARG['chains'] = CHAINS_2
 
 IPTABLES_FILTER_2 = """# Generated by iptables_manager
@@ -884,7 +1192,8 @@ COMMIT
 # Completed by iptables_manager
 """ % IPTABLES_ARG
 
-IPTABLES_FILTER_2_2 = """# Generated by iptables_manager
+IPTABLES_ARG['chains'] = CHAINS_1
+IPTABLES_FILTER_V6_1 = """# Generated by iptables_manager
 *filter
 :neutron-filter-top - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
@@ -895,10 +1204,6 @@ IPTABLES_FILTER_2_2 = """# Generated by iptables_manager
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
 [0:0] -A FORWARD -j neutron-filter-top
 [0:0] -A OUTPUT -j neutron-filter-top
 [0:0] -A neutron-filter-top -j %(bn)s-local
@@ -910,11 +1215,14 @@ IPTABLES_FILTER_2_2 = """# Generated by iptables_manager
 %(physdev_is_bridged)s -j %(bn)s-sg-chain
 [0:0] -A %(bn)s-sg-chain %(physdev_mod)s --physdev-INGRESS tap_port1 \
 %(physdev_is_bridged)s -j %(bn)s-i_port1
+[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 130 -j RETURN
+[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 131 -j RETURN
+[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 132 -j RETURN
+[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 134 -j RETURN
+[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 135 -j RETURN
+[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 136 -j RETURN
 [0:0] -A %(bn)s-i_port1 -m state --state INVALID -j DROP
 [0:0] -A %(bn)s-i_port1 -m state --state RELATED,ESTABLISHED -j RETURN
-[0:0] -A %(bn)s-i_port1 -s 10.0.0.2 -p udp -m udp --sport 67 --dport 68 -j \
-RETURN
-[0:0] -A %(bn)s-i_port1 -p tcp -m tcp --dport 22 -j RETURN
 [0:0] -A %(bn)s-i_port1 -j %(bn)s-sg-fallback
 [0:0] -A %(bn)s-FORWARD %(physdev_mod)s --physdev-EGRESS tap_port1 \
 %(physdev_is_bridged)s -j %(bn)s-sg-chain
@@ -922,49 +1230,19 @@ RETURN
 %(physdev_is_bridged)s -j %(bn)s-o_port1
 [0:0] -A %(bn)s-INPUT %(physdev_mod)s --physdev-EGRESS tap_port1 \
 %(physdev_is_bridged)s -j %(bn)s-o_port1
-[0:0] -A %(bn)s-s_port1 -m mac --mac-source 12:34:56:78:9a:bc -s 10.0.0.3 -j \
-RETURN
-[0:0] -A %(bn)s-s_port1 -j DROP
-[0:0] -A %(bn)s-o_port1 -p udp -m udp --sport 68 --dport 67 -j RETURN
-[0:0] -A %(bn)s-o_port1 -j %(bn)s-s_port1
-[0:0] -A %(bn)s-o_port1 -p udp -m udp --sport 67 --dport 68 -j DROP
+[0:0] -A %(bn)s-o_port1 -p icmpv6 -j RETURN
 [0:0] -A %(bn)s-o_port1 -m state --state INVALID -j DROP
 [0:0] -A %(bn)s-o_port1 -m state --state RELATED,ESTABLISHED -j RETURN
-[0:0] -A %(bn)s-o_port1 -j RETURN
 [0:0] -A %(bn)s-o_port1 -j %(bn)s-sg-fallback
-[0:0] -A %(bn)s-FORWARD %(physdev_mod)s --physdev-INGRESS tap_port2 \
-%(physdev_is_bridged)s -j %(bn)s-sg-chain
-[0:0] -A %(bn)s-sg-chain %(physdev_mod)s --physdev-INGRESS tap_port2 \
-%(physdev_is_bridged)s -j %(bn)s-i_port2
-[0:0] -A %(bn)s-i_port2 -m state --state INVALID -j DROP
-[0:0] -A %(bn)s-i_port2 -m state --state RELATED,ESTABLISHED -j RETURN
-[0:0] -A %(bn)s-i_port2 -s 10.0.0.2 -p udp -m udp --sport 67 --dport 68 -j \
-RETURN
-[0:0] -A %(bn)s-i_port2 -p tcp -m tcp --dport 22 -j RETURN
-[0:0] -A %(bn)s-i_port2 -s 10.0.0.3 -j RETURN
-[0:0] -A %(bn)s-i_port2 -j %(bn)s-sg-fallback
-[0:0] -A %(bn)s-FORWARD %(physdev_mod)s --physdev-EGRESS tap_port2 \
-%(physdev_is_bridged)s -j %(bn)s-sg-chain
-[0:0] -A %(bn)s-sg-chain %(physdev_mod)s --physdev-EGRESS tap_port2 \
-%(physdev_is_bridged)s -j %(bn)s-o_port2
-[0:0] -A %(bn)s-INPUT %(physdev_mod)s --physdev-EGRESS tap_port2 \
-%(physdev_is_bridged)s -j %(bn)s-o_port2
-[0:0] -A %(bn)s-s_port2 -m mac --mac-source 12:34:56:78:9a:bd -s 10.0.0.4 -j \
-RETURN
-[0:0] -A %(bn)s-s_port2 -j DROP
-[0:0] -A %(bn)s-o_port2 -p udp -m udp --sport 68 --dport 67 -j RETURN
-[0:0] -A %(bn)s-o_port2 -j %(bn)s-s_port2
-[0:0] -A %(bn)s-o_port2 -p udp -m udp --sport 67 --dport 68 -j DROP
-[0:0] -A %(bn)s-o_port2 -m state --state INVALID -j DROP
-[0:0] -A %(bn)s-o_port2 -m state --state RELATED,ESTABLISHED -j RETURN
-[0:0] -A %(bn)s-o_port2 -j RETURN
-[0:0] -A %(bn)s-o_port2 -j %(bn)s-sg-fallback
 [0:0] -A %(bn)s-sg-chain -j ACCEPT
 COMMIT
 # Completed by iptables_manager
 """ % IPTABLES_ARG
 
-IPTABLES_FILTER_2_3 = """# Generated by iptables_manager
+
+IPTABLES_ARG['chains'] = CHAINS_2
+
+IPTABLES_FILTER_V6_2 = """# Generated by iptables_manager
 *filter
 :neutron-filter-top - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
@@ -977,8 +1255,6 @@ IPTABLES_FILTER_2_3 = """# Generated by iptables_manager
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
 [0:0] -A FORWARD -j neutron-filter-top
 [0:0] -A OUTPUT -j neutron-filter-top
 [0:0] -A neutron-filter-top -j %(bn)s-local
@@ -990,13 +1266,14 @@ IPTABLES_FILTER_2_3 = """# Generated by iptables_manager
 %(physdev_is_bridged)s -j %(bn)s-sg-chain
 [0:0] -A %(bn)s-sg-chain %(physdev_mod)s --physdev-INGRESS tap_port1 \
 %(physdev_is_bridged)s -j %(bn)s-i_port1
+[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 130 -j RETURN
+[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 131 -j RETURN
+[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 132 -j RETURN
+[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 134 -j RETURN
+[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 135 -j RETURN
+[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 136 -j RETURN
 [0:0] -A %(bn)s-i_port1 -m state --state INVALID -j DROP
 [0:0] -A %(bn)s-i_port1 -m state --state RELATED,ESTABLISHED -j RETURN
-[0:0] -A %(bn)s-i_port1 -s 10.0.0.2 -p udp -m udp --sport 67 --dport 68 -j \
-RETURN
-[0:0] -A %(bn)s-i_port1 -p tcp -m tcp --dport 22 -j RETURN
-[0:0] -A %(bn)s-i_port1 -s 10.0.0.4 -j RETURN
-[0:0] -A %(bn)s-i_port1 -p icmp -j RETURN
 [0:0] -A %(bn)s-i_port1 -j %(bn)s-sg-fallback
 [0:0] -A %(bn)s-FORWARD %(physdev_mod)s --physdev-EGRESS tap_port1 \
 %(physdev_is_bridged)s -j %(bn)s-sg-chain
@@ -1004,27 +1281,22 @@ RETURN
 %(physdev_is_bridged)s -j %(bn)s-o_port1
 [0:0] -A %(bn)s-INPUT %(physdev_mod)s --physdev-EGRESS tap_port1 \
 %(physdev_is_bridged)s -j %(bn)s-o_port1
-[0:0] -A %(bn)s-s_port1 -m mac --mac-source 12:34:56:78:9a:bc -s 10.0.0.3 -j \
-RETURN
-[0:0] -A %(bn)s-s_port1 -j DROP
-[0:0] -A %(bn)s-o_port1 -p udp -m udp --sport 68 --dport 67 -j RETURN
-[0:0] -A %(bn)s-o_port1 -j %(bn)s-s_port1
-[0:0] -A %(bn)s-o_port1 -p udp -m udp --sport 67 --dport 68 -j DROP
+[0:0] -A %(bn)s-o_port1 -p icmpv6 -j RETURN
 [0:0] -A %(bn)s-o_port1 -m state --state INVALID -j DROP
 [0:0] -A %(bn)s-o_port1 -m state --state RELATED,ESTABLISHED -j RETURN
-[0:0] -A %(bn)s-o_port1 -j RETURN
 [0:0] -A %(bn)s-o_port1 -j %(bn)s-sg-fallback
 [0:0] -A %(bn)s-FORWARD %(physdev_mod)s --physdev-INGRESS tap_port2 \
 %(physdev_is_bridged)s -j %(bn)s-sg-chain
 [0:0] -A %(bn)s-sg-chain %(physdev_mod)s --physdev-INGRESS tap_port2 \
 %(physdev_is_bridged)s -j %(bn)s-i_port2
+[0:0] -A %(bn)s-i_port2 -p icmpv6 --icmpv6-type 130 -j RETURN
+[0:0] -A %(bn)s-i_port2 -p icmpv6 --icmpv6-type 131 -j RETURN
+[0:0] -A %(bn)s-i_port2 -p icmpv6 --icmpv6-type 132 -j RETURN
+[0:0] -A %(bn)s-i_port2 -p icmpv6 --icmpv6-type 134 -j RETURN
+[0:0] -A %(bn)s-i_port2 -p icmpv6 --icmpv6-type 135 -j RETURN
+[0:0] -A %(bn)s-i_port2 -p icmpv6 --icmpv6-type 136 -j RETURN
 [0:0] -A %(bn)s-i_port2 -m state --state INVALID -j DROP
 [0:0] -A %(bn)s-i_port2 -m state --state RELATED,ESTABLISHED -j RETURN
-[0:0] -A %(bn)s-i_port2 -s 10.0.0.2 -p udp -m udp --sport 67 --dport 68 -j \
-RETURN
-[0:0] -A %(bn)s-i_port2 -p tcp -m tcp --dport 22 -j RETURN
-[0:0] -A %(bn)s-i_port2 -s 10.0.0.3 -j RETURN
-[0:0] -A %(bn)s-i_port2 -p icmp -j RETURN
 [0:0] -A %(bn)s-i_port2 -j %(bn)s-sg-fallback
 [0:0] -A %(bn)s-FORWARD %(physdev_mod)s --physdev-EGRESS tap_port2 \
 %(physdev_is_bridged)s -j %(bn)s-sg-chain
@@ -1032,184 +1304,210 @@ RETURN
 %(physdev_is_bridged)s -j %(bn)s-o_port2
 [0:0] -A %(bn)s-INPUT %(physdev_mod)s --physdev-EGRESS tap_port2 \
 %(physdev_is_bridged)s -j %(bn)s-o_port2
-[0:0] -A %(bn)s-s_port2 -m mac --mac-source 12:34:56:78:9a:bd -s 10.0.0.4 -j \
-RETURN
-[0:0] -A %(bn)s-s_port2 -j DROP
-[0:0] -A %(bn)s-o_port2 -p udp -m udp --sport 68 --dport 67 -j RETURN
-[0:0] -A %(bn)s-o_port2 -j %(bn)s-s_port2
-[0:0] -A %(bn)s-o_port2 -p udp -m udp --sport 67 --dport 68 -j DROP
+[0:0] -A %(bn)s-o_port2 -p icmpv6 -j RETURN
 [0:0] -A %(bn)s-o_port2 -m state --state INVALID -j DROP
 [0:0] -A %(bn)s-o_port2 -m state --state RELATED,ESTABLISHED -j RETURN
-[0:0] -A %(bn)s-o_port2 -j RETURN
 [0:0] -A %(bn)s-o_port2 -j %(bn)s-sg-fallback
 [0:0] -A %(bn)s-sg-chain -j ACCEPT
 COMMIT
 # Completed by iptables_manager
 """ % IPTABLES_ARG
 
+# The changed chains rewritten by iptables-restore --noflush
+IPTABLES_ARG['chains'] = CHAINS_2
 
-IPTABLES_ARG['chains'] = CHAINS_EMPTY
-IPTABLES_FILTER_EMPTY = """# Generated by iptables_manager
-*filter
-:neutron-filter-top - [0:0]
+IPTABLES_NOFLUSH_REMOVE_1 = """*filter
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
-[0:0] -A FORWARD -j neutron-filter-top
-[0:0] -A OUTPUT -j neutron-filter-top
-[0:0] -A neutron-filter-top -j %(bn)s-local
-[0:0] -A INPUT -j %(bn)s-INPUT
-[0:0] -A OUTPUT -j %(bn)s-OUTPUT
-[0:0] -A FORWARD -j %(bn)s-FORWARD
-[0:0] -A %(bn)s-sg-fallback -j DROP
-COMMIT
-# Completed by iptables_manager
-""" % IPTABLES_ARG
+-X %(bn)s-i_port1
+-X %(bn)s-o_port1
+-X %(bn)s-s_port1
+COMMIT""" % IPTABLES_ARG
 
-IPTABLES_ARG['chains'] = CHAINS_1
-IPTABLES_FILTER_V6_1 = """# Generated by iptables_manager
-*filter
-:neutron-filter-top - [0:0]
+IPTABLES_NOFLUSH_V6_REMOVE_1 = """*filter
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
+-X %(bn)s-i_port1
+-X %(bn)s-o_port1
+COMMIT""" % IPTABLES_ARG
+
+IPTABLES_NOFLUSH_1_2 = """*filter
 :%(bn)s-(%(chains)s) - [0:0]
+-A %(bn)s-i_port1 -m state --state INVALID -j DROP
+-A %(bn)s-i_port1 -m state --state RELATED,ESTABLISHED -j RETURN
+-A %(bn)s-i_port1 -s 10.0.0.2 -p udp -m udp --sport 67 --dport 68 -j RETURN
+-A %(bn)s-i_port1 -p tcp -m tcp --dport 22 -j RETURN
+-A %(bn)s-i_port1 -s 10.0.0.4 -j RETURN
+-A %(bn)s-i_port1 -j %(bn)s-sg-fallback
+COMMIT""" % IPTABLES_ARG
+
+IPTABLES_NOFLUSH_ADD_2 = """*filter
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
-[0:0] -A FORWARD -j neutron-filter-top
-[0:0] -A OUTPUT -j neutron-filter-top
-[0:0] -A neutron-filter-top -j %(bn)s-local
-[0:0] -A INPUT -j %(bn)s-INPUT
-[0:0] -A OUTPUT -j %(bn)s-OUTPUT
-[0:0] -A FORWARD -j %(bn)s-FORWARD
-[0:0] -A %(bn)s-sg-fallback -j DROP
-[0:0] -A %(bn)s-FORWARD %(physdev_mod)s --physdev-INGRESS tap_port1 \
+:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-INGRESS tap_port1 \
 %(physdev_is_bridged)s -j %(bn)s-sg-chain
-[0:0] -A %(bn)s-sg-chain %(physdev_mod)s --physdev-INGRESS tap_port1 \
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-INGRESS tap_port1 \
 %(physdev_is_bridged)s -j %(bn)s-i_port1
-[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 130 -j RETURN
-[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 131 -j RETURN
-[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 132 -j RETURN
-[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 134 -j RETURN
-[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 135 -j RETURN
-[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 136 -j RETURN
-[0:0] -A %(bn)s-i_port1 -m state --state INVALID -j DROP
-[0:0] -A %(bn)s-i_port1 -m state --state RELATED,ESTABLISHED -j RETURN
-[0:0] -A %(bn)s-i_port1 -j %(bn)s-sg-fallback
-[0:0] -A %(bn)s-FORWARD %(physdev_mod)s --physdev-EGRESS tap_port1 \
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-EGRESS tap_port1 \
 %(physdev_is_bridged)s -j %(bn)s-sg-chain
-[0:0] -A %(bn)s-sg-chain %(physdev_mod)s --physdev-EGRESS tap_port1 \
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-EGRESS tap_port1 \
 %(physdev_is_bridged)s -j %(bn)s-o_port1
-[0:0] -A %(bn)s-INPUT %(physdev_mod)s --physdev-EGRESS tap_port1 \
+-A %(bn)s-INPUT %(physdev_mod)s --physdev-EGRESS tap_port1 \
 %(physdev_is_bridged)s -j %(bn)s-o_port1
-[0:0] -A %(bn)s-o_port1 -p icmpv6 -j RETURN
-[0:0] -A %(bn)s-o_port1 -m state --state INVALID -j DROP
-[0:0] -A %(bn)s-o_port1 -m state --state RELATED,ESTABLISHED -j RETURN
-[0:0] -A %(bn)s-o_port1 -j %(bn)s-sg-fallback
-[0:0] -A %(bn)s-sg-chain -j ACCEPT
-COMMIT
-# Completed by iptables_manager
-""" % IPTABLES_ARG
-
-
-IPTABLES_ARG['chains'] = CHAINS_2
+-A %(bn)s-sg-chain -j ACCEPT
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-INGRESS tap_port2 \
+%(physdev_is_bridged)s -j %(bn)s-sg-chain
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-INGRESS tap_port2 \
+%(physdev_is_bridged)s -j %(bn)s-i_port2
+-A %(bn)s-i_port2 -m state --state INVALID -j DROP
+-A %(bn)s-i_port2 -m state --state RELATED,ESTABLISHED -j RETURN
+-A %(bn)s-i_port2 -s 10.0.0.2 -p udp -m udp --sport 67 --dport 68 -j RETURN
+-A %(bn)s-i_port2 -p tcp -m tcp --dport 22 -j RETURN
+-A %(bn)s-i_port2 -s 10.0.0.3 -j RETURN
+-A %(bn)s-i_port2 -j %(bn)s-sg-fallback
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-EGRESS tap_port2 \
+%(physdev_is_bridged)s -j %(bn)s-sg-chain
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-EGRESS tap_port2 \
+%(physdev_is_bridged)s -j %(bn)s-o_port2
+-A %(bn)s-INPUT %(physdev_mod)s --physdev-EGRESS tap_port2 \
+%(physdev_is_bridged)s -j %(bn)s-o_port2
+-A %(bn)s-s_port2 -m mac --mac-source 12:34:56:78:9a:bd -s 10.0.0.4 -j RETURN
+-A %(bn)s-s_port2 -j DROP
+-A %(bn)s-o_port2 -p udp -m udp --sport 68 --dport 67 -j RETURN
+-A %(bn)s-o_port2 -j %(bn)s-s_port2
+-A %(bn)s-o_port2 -p udp -m udp --sport 67 --dport 68 -j DROP
+-A %(bn)s-o_port2 -m state --state INVALID -j DROP
+-A %(bn)s-o_port2 -m state --state RELATED,ESTABLISHED -j RETURN
+-A %(bn)s-o_port2 -j RETURN
+-A %(bn)s-o_port2 -j %(bn)s-sg-fallback
+-A %(bn)s-sg-chain -j ACCEPT
+COMMIT""" % IPTABLES_ARG
 
-IPTABLES_FILTER_V6_2 = """# Generated by iptables_manager
-*filter
-:neutron-filter-top - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
+IPTABLES_NOFLUSH_V6_ADD_2 = """*filter
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-[0:0] -A FORWARD -j neutron-filter-top
-[0:0] -A OUTPUT -j neutron-filter-top
-[0:0] -A neutron-filter-top -j %(bn)s-local
-[0:0] -A INPUT -j %(bn)s-INPUT
-[0:0] -A OUTPUT -j %(bn)s-OUTPUT
-[0:0] -A FORWARD -j %(bn)s-FORWARD
-[0:0] -A %(bn)s-sg-fallback -j DROP
-[0:0] -A %(bn)s-FORWARD %(physdev_mod)s --physdev-INGRESS tap_port1 \
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-INGRESS tap_port1 \
 %(physdev_is_bridged)s -j %(bn)s-sg-chain
-[0:0] -A %(bn)s-sg-chain %(physdev_mod)s --physdev-INGRESS tap_port1 \
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-INGRESS tap_port1 \
 %(physdev_is_bridged)s -j %(bn)s-i_port1
-[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 130 -j RETURN
-[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 131 -j RETURN
-[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 132 -j RETURN
-[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 134 -j RETURN
-[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 135 -j RETURN
-[0:0] -A %(bn)s-i_port1 -p icmpv6 --icmpv6-type 136 -j RETURN
-[0:0] -A %(bn)s-i_port1 -m state --state INVALID -j DROP
-[0:0] -A %(bn)s-i_port1 -m state --state RELATED,ESTABLISHED -j RETURN
-[0:0] -A %(bn)s-i_port1 -j %(bn)s-sg-fallback
-[0:0] -A %(bn)s-FORWARD %(physdev_mod)s --physdev-EGRESS tap_port1 \
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-EGRESS tap_port1 \
 %(physdev_is_bridged)s -j %(bn)s-sg-chain
-[0:0] -A %(bn)s-sg-chain %(physdev_mod)s --physdev-EGRESS tap_port1 \
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-EGRESS tap_port1 \
 %(physdev_is_bridged)s -j %(bn)s-o_port1
-[0:0] -A %(bn)s-INPUT %(physdev_mod)s --physdev-EGRESS tap_port1 \
+-A %(bn)s-INPUT %(physdev_mod)s --physdev-EGRESS tap_port1 \
 %(physdev_is_bridged)s -j %(bn)s-o_port1
-[0:0] -A %(bn)s-o_port1 -p icmpv6 -j RETURN
-[0:0] -A %(bn)s-o_port1 -m state --state INVALID -j DROP
-[0:0] -A %(bn)s-o_port1 -m state --state RELATED,ESTABLISHED -j RETURN
-[0:0] -A %(bn)s-o_port1 -j %(bn)s-sg-fallback
-[0:0] -A %(bn)s-FORWARD %(physdev_mod)s --physdev-INGRESS tap_port2 \
+-A %(bn)s-sg-chain -j ACCEPT
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-INGRESS tap_port2 \
 %(physdev_is_bridged)s -j %(bn)s-sg-chain
-[0:0] -A %(bn)s-sg-chain %(physdev_mod)s --physdev-INGRESS tap_port2 \
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-INGRESS tap_port2 \
 %(physdev_is_bridged)s -j %(bn)s-i_port2
-[0:0] -A %(bn)s-i_port2 -p icmpv6 --icmpv6-type 130 -j RETURN
-[0:0] -A %(bn)s-i_port2 -p icmpv6 --icmpv6-type 131 -j RETURN
-[0:0] -A %(bn)s-i_port2 -p icmpv6 --icmpv6-type 132 -j RETURN
-[0:0] -A %(bn)s-i_port2 -p icmpv6 --icmpv6-type 134 -j RETURN
-[0:0] -A %(bn)s-i_port2 -p icmpv6 --icmpv6-type 135 -j RETURN
-[0:0] -A %(bn)s-i_port2 -p icmpv6 --icmpv6-type 136 -j RETURN
-[0:0] -A %(bn)s-i_port2 -m state --state INVALID -j DROP
-[0:0] -A %(bn)s-i_port2 -m state --state RELATED,ESTABLISHED -j RETURN
-[0:0] -A %(bn)s-i_port2 -j %(bn)s-sg-fallback
-[0:0] -A %(bn)s-FORWARD %(physdev_mod)s --physdev-EGRESS tap_port2 \
+-A %(bn)s-i_port2 -p icmpv6 --icmpv6-type 130 -j RETURN
+-A %(bn)s-i_port2 -p icmpv6 --icmpv6-type 131 -j RETURN
+-A %(bn)s-i_port2 -p icmpv6 --icmpv6-type 132 -j RETURN
+-A %(bn)s-i_port2 -p icmpv6 --icmpv6-type 134 -j RETURN
+-A %(bn)s-i_port2 -p icmpv6 --icmpv6-type 135 -j RETURN
+-A %(bn)s-i_port2 -p icmpv6 --icmpv6-type 136 -j RETURN
+-A %(bn)s-i_port2 -m state --state INVALID -j DROP
+-A %(bn)s-i_port2 -m state --state RELATED,ESTABLISHED -j RETURN
+-A %(bn)s-i_port2 -j %(bn)s-sg-fallback
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-EGRESS tap_port2 \
 %(physdev_is_bridged)s -j %(bn)s-sg-chain
-[0:0] -A %(bn)s-sg-chain %(physdev_mod)s --physdev-EGRESS tap_port2 \
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-EGRESS tap_port2 \
 %(physdev_is_bridged)s -j %(bn)s-o_port2
-[0:0] -A %(bn)s-INPUT %(physdev_mod)s --physdev-EGRESS tap_port2 \
+-A %(bn)s-INPUT %(physdev_mod)s --physdev-EGRESS tap_port2 \
 %(physdev_is_bridged)s -j %(bn)s-o_port2
-[0:0] -A %(bn)s-o_port2 -p icmpv6 -j RETURN
-[0:0] -A %(bn)s-o_port2 -m state --state INVALID -j DROP
-[0:0] -A %(bn)s-o_port2 -m state --state RELATED,ESTABLISHED -j RETURN
-[0:0] -A %(bn)s-o_port2 -j %(bn)s-sg-fallback
-[0:0] -A %(bn)s-sg-chain -j ACCEPT
-COMMIT
-# Completed by iptables_manager
-""" % IPTABLES_ARG
+-A %(bn)s-o_port2 -p icmpv6 -j RETURN
+-A %(bn)s-o_port2 -m state --state INVALID -j DROP
+-A %(bn)s-o_port2 -m state --state RELATED,ESTABLISHED -j RETURN
+-A %(bn)s-o_port2 -j %(bn)s-sg-fallback
+-A %(bn)s-sg-chain -j ACCEPT
+COMMIT""" % IPTABLES_ARG
 
-IPTABLES_ARG['chains'] = CHAINS_EMPTY
-IPTABLES_FILTER_V6_EMPTY = """# Generated by iptables_manager
-*filter
-:neutron-filter-top - [0:0]
+IPTABLES_NOFLUSH_1 = """*filter
 :%(bn)s-(%(chains)s) - [0:0]
+-A %(bn)s-i_port1 -m state --state INVALID -j DROP
+-A %(bn)s-i_port1 -m state --state RELATED,ESTABLISHED -j RETURN
+-A %(bn)s-i_port1 -s 10.0.0.2 -p udp -m udp --sport 67 --dport 68 -j RETURN
+-A %(bn)s-i_port1 -p tcp -m tcp --dport 22 -j RETURN
+-A %(bn)s-i_port1 -j %(bn)s-sg-fallback
+COMMIT""" % IPTABLES_ARG
+
+IPTABLES_NOFLUSH_REMOVE_2 = """*filter
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
-[0:0] -A FORWARD -j neutron-filter-top
-[0:0] -A OUTPUT -j neutron-filter-top
-[0:0] -A neutron-filter-top -j %(bn)s-local
-[0:0] -A INPUT -j %(bn)s-INPUT
-[0:0] -A OUTPUT -j %(bn)s-OUTPUT
-[0:0] -A FORWARD -j %(bn)s-FORWARD
-[0:0] -A %(bn)s-sg-fallback -j DROP
-COMMIT
-# Completed by iptables_manager
-""" % IPTABLES_ARG
+:%(bn)s-(%(chains)s) - [0:0]
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-INGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-sg-chain
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-INGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-i_port1
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-EGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-sg-chain
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-EGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-o_port1
+-A %(bn)s-INPUT %(physdev_mod)s --physdev-EGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-o_port1
+-A %(bn)s-sg-chain -j ACCEPT
+-X %(bn)s-i_port2
+-X %(bn)s-o_port2
+-X %(bn)s-s_port2
+COMMIT""" % IPTABLES_ARG
+
+IPTABLES_NOFLUSH_V6_REMOVE_2 = """*filter
+:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-INGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-sg-chain
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-INGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-i_port1
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-EGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-sg-chain
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-EGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-o_port1
+-A %(bn)s-INPUT %(physdev_mod)s --physdev-EGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-o_port1
+-A %(bn)s-sg-chain -j ACCEPT
+-X %(bn)s-i_port2
+-X %(bn)s-o_port2
+COMMIT""" % IPTABLES_ARG
+
+IPTABLES_NOFLUSH_2_3 = """*filter
+:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
+-A %(bn)s-i_port1 -m state --state INVALID -j DROP
+-A %(bn)s-i_port1 -m state --state RELATED,ESTABLISHED -j RETURN
+-A %(bn)s-i_port1 -s 10.0.0.2 -p udp -m udp --sport 67 --dport 68 -j RETURN
+-A %(bn)s-i_port1 -p tcp -m tcp --dport 22 -j RETURN
+-A %(bn)s-i_port1 -s 10.0.0.4 -j RETURN
+-A %(bn)s-i_port1 -p icmp -j RETURN
+-A %(bn)s-i_port1 -j %(bn)s-sg-fallback
+-A %(bn)s-i_port2 -m state --state INVALID -j DROP
+-A %(bn)s-i_port2 -m state --state RELATED,ESTABLISHED -j RETURN
+-A %(bn)s-i_port2 -s 10.0.0.2 -p udp -m udp --sport 67 --dport 68 -j RETURN
+-A %(bn)s-i_port2 -p tcp -m tcp --dport 22 -j RETURN
+-A %(bn)s-i_port2 -s 10.0.0.3 -j RETURN
+-A %(bn)s-i_port2 -p icmp -j RETURN
+-A %(bn)s-i_port2 -j %(bn)s-sg-fallback
+COMMIT""" % IPTABLES_ARG
 
 FIREWALL_BASE_PACKAGE = 'neutron.agent.linux.iptables_firewall.'
 FIREWALL_IPTABLES_DRIVER = FIREWALL_BASE_PACKAGE + 'IptablesFirewallDriver'
@@ -1253,6 +1551,7 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
         self.iptables_execute.side_effect = self.iptables_execute_return_values
 
         self.rpc = mock.Mock()
+        self.rpc.security_group_info_for_devices.return_value = None
         self.agent.plugin_rpc = self.rpc
         rule1 = [{'direction': 'ingress',
                   'protocol': const.PROTO_NAME_UDP,
@@ -1372,10 +1671,24 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
             root_helper=self.root_helper,
             return_value='')
 
+    def _replay_iptables_noflush(self, v4_filter, v6_filter=None):
+        self._register_mock_call(
+            ['iptables-restore', '--noflush'],
+            process_input=self._regex(v4_filter),
+            root_helper=self.root_helper,
+            return_value='')
+        if v6_filter:
+            self._register_mock_call(
+                ['ip6tables-restore', '--noflush'],
+                process_input=self._regex(v6_filter),
+                root_helper=self.root_helper,
+                return_value='')
+
     def test_prepare_remove_port(self):
         self.rpc.security_group_rules_for_devices.return_value = self.devices1
         self._replay_iptables(IPTABLES_FILTER_1, IPTABLES_FILTER_V6_1)
-        self._replay_iptables(IPTABLES_FILTER_EMPTY, IPTABLES_FILTER_V6_EMPTY)
+        self._replay_iptables_noflush(IPTABLES_NOFLUSH_REMOVE_1,
+                                      IPTABLES_NOFLUSH_V6_REMOVE_1)
 
         self.agent.prepare_devices_filter(['tap_port1'])
         self.agent.remove_devices_filter(['tap_port1'])
@@ -1385,11 +1698,14 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
     def test_security_group_member_updated(self):
         self.rpc.security_group_rules_for_devices.return_value = self.devices1
         self._replay_iptables(IPTABLES_FILTER_1, IPTABLES_FILTER_V6_1)
-        self._replay_iptables(IPTABLES_FILTER_1_2, IPTABLES_FILTER_V6_1)
-        self._replay_iptables(IPTABLES_FILTER_2, IPTABLES_FILTER_V6_2)
-        self._replay_iptables(IPTABLES_FILTER_2_2, IPTABLES_FILTER_V6_2)
-        self._replay_iptables(IPTABLES_FILTER_1, IPTABLES_FILTER_V6_1)
-        self._replay_iptables(IPTABLES_FILTER_EMPTY, IPTABLES_FILTER_V6_EMPTY)
+        self._replay_iptables_noflush(IPTABLES_NOFLUSH_1_2)
+        self._replay_iptables_noflush(IPTABLES_NOFLUSH_ADD_2,
+                                      IPTABLES_NOFLUSH_V6_ADD_2)
+        self._replay_iptables_noflush(IPTABLES_NOFLUSH_1)
+        self._replay_iptables_noflush(IPTABLES_NOFLUSH_REMOVE_2,
+                                      IPTABLES_NOFLUSH_V6_REMOVE_2)
+        self._replay_iptables_noflush(IPTABLES_NOFLUSH_REMOVE_1,
+                                      IPTABLES_NOFLUSH_V6_REMOVE_1)
 
         self.agent.prepare_devices_filter(['tap_port1'])
         self.rpc.security_group_rules_for_devices.return_value = self.devices2
@@ -1405,7 +1721,7 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
     def test_security_group_rule_updated(self):
         self.rpc.security_group_rules_for_devices.return_value = self.devices2
         self._replay_iptables(IPTABLES_FILTER_2, IPTABLES_FILTER_V6_2)
-        self._replay_iptables(IPTABLES_FILTER_2_3, IPTABLES_FILTER_V6_2)
+        self._replay_iptables_noflush(IPTABLES_NOFLUSH_2_3)
 
         self.agent.prepare_devices_filter(['tap_port1', 'tap_port3'])
         self.rpc.security_group_rules_for_devices.return_value = self.devices3
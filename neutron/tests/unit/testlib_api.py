@@ -13,9 +13,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from sqlalchemy import event
 import testtools
 
 from neutron.api.v2 import attributes
+from neutron.openstack.common.db.sqlalchemy import session
 from neutron.tests import base
 from neutron import wsgi
 
@@ -33,6 +35,37 @@ class ExpectedException(testtools.ExpectedException):
         return False
 
 
+class QueryCounter(object):
+    """Count the SQL statements run on the database within a block.
+
+    with QueryCounter() as counter:
+        plugin.get_networks(context)
+    self.assertEqual(2, counter.count)
+    """
+
+    def __init__(self):
+        self.statements = []
+        self._active = False
+        event.listen(session.get_engine(sqlite_fk=True),
+                     'after_cursor_execute', self._after_cursor_execute)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters,
+                              context, executemany):
+        if self._active:
+            self.statements.append(statement)
+
+    def __enter__(self):
+        self._active = True
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._active = False
+
+
 def create_request(path, body, content_type, method='GET',
                    query_string=None, context=None):
     if query_string:
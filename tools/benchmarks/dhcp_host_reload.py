@@ -0,0 +1,170 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Replay a burst of port events against the dnsmasq driver.
+
+The ports of a network are created one after the other, as during a mass
+boot, then some of them are updated again.  Every event goes through the
+NetworkCache of the DHCP agent and reloads the allocations of the network
+with the dnsmasq driver writing its config files to a temporary directory:
+
+ * old: the whole hosts file is formatted and both files are written and
+   dnsmasq is sent a SIGHUP on every event, as the driver used to do;
+ * per-event: the driver keeps its host table and only writes the files
+   which changed, dhcp_reload_delay = 0;
+ * coalesced: the events received within dhcp_reload_delay are applied by
+   a single reload, --window events are received by reload.
+
+The time taken, the config files written and the SIGHUPs sent are reported
+for each one:
+
+    python tools/benchmarks/dhcp_host_reload.py --ports 4000 --window 50
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from neutron.agent.common import config
+from neutron.agent import dhcp_agent
+from neutron.agent.linux import dhcp
+from neutron.agent.linux import utils
+
+
+NETWORK_ID = '12345678-1234-5678-1234567890ab'
+SUBNET_ID = 'bbbbbbbb-bbbb-bbbb-bbbbbbbbbbbb'
+
+
+class BenchDnsmasq(dhcp.Dnsmasq):
+    """Dnsmasq driver of a running dnsmasq process."""
+
+    active = True
+    pid = 1
+
+
+class LegacyDnsmasq(BenchDnsmasq):
+    """Dnsmasq driver rewriting all its config on every reload."""
+
+    def _replace_conf_file(self, file_name, data):
+        utils.replace_file(file_name, data)
+        return True
+
+    def _build_hosts_file(self):
+        self._host_tables.pop(self.network.id, None)
+        return super(LegacyDnsmasq, self)._build_hosts_file()
+
+
+def make_port(index, revision=0):
+    return dhcp.DictModel({
+        'id': 'port-%05d' % index,
+        'network_id': NETWORK_ID,
+        'device_owner': 'compute:nova',
+        'mac_address': 'fa:16:3e:%02x:%02x:%02x' % (
+            revision, index >> 8, index & 0xff),
+        'fixed_ips': [{'subnet_id': SUBNET_ID,
+                       'ip_address': '10.%d.%d.%d' % (
+                           revision, index >> 8, index & 0xff)}]})
+
+
+def make_events(ports, updates):
+    events = [make_port(i) for i in range(ports)]
+    events.extend(make_port(i, 1) for i in range(0, ports, ports // updates))
+    return events
+
+
+def make_conf(confs_dir):
+    conf = config.setup_conf()
+    conf.register_opts(dhcp.OPTS)
+    conf.register_opts(dhcp_agent.DhcpAgent.OPTS)
+    conf(args=[])
+    conf.set_override('dhcp_confs', confs_dir)
+    return conf
+
+
+def replay(driver_cls, events, window):
+    confs_dir = tempfile.mkdtemp()
+    os.mkdir(os.path.join(confs_dir, NETWORK_ID))
+    conf = make_conf(confs_dir)
+    cache = dhcp_agent.NetworkCache()
+    cache.put(dhcp.NetModel(True, {
+        'id': NETWORK_ID,
+        'subnets': [{'id': SUBNET_ID, 'ip_version': 4, 'cidr': '10.0.0.0/8',
+                     'enable_dhcp': True, 'gateway_ip': '10.0.0.1',
+                     'dns_nameservers': [], 'host_routes': []}],
+        'ports': []}))
+    replace_file = mock.Mock(side_effect=utils.replace_file)
+    try:
+        with mock.patch.object(dhcp, 'DeviceManager'):
+            with mock.patch.object(utils, 'execute') as execute:
+                with mock.patch.object(utils, 'replace_file', replace_file):
+                    start = time.time()
+                    for index, port in enumerate(events, 1):
+                        cache.put_port(port)
+                        if index % window and index != len(events):
+                            continue
+                        network = cache.get_network_by_id(NETWORK_ID)
+                        driver_cls(conf, network,
+                                   version=dhcp.Dnsmasq.MINIMUM_VERSION
+                                   ).reload_allocations()
+                    elapsed = time.time() - start
+        with open(os.path.join(confs_dir, NETWORK_ID, 'host')) as f:
+            hosts = f.read()
+    finally:
+        shutil.rmtree(confs_dir, ignore_errors=True)
+        driver_cls._host_tables.clear()
+        driver_cls._conf_file_contents.clear()
+    return elapsed, replace_file.call_count, execute.call_count, hosts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--ports', type=int, default=4000,
+                        help='Number of ports created on the network.')
+    parser.add_argument('--updates', type=int, default=400,
+                        help='Number of ports updated after their creation.')
+    parser.add_argument('--window', type=int, default=50,
+                        help='Number of events received within '
+                             'dhcp_reload_delay.')
+    args = parser.parse_args()
+
+    events = make_events(args.ports, args.updates)
+    print('%d port events on a network of %d ports' % (
+        len(events), args.ports))
+    results = []
+    for name, driver_cls, window in (('old', LegacyDnsmasq, 1),
+                                     ('per-event', BenchDnsmasq, 1),
+                                     ('coalesced', BenchDnsmasq,
+                                      args.window)):
+        elapsed, writes, hups, hosts = replay(driver_cls, events, window)
+        print('%-10s %10.3fs %8d files written %8d SIGHUP' % (
+            name, elapsed, writes, hups))
+        results.append((elapsed, hosts))
+    if len(set(hosts for elapsed, hosts in results)) != 1:
+        sys.exit('The hosts files differ')
+    print('identical hosts files, coalesced %.1fx faster than old' % (
+        results[0][0] / results[2][0]))
+
+
+if __name__ == '__main__':
+    main()
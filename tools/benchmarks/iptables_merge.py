@@ -0,0 +1,348 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the old and the current iptables-save merge.
+
+A synthetic iptables-save dump of the filter table, laid out like the one
+of a compute node running the OVS hybrid firewall, is merged with the
+in-memory rules of an IptablesManager by the quadratic merge neutron used
+to have and by IptablesManager._modify_rules. Most rules are already in
+the dump with non-zero counters; some were added and some removed since
+it was saved, and some chains and rules belong to other components.
+
+Both merges must produce the same lines, the time taken by each one is
+reported:
+
+    python tools/benchmarks/iptables_merge.py --lines 50000
+
+The old merge needs about a quarter of an hour for 50000 lines, --skip-old only
+runs the current one.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from neutron.agent.linux import iptables_manager
+
+
+BINARY_NAME = 'neutron-openvswi'
+RULES_PER_PORT = 16
+
+
+class LegacyIptablesManager(iptables_manager.IptablesManager):
+    """IptablesManager with the merge used before it was indexed."""
+
+    def _modify_rules(self, current_lines, table, table_name):
+        unwrapped_chains = table.unwrapped_chains
+        chains = table.chains
+        remove_chains = table.remove_chains
+        rules = table.rules
+        remove_rules = table.remove_rules
+
+        if not current_lines:
+            fake_table = ['# Generated by iptables_manager',
+                          '*' + table_name, 'COMMIT',
+                          '# Completed by iptables_manager']
+            current_lines = fake_table
+
+        # Fill old_filter with any chains or rules we might have added,
+        # they could have a [packet:byte] count we want to preserve.
+        # Fill new_filter with any chains or rules without our name in them.
+        old_filter, new_filter = [], []
+        for line in current_lines:
+            (old_filter if self.wrap_name in line else
+             new_filter).append(line.strip())
+
+        rules_index = self._find_rules_index(new_filter)
+
+        all_chains = [':%s' % name for name in unwrapped_chains]
+        all_chains += [':%s-%s' % (self.wrap_name, name) for name in chains]
+
+        # Iterate through all the chains, trying to find an existing
+        # match.
+        our_chains = []
+        for chain in all_chains:
+            chain_str = str(chain).strip()
+
+            orig_filter = [s for s in old_filter if chain_str in s.strip()]
+            dup_filter = [s for s in new_filter if chain_str in s.strip()]
+            new_filter = [s for s in new_filter if chain_str not in s.strip()]
+
+            # if no old or duplicates, use original chain
+            if orig_filter:
+                # grab the last entry, if there is one
+                old = orig_filter[-1]
+                chain_str = str(old).strip()
+            elif dup_filter:
+                # grab the last entry, if there is one
+                dup = dup_filter[-1]
+                chain_str = str(dup).strip()
+            else:
+                # add-on the [packet:bytes]
+                chain_str += ' - [0:0]'
+
+            our_chains += [chain_str]
+
+        # Iterate through all the rules, trying to find an existing
+        # match.
+        our_rules = []
+        bot_rules = []
+        for rule in rules:
+            rule_str = str(rule).strip()
+            # Further down, we weed out duplicates from the bottom of the
+            # list, so here we remove the dupes ahead of time.
+
+            orig_filter = [s for s in old_filter if rule_str in s.strip()]
+            dup_filter = [s for s in new_filter if rule_str in s.strip()]
+            new_filter = [s for s in new_filter if rule_str not in s.strip()]
+
+            # if no old or duplicates, use original rule
+            if orig_filter:
+                # grab the last entry, if there is one
+                old = orig_filter[-1]
+                rule_str = str(old).strip()
+            elif dup_filter:
+                # grab the last entry, if there is one
+                dup = dup_filter[-1]
+                rule_str = str(dup).strip()
+                # backup one index so we write the array correctly
+                rules_index -= 1
+            else:
+                # add-on the [packet:bytes]
+                rule_str = '[0:0] ' + rule_str
+
+            if rule.top:
+                # rule.top == True means we want this rule to be at the top.
+                our_rules += [rule_str]
+            else:
+                bot_rules += [rule_str]
+
+        our_rules += bot_rules
+
+        new_filter[rules_index:rules_index] = our_rules
+        new_filter[rules_index:rules_index] = our_chains
+
+        def _strip_packets_bytes(line):
+            # strip any [packet:byte] counts at start or end of lines
+            if line.startswith(':'):
+                # it's a chain, for example, ":neutron-billing - [0:0]"
+                line = line.split(':')[1]
+                line = line.split(' - [', 1)[0]
+            elif line.startswith('['):
+                # it's a rule, for example, "[0:0] -A neutron-billing..."
+                line = line.split('] ', 1)[1]
+            line = line.strip()
+            return line
+
+        seen_chains = set()
+
+        def _weed_out_duplicate_chains(line):
+            # ignore [packet:byte] counts at end of lines
+            if line.startswith(':'):
+                line = _strip_packets_bytes(line)
+                if line in seen_chains:
+                    return False
+                else:
+                    seen_chains.add(line)
+
+            # Leave it alone
+            return True
+
+        seen_rules = set()
+
+        def _weed_out_duplicate_rules(line):
+            if line.startswith('['):
+                line = _strip_packets_bytes(line)
+                if line in seen_rules:
+                    return False
+                else:
+                    seen_rules.add(line)
+
+            # Leave it alone
+            return True
+
+        def _weed_out_removes(line):
+            # We need to find exact matches here
+            if line.startswith(':'):
+                line = _strip_packets_bytes(line)
+                for chain in remove_chains:
+                    if chain == line:
+                        remove_chains.remove(chain)
+                        return False
+            elif line.startswith('['):
+                line = _strip_packets_bytes(line)
+                for rule in remove_rules:
+                    rule_str = _strip_packets_bytes(str(rule))
+                    if rule_str == line:
+                        remove_rules.remove(rule)
+                        return False
+
+            # Leave it alone
+            return True
+
+        # We filter duplicates.  Go through the chains and rules, letting
+        # the *last* occurrence take precendence since it could have a
+        # non-zero [packet:byte] count we want to preserve.  We also filter
+        # out anything in the "remove" list.
+        new_filter.reverse()
+        new_filter = [line for line in new_filter
+                      if _weed_out_duplicate_chains(line) and
+                      _weed_out_duplicate_rules(line) and
+                      _weed_out_removes(line)]
+        new_filter.reverse()
+
+        # flush lists, just in case we didn't find something
+        remove_chains.clear()
+        for rule in remove_rules:
+            remove_rules.remove(rule)
+
+        return new_filter
+
+
+def _port_rules(port):
+    """Return the (chain, rule) of the security group rules of a port."""
+    device = 'tap%05d-aa' % port
+    rules = [('i%05d-aa' % port, '-m state --state INVALID -j DROP'),
+             ('i%05d-aa' % port,
+              '-m state --state RELATED,ESTABLISHED -j RETURN'),
+             ('o%05d-aa' % port, '-m physdev --physdev-in %s '
+              '--physdev-is-bridged -j $s%05d-aa' % (device, port)),
+             ('s%05d-aa' % port,
+              '-m mac --mac-source fa:16:3e:00:%02x:%02x -s 10.0.%d.%d '
+              '-j RETURN' % (port >> 8, port & 0xff, port >> 8, port & 0xff)),
+             ('s%05d-aa' % port, '-j DROP')]
+    for i in range(RULES_PER_PORT - len(rules)):
+        rules.append(('i%05d-aa' % port, '-s 10.%d.%d.%d/32 -p tcp -m tcp '
+                      '--dport %d -j RETURN' % (port >> 8, port & 0xff,
+                                                i + 3, 1000 + i)))
+    return device, rules
+
+
+def build(lines, seed):
+    """Return an IptablesManager and the filter table dump to merge."""
+    rand = random.Random(seed)
+    manager = iptables_manager.IptablesManager(
+        state_less=True, binary_name=BINARY_NAME)
+    table = manager.ipv4['filter']
+    table.add_chain('sg-chain')
+    table.add_chain('sg-fallback')
+    table.add_rule('sg-fallback', '-j DROP')
+
+    def wrap(chain):
+        return '%s-%s' % (BINARY_NAME, chain)
+
+    def counters():
+        return '[%d:%d]' % (rand.randint(0, 1000), rand.randint(0, 10 ** 6))
+
+    saved_chains = [':INPUT ACCEPT [0:0]', ':FORWARD ACCEPT [0:0]',
+                    ':OUTPUT ACCEPT [0:0]', ':neutron-filter-top - [0:0]']
+    saved_rules = []
+    for chain in ('INPUT', 'OUTPUT', 'FORWARD', 'local', 'sg-chain',
+                  'sg-fallback'):
+        saved_chains.append(':%s - [0:0]' % wrap(chain))
+    for chain in ('INPUT', 'OUTPUT', 'FORWARD'):
+        saved_rules.append('%s -A %s -j %s' % (
+            counters(), chain, wrap(chain)))
+    saved_rules.append('%s -A %s -j DROP' % (counters(), wrap('sg-fallback')))
+
+    port = -1
+    while len(saved_chains) + len(saved_rules) + 4 < lines:
+        port += 1
+        device, rules = _port_rules(port)
+        if port % 10 == 9:
+            # A chain and rules created by another component
+            saved_chains.append(':nova-compute-i%05d - [0:0]' % port)
+            saved_rules.append('%s -A FORWARD -i %s -j nova-compute-i%05d'
+                               % (counters(), device, port))
+            saved_rules.extend('%s -A nova-compute-i%05d %s' % (
+                counters(), port, rule.replace('$', 'nova-compute-'))
+                for chain, rule in rules)
+            continue
+        # One in ten ports was added and one in ten is going to be removed
+        # since the dump was saved.
+        saved = port % 10 != 0
+        managed = port % 10 != 1
+        for chain in ('i%05d-aa' % port, 'o%05d-aa' % port,
+                      's%05d-aa' % port):
+            if saved:
+                saved_chains.append(':%s - [0:0]' % wrap(chain))
+            if managed:
+                table.add_chain(chain)
+        jumps = [('FORWARD', '-m physdev --physdev-out %s '
+                  '--physdev-is-bridged -j $sg-chain' % device),
+                 ('FORWARD', '-m physdev --physdev-in %s '
+                  '--physdev-is-bridged -j $sg-chain' % device),
+                 ('sg-chain', '-m physdev --physdev-out %s '
+                  '--physdev-is-bridged -j $i%05d-aa' % (device, port)),
+                 ('sg-chain', '-m physdev --physdev-in %s '
+                  '--physdev-is-bridged -j $o%05d-aa' % (device, port))]
+        for chain, rule in jumps + rules:
+            if saved:
+                saved_rules.append('%s -A %s %s' % (
+                    counters(), wrap(chain), rule.replace('$', BINARY_NAME +
+                                                          '-')))
+            if managed:
+                table.add_rule(chain, rule)
+    table.add_rule('sg-chain', '-j ACCEPT')
+    saved_rules.append('%s -A %s -j ACCEPT' % (counters(), wrap('sg-chain')))
+
+    dump = (['# Generated by iptables-save v1.4.12', '*filter'] +
+            saved_chains + saved_rules +
+            ['COMMIT', '# Completed on Mon Oct 21 10:00:00 2013'])
+    return manager, dump
+
+
+def merge(manager_cls, manager, dump):
+    table = manager.ipv4['filter']
+    merger = manager_cls(state_less=True, binary_name=BINARY_NAME)
+    start = time.time()
+    lines = merger._modify_rules(list(dump), table, 'filter')
+    return lines, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--lines', type=int, default=50000,
+                        help='Number of lines of the iptables-save dump.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip-old', action='store_true',
+                        help='Only run the current merge.')
+    args = parser.parse_args()
+
+    manager, dump = build(args.lines, args.seed)
+    print('%d lines saved, %d chains and %d rules in memory' % (
+        len(dump), len(manager.ipv4['filter'].chains),
+        len(manager.ipv4['filter'].rules)))
+    new_lines, new_time = merge(iptables_manager.IptablesManager,
+                                manager, dump)
+    print('%-8s %10.3fs %8d lines' % ('current', new_time, len(new_lines)))
+    if args.skip_old:
+        return
+    old_lines, old_time = merge(LegacyIptablesManager, manager, dump)
+    print('%-8s %10.3fs %8d lines' % ('old', old_time, len(old_lines)))
+    if old_lines != new_lines:
+        sys.exit('The merged lines differ')
+    print('identical output, %.1fx faster' % (old_time / new_time))
+
+
+if __name__ == '__main__':
+    main()
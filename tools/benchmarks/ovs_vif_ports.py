@@ -0,0 +1,280 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Count the ovs-vsctl calls made to read the ports of a bridge.
+
+The ovs-vsctl calls of an OVSBridge are served by a fake ovs-vsctl, which
+holds an integration bridge with a number of VIF ports and another bridge,
+and counts the processes which would have been spawned. The OVS agent
+operations reading the ports are run with the per-port reads neutron used
+to have and with the current ones:
+
+- the agent starts: the VIF ports are listed and each one is looked up;
+- a number of loops of the agent, in each of which the VIF ports are
+  listed and the ports which changed are looked up;
+- the VIF ports are deleted, as by neutron-ovs-cleanup.
+
+Both must find the same ports, the number of spawns and the time taken by
+each operation are reported:
+
+    python tools/benchmarks/ovs_vif_ports.py --ports 200 --spawn-cost 5
+
+--spawn-cost adds the given number of milliseconds to each call, a real
+ovs-vsctl run through rootwrap takes tens of milliseconds.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import mock
+
+from neutron.agent.linux import ovs_lib
+from neutron.openstack.common import jsonutils
+
+
+BRIDGE = 'br-int'
+OTHER_BRIDGE = 'br-tun'
+
+
+class LegacyOVSBridge(ovs_lib.OVSBridge):
+    """OVSBridge with the reads used before the bridge snapshot."""
+
+    def get_port_name_list(self):
+        res = self.run_vsctl(["list-ports", self.br_name])
+        if res:
+            return res.strip().split("\n")
+        return []
+
+    def get_vif_ports(self):
+        edge_ports = []
+        port_names = self.get_port_name_list()
+        for name in port_names:
+            external_ids = self.db_get_map("Interface", name, "external_ids")
+            ofport = self.db_get_val("Interface", name, "ofport")
+            if "iface-id" in external_ids and "attached-mac" in external_ids:
+                p = ovs_lib.VifPort(name, ofport, external_ids["iface-id"],
+                                    external_ids["attached-mac"], self)
+                edge_ports.append(p)
+        return edge_ports
+
+    def get_vif_port_set(self):
+        port_names = self.get_port_name_list()
+        edge_ports = set()
+        args = ['--format=json', '--', '--columns=name,external_ids',
+                'list', 'Interface']
+        result = self.run_vsctl(args)
+        if not result:
+            return edge_ports
+        for row in jsonutils.loads(result)['data']:
+            name = row[0]
+            if name not in port_names:
+                continue
+            external_ids = dict(row[1][1])
+            if "iface-id" in external_ids and "attached-mac" in external_ids:
+                edge_ports.add(external_ids['iface-id'])
+        return edge_ports
+
+    def delete_ports(self, all_ports=False):
+        if all_ports:
+            port_names = self.get_port_name_list()
+        else:
+            port_names = (port.port_name for port in self.get_vif_ports())
+
+        for port_name in port_names:
+            self.delete_port(port_name)
+
+
+class FakeOvsVsctl(object):
+    """Serve the ovs-vsctl commands used by OVSBridge from memory."""
+
+    def __init__(self, ports, spawn_cost):
+        self.spawn_cost = spawn_cost
+        self.spawns = 0
+        # name -> bridge, ofport, external_ids
+        self.interfaces = {}
+        self.bridges = {BRIDGE: [], OTHER_BRIDGE: []}
+        for i in range(ports):
+            self._add_port(BRIDGE, 'tap%05d' % i, {
+                'iface-id': self.vif_id(i),
+                'attached-mac': 'fa:16:3e:%02x:%02x:%02x' % (
+                    i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff),
+                'iface-status': 'active'})
+        self._add_port(BRIDGE, 'patch-tun', {})
+        self._add_port(OTHER_BRIDGE, 'patch-int', {})
+        for i in range(ports / 10):
+            self._add_port(OTHER_BRIDGE, 'gre-%05d' % i, {})
+
+    @staticmethod
+    def vif_id(i):
+        return '%08d-0000-0000-0000-000000000000' % i
+
+    def _add_port(self, bridge, name, external_ids):
+        self.bridges[bridge].append(name)
+        self.interfaces[name] = (bridge, len(self.interfaces) + 1,
+                                 external_ids)
+
+    def execute(self, args, root_helper=None, **kwargs):
+        self.spawns += 1
+        if self.spawn_cost:
+            time.sleep(self.spawn_cost)
+        assert args[0] == 'ovs-vsctl', args
+        json_format = '--format=json' in args
+        commands = [[]]
+        for arg in args[2:]:
+            if arg == '--':
+                commands.append([])
+            elif not arg.startswith('--') or arg.startswith('--columns='):
+                commands[-1].append(arg)
+        outputs = [self._run(command, json_format)
+                   for command in commands if command]
+        return ''.join(output for output in outputs if output)
+
+    def _run(self, command, json_format):
+        columns = None
+        if command[0].startswith('--columns='):
+            columns = command.pop(0)[len('--columns='):].split(',')
+        action = command[0]
+        if action == 'list-ports':
+            return ''.join('%s\n' % name
+                           for name in self.bridges[command[1]])
+        if action == 'del-port':
+            self.bridges[command[1]].remove(command[2])
+            del self.interfaces[command[2]]
+            return
+        if action == 'get':
+            bridge, ofport, external_ids = self.interfaces[command[2]]
+            if command[3] == 'ofport':
+                return '%d\n' % ofport
+            return '{%s}\n' % ', '.join('%s="%s"' % item
+                                        for item in external_ids.items())
+        if action == 'find':
+            port_id = command[2].split('=', 1)[1].strip('"')
+            for name, (bridge, ofport, external_ids) in (
+                    self.interfaces.items()):
+                if external_ids.get('iface-id') == port_id:
+                    return ('external_ids        : {%s}\n'
+                            'name                : "%s"\n'
+                            'ofport              : %d\n' % (
+                                ', '.join('%s="%s"' % item
+                                          for item in external_ids.items()),
+                                name, ofport))
+            return ''
+        if action == 'list':
+            assert json_format and columns, command
+            return jsonutils.dumps(self._list(command[1], command[2:],
+                                              columns)) + '\n'
+        raise AssertionError('Unexpected command %s' % command)
+
+    def _list(self, table, records, columns):
+        rows = []
+        if table == 'Bridge':
+            for name in records or self.bridges:
+                ports = [['uuid', 'Port-%s' % port]
+                         for port in self.bridges[name]]
+                # Sets of a single element are output as the element
+                rows.append({'name': name,
+                             'ports': (ports[0] if len(ports) == 1
+                                       else ['set', ports])})
+        else:
+            for name, (bridge, ofport, external_ids) in (
+                    self.interfaces.items()):
+                rows.append({
+                    '_uuid': ['uuid', '%s-%s' % (table, name)],
+                    'name': name,
+                    'interfaces': ['uuid', 'Interface-%s' % name],
+                    'ofport': ofport,
+                    'external_ids': ['map', external_ids.items()]})
+        return {'headings': columns,
+                'data': [[row[column] for column in columns]
+                         for row in rows]}
+
+
+def _vif_ports(ports):
+    return sorted((p.port_name, int(p.ofport), p.vif_id, p.vif_mac)
+                  for p in ports)
+
+
+def run(bridge_class, args):
+    vsctl = FakeOvsVsctl(args.ports, args.spawn_cost / 1000.0)
+    results = []
+    with mock.patch.object(ovs_lib.utils, 'execute', new=vsctl.execute):
+        bridge = bridge_class(BRIDGE, 'sudo')
+
+        def measure(operation, func):
+            spawns = vsctl.spawns
+            start = time.time()
+            result = func()
+            results.append((operation, vsctl.spawns - spawns,
+                            time.time() - start))
+            return result
+
+        def start_agent():
+            port_ids = bridge.get_vif_port_set()
+            return [bridge.get_vif_port_by_id(port_id)
+                    for port_id in sorted(port_ids)]
+
+        def agent_loops():
+            found = []
+            for loop in range(args.loops):
+                bridge.get_vif_port_set()
+                for i in range(args.updates):
+                    port_id = vsctl.vif_id((loop * args.updates + i) %
+                                           args.ports)
+                    found.append(bridge.get_vif_port_by_id(port_id))
+            return found
+
+        started = measure('start agent', start_agent)
+        looped = measure('%d agent loops' % args.loops, agent_loops)
+        vif_ports = measure('get_vif_ports', bridge.get_vif_ports)
+        measure('delete_ports', bridge.delete_ports)
+        remaining = bridge_class(BRIDGE, 'sudo').get_port_name_list()
+    return ((_vif_ports(started), _vif_ports(looped), _vif_ports(vif_ports),
+             remaining), results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--ports', type=int, default=200,
+                        help='Number of VIF ports on the bridge')
+    parser.add_argument('--loops', type=int, default=10,
+                        help='Number of agent loops')
+    parser.add_argument('--updates', type=int, default=5,
+                        help='Number of ports looked up by each agent loop')
+    parser.add_argument('--spawn-cost', type=float, default=0,
+                        help='Milliseconds added to each ovs-vsctl call')
+    args = parser.parse_args()
+
+    found = None
+    for name, bridge_class in (('legacy', LegacyOVSBridge),
+                               ('snapshot', ovs_lib.OVSBridge)):
+        ports, results = run(bridge_class, args)
+        if found is None:
+            found = ports
+        elif ports != found:
+            print('%s found different ports' % name)
+            sys.exit(1)
+        for operation, spawns, elapsed in results:
+            print('%-10s %-20s %6d spawns %8.3fs' %
+                  (name, operation, spawns, elapsed))
+
+
+if __name__ == '__main__':
+    main()